@@ -100,7 +100,7 @@ class ActorSubscriptionProcessor:
 
         # --- 步骤 3: ★★★ 使用线程池并发执行所有演员的扫描任务 ★★★ ---
         processed_count = 0
-        # 使用较少的 workers (如5) 可以避免因并发过高而触发 TMDb 的 API 速率限制
+        # TMDb 的总请求速率由全局限流器控制，这里的并发数只决定同时扫描几位演员
         with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
             
             # 提交所有任务到线程池
@@ -278,8 +278,9 @@ class ActorSubscriptionProcessor:
                     logger.info(f"  ➜ [阶段 3/4] 正在并发处理 {len(works_not_in_library)} 部不在库的新作品...")
                     results_to_commit = []
                     if works_not_in_library:
-                        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                            future_to_work = {executor.submit(self._process_single_work, work, sub, subscription_source): work for work in works_not_in_library}
+                        with concurrent.futures.ThreadPoolExecutor(max_workers=constants.TMDB_MAX_WORKERS) as executor:
+                            process_work = tmdb.bind_priority(self._process_single_work)
+                            future_to_work = {executor.submit(process_work, work, sub, subscription_source): work for work in works_not_in_library}
                             for future in concurrent.futures.as_completed(future_to_work):
                                 if self.is_stop_requested(): break
                                 result = future.result()
@@ -535,9 +536,10 @@ class ActorSubscriptionProcessor:
         logger.info(f"  ➜ 正在为 {len(works_to_fetch_credits)} 部电视剧作品并发获取演员番位信息...")
         
         # 使用线程池并发获取电视剧作品的详细信息
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=constants.TMDB_MAX_WORKERS) as executor:
+            fetch_credits = tmdb.bind_priority(self._fetch_tv_work_credits)
             future_to_work = {
-                executor.submit(self._fetch_tv_work_credits, work, api_key): work
+                executor.submit(fetch_credits, work, api_key): work
                 for work in works_to_fetch_credits
             }
 
@@ -467,7 +467,7 @@ def enrich_all_actor_aliases_task(
                 logger.info(f"  ➜ 找到 {total_tmdb} 位演员需要从 TMDb 补充元数据。")
                 
                 CHUNK_SIZE = 200
-                MAX_TMDB_WORKERS = 5
+                MAX_TMDB_WORKERS = constants.TMDB_MAX_WORKERS
 
                 for i in range(0, total_tmdb, CHUNK_SIZE):
                     if (stop_event and stop_event.is_set()) or (time.time() >= end_time):
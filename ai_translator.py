@@ -2,9 +2,13 @@
 import json
 import re
 import time
-from typing import Optional, Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any, List, Callable, Tuple
 import logging
 
+import constants
+
 logger = logging.getLogger(__name__)
 def _safe_json_loads(text: str) -> Optional[Dict]:
     """
@@ -71,15 +75,24 @@ def _safe_json_loads(text: str) -> Optional[Dict]:
         
         return None
 # --- 动态导入所有需要的 SDK ---
+# 已安装 SDK 的限流异常类型，供 _is_rate_limit_error 判断
+_RATE_LIMIT_ERROR_TYPES: Tuple[type, ...] = ()
+
 try:
-    from openai import OpenAI, APIError, APITimeoutError
+    from openai import OpenAI, APIError, APITimeoutError, RateLimitError
     OPENAI_AVAILABLE = True
+    _RATE_LIMIT_ERROR_TYPES += (RateLimitError,)
 except ImportError:
     OPENAI_AVAILABLE = False
 
 try:
+    import zhipuai
     from zhipuai import ZhipuAI
     ZHIPUAI_AVAILABLE = True
+    # 旧版 SDK 没有该异常类型时只靠状态码判断限流，不影响提供商可用性
+    _zhipuai_rate_limit_error = getattr(zhipuai, 'APIReachLimitError', None)
+    if isinstance(_zhipuai_rate_limit_error, type):
+        _RATE_LIMIT_ERROR_TYPES += (_zhipuai_rate_limit_error,)
 except ImportError:
     ZHIPUAI_AVAILABLE = False
 
@@ -89,6 +102,12 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
+try:
+    from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+    _RATE_LIMIT_ERROR_TYPES += (ResourceExhausted, TooManyRequests)
+except ImportError:
+    pass
+
 # ★★★ 说明书一：给“翻译官”看的（翻译模式） - 已优化 ★★★
 FAST_MODE_SYSTEM_PROMPT = """
 You are a translation API that only returns JSON.
@@ -132,6 +151,181 @@ You will receive a JSON object with `context` (containing `title` and `year`) an
 **Output Format (MANDATORY):**
 You MUST return a single, valid JSON object mapping each original term to its Chinese translation. NO other text or markdown.
 """
+# ======================================================================
+# 请求调度：并发上限 + RPM/TPM 令牌桶 + 429 自适应退避
+# ======================================================================
+def _estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符约 1 token/字，其余约 4 字符/token。"""
+    if not text:
+        return 0
+    cjk = len(re.findall(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]', text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _estimate_output_tokens(term: str) -> int:
+    # 输出是 {"原文": "译文"}：原文回显一次，译文按每个原文 token 约 1.5 个中文 token 估算，再加上引号、冒号、逗号
+    term_tokens = _estimate_tokens(term)
+    return term_tokens + (term_tokens * 3 + 1) // 2 + 6
+
+def _is_rate_limit_error(e: Exception) -> bool:
+    """
+    识别各 SDK 的限流错误 (HTTP 429 / 配额耗尽)。只看异常类型和 HTTP 状态码，
+    不匹配错误文本，以免消息里恰好含有 "429" 的其它错误被当成限流反复重试。
+    """
+    if _RATE_LIMIT_ERROR_TYPES and isinstance(e, _RATE_LIMIT_ERROR_TYPES):
+        return True
+    for status in (getattr(e, 'status_code', None), getattr(e, 'code', None),
+                   getattr(getattr(e, 'response', None), 'status_code', None)):
+        if status == 429:
+            return True
+    return False
+
+def _retry_after_seconds(e: Exception) -> Optional[float]:
+    headers = getattr(getattr(e, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class _TokenBucket:
+    """每分钟补充 rate 个令牌的令牌桶；单次请求超过桶容量时先等桶满再透支，避免永久阻塞。"""
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = self.rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float, scale: float = 1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_minute * scale / 60.0)
+                self.updated_at = now
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait = (needed - self.tokens) * 60.0 / (self.rate_per_minute * scale)
+            time.sleep(min(wait, 5.0))
+
+class AIRequestDispatcher:
+    """
+    同一服务商的所有 AITranslator 共享一个调度器：
+    - 同时在途的请求数不超过 max_concurrency；
+    - 按 RPM / TPM 令牌桶放行 (0 表示不限制)；
+    - 遇到 429 时按 Retry-After 或指数退避重试，并临时把速率减半，之后随成功请求逐步恢复。
+    """
+    def __init__(self, provider: str, max_concurrency: int, rpm: int, tpm: int):
+        self.provider = provider
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rpm = int(rpm or 0)
+        self.tpm = int(tpm or 0)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._request_bucket = _TokenBucket(self.rpm) if self.rpm > 0 else None
+        self._token_bucket = _TokenBucket(self.tpm) if self.tpm > 0 else None
+        self._scale_lock = threading.Lock()
+        self._rate_scale = 1.0
+
+    def _on_success(self):
+        with self._scale_lock:
+            self._rate_scale = min(1.0, self._rate_scale + 0.05)
+
+    def _on_rate_limited(self):
+        with self._scale_lock:
+            self._rate_scale = max(0.1, self._rate_scale * 0.5)
+
+    def _acquire(self, estimated_tokens: int):
+        scale = self._rate_scale
+        if self._request_bucket:
+            self._request_bucket.acquire(1, scale)
+        if self._token_bucket:
+            self._token_bucket.acquire(estimated_tokens, scale)
+
+    def call(self, func: Callable[[], Dict[str, str]], estimated_tokens: int, label: str) -> Dict[str, str]:
+        for attempt in range(constants.AI_RATE_LIMIT_MAX_RETRIES + 1):
+            self._acquire(estimated_tokens)
+            try:
+                with self._slots:
+                    result = func()
+                self._on_success()
+                return result
+            except Exception as e:
+                if not _is_rate_limit_error(e):
+                    logger.error(f"  ➜ {label} 请求失败: {e}", exc_info=True)
+                    return {}
+                self._on_rate_limited()
+                if attempt >= constants.AI_RATE_LIMIT_MAX_RETRIES:
+                    logger.error(f"  ➜ {label} 连续 {attempt + 1} 次触发限流 (429)，放弃该批次。")
+                    return {}
+                wait = _retry_after_seconds(e) or min(
+                    constants.AI_RATE_LIMIT_BACKOFF_MAX_SECONDS,
+                    constants.AI_RATE_LIMIT_BACKOFF_BASE_SECONDS * (2 ** attempt)
+                )
+                logger.warning(f"  ➜ {label} 触发限流 (429)，{wait:.1f} 秒后重试 ({attempt + 1}/{constants.AI_RATE_LIMIT_MAX_RETRIES})，速率临时降为 {self._rate_scale:.0%}。")
+                time.sleep(wait)
+        return {}
+
+    def run_chunks(self, chunks: List[List[str]], worker: Callable[[List[str]], Dict[str, str]],
+                   prompt_tokens: int, label: str) -> Dict[str, str]:
+        """并发执行所有批次并合并结果，单个批次失败不影响其它批次。"""
+        all_results: Dict[str, str] = {}
+        if not chunks:
+            return all_results
+
+        def _run(index: int, chunk: List[str]) -> Dict[str, str]:
+            estimated = prompt_tokens + _estimate_tokens(json.dumps(chunk, ensure_ascii=False)) \
+                + sum(_estimate_output_tokens(t) for t in chunk)
+            chunk_label = f"{label} 批次 {index + 1}/{len(chunks)}" if len(chunks) > 1 else label
+            return self.call(lambda: worker(chunk), estimated, chunk_label)
+
+        if len(chunks) == 1:
+            return _run(0, chunks[0]) or {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks))) as executor:
+            futures = [executor.submit(_run, i, chunk) for i, chunk in enumerate(chunks)]
+            for future in as_completed(futures):
+                result_chunk = future.result()
+                if result_chunk:
+                    all_results.update(result_chunk)
+        return all_results
+
+_dispatchers: Dict[Tuple, AIRequestDispatcher] = {}
+_dispatchers_lock = threading.Lock()
+
+def get_request_dispatcher(config: Dict[str, Any]) -> AIRequestDispatcher:
+    """按服务商和配额取得共享调度器；配置中的 0 表示使用该服务商的默认值。"""
+    provider = config.get(constants.CONFIG_OPTION_AI_PROVIDER, "openai").lower()
+    defaults = constants.AI_PROVIDER_RATE_DEFAULTS.get(provider, constants.AI_PROVIDER_RATE_DEFAULTS['openai'])
+    concurrency = config.get(constants.CONFIG_OPTION_AI_MAX_CONCURRENCY) or defaults['concurrency']
+    rpm = config.get(constants.CONFIG_OPTION_AI_RPM_LIMIT) or defaults['rpm']
+    tpm = config.get(constants.CONFIG_OPTION_AI_TPM_LIMIT) or defaults['tpm']
+    key = (provider, config.get(constants.CONFIG_OPTION_AI_BASE_URL), int(concurrency), int(rpm), int(tpm))
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(key)
+        if dispatcher is None:
+            dispatcher = AIRequestDispatcher(provider, concurrency, rpm, tpm)
+            _dispatchers[key] = dispatcher
+            logger.debug(f"  ➜ AI 请求调度器: {provider} 并发 {dispatcher.max_concurrency}，RPM {rpm or '不限'}，TPM {tpm or '不限'}。")
+        return dispatcher
+
+def plan_chunks(texts: List[str], max_items: int, max_output_tokens: int) -> List[List[str]]:
+    """按条目数和预估输出 token 数切分批次，长词条自动少放几条。"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = _estimate_output_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_output_tokens):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
 class AITranslator:
     def __init__(self, config: Dict[str, Any]):
         self.provider = config.get("ai_provider", "openai").lower()
@@ -142,6 +336,8 @@ class AITranslator:
         
         if not self.api_key:
             raise ValueError("AI Translator: API Key 未配置。")
+
+        self.dispatcher = get_request_dispatcher(config)
             
         self.client = None
         self._initialize_client()
@@ -204,118 +400,49 @@ class AITranslator:
         else:
             # 其他所有情况（包括默认的'fast'），都喊“翻译组”来干活
             return self._translate_fast_mode(unique_texts)
-    # ★★★ “翻译快做”小组长 (现在负责分批和调度！) ★★★
-    def _translate_fast_mode(self, texts: List[str]) -> Dict[str, str]:
-        CHUNK_SIZE = 50
-        REQUEST_INTERVAL = 1.5
+    # ★★★ 通用小组长：按 token 预算分批，交给调度器并发派发 ★★★
+    def _dispatch_mode(self, mode_label: str, texts: List[str], max_items: int, system_prompt: str,
+                       workers: Dict[str, Callable[[List[str]], Dict[str, str]]], context_log: str = "") -> Dict[str, str]:
+        worker = workers.get(self.provider)
+        if not worker:
+            logger.error(f"  ➜ [{mode_label}] 不支持的AI提供商: {self.provider}")
+            return {}
 
-        all_results = {}
-        text_chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, len(texts), CHUNK_SIZE)]
+        text_chunks = plan_chunks(texts, max_items, constants.AI_MAX_OUTPUT_TOKENS_PER_REQUEST)
         total_chunks = len(text_chunks)
-
-        # ▼▼▼ 只在真正分块时才打印详细日志 ▼▼▼
         if total_chunks > 1:
-            logger.info(f"  ➜ [翻译模式] 数据量较大，已自动分块。共 {len(texts)} 个词条，分为 {total_chunks} 个批次，每批最多 {CHUNK_SIZE} 个。")
+            logger.info(f"  ➜ [{mode_label}] 数据量较大，已自动分块。共 {len(texts)} 个词条，分为 {total_chunks} 个批次，每批最多 {max_items} 个，最多 {self.dispatcher.max_concurrency} 个批次并发。")
         else:
-            logger.info(f"  ➜ [翻译模式] 开始处理 {len(texts)} 个词条...")
+            logger.info(f"  ➜ [{mode_label}] 开始处理 {len(texts)} 个词条{context_log}...")
 
-        # 3. 小组长逐个派发任务
-        for i, chunk in enumerate(text_chunks):
-            if total_chunks > 1:
-                logger.info(f"  ➜ [翻译模式] 正在处理批次 {i + 1}/{total_chunks}")
-            
-            # 根据公司（provider）选择不同的员工干活
-            result_chunk = {}
-            if self.provider == 'openai':
-                result_chunk = self._fast_openai(chunk)
-            elif self.provider == 'zhipuai':
-                result_chunk = self._fast_zhipuai(chunk)
-            elif self.provider == 'gemini':
-                result_chunk = self._fast_gemini(chunk)
-            
-            if result_chunk:
-                all_results.update(result_chunk)
-            
-            # 4. 安排休息时间（如果不是最后一批）
-            if i < total_chunks - 1:
-                logger.debug(f"  ➜ 批次处理完毕，等待 {REQUEST_INTERVAL} 秒...")
-                time.sleep(REQUEST_INTERVAL)
-        
-        return all_results
+        return self.dispatcher.run_chunks(
+            text_chunks, worker, _estimate_tokens(system_prompt), f"[{mode_label}-{self.provider}]"
+        )
+
+    # ★★★ “翻译快做”小组长 ★★★
+    def _translate_fast_mode(self, texts: List[str]) -> Dict[str, str]:
+        return self._dispatch_mode("翻译模式", texts, 50, FAST_MODE_SYSTEM_PROMPT, {
+            'openai': self._fast_openai,
+            'zhipuai': self._fast_zhipuai,
+            'gemini': self._fast_gemini,
+        })
     
     # ★★★ “强制音译”小组长 ★★★
     def _translate_transliterate_mode(self, texts: List[str]) -> Dict[str, str]:
-        CHUNK_SIZE = 50
-        REQUEST_INTERVAL = 1.5
-
-        all_results = {}
-        text_chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, len(texts), CHUNK_SIZE)]
-        total_chunks = len(text_chunks)
-
-        if total_chunks > 1:
-            logger.info(f"  ➜ [音译模式] 数据量较大，已自动分块。共 {len(texts)} 个词条，分为 {total_chunks} 个批次。")
-        else:
-            logger.info(f"  ➜ [音译模式] 开始处理 {len(texts)} 个词条...")
+        return self._dispatch_mode("音译模式", texts, 50, FORCE_TRANSLITERATE_PROMPT, {
+            'openai': self._transliterate_openai,
+            'zhipuai': self._transliterate_zhipuai,
+            'gemini': self._transliterate_gemini,
+        })
 
-        for i, chunk in enumerate(text_chunks):
-            if total_chunks > 1:
-                logger.info(f"  ➜ [音译模式] 正在处理批次 {i + 1}/{total_chunks}")
-            
-            result_chunk = {}
-            # 根据提供商选择不同的实现
-            if self.provider == 'openai':
-                result_chunk = self._transliterate_openai(chunk)
-            elif self.provider == 'zhipuai':
-                result_chunk = self._transliterate_zhipuai(chunk)
-            elif self.provider == 'gemini':
-                result_chunk = self._transliterate_gemini(chunk)
-            
-            if result_chunk:
-                all_results.update(result_chunk)
-            
-            if i < total_chunks - 1:
-                time.sleep(REQUEST_INTERVAL)
-        
-        return all_results
-
-    # ★★★ “顾问精做”小组长 (同样负责分批和调度！) ★★★
+    # ★★★ “顾问精做”小组长 ★★★
     def _translate_quality_mode(self, texts: List[str], title: Optional[str], year: Optional[int]) -> Dict[str, str]:
-        CHUNK_SIZE = 30
-        REQUEST_INTERVAL = 1.5
-
-        all_results = {}
-        text_chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, len(texts), CHUNK_SIZE)]
-        total_chunks = len(text_chunks)
+        return self._dispatch_mode("顾问模式", texts, 30, QUALITY_MODE_SYSTEM_PROMPT, {
+            'openai': lambda chunk: self._quality_openai(chunk, title, year),
+            'zhipuai': lambda chunk: self._quality_zhipuai(chunk, title, year),
+            'gemini': lambda chunk: self._quality_gemini(chunk, title, year),
+        }, context_log=f" (上下文: '{title}')")
 
-        # ▼▼▼ 只在真正分块时才打印详细日志 ▼▼▼
-        if total_chunks > 1:
-            logger.info(f"  ➜ [顾问模式] 数据量较大，已自动分块。共 {len(texts)} 个词条，分为 {total_chunks} 个批次，每批最多 {CHUNK_SIZE} 个。")
-        else:
-            # 如果只有一个批次，日志就应该更简洁
-            logger.info(f"  ➜ [顾问模式] 开始处理 {len(texts)} 个词条 (上下文: '{title}') ...")
-
-        # 3. 小组长逐个派发任务
-        for i, chunk in enumerate(text_chunks):
-            if total_chunks > 1:
-                logger.info(f"  ➜ [顾问模式] 正在处理批次 {i + 1}/{total_chunks}")
-            
-            result_chunk = {}
-            if self.provider == 'openai':
-                result_chunk = self._quality_openai(chunk, title, year)
-            elif self.provider == 'zhipuai':
-                result_chunk = self._quality_zhipuai(chunk, title, year)
-            elif self.provider == 'gemini':
-                result_chunk = self._quality_gemini(chunk, title, year)
-
-            if result_chunk:
-                all_results.update(result_chunk)
-
-            # 4. 安排休息时间
-            if i < total_chunks - 1:
-                logger.debug(f"  ➜ 批次处理完毕，等待 {REQUEST_INTERVAL} 秒...")
-                time.sleep(REQUEST_INTERVAL)
-        
-        return all_results
     # --- 底层员工：具体实现各种模式和提供商的组合 ---
     # --- OpenAI 员工 ---
     def _fast_openai(self, texts: List[str]) -> Dict[str, str]:
@@ -336,6 +463,7 @@ class AITranslator:
             response_content = chat_completion.choices[0].message.content
             return _safe_json_loads(response_content) or {} # 如果抢救失败，返回一个空字典
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [翻译模式-OpenAI] 翻译时发生错误: {e}", exc_info=True)
             return {}
 
@@ -358,6 +486,7 @@ class AITranslator:
             response_content = chat_completion.choices[0].message.content
             return _safe_json_loads(response_content) or {} # 如果抢救失败，返回一个空字典
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [顾问模式-OpenAI] 翻译时发生错误: {e}", exc_info=True)
             return {}
 
@@ -379,6 +508,7 @@ class AITranslator:
             response_content = response.choices[0].message.content
             return _safe_json_loads(response_content) or {} # 如果抢救失败，返回一个空字典
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [翻译模式-智谱AI] 翻译时发生错误: {e}", exc_info=True)
             return {}
 
@@ -400,6 +530,7 @@ class AITranslator:
             response_content = response.choices[0].message.content
             return _safe_json_loads(response_content) or {} # 如果抢救失败，返回一个空字典
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [顾问模式-智谱AI] 翻译时发生错误: {e}", exc_info=True)
             return {}
 
@@ -427,6 +558,7 @@ class AITranslator:
             # 另外，Gemini的JSON模式输出非常干净，通常不需要_safe_json_loads，但为了保险起见可以加上
             return _safe_json_loads(response.text) or {}
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [翻译模式-Gemini] 翻译时发生错误: {e}", exc_info=True)
             # 尝试从错误中提取可解析的部分
             if hasattr(e, 'last_response') and e.last_response:
@@ -453,6 +585,7 @@ class AITranslator:
             )
             return _safe_json_loads(response.text) or {}
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [顾问模式-Gemini] 翻译时发生错误: {e}", exc_info=True)
             if hasattr(e, 'last_response') and e.last_response:
                 logger.info("  ➜ 尝试从Gemini的错误响应中恢复内容...")
@@ -478,6 +611,7 @@ class AITranslator:
             response_content = chat_completion.choices[0].message.content
             return _safe_json_loads(response_content) or {}
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [音译模式-OpenAI] 翻译时发生错误: {e}", exc_info=True)
             return {}
 
@@ -499,6 +633,7 @@ class AITranslator:
             response_content = response.choices[0].message.content
             return _safe_json_loads(response_content) or {}
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [音译模式-智谱AI] 翻译时发生错误: {e}", exc_info=True)
             return {}
 
@@ -521,6 +656,7 @@ class AITranslator:
             )
             return _safe_json_loads(response.text) or {}
         except Exception as e:
+            if _is_rate_limit_error(e): raise
             logger.error(f"  ➜ [音译模式-Gemini] 翻译时发生错误: {e}", exc_info=True)
             if hasattr(e, 'last_response') and e.last_response:
                 return _safe_json_loads(e.last_response.text) or {}
@@ -49,6 +49,9 @@ BOOTSTRAP_CONFIG_DEF = {
     constants.CONFIG_OPTION_DB_USER: (constants.CONFIG_SECTION_DATABASE, 'string', 'postgres'),
     constants.CONFIG_OPTION_DB_PASSWORD: (constants.CONFIG_SECTION_DATABASE, 'string', 'your_password'),
     constants.CONFIG_OPTION_DB_NAME: (constants.CONFIG_SECTION_DATABASE, 'string', 'emby_toolkit'),
+    constants.CONFIG_OPTION_DB_POOL_MIN_SIZE: (constants.CONFIG_SECTION_DATABASE, 'int', constants.DEFAULT_DB_POOL_MIN_SIZE),
+    constants.CONFIG_OPTION_DB_POOL_MAX_SIZE: (constants.CONFIG_SECTION_DATABASE, 'int', constants.DEFAULT_DB_POOL_MAX_SIZE),
+    constants.CONFIG_OPTION_DB_POOL_WAIT_TIMEOUT: (constants.CONFIG_SECTION_DATABASE, 'float', constants.DEFAULT_DB_POOL_WAIT_TIMEOUT),
     # [Authentication]
     constants.CONFIG_OPTION_AUTH_ENABLED: (constants.CONFIG_SECTION_AUTH, 'boolean', False),
     constants.CONFIG_OPTION_AUTH_USERNAME: (constants.CONFIG_SECTION_AUTH, 'string', constants.DEFAULT_USERNAME),
@@ -64,6 +67,7 @@ DYNAMIC_CONFIG_DEF = {
     constants.CONFIG_OPTION_EMBY_LIBRARIES_TO_PROCESS: (constants.CONFIG_SECTION_EMBY, 'list', []),
     constants.CONFIG_OPTION_EMBY_ADMIN_USER: (constants.CONFIG_SECTION_EMBY, 'string', ""),
     constants.CONFIG_OPTION_EMBY_ADMIN_PASS: (constants.CONFIG_SECTION_EMBY, 'password', ""), 
+    constants.CONFIG_OPTION_EMBY_PAGE_SIZE: (constants.CONFIG_SECTION_EMBY, 'int', constants.DEFAULT_EMBY_PAGE_SIZE),
 
     # [ReverseProxy]
     constants.CONFIG_OPTION_PROXY_ENABLED: (constants.CONFIG_SECTION_REVERSE_PROXY, 'boolean', False),
@@ -72,11 +76,13 @@ DYNAMIC_CONFIG_DEF = {
     constants.CONFIG_OPTION_PROXY_NATIVE_VIEW_SELECTION: (constants.CONFIG_SECTION_REVERSE_PROXY, 'list', []),
     constants.CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER: (constants.CONFIG_SECTION_REVERSE_PROXY, 'str', 'before'),
     constants.CONFIG_OPTION_PROXY_302_REDIRECT_URL: (constants.CONFIG_SECTION_REVERSE_PROXY, 'string', ""),
+    constants.CONFIG_OPTION_PROXY_VISIBLE_IDS_CACHE_MB: (constants.CONFIG_SECTION_REVERSE_PROXY, 'int', constants.DEFAULT_PROXY_VISIBLE_IDS_CACHE_MB),
     constants.CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER: (constants.CONFIG_SECTION_REVERSE_PROXY, 'str', 'before'),
 
     # [TMDB]
     constants.CONFIG_OPTION_TMDB_API_KEY: (constants.CONFIG_SECTION_TMDB, 'string', ""),
     constants.CONFIG_OPTION_TMDB_API_BASE_URL: (constants.CONFIG_SECTION_TMDB, 'string', "https://api.themoviedb.org/3"),
+    constants.CONFIG_OPTION_TMDB_CACHE_ENABLED: (constants.CONFIG_SECTION_TMDB, 'boolean', True),
     constants.CONFIG_OPTION_GITHUB_TOKEN: (constants.CONFIG_SECTION_GITHUB, 'string', ""),
 
     # [DoubanAPI]
@@ -100,6 +106,7 @@ DYNAMIC_CONFIG_DEF = {
 
     # [General]
     "delay_between_items_sec": ("General", 'float', 0.5),
+    constants.CONFIG_OPTION_FULL_SCAN_WORKERS: ("General", 'int', constants.DEFAULT_FULL_SCAN_WORKERS),
     constants.CONFIG_OPTION_MIN_SCORE_FOR_REVIEW: ("General", 'float', constants.DEFAULT_MIN_SCORE_FOR_REVIEW),
     constants.CONFIG_OPTION_MAX_ACTORS_TO_PROCESS: ("General", 'int', constants.DEFAULT_MAX_ACTORS_TO_PROCESS),
     constants.CONFIG_OPTION_REMOVE_ACTORS_WITHOUT_AVATARS: ("General", 'boolean', True),
@@ -117,6 +124,9 @@ DYNAMIC_CONFIG_DEF = {
     constants.CONFIG_OPTION_AI_MODEL_NAME: (constants.CONFIG_SECTION_AI_TRANSLATION, 'string', "deepseek-ai/DeepSeek-V2.5"),
     constants.CONFIG_OPTION_AI_BASE_URL: (constants.CONFIG_SECTION_AI_TRANSLATION, 'string', "https://api.siliconflow.cn/v1"),
     constants.CONFIG_OPTION_AI_TRANSLATION_MODE: (constants.CONFIG_SECTION_AI_TRANSLATION, 'string', 'fast'),
+    constants.CONFIG_OPTION_AI_MAX_CONCURRENCY: (constants.CONFIG_SECTION_AI_TRANSLATION, 'int', 0),
+    constants.CONFIG_OPTION_AI_RPM_LIMIT: (constants.CONFIG_SECTION_AI_TRANSLATION, 'int', 0),
+    constants.CONFIG_OPTION_AI_TPM_LIMIT: (constants.CONFIG_SECTION_AI_TRANSLATION, 'int', 0),
 
     # [Scheduler]
     # --- 高频任务链 ---
@@ -137,6 +147,7 @@ DYNAMIC_CONFIG_DEF = {
     # [Logging]
     constants.CONFIG_OPTION_LOG_ROTATION_SIZE_MB: (constants.CONFIG_SECTION_LOGGING, 'int', constants.DEFAULT_LOG_ROTATION_SIZE_MB),
     constants.CONFIG_OPTION_LOG_ROTATION_BACKUPS: (constants.CONFIG_SECTION_LOGGING, 'int', constants.DEFAULT_LOG_ROTATION_BACKUPS),
+    constants.CONFIG_OPTION_LOG_SAMPLING_ENABLED: (constants.CONFIG_SECTION_LOGGING, 'boolean', True),
     constants.CONFIG_OPTION_REGISTRATION_REDIRECT_URL: (constants.CONFIG_SECTION_USER_MANAGEMENT, 'string', ""),
 
     # [Telegram]
@@ -25,6 +25,15 @@ ENV_VAR_DB_PORT = "DB_PORT"
 ENV_VAR_DB_USER = "DB_USER"
 ENV_VAR_DB_PASSWORD = "DB_PASSWORD"
 ENV_VAR_DB_NAME = "DB_NAME"
+# --- 连接池 ---
+CONFIG_OPTION_DB_POOL_MIN_SIZE = "db_pool_min_size"             # 连接池常驻的最小连接数
+CONFIG_OPTION_DB_POOL_MAX_SIZE = "db_pool_max_size"             # 连接池允许的最大连接数
+CONFIG_OPTION_DB_POOL_WAIT_TIMEOUT = "db_pool_wait_timeout"     # 池满时等待空闲连接的秒数，超时后临时建立溢出连接
+DEFAULT_DB_POOL_MIN_SIZE = 2
+DEFAULT_DB_POOL_MAX_SIZE = 20
+DEFAULT_DB_POOL_WAIT_TIMEOUT = 5.0
+DB_POOL_IDLE_TIMEOUT_SECONDS = 300          # 空闲超过此时间的连接将被回收 (保留最小连接数)
+DB_POOL_HEALTH_CHECK_INTERVAL_SECONDS = 30  # 空闲超过此时间的连接在借出前会先做一次 SELECT 1 探活
 
 # ==============================================================================
 # ✨ 通知服务 (Notification Services)
@@ -43,6 +52,8 @@ CONFIG_OPTION_PROXY_MERGE_NATIVE = "proxy_merge_native_libraries"
 CONFIG_OPTION_PROXY_NATIVE_VIEW_SELECTION = "proxy_native_view_selection"  # List[str]
 CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER = "proxy_native_view_order"  # str, 'before' or 'after'
 CONFIG_OPTION_PROXY_302_REDIRECT_URL = "proxy_302_redirect_url"
+CONFIG_OPTION_PROXY_VISIBLE_IDS_CACHE_MB = "proxy_visible_ids_cache_mb"  # 虚拟库可见ID进程内缓存的内存预算 (MB)
+DEFAULT_PROXY_VISIBLE_IDS_CACHE_MB = 64
 CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER = "proxy_native_view_order"  # str, 'before' or 'after'
 
 # ==============================================================================
@@ -56,6 +67,18 @@ CONFIG_OPTION_EMBY_API_TIMEOUT = "emby_api_timeout"     # Emby API 超时时间
 CONFIG_OPTION_EMBY_LIBRARIES_TO_PROCESS = "libraries_to_process" # 需要处理的媒体库名称列表
 CONFIG_OPTION_EMBY_ADMIN_USER = "emby_admin_user"       # (可选) 用于自动登录获取令牌的管理员用户名
 CONFIG_OPTION_EMBY_ADMIN_PASS = "emby_admin_pass"       # (可选) 用于自动登录获取令牌的管理员密码
+CONFIG_OPTION_EMBY_PAGE_SIZE = "emby_page_size"         # 分页拉取媒体库项目时每页的条数
+DEFAULT_EMBY_PAGE_SIZE = 500
+METADATA_SYNC_WATERMARK_OVERLAP_MINUTES = 10  # 增量同步按水位线拉取变更时向前多取的分钟数，抵消 Emby 与本机的时钟偏差
+# --- Emby HTTP 客户端 ---
+EMBY_HTTP_POOL_CONNECTIONS = 4          # 共享 Session 缓存的主机连接池数量
+EMBY_HTTP_POOL_MAXSIZE = 32             # 每个主机保持的 keep-alive 连接上限
+EMBY_HTTP_CONNECT_TIMEOUT_SECONDS = 5   # 建立 TCP 连接的超时时间
+EMBY_HTTP_MAX_RETRIES = 3               # 连接错误/网关错误的最大重试次数
+EMBY_HTTP_BACKOFF_FACTOR = 0.3          # 重试退避系数
+# --- 用户权限快照 ---
+PERMISSION_SNAPSHOT_MAX_AGE_HOURS = 24   # Policy 未变且数量一致时，快照最多沿用多久才强制重新枚举
+EMBY_USER_POLICY_CACHE_TTL_SECONDS = 300  # 解析项目访问权限时，用户 Policy 与媒体库路径的缓存时间
 
 # ==============================================================================
 # ✨ 数据处理流程配置 (Processing Workflow)
@@ -63,9 +86,16 @@ CONFIG_OPTION_EMBY_ADMIN_PASS = "emby_admin_pass"       # (可选) 用于自动
 CONFIG_SECTION_PROCESSING = "Processing"
 CONFIG_OPTION_MAX_ACTORS_TO_PROCESS = "max_actors_to_process"   # 每个媒体项目处理的演员数量上限
 DEFAULT_MAX_ACTORS_TO_PROCESS = 50                              # 默认的演员数量上限
+ACTOR_BULK_UPSERT_CHUNK_SIZE = 5000                             # 演员批量写入时每次合并进 person_identity_map 的行数
 CONFIG_OPTION_MIN_SCORE_FOR_REVIEW = "min_score_for_review"     # 低于此评分的项目将进入手动处理列表
 DEFAULT_MIN_SCORE_FOR_REVIEW = 6.0                              # 默认的最低分
 CONFIG_OPTION_REMOVE_ACTORS_WITHOUT_AVATARS = "remove_actors_without_avatars" # 是否移除无头像的演员
+CONFIG_OPTION_FULL_SCAN_WORKERS = "full_scan_workers"       # 全量扫描时并发处理的项目数，1 为逐个串行处理
+DEFAULT_FULL_SCAN_WORKERS = 1
+DOUBAN_MAX_CONCURRENCY = 1                  # 并发处理时同时访问豆瓣的项目数上限 (豆瓣有严格的频率限制)
+WATCHLIST_SERIES_WORKERS = 10               # 追剧更新时并发处理的剧集数
+WATCHLIST_SEASON_FETCH_CONCURRENCY = 8      # 追剧更新时全进程同时向 TMDb 拉取季详情的请求数上限
+AI_TRANSLATION_MAX_CONCURRENCY = 2          # 并发处理时同时提交 AI 翻译的项目数上限
 
 # ==============================================================================
 # ✨ 外部API与数据源配置 (External APIs & Data Sources)
@@ -75,6 +105,20 @@ CONFIG_SECTION_TMDB = "TMDB"
 CONFIG_OPTION_TMDB_API_KEY = "tmdb_api_key" # TMDb API密钥
 CONFIG_OPTION_TMDB_API_BASE_URL = "tmdb_api_base_url" # TMDb API基础URL
 ENV_VAR_TMDB_API_BASE_URL = "TMDB_API_BASE_URL" # TMDb API基础URL环境变量
+TMDB_RATE_LIMIT_PER_SECOND = 35   # 全进程共享的 TMDb 请求速率上限 (TMDb 官方约为每秒 50 次)
+TMDB_RATE_LIMIT_BURST = 20        # 令牌桶容量，允许的瞬时突发请求数
+TMDB_MAX_WORKERS = 10             # 批量获取 TMDb 数据时的默认并发数，总速率仍由限流器控制
+CONFIG_OPTION_TMDB_CACHE_ENABLED = "tmdb_cache_enabled" # 是否把 TMDb 响应持久化缓存到数据库
+# TMDb 响应缓存的有效期 (秒)，按资源类别区分：已完结/久远的内容几乎不会变，连载中的内容变化频繁
+TMDB_CACHE_TTL_STABLE_SECONDS = 30 * 86400      # 已完结剧集、上映超过一年的电影、已播完的季/集
+TMDB_CACHE_TTL_ACTIVE_SECONDS = 6 * 3600        # 连载中剧集、新片、仍在播出的季/集
+TMDB_CACHE_TTL_PERSON_SECONDS = 12 * 3600       # 人物详情与作品列表 (演员订阅靠它发现新作品，不宜过长)
+TMDB_CACHE_TTL_REFERENCE_SECONDS = 30 * 86400   # 类型列表、系列合集等参考数据
+TMDB_CACHE_TTL_LISTING_SECONDS = 3600           # 搜索、发现、热门、片单等列表类结果
+TMDB_CACHE_TTL_DEFAULT_SECONDS = 86400
+TMDB_CACHE_RECENT_AIR_DAYS = 30                 # 最近这么多天内播出的季/集按“活跃”处理
+TMDB_CACHE_RECENT_RELEASE_DAYS = 365            # 上映不满这么多天的电影按“活跃”处理
+TMDB_CACHE_PURGE_GRACE_DAYS = 30                # 过期超过这么多天且未被重新验证的缓存会被清理
 # --- GitHub (用于版本检查) ---
 CONFIG_SECTION_GITHUB = "GitHub"
 CONFIG_OPTION_GITHUB_TOKEN = "github_token" # 用于提高API速率限制的个人访问令牌
@@ -111,6 +155,20 @@ CONFIG_OPTION_AI_API_KEY = "ai_api_key"                         # AI服务的API
 CONFIG_OPTION_AI_MODEL_NAME = "ai_model_name"                   # 使用的AI模型名称 (如 'Qwen/Qwen2-7B-Instruct')
 CONFIG_OPTION_AI_BASE_URL = "ai_base_url"                       # AI服务的API基础URL
 CONFIG_OPTION_AI_TRANSLATION_MODE = "ai_translation_mode"       # AI翻译模式 ('fast' 或 'quality')
+TRANSLATION_CACHE_LRU_SIZE = 20000                               # 翻译缓存进程内 LRU 的条目上限
+CONFIG_OPTION_AI_MAX_CONCURRENCY = "ai_max_concurrency"         # 同时在途的 AI 请求数，0 表示使用服务商默认值
+CONFIG_OPTION_AI_RPM_LIMIT = "ai_rpm_limit"                     # 每分钟请求数上限，0 表示使用服务商默认值
+CONFIG_OPTION_AI_TPM_LIMIT = "ai_tpm_limit"                     # 每分钟 token 数上限，0 表示使用服务商默认值 (默认值也为 0 时不限制)
+# 各服务商的默认配额：concurrency / rpm / tpm (0 = 不限制)
+AI_PROVIDER_RATE_DEFAULTS = {
+    'openai':  {'concurrency': 4, 'rpm': 60, 'tpm': 0},
+    'zhipuai': {'concurrency': 3, 'rpm': 60, 'tpm': 0},
+    'gemini':  {'concurrency': 2, 'rpm': 15, 'tpm': 250000},
+}
+AI_MAX_OUTPUT_TOKENS_PER_REQUEST = 4000     # 按预估输出 token 数切分批次，避免长译文被截断
+AI_RATE_LIMIT_MAX_RETRIES = 5               # 遇到 429 时的最大重试次数
+AI_RATE_LIMIT_BACKOFF_BASE_SECONDS = 2      # 429 退避的初始等待时间，之后指数增长
+AI_RATE_LIMIT_BACKOFF_MAX_SECONDS = 60      # 429 退避的最长等待时间
 
 # ==============================================================================
 # ✨ 网络配置 (Network) - ★★★ 新增部分 ★★★
@@ -150,6 +208,14 @@ CONFIG_OPTION_LOG_ROTATION_SIZE_MB = "log_rotation_size_mb"
 CONFIG_OPTION_LOG_ROTATION_BACKUPS = "log_rotation_backup_count"
 DEFAULT_LOG_ROTATION_SIZE_MB = 5
 DEFAULT_LOG_ROTATION_BACKUPS = 10
+CONFIG_OPTION_LOG_SAMPLING_ENABLED = "log_sampling_enabled"  # 是否折叠“正在跳过已处理的项目”等重复性日志
+LOG_QUEUE_MAX_SIZE = 10000              # 异步日志队列容量，满时丢弃 WARNING 以下的日志并计数
+LOG_QUEUE_PUT_TIMEOUT_SECONDS = 2       # 队列满时 WARNING 及以上日志最多等待入队的秒数
+FRONTEND_LOG_BUFFER_SIZE = 100          # 前端实时日志保留的最近条数
+LOG_SAMPLE_WINDOW_SECONDS = 10          # 重复性日志的限流窗口
+LOG_SAMPLE_BURST = 5                    # 每个窗口内同类日志最多放行的条数
+LOG_SEARCH_MAX_RESULTS = 1000          # 单次日志搜索最多返回的行数（分页上限）
+LOG_SEARCH_CONTEXT_MAX_BLOCKS = 100     # 单次上下文搜索最多返回的处理块数
 # ==============================================================================
 # ✨ 内部常量与映射 (Internal Constants & Mappings)
 # ==============================================================================
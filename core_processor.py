@@ -7,6 +7,8 @@ from typing import Dict, List, Optional, Any, Tuple
 from collections import defaultdict
 import shutil
 import threading
+import concurrent.futures
+from contextlib import contextmanager
 from datetime import datetime, timezone
 import time as time_module
 import psycopg2
@@ -131,6 +133,11 @@ class MediaProcessor:
         self.ai_translator = AITranslator(self.config) if self.ai_enabled else None
         
         self._stop_event = threading.Event()
+        # 并发处理时按外部数据源限流：豆瓣严格串行，AI 少量并发，TMDb/Emby 由各自的连接池约束
+        self._source_semaphores = {
+            "douban": threading.BoundedSemaphore(constants.DOUBAN_MAX_CONCURRENCY),
+            "ai": threading.BoundedSemaphore(constants.AI_TRANSLATION_MAX_CONCURRENCY),
+        }
         self.processed_items_cache = self._load_processed_log_from_db()
         self.manual_edit_cache = TTLCache(maxsize=10, ttl=600)
         logger.trace("核心处理器初始化完成。")
@@ -466,6 +473,16 @@ class MediaProcessor:
     def is_stop_requested(self) -> bool:
         return self._stop_event.is_set()
 
+    @contextmanager
+    def _source_slot(self, source: str):
+        """占用一个外部数据源的并发名额，串行处理时不会产生等待。"""
+        semaphore = self._source_semaphores.get(source)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
     def _load_processed_log_from_db(self) -> Dict[str, str]:
         log_dict = {}
         try:
@@ -551,44 +568,45 @@ class MediaProcessor:
         # 3. 如果本地未找到，回退到功能完整的在线API路径
         logger.info("  ➜ 未找到本地豆瓣缓存，将通过在线API获取演员和评分信息。")
 
-        # 3.1 匹配豆瓣ID和类型。现在 match_info 返回的结果是完全可信的。
-        match_info_result = self.douban_api.match_info(
-            name=item_name, imdbid=imdb_id, mtype=item_type, year=item_year
-        )
+        with self._source_slot("douban"):
+            # 3.1 匹配豆瓣ID和类型。现在 match_info 返回的结果是完全可信的。
+            match_info_result = self.douban_api.match_info(
+                name=item_name, imdbid=imdb_id, mtype=item_type, year=item_year
+            )
 
-        if match_info_result.get("error") or not match_info_result.get("id"):
-            logger.warning(f"在线匹配豆瓣ID失败 for '{item_name}': {match_info_result.get('message', '未找到ID')}")
-            return [], None
+            if match_info_result.get("error") or not match_info_result.get("id"):
+                logger.warning(f"在线匹配豆瓣ID失败 for '{item_name}': {match_info_result.get('message', '未找到ID')}")
+                return [], None
 
-        douban_id = match_info_result["id"]
-        # ✨✨✨ 直接信任从 douban.py 返回的类型 ✨✨✨
-        douban_type = match_info_result.get("type")
+            douban_id = match_info_result["id"]
+            # ✨✨✨ 直接信任从 douban.py 返回的类型 ✨✨✨
+            douban_type = match_info_result.get("type")
 
-        if not douban_type:
-            logger.error(f"从豆瓣匹配结果中未能获取到媒体类型 for ID {douban_id}。处理中止。")
-            return [], None
+            if not douban_type:
+                logger.error(f"从豆瓣匹配结果中未能获取到媒体类型 for ID {douban_id}。处理中止。")
+                return [], None
 
-        # 3.2 获取演职员 (使用完全可信的类型)
-        cast_data = self.douban_api.get_acting(
-            name=item_name, 
-            douban_id_override=douban_id, 
-            mtype=douban_type
-        )
-        douban_cast_raw = cast_data.get("cast", [])
-
-        # 3.3 获取详情（为了评分），同样使用可信的类型
-        details_data = self.douban_api._get_subject_details(douban_id, douban_type)
-        douban_rating = None
-        if details_data and not details_data.get("error"):
-            rating_str = details_data.get("rating", {}).get("value")
-            if rating_str:
-                try:
-                    douban_rating = float(rating_str)
-                    logger.info(f"  ➜ 在线获取到豆瓣评分 for '{item_name}': {douban_rating}")
-                except (ValueError, TypeError):
-                    pass
+            # 3.2 获取演职员 (使用完全可信的类型)
+            cast_data = self.douban_api.get_acting(
+                name=item_name, 
+                douban_id_override=douban_id, 
+                mtype=douban_type
+            )
+            douban_cast_raw = cast_data.get("cast", [])
+
+            # 3.3 获取详情（为了评分），同样使用可信的类型
+            details_data = self.douban_api._get_subject_details(douban_id, douban_type)
+            douban_rating = None
+            if details_data and not details_data.get("error"):
+                rating_str = details_data.get("rating", {}).get("value")
+                if rating_str:
+                    try:
+                        douban_rating = float(rating_str)
+                        logger.info(f"  ➜ 在线获取到豆瓣评分 for '{item_name}': {douban_rating}")
+                    except (ValueError, TypeError):
+                        pass
 
-        return douban_cast_raw, douban_rating
+            return douban_cast_raw, douban_rating
     
     # --- 通过TmdbID查找映射表 ---
     def _find_person_in_map_by_tmdb_id(self, tmdb_id: str, cursor: psycopg2.extensions.cursor) -> Optional[Dict[str, Any]]:
@@ -683,15 +701,34 @@ class MediaProcessor:
         all_emby_libraries = emby.get_emby_libraries(self.emby_url, self.emby_api_key, self.emby_user_id) or []
         library_name_map = {lib.get('Id'): lib.get('Name', '未知库名') for lib in all_emby_libraries}
         
-        movies = emby.get_emby_library_items(self.emby_url, self.emby_api_key, "Movie", self.emby_user_id, libs_to_process_ids, library_name_map=library_name_map) or []
-        series = emby.get_emby_library_items(self.emby_url, self.emby_api_key, "Series", self.emby_user_id, libs_to_process_ids, library_name_map=library_name_map) or []
+        # 分页流式拉取，只保留处理循环真正用到的 Id/Name，不再把整库的完整 JSON 留在内存里
+        def _collect_light_items(item_type: str) -> list:
+            light_items, source_lib_ids = [], set()
+            for page in emby.iter_emby_library_items(
+                self.emby_url, self.emby_api_key, libs_to_process_ids,
+                media_type_filter=item_type, user_id=self.emby_user_id,
+                fields="Id,Name,Type", prefetch_pages=2,
+                stop_event=self._stop_event, library_name_map=library_name_map
+            ):
+                for item in page:
+                    if item.get('Id'):
+                        light_items.append({'Id': item['Id'], 'Name': item.get('Name')})
+                        source_lib_ids.add(item.get('_SourceLibraryId'))
+            return light_items, source_lib_ids
+
+        movies, movie_lib_ids = _collect_light_items("Movie")
+        series, series_lib_ids = _collect_light_items("Series")
+
+        if self.is_stop_requested():
+            logger.warning("全库扫描任务在获取媒体列表阶段被用户中止。")
+            return
         
         if movies:
-            source_movie_lib_names = sorted(list({library_name_map.get(item.get('_SourceLibraryId')) for item in movies if item.get('_SourceLibraryId')}))
+            source_movie_lib_names = sorted(list({library_name_map.get(lib_id) for lib_id in movie_lib_ids if lib_id}))
             logger.info(f"  ➜ 从媒体库【{', '.join(source_movie_lib_names)}】获取到 {len(movies)} 个电影项目。")
 
         if series:
-            source_series_lib_names = sorted(list({library_name_map.get(item.get('_SourceLibraryId')) for item in series if item.get('_SourceLibraryId')}))
+            source_series_lib_names = sorted(list({library_name_map.get(lib_id) for lib_id in series_lib_ids if lib_id}))
             logger.info(f"  ➜ 从媒体库【{', '.join(source_series_lib_names)}】获取到 {len(series)} 个电视剧项目。")
 
         all_items = movies + series
@@ -705,32 +742,33 @@ class MediaProcessor:
         # --- 新增：清理已删除的媒体项 ---
         if update_status_callback: update_status_callback(20, "正在检查并清理已删除的媒体项...")
         
+        emby_ids_in_library = [item['Id'] for item in all_items if item.get('Id')]
         with get_central_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT item_id, item_name FROM processed_log")
-            processed_log_entries = cursor.fetchall()
-            
-            processed_ids_in_db = {entry['item_id'] for entry in processed_log_entries}
-            emby_ids_in_library = {item.get('Id') for item in all_items if item.get('Id')}
-            
-            # 找出在 processed_log 中但不在 Emby 媒体库中的项目
-            deleted_items_to_clean = processed_ids_in_db - emby_ids_in_library
-            
-            if deleted_items_to_clean:
-                logger.info(f"  ➜ 发现 {len(deleted_items_to_clean)} 个已从 Emby 媒体库删除的项目，正在从 '已处理' 中移除...")
-                for deleted_item_id in deleted_items_to_clean:
-                    self.log_db_manager.remove_from_processed_log(cursor, deleted_item_id)
-                    # 同时从内存缓存中移除
-                    if deleted_item_id in self.processed_items_cache:
-                        del self.processed_items_cache[deleted_item_id]
-                    logger.debug(f"  ➜ 已从 '已处理' 中移除 ItemID: {deleted_item_id}")
-                conn.commit()
-                logger.info("  ➜ 已删除媒体项的清理工作完成。")
-            else:
-                logger.info("  ➜ 未发现需要从 '已处理' 中清理的已删除媒体项。")
+            # 把当前库的 ID 集合一次性交给数据库做差集删除，返回被删掉的记录
+            stale_entries = self.log_db_manager.prune_processed_log(cursor, emby_ids_in_library)
+            conn.commit()
+
+        if stale_entries:
+            logger.info(f"  ➜ 已从 '已处理' 中移除 {len(stale_entries)} 个已从 Emby 媒体库删除的项目。")
+            for entry in stale_entries:
+                self.processed_items_cache.pop(entry['item_id'], None)
+            preview = ", ".join(f"{e['item_name']}({e['item_id']})" for e in stale_entries[:50])
+            logger.debug(f"  ➜ 已移除的项目: {preview}" + (" ..." if len(stale_entries) > 50 else ""))
+            logger.info("  ➜ 已删除媒体项的清理工作完成。")
+        else:
+            logger.info("  ➜ 未发现需要从 '已处理' 中清理的已删除媒体项。")
         
         if update_status_callback: update_status_callback(30, "已删除媒体项清理完成，开始处理现有媒体...")
 
+        # --- 并发模式：交给固定大小的工作池 ---
+        max_workers = int(self.config.get(constants.CONFIG_OPTION_FULL_SCAN_WORKERS, constants.DEFAULT_FULL_SCAN_WORKERS) or 1)
+        if max_workers > 1:
+            self._process_items_concurrently(all_items, force_full_update, max_workers, update_status_callback, progress_start=30)
+            if not self.is_stop_requested() and update_status_callback:
+                update_status_callback(100, "全量处理完成")
+            return
+
         # --- 现有媒体项处理循环 ---
         for i, item in enumerate(all_items):
             if self.is_stop_requested():
@@ -741,7 +779,7 @@ class MediaProcessor:
             item_name = item.get('Name', f"ID:{item_id}")
 
             if not force_full_update and item_id in self.processed_items_cache:
-                logger.info(f"  ➜ 正在跳过已处理的项目: {item_name}")
+                logger.info(f"  ➜ 正在跳过已处理的项目: {item_name}", extra={"sample_key": "skip_processed"})
                 if update_status_callback:
                     # 调整进度条的起始点，使其在清理后从 30% 开始
                     progress_after_cleanup = 30
@@ -763,6 +801,66 @@ class MediaProcessor:
         
         if not self.is_stop_requested() and update_status_callback:
             update_status_callback(100, "全量处理完成")
+
+    # --- 全量扫描的并发执行器 ---
+    def _process_items_concurrently(self, items: List[Dict[str, Any]], force_full_update: bool, max_workers: int,
+                                    update_status_callback: Optional[callable] = None, progress_start: int = 30):
+        """
+        用固定大小的工作池并发处理项目。
+        - 每个项目始终由同一个 worker 从头到尾处理，单个项目内的数据库写入顺序与串行模式一致。
+        - 只保持 max_workers * 2 个项目在途，停止信号到达后不再提交新项目，等在途项目自行退出。
+        - 进度只在主线程里按完成数汇报。
+        """
+        total = len(items)
+        delay_between_items = float(self.config.get("delay_between_items_sec", 0.5))
+        done = 0
+        logger.info(f"  ➜ 以并发模式处理 {total} 个项目 (worker 数: {max_workers})。")
+
+        def _report(label: str, item_name: str):
+            if update_status_callback:
+                current_progress = progress_start + int((done / total) * (100 - progress_start))
+                update_status_callback(current_progress, f"{label} ({done}/{total}): {item_name}")
+
+        def _worker(item_id: str):
+            try:
+                return self.process_single_item(item_id, force_full_update=force_full_update)
+            finally:
+                # 每个 worker 自己保持原有的条目间隔，对 Emby 的节奏与串行模式一致
+                if delay_between_items > 0 and not self.is_stop_requested():
+                    time_module.sleep(delay_between_items)
+
+        item_iter = iter(items)
+        in_flight: Dict[concurrent.futures.Future, str] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FullScanWorker") as executor:
+            while True:
+                while not self.is_stop_requested() and len(in_flight) < max_workers * 2:
+                    item = next(item_iter, None)
+                    if item is None:
+                        break
+                    item_id = item.get('Id')
+                    item_name = item.get('Name', f"ID:{item_id}")
+                    if not force_full_update and item_id in self.processed_items_cache:
+                        logger.info(f"  ➜ 正在跳过已处理的项目: {item_name}", extra={"sample_key": "skip_processed"})
+                        done += 1
+                        _report("跳过", item_name)
+                        continue
+                    in_flight[executor.submit(_worker, item_id)] = item_name
+
+                if not in_flight:
+                    break
+
+                finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    item_name = in_flight.pop(future)
+                    done += 1
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"并发处理 '{item_name}' 时发生未捕获的错误: {e}", exc_info=True)
+                    _report("已处理", item_name)
+
+        if self.is_stop_requested():
+            logger.warning("全库扫描任务已被用户中止。")
     
     # --- 核心处理总管 ---
     def process_single_item(self, emby_item_id: str, force_full_update: bool = False):
@@ -773,7 +871,7 @@ class MediaProcessor:
         # 1. 除非强制，否则跳过已处理的
         if not force_full_update and emby_item_id in self.processed_items_cache:
             item_name_from_cache = self.processed_items_cache.get(emby_item_id, f"ID:{emby_item_id}")
-            logger.info(f"媒体 '{item_name_from_cache}' 跳过已处理记录。")
+            logger.info(f"媒体 '{item_name_from_cache}' 跳过已处理记录。", extra={"sample_key": "skip_processed"})
             return True
 
         # 2. 检查停止信号
@@ -1308,8 +1406,9 @@ class MediaProcessor:
                     match_found = False
                     if d_douban_id and self.douban_api and self.tmdb_api_key:
                         if self.is_stop_requested(): raise InterruptedError("任务中止")
-                        details = self.douban_api.celebrity_details(d_douban_id)
-                        time_module.sleep(0.3)
+                        with self._source_slot("douban"):
+                            details = self.douban_api.celebrity_details(d_douban_id)
+                            time_module.sleep(0.3)
                         d_imdb_id = None
                         if details and not details.get("error"):
                             try:
@@ -1476,8 +1575,9 @@ class MediaProcessor:
 
                     if douban_id:
                         try:
-                            details = self.douban_api.celebrity_details(douban_id)
-                            time_module.sleep(0.3)
+                            with self._source_slot("douban"):
+                                details = self.douban_api.celebrity_details(douban_id)
+                                time_module.sleep(0.3)
                             
                             if details and not details.get("error"):
                                 avatar_url = (details.get("avatars", {}) or {}).get("large")
@@ -1562,8 +1662,9 @@ class MediaProcessor:
             if remaining_terms:
                 cached_results = {}
                 terms_for_api = []
+                cached_entries = self.actor_db_manager.get_translations_from_db(cursor, remaining_terms)
                 for term in remaining_terms:
-                    cached = self.actor_db_manager.get_translation_from_db(cursor, term)
+                    cached = cached_entries.get(term)
                     if cached and cached.get('translated_text'):
                         cached_results[term] = cached['translated_text']
                     else:
@@ -1582,10 +1683,10 @@ class MediaProcessor:
                     logger.info(f"  ➜ [翻译统计] 3. AI处理 (快速模式): 提交 {len(terms_for_api)} 条。")
                     if terms_for_api:
                         logger.debug(f"    ➜ 提交给[快速模式]的词条: {terms_for_api}")
-                    fast_api_results = self.ai_translator.batch_translate(terms_for_api, mode='fast')
-                    for term, translation in fast_api_results.items():
-                        final_translation_map[term] = translation
-                        self.actor_db_manager.save_translation_to_db(cursor, term, translation, self.ai_translator.provider)
+                    with self._source_slot("ai"):
+                        fast_api_results = self.ai_translator.batch_translate(terms_for_api, mode='fast')
+                    final_translation_map.update(fast_api_results)
+                    self.actor_db_manager.save_translations_to_db(cursor, fast_api_results, self.ai_translator.provider)
                 failed_terms = []
                 for term in remaining_terms:
                     if not utils.contains_chinese(final_translation_map.get(term, term)):
@@ -1595,7 +1696,8 @@ class MediaProcessor:
                 logger.info(f"  ➜ [翻译统计] 4. AI处理 (音译模式): 提交 {len(remaining_terms)} 条。")
                 if remaining_terms:
                     logger.debug(f"    ➜ 提交给[音译模式]的词条: {remaining_terms}")
-                transliterate_results = self.ai_translator.batch_translate(remaining_terms, mode='transliterate')
+                with self._source_slot("ai"):
+                    transliterate_results = self.ai_translator.batch_translate(remaining_terms, mode='transliterate')
                 final_translation_map.update(transliterate_results)
                 still_failed_terms = []
                 for term in remaining_terms:
@@ -1608,7 +1710,8 @@ class MediaProcessor:
                 logger.info(f"  ➜ [翻译统计] 5. AI处理 (顾问模式): 提交 {len(remaining_terms)} 条。")
                 if remaining_terms:
                     logger.debug(f"  ➜ 提交给[顾问模式]的词条: {remaining_terms}")
-                quality_results = self.ai_translator.batch_translate(remaining_terms, mode='quality', title=item_title, year=item_year)
+                with self._source_slot("ai"):
+                    quality_results = self.ai_translator.batch_translate(remaining_terms, mode='quality', title=item_title, year=item_year)
                 final_translation_map.update(quality_results)
             
             successfully_translated_terms = {term for term in terms_to_translate if utils.contains_chinese(final_translation_map.get(term, ''))}
@@ -1660,20 +1763,12 @@ class MediaProcessor:
         logger.info(f"  ➜ 开始将 {len(final_cast_perfect)} 位最终演员的完整信息同步回数据库...")
         processed_count = 0
         
-        # 在循环外准备 emby_config，避免重复创建
         emby_config_for_upsert = {"url": self.emby_url, "api_key": self.emby_api_key, "user_id": self.emby_user_id}
 
-        for actor in final_cast_perfect:
-            # 直接将 actor 字典和 emby_config 传递给 upsert_person 函数
-            map_id, action = self.actor_db_manager.upsert_person(cursor, actor, emby_config_for_upsert)
-            
+        # 整个演员表一次合并写入；单行冲突在 bulk_upsert_persons 内部用保存点隔离，不会拖垮其他演员
+        for map_id, action in self.actor_db_manager.bulk_upsert_persons(cursor, final_cast_perfect, emby_config_for_upsert):
             if action not in ["ERROR", "SKIPPED", "CONFLICT_ERROR", "UNKNOWN_ERROR"]:
                 processed_count += 1
-            else:
-                # 如果发生错误，回滚当前演员的操作，并为下一个演员开启新事务
-                # 这是为了防止一个演员的错误导致整个批次失败
-                cursor.connection.rollback()
-                cursor.execute("BEGIN")
 
         logger.info(f"  ➜ 成功处理了 {processed_count} 位演员的数据库回写/更新。")
 
@@ -1736,8 +1831,9 @@ class MediaProcessor:
                 # 2. 根据模式决定是否使用缓存
                 if translation_mode == 'fast':
                     logger.debug("[快速模式] 正在检查全局翻译缓存...")
+                    cached_entries = self.actor_db_manager.get_translations_from_db(cursor, texts_to_collect)
                     for text in texts_to_collect:
-                        cached_entry = self.actor_db_manager.get_translation_from_db(cursor=cursor, text=text)
+                        cached_entry = cached_entries.get(text)
                         if cached_entry:
                             translation_cache[text] = cached_entry.get("translated_text")
                         else:
@@ -1759,13 +1855,9 @@ class MediaProcessor:
                         translation_cache.update(translation_map_from_api)
                         
                         if translation_mode == 'fast':
-                            for original, translated in translation_map_from_api.items():
-                                self.actor_db_manager.save_translation_to_db(
-                                    cursor=cursor,
-                                    original_text=original, 
-                                    translated_text=translated, 
-                                    engine_used=self.ai_translator.provider
-                                )
+                            self.actor_db_manager.save_translations_to_db(
+                                cursor, translation_map_from_api, self.ai_translator.provider
+                            )
                     else:
                         logger.warning("手动编辑-翻译：AI批量翻译未返回任何结果。")
                 else:
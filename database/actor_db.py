@@ -1,19 +1,47 @@
 # database/actor_db.py
 import psycopg2
+from psycopg2.extras import execute_values
 import logging
 import json
-from typing import Optional, Dict, Any, List, Tuple, Set
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Set, Iterable
 from datetime import datetime
 
-from .connection import get_db_connection
+from cachetools import LRUCache
+
+from .connection import get_db_connection, run_after_commit
 from . import media_db, request_db
 from utils import contains_chinese
-from handler.emby import get_emby_item_details
+from handler.emby import get_emby_item_details, get_emby_items_by_id
 from config_manager import APP_CONFIG
 import extensions 
 import utils
+import constants
 logger = logging.getLogger(__name__)
 
+# ======================================================================
+# 模块: 翻译缓存的进程内 LRU
+# ======================================================================
+# 以 original_text 为键，缓存 translation_cache 表的整行 (含失败记录)。
+# 只缓存数据库中确实存在的记录：读写都在所在事务提交成功后才回填 LRU，回滚的数据不会进入缓存。
+_translation_lru = LRUCache(maxsize=constants.TRANSLATION_CACHE_LRU_SIZE)
+_translation_lru_lock = threading.Lock()
+
+def invalidate_translation_cache():
+    """translation_cache 表被清空或整表导入后调用。"""
+    with _translation_lru_lock:
+        _translation_lru.clear()
+
+def _remember_translations(rows: Iterable[Dict[str, Any]]):
+    with _translation_lru_lock:
+        for row in rows:
+            _translation_lru[row['original_text']] = row
+
+def _forget_translations(original_texts: Iterable[str]):
+    with _translation_lru_lock:
+        for text in original_texts:
+            _translation_lru.pop(text, None)
+
 # ======================================================================
 # 模块: 演员数据访问 
 # ======================================================================
@@ -28,11 +56,11 @@ class ActorDBManager:
     def get_translation_from_db(self, cursor: psycopg2.extensions.cursor, text: str, by_translated_text: bool = False) -> Optional[Dict[str, Any]]:
         """【PostgreSQL版】从数据库获取翻译缓存，并自我净化坏数据。"""
         
+        if not by_translated_text:
+            return self.get_translations_from_db(cursor, [text]).get(text)
+
         try:
-            if by_translated_text:
-                sql = "SELECT original_text, translated_text, engine_used FROM translation_cache WHERE translated_text = %s"
-            else:
-                sql = "SELECT original_text, translated_text, engine_used FROM translation_cache WHERE original_text = %s"
+            sql = "SELECT original_text, translated_text, engine_used FROM translation_cache WHERE translated_text = %s"
 
             cursor.execute(sql, (text,))
             row = cursor.fetchone()
@@ -47,6 +75,7 @@ class ActorDBManager:
                 logger.warning(f"  ➜ 发现无效的历史翻译缓存: '{original_text_key}' -> '{translated_text}'。将自动销毁此记录。")
                 try:
                     cursor.execute("DELETE FROM translation_cache WHERE original_text = %s", (original_text_key,))
+                    _forget_translations([original_text_key])
                 except Exception as e_delete:
                     logger.error(f"  ➜ 销毁无效缓存 '{original_text_key}' 时失败: {e_delete}")
                 return None
@@ -57,27 +86,93 @@ class ActorDBManager:
             logger.error(f"  ➜ 读取翻译缓存时发生错误 for '{text}': {e}", exc_info=True)
             return None
 
+    def get_translations_from_db(self, cursor: psycopg2.extensions.cursor, texts: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        【批量版】按原文批量读取翻译缓存：{original_text: 行}。
+        先查进程内 LRU，未命中的一次 = ANY(%s) 查询补齐；不含中文的坏译文会被一并销毁。
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        with _translation_lru_lock:
+            for text in dict.fromkeys(t for t in texts if t):
+                row = _translation_lru.get(text)
+                if row is None:
+                    missing.append(text)
+                else:
+                    results[text] = row
+        if not missing:
+            return results
+
+        try:
+            cursor.execute(
+                "SELECT original_text, translated_text, engine_used FROM translation_cache WHERE original_text = ANY(%s)",
+                (missing,)
+            )
+            fetched = [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"  ➜ 批量读取翻译缓存时发生错误: {e}", exc_info=True)
+            return results
+
+        valid_rows = []
+        invalid_keys = []
+        for row in fetched:
+            translated_text = row['translated_text']
+            if translated_text and not contains_chinese(translated_text):
+                logger.warning(f"  ➜ 发现无效的历史翻译缓存: '{row['original_text']}' -> '{translated_text}'。将自动销毁此记录。")
+                invalid_keys.append(row['original_text'])
+            else:
+                valid_rows.append(row)
+                results[row['original_text']] = row
+
+        if invalid_keys:
+            try:
+                cursor.execute("DELETE FROM translation_cache WHERE original_text = ANY(%s)", (invalid_keys,))
+            except Exception as e_delete:
+                logger.error(f"  ➜ 销毁无效缓存时失败: {e_delete}")
+        if valid_rows:
+            run_after_commit(cursor.connection, lambda: _remember_translations(valid_rows))
+        return results
+
 
     def save_translation_to_db(self, cursor: psycopg2.extensions.cursor, original_text: str, translated_text: Optional[str], engine_used: Optional[str]):
         """【PostgreSQL版】将翻译结果保存到数据库，增加中文校验。"""
-        
-        if translated_text and translated_text.strip() and not contains_chinese(translated_text):
-            logger.warning(f"  ➜ 翻译结果 '{translated_text}' 不含中文，已丢弃。原文: '{original_text}'")
+        self.save_translations_to_db(cursor, {original_text: translated_text}, engine_used)
+
+    def save_translations_to_db(self, cursor: psycopg2.extensions.cursor, translations: Dict[str, Optional[str]], engine_used: Optional[str]):
+        """
+        【批量版】一次性写入多条翻译结果 {原文: 译文}，译文为 None 表示失败记录。
+        不含中文的译文会被丢弃；所在事务提交成功后才回填进程内 LRU。
+        """
+        rows = []
+        for original_text, translated_text in translations.items():
+            if not original_text:
+                continue
+            if translated_text and translated_text.strip() and not contains_chinese(translated_text):
+                logger.warning(f"  ➜ 翻译结果 '{translated_text}' 不含中文，已丢弃。原文: '{original_text}'")
+                continue
+            rows.append((original_text, translated_text, engine_used))
+        if not rows:
             return
 
         try:
             sql = """
                 INSERT INTO translation_cache (original_text, translated_text, engine_used, last_updated_at) 
-                VALUES (%s, %s, %s, NOW())
+                VALUES %s
                 ON CONFLICT (original_text) DO UPDATE SET
                     translated_text = EXCLUDED.translated_text,
                     engine_used = EXCLUDED.engine_used,
                     last_updated_at = NOW();
             """
-            cursor.execute(sql, (original_text, translated_text, engine_used))
-            logger.trace(f"  ➜ 翻译缓存存DB: '{original_text}' -> '{translated_text}' (引擎: {engine_used})")
+            execute_values(cursor, sql, rows, template="(%s, %s, %s, NOW())", page_size=500)
+            saved_rows = [{'original_text': o, 'translated_text': t, 'engine_used': e} for o, t, e in rows]
+            # 先让旧值失效，新值等提交后再写入，避免回滚后 LRU 里残留数据库中不存在的译文
+            _forget_translations(o for o, _, _ in rows)
+            run_after_commit(cursor.connection, lambda: _remember_translations(saved_rows))
+            for original_text, translated_text, _ in rows:
+                logger.trace(f"  ➜ 翻译缓存存DB: '{original_text}' -> '{translated_text}' (引擎: {engine_used})")
         except Exception as e:
-            logger.error(f"  ➜ DB保存翻译缓存失败 for '{original_text}': {e}", exc_info=True)
+            logger.error(f"  ➜ DB批量保存翻译缓存失败 ({len(rows)} 条): {e}", exc_info=True)
+            _forget_translations(o for o, _, _ in rows)
 
     # 核心批量写入函数
     def batch_upsert_actors_and_metadata(self, cursor: psycopg2.extensions.cursor, actors_list: List[Dict[str, Any]], emby_config: Dict[str, Any]) -> Dict[str, int]:
@@ -92,16 +187,13 @@ class ActorDBManager:
         logger.info(f"  ➜ [演员数据管家] 开始批量处理 {len(actors_list)} 位演员的写入任务...")
         stats = {"INSERTED": 0, "UPDATED": 0, "UNCHANGED": 0, "SKIPPED": 0, "ERROR": 0}
 
-        for actor_data in actors_list:
-            # 直接调用下面已经很完善的单个演员处理函数
-            map_id, action = self.upsert_person(cursor, actor_data, emby_config)
-            
+        for map_id, action in self.bulk_upsert_persons(cursor, actors_list, emby_config):
             # 累加统计结果
             if action in stats:
                 stats[action] += 1
             else:
                 stats["ERROR"] += 1
-        
+
         logger.info(f"  ➜ [演员数据管家] 批量写入完成。统计: {stats}")
         return stats
 
@@ -288,99 +380,258 @@ class ActorDBManager:
         logger.debug(f"  ➜ [演员数据管家-恢复] 成功恢复 {len(rehydrated_list)} 位演员的元数据。")
         return rehydrated_list
 
+    # 演员写入的暂存表列顺序，_merge_person_rows 和 execute_values 共用
+    _PERSON_STAGE_COLUMNS = ("row_no", "primary_name", "emby_person_id", "tmdb_person_id", "imdb_id", "douban_celebrity_id")
+    # 会被 person_identity_map 的 UNIQUE 约束卡住的辅助 ID 列
+    _PERSON_SECONDARY_ID_COLUMNS = ("emby_person_id", "imdb_id", "douban_celebrity_id")
+    _ACTOR_METADATA_KEYS = ('profile_path', 'gender', 'popularity')
+
     def upsert_person(self, cursor: psycopg2.extensions.cursor, person_data: Dict[str, Any], emby_config: Dict[str, Any]) -> Tuple[int, str]:
         """
-        【V8 - 精准统计修复版】
-        通过为 ON CONFLICT DO UPDATE 增加 WHERE 条件，实现真正的条件更新。
-        这能准确区分数据实际被“更新”和数据因无变化而“未变”的情况，从而解决统计不准的问题。
+        单个演员写入，内部直接走 bulk_upsert_persons，保证单条与批量的合并规则完全一致。
         """
-        emby_id = str(person_data.get("emby_id") or '').strip() or None
-        tmdb_id_raw = person_data.get("id") or person_data.get("tmdb_id")
-        imdb_id = str(person_data.get("imdb_id") or '').strip() or None
-        douban_id = str(person_data.get("douban_id") or '').strip() or None
-        name = str(person_data.get("name") or '').strip()
-
-        tmdb_id = None
-        if tmdb_id_raw and str(tmdb_id_raw).isdigit():
-            try:
-                tmdb_id = int(tmdb_id_raw)
-            except (ValueError, TypeError):
-                pass
+        return self.bulk_upsert_persons(cursor, [person_data], emby_config)[0]
 
+    @staticmethod
+    def _normalize_person_row(person_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """把调用方传入的各种演员字典规整成 person_identity_map 的一行，缺少有效 tmdb_id 时返回 None。"""
+        tmdb_id_raw = person_data.get("id") or person_data.get("tmdb_id")
+        if not tmdb_id_raw or not str(tmdb_id_raw).isdigit():
+            return None
+        try:
+            tmdb_id = int(tmdb_id_raw)
+        except (ValueError, TypeError):
+            return None
         if not tmdb_id:
-            logger.warning(f"upsert_person 调用缺少有效的 tmdb_person_id，跳过。 (原始值: {tmdb_id_raw})")
-            return -1, "SKIPPED"
+            return None
 
-        if not name and emby_id:
-            details = get_emby_item_details(emby_id, emby_config['url'], emby_config['api_key'], emby_config['user_id'], fields="Name")
-            name = details.get("Name") if details else "Unknown Actor"
-        elif not name:
-            name = "Unknown Actor"
+        return {
+            "primary_name": str(person_data.get("name") or '').strip(),
+            "emby_person_id": str(person_data.get("emby_id") or '').strip() or None,
+            "tmdb_person_id": tmdb_id,
+            "imdb_id": str(person_data.get("imdb_id") or '').strip() or None,
+            "douban_celebrity_id": str(person_data.get("douban_id") or '').strip() or None,
+        }
+
+    @staticmethod
+    def _prefetch_person_names(emby_ids: List[str], emby_config: Dict[str, Any]) -> Dict[str, str]:
+        """缺名字的演员统一按批次从 Emby 拉取，替代逐个 get_emby_item_details。"""
+        if not emby_ids or not emby_config or not emby_config.get('url') or not emby_config.get('api_key'):
+            return {}
+        items = get_emby_items_by_id(
+            emby_config['url'], emby_config['api_key'], emby_config.get('user_id'),
+            emby_ids, fields="Name"
+        )
+        return {str(item.get("Id")): item.get("Name") for item in items or [] if item.get("Id") and item.get("Name")}
+
+    def _merge_person_rows(self, cursor: psycopg2.extensions.cursor, rows: List[Dict[str, Any]]) -> Dict[int, Tuple[int, str]]:
+        """
+        把一批已去重的演员行写入暂存表，再用一条 INSERT ... ON CONFLICT 合并进 person_identity_map。
+        返回 {tmdb_person_id: (map_id, action)}。
+        """
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS person_upsert_stage (
+                row_no INTEGER,
+                primary_name TEXT,
+                emby_person_id TEXT,
+                tmdb_person_id INTEGER,
+                imdb_id TEXT,
+                douban_celebrity_id TEXT
+            ) ON COMMIT DROP
+        """)
+        cursor.execute("TRUNCATE person_upsert_stage")
+        execute_values(
+            cursor,
+            f"INSERT INTO person_upsert_stage ({', '.join(self._PERSON_STAGE_COLUMNS)}) VALUES %s",
+            [tuple(row[col] for col in self._PERSON_STAGE_COLUMNS) for row in rows],
+            page_size=1000
+        )
+
+        # 辅助 ID 已被库里其他演员占用时，保留原有归属，本次只更新其余字段。
+        # 逐条写入时这种情况会触发唯一约束错误并回滚整个事务。
+        for col in self._PERSON_SECONDARY_ID_COLUMNS:
+            cursor.execute(f"""
+                UPDATE person_upsert_stage s SET {col} = NULL
+                FROM person_identity_map p
+                WHERE p.{col} = s.{col}
+                  AND p.tmdb_person_id IS DISTINCT FROM s.tmdb_person_id
+            """)
+            if cursor.rowcount:
+                logger.debug(f"  ├─ {cursor.rowcount} 位演员的 {col} 已被其他演员占用，本次保留原有关联。")
+
+        cursor.execute("""
+            INSERT INTO person_identity_map
+            (primary_name, emby_person_id, tmdb_person_id, imdb_id, douban_celebrity_id, last_updated_at)
+            SELECT primary_name, emby_person_id, tmdb_person_id, imdb_id, douban_celebrity_id, NOW()
+            FROM person_upsert_stage
+            ORDER BY row_no
+            ON CONFLICT (tmdb_person_id) DO UPDATE SET
+                -- 名字总是更新为最新的
+                primary_name = EXCLUDED.primary_name,
+
+                -- ID字段：优先使用新传入的非空值，否则保留数据库中已有的值
+                emby_person_id = COALESCE(EXCLUDED.emby_person_id, person_identity_map.emby_person_id),
+                imdb_id = COALESCE(EXCLUDED.imdb_id, person_identity_map.imdb_id),
+                douban_celebrity_id = COALESCE(EXCLUDED.douban_celebrity_id, person_identity_map.douban_celebrity_id),
+
+                last_updated_at = NOW()
+            WHERE
+                -- 使用 IS DISTINCT FROM 来正确处理 NULL 值，确保只有在数据实际变化时才更新
+                person_identity_map.primary_name IS DISTINCT FROM EXCLUDED.primary_name OR
+                person_identity_map.emby_person_id IS DISTINCT FROM COALESCE(EXCLUDED.emby_person_id, person_identity_map.emby_person_id) OR
+                person_identity_map.imdb_id IS DISTINCT FROM COALESCE(EXCLUDED.imdb_id, person_identity_map.imdb_id) OR
+                person_identity_map.douban_celebrity_id IS DISTINCT FROM COALESCE(EXCLUDED.douban_celebrity_id, person_identity_map.douban_celebrity_id)
+            RETURNING map_id, tmdb_person_id, (CASE xmax WHEN 0 THEN 'INSERTED' ELSE 'UPDATED' END) AS action
+        """)
+        results = {row['tmdb_person_id']: (row['map_id'], row['action']) for row in cursor.fetchall()}
+
+        # 没有返回的行是冲突但 WHERE 条件不满足，即数据未变化，需要补查 map_id
+        unchanged_ids = [row['tmdb_person_id'] for row in rows if row['tmdb_person_id'] not in results]
+        if unchanged_ids:
+            cursor.execute(
+                "SELECT map_id, tmdb_person_id FROM person_identity_map WHERE tmdb_person_id = ANY(%s)",
+                (unchanged_ids,)
+            )
+            for row in cursor.fetchall():
+                results[row['tmdb_person_id']] = (row['map_id'], "UNCHANGED")
+        return results
 
+    def _merge_person_chunk(self, cursor: psycopg2.extensions.cursor, rows: List[Dict[str, Any]]) -> Dict[int, Tuple[int, str]]:
+        """
+        在保存点内合并一个批次；若整批失败（例如批次内两位演员互换 emby_id），
+        退回逐行合并，只把真正出错的行标记为 ERROR，不影响外层事务。
+        """
+        cursor.execute("SAVEPOINT person_bulk_upsert")
         try:
-            sql = """
-                INSERT INTO person_identity_map 
-                (primary_name, emby_person_id, tmdb_person_id, imdb_id, douban_celebrity_id, last_updated_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-                ON CONFLICT (tmdb_person_id) DO UPDATE SET
-                    -- 名字总是更新为最新的
-                    primary_name = EXCLUDED.primary_name,
-                    
-                    -- ID字段：优先使用新传入的非空值，否则保留数据库中已有的值
-                    emby_person_id = COALESCE(EXCLUDED.emby_person_id, person_identity_map.emby_person_id),
-                    imdb_id = COALESCE(EXCLUDED.imdb_id, person_identity_map.imdb_id),
-                    douban_celebrity_id = COALESCE(EXCLUDED.douban_celebrity_id, person_identity_map.douban_celebrity_id),
-                    
-                    last_updated_at = NOW()
-                WHERE
-                    -- 使用 IS DISTINCT FROM 来正确处理 NULL 值，确保只有在数据实际变化时才更新
-                    person_identity_map.primary_name IS DISTINCT FROM EXCLUDED.primary_name OR
-                    person_identity_map.emby_person_id IS DISTINCT FROM COALESCE(EXCLUDED.emby_person_id, person_identity_map.emby_person_id) OR
-                    person_identity_map.imdb_id IS DISTINCT FROM COALESCE(EXCLUDED.imdb_id, person_identity_map.imdb_id) OR
-                    person_identity_map.douban_celebrity_id IS DISTINCT FROM COALESCE(EXCLUDED.douban_celebrity_id, person_identity_map.douban_celebrity_id)
-                RETURNING map_id, (CASE xmax WHEN 0 THEN 'INSERTED' ELSE 'UPDATED' END) as action;
+            results = self._merge_person_rows(cursor, rows)
+            cursor.execute("RELEASE SAVEPOINT person_bulk_upsert")
+            return results
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT person_bulk_upsert")
+            logger.warning(f"  ➜ [演员数据管家] 批量合并 {len(rows)} 位演员失败，改为逐行合并: {e}")
+
+        results = {}
+        for row in rows:
+            cursor.execute("SAVEPOINT person_row_upsert")
+            try:
+                results.update(self._merge_person_rows(cursor, [row]))
+                cursor.execute("RELEASE SAVEPOINT person_row_upsert")
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT person_row_upsert")
+                logger.error(f"upsert_person 发生数据库完整性冲突，可能是 emby_id 或其他唯一键重复。emby_id={row['emby_person_id']}, tmdb_id={row['tmdb_person_id']}: {e}")
+                results[row['tmdb_person_id']] = (-1, "ERROR")
+        return results
+
+    def _bulk_upsert_actor_metadata(self, cursor: psycopg2.extensions.cursor, metadata_by_tmdb_id: Dict[int, Dict[str, Any]]):
+        """一次性把 TMDb 演员详情写入 actor_metadata，字段规则与 update_actor_metadata_from_tmdb 相同。"""
+        if not metadata_by_tmdb_id:
+            return
+        rows = [
+            (
+                tmdb_id,
+                data.get("profile_path"),
+                data.get("gender"),
+                data.get("adult", False),
+                data.get("popularity"),
+                data.get("original_name")
+            )
+            for tmdb_id, data in metadata_by_tmdb_id.items()
+        ]
+        execute_values(
+            cursor,
             """
-            
-            cursor.execute(sql, (name, emby_id, tmdb_id, imdb_id, douban_id))
-            result = cursor.fetchone()
-
-            action: str
-            map_id: int
+                INSERT INTO actor_metadata (tmdb_id, profile_path, gender, adult, popularity, original_name, last_updated_at)
+                VALUES %s
+                ON CONFLICT (tmdb_id) DO UPDATE SET
+                    profile_path = EXCLUDED.profile_path,
+                    gender = EXCLUDED.gender,
+                    adult = EXCLUDED.adult,
+                    popularity = EXCLUDED.popularity,
+                    original_name = EXCLUDED.original_name,
+                    last_updated_at = NOW()
+            """,
+            rows,
+            template="(%s, %s, %s, %s, %s, %s, NOW())",
+            page_size=1000
+        )
+        logger.trace(f"  ➜ 成功将 {len(rows)} 位演员的元数据缓存到数据库。")
+
+    def bulk_upsert_persons(self, cursor: psycopg2.extensions.cursor, persons: List[Dict[str, Any]], emby_config: Dict[str, Any]) -> List[Tuple[int, str]]:
+        """
+        【批量写入】person_identity_map 与 actor_metadata 的集合式 upsert。
+        - 缺名字的演员先按批次从 Emby 预取，不再在事务中逐个请求。
+        - 每 ACTOR_BULK_UPSERT_CHUNK_SIZE 行写入一次暂存表，再以单条语句合并。
+        返回与 persons 一一对应的 (map_id, action) 列表，action 为 INSERTED/UPDATED/UNCHANGED/SKIPPED/ERROR。
+        """
+        if not persons:
+            return []
 
-            if result:
-                # 如果有返回结果，说明发生了 INSERT 或 UPDATE
-                map_id = result['map_id']
-                action = result['action']
-                logger.debug(f"  ├─ 演员 '{name}' (TMDb: {tmdb_id}) 处理完成。结果: {action} (map_id: {map_id})")
+        normalized = [self._normalize_person_row(p) for p in persons]
+        for person_data, row in zip(persons, normalized):
+            if row is None:
+                logger.warning(f"upsert_person 调用缺少有效的 tmdb_person_id，跳过。 (原始值: {person_data.get('id') or person_data.get('tmdb_id')})")
+
+        # 同一 tmdb_id 多次出现时，后出现的非空字段覆盖先出现的，最终只合并一行
+        merged: Dict[int, Dict[str, Any]] = {}
+        metadata_by_tmdb_id: Dict[int, Dict[str, Any]] = {}
+        for person_data, row in zip(persons, normalized):
+            if row is None:
+                continue
+            existing = merged.get(row['tmdb_person_id'])
+            if existing:
+                for key, value in row.items():
+                    if value:
+                        existing[key] = value
             else:
-                # 如果没有返回结果，说明存在冲突但 WHERE 条件不满足，数据未发生变化
-                action = "UNCHANGED"
-                # 需要手动查询一下 map_id，以便后续流程使用
-                cursor.execute("SELECT map_id FROM person_identity_map WHERE tmdb_person_id = %s", (tmdb_id,))
-                existing_record = cursor.fetchone()
-                if not existing_record:
-                    logger.error(f"upsert_person 逻辑错误: 未能更新也未能找到现有演员记录 for tmdb_id={tmdb_id}")
-                    return -1, "ERROR"
-                map_id = existing_record['map_id']
-                logger.trace(f"  ➜ 演员 '{name}' (TMDb: {tmdb_id}) 数据无变化，标记为 UNCHANGED。")
-
-            # 统一处理元数据更新
-            if 'profile_path' in person_data or 'gender' in person_data or 'popularity' in person_data:
-                self.update_actor_metadata_from_tmdb(cursor, tmdb_id, person_data)
-
-            return map_id, action
-
-        except psycopg2.IntegrityError as ie:
-            conn = cursor.connection
-            conn.rollback()
-            logger.error(f"upsert_person 发生数据库完整性冲突，可能是 emby_id 或其他唯一键重复。emby_id={emby_id}, tmdb_id={tmdb_id}: {ie}")
-            return -1, "ERROR"
-        except Exception as e:
-            conn = cursor.connection
-            conn.rollback()
-            logger.error(f"upsert_person 发生未知异常，emby_person_id={emby_id}: {e}", exc_info=True)
-            return -1, "ERROR"
-        
+                merged[row['tmdb_person_id']] = dict(row)
+            if any(key in person_data for key in self._ACTOR_METADATA_KEYS):
+                metadata_by_tmdb_id[row['tmdb_person_id']] = person_data
+
+        rows = list(merged.values())
+        missing_name_ids = list(dict.fromkeys(
+            row['emby_person_id'] for row in rows if not row['primary_name'] and row['emby_person_id']
+        ))
+        fetched_names = self._prefetch_person_names(missing_name_ids, emby_config)
+        for row in rows:
+            if not row['primary_name']:
+                row['primary_name'] = fetched_names.get(row['emby_person_id']) or "Unknown Actor"
+
+        # 批次内重复的辅助 ID 只保留第一次出现，避免单条合并语句自相冲突
+        seen_secondary = {col: set() for col in self._PERSON_SECONDARY_ID_COLUMNS}
+        for row_no, row in enumerate(rows):
+            row['row_no'] = row_no
+            for col in self._PERSON_SECONDARY_ID_COLUMNS:
+                value = row[col]
+                if value is None:
+                    continue
+                if value in seen_secondary[col]:
+                    row[col] = None
+                else:
+                    seen_secondary[col].add(value)
+
+        chunk_size = constants.ACTOR_BULK_UPSERT_CHUNK_SIZE
+        results: Dict[int, Tuple[int, str]] = {}
+        for i in range(0, len(rows), chunk_size):
+            results.update(self._merge_person_chunk(cursor, rows[i:i + chunk_size]))
+
+        valid_metadata = {
+            tmdb_id: data for tmdb_id, data in metadata_by_tmdb_id.items()
+            if results.get(tmdb_id, (-1, "ERROR"))[1] != "ERROR"
+        }
+        if valid_metadata:
+            cursor.execute("SAVEPOINT actor_metadata_bulk_upsert")
+            try:
+                self._bulk_upsert_actor_metadata(cursor, valid_metadata)
+                cursor.execute("RELEASE SAVEPOINT actor_metadata_bulk_upsert")
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT actor_metadata_bulk_upsert")
+                logger.error(f"  ➜ 批量缓存 {len(valid_metadata)} 位演员元数据到数据库时失败: {e}", exc_info=True)
+
+        return [
+            (-1, "SKIPPED") if row is None else results.get(row['tmdb_person_id'], (-1, "ERROR"))
+            for row in normalized
+        ]
+
     def disassociate_emby_ids(self, cursor: psycopg2.extensions.cursor, emby_ids: set) -> int:
         """
         将一组给定的 emby_person_id 在数据库中设为 NULL。
@@ -1,11 +1,12 @@
 # database/cleanup_db.py
 import logging
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from psycopg2 import sql
 from psycopg2.extras import Json, execute_values
 
 from .connection import get_db_connection
+from .media_db import library_path_patterns
 
 logger = logging.getLogger(__name__)
 
@@ -113,4 +114,63 @@ def clear_pending_cleanup_tasks():
                 conn.commit()
                 logger.info("已清空所有待处理的媒体清理索引。")
     except Exception as e:
-        logger.error(f"清空待处理的媒体清理索引时失败: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"清空待处理的媒体清理索引时失败: {e}", exc_info=True)
+# --- 多版本扫描 ---
+# 扫描范围用 SQL 表达：按文件路径前缀 (优先) 或按 Emby ID 经 media_emby_id_map 半连接过滤，
+# 避免对每一行展开 emby_item_ids_json 再和一个巨大的数组逐一比较。
+def _multi_version_scope(library_paths: Optional[List[str]], emby_ids: Optional[List[str]]) -> Tuple[str, List[Any]]:
+    clause, params = "", []
+    if library_paths is not None:
+        clause += """
+            AND EXISTS (
+                SELECT 1 FROM jsonb_array_elements(t.asset_details_json) AS asset
+                WHERE asset->>'path' LIKE ANY(%s)
+            )
+        """
+        params.append(library_path_patterns(library_paths))
+    if emby_ids is not None:
+        clause += """
+            AND (t.tmdb_id, t.item_type) IN (
+                SELECT m.tmdb_id, m.item_type FROM media_emby_id_map m WHERE m.emby_id = ANY(%s)
+            )
+        """
+        params.append(list(emby_ids))
+    return clause, params
+
+_MULTI_VERSION_BASE_SQL = """
+    FROM media_metadata AS t
+    WHERE t.in_library = TRUE
+      AND jsonb_typeof(t.asset_details_json) = 'array'
+      AND jsonb_array_length(t.asset_details_json) > 1
+"""
+
+def count_multi_version_items(library_paths: Optional[List[str]] = None, emby_ids: Optional[List[str]] = None) -> int:
+    """统计范围内的多版本媒体数量，用于进度显示。"""
+    scope_clause, params = _multi_version_scope(library_paths, emby_ids)
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) AS total {_MULTI_VERSION_BASE_SQL} {scope_clause}", params)
+            return int(cursor.fetchone()['total'])
+
+def iter_multi_version_item_batches(library_paths: Optional[List[str]] = None,
+                                    emby_ids: Optional[List[str]] = None,
+                                    batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+    """
+    用服务端游标一次查询流式读取所有多版本媒体，标题与版本信息一并返回，按批产出。
+    library_paths 与 emby_ids 都为 None 时扫描全部媒体库。
+    """
+    scope_clause, params = _multi_version_scope(library_paths, emby_ids)
+    query = f"""
+        SELECT t.tmdb_id, t.item_type, t.title, t.asset_details_json
+        {_MULTI_VERSION_BASE_SQL} {scope_clause}
+        ORDER BY t.item_type, t.tmdb_id
+    """
+    with get_db_connection() as conn:
+        with conn.cursor(name="cleanup_multi_version_scan") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
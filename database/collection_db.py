@@ -6,9 +6,10 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List
 
 from .connection import get_db_connection
-from . import media_db, request_db
+from . import media_db, request_db, queries_db, permission_db
 import config_manager
 import constants
+import extensions
 import handler.tmdb as tmdb
 import handler.emby as emby
 
@@ -77,8 +78,9 @@ def create_custom_collection(name: str, type: str, definition_json: str, allowed
             # ★★★ 2. 在执行时传入第4个参数 ★★★
             cursor.execute(sql, (name, type, definition_json, allowed_user_ids_json))
             new_id = cursor.fetchone()['id']
-            logger.info(f"成功创建自定义合集 '{name}' (类型: {type})。")
-            return new_id
+        extensions.invalidate_views_cache()
+        logger.info(f"成功创建自定义合集 '{name}' (类型: {type})。")
+        return new_id
     except psycopg2.Error as e:
         logger.error(f"创建自定义合集 '{name}' 时发生数据库错误: {e}", exc_info=True)
         raise
@@ -129,7 +131,9 @@ def update_custom_collection(collection_id: int, name: str, type: str, definitio
             cursor = conn.cursor()
             # ★★★ 2. 在执行时传入新参数 ★★★
             cursor.execute(sql, (name, type, definition_json, status, allowed_user_ids_json, collection_id))
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+        extensions.invalidate_views_cache()
+        return updated
     except psycopg2.Error as e:
         logger.error(f"更新自定义合集 ID {collection_id} 时出错: {e}", exc_info=True)
         return False
@@ -140,7 +144,9 @@ def delete_custom_collection(collection_id: int) -> bool:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM custom_collections WHERE id = %s", (collection_id,))
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+        extensions.invalidate_views_cache()
+        return deleted
     except psycopg2.Error as e:
         logger.error(f"删除自定义合集 (ID: {collection_id}) 时出错: {e}", exc_info=True)
         raise
@@ -154,7 +160,8 @@ def update_custom_collections_order(ordered_ids: List[int]) -> bool:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.executemany(sql, data_to_update)
-            return True
+        extensions.invalidate_views_cache()
+        return True
     except psycopg2.Error as e:
         logger.error(f"批量更新自定义合集顺序时出错: {e}", exc_info=True)
         return False
@@ -182,6 +189,7 @@ def update_custom_collection_sync_results(collection_id: int, update_data: Dict[
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(sql, tuple(values))
+        extensions.invalidate_views_cache()
     except psycopg2.Error as e:
         logger.error(f"更新自定义合集 {collection_id} 的同步结果时出错: {e}", exc_info=True)
         raise
@@ -520,12 +528,14 @@ def update_user_caches_on_item_add(
     new_item_tmdb_id: str, 
     new_item_name: str,
     matching_collection_ids: list, 
-    emby_config: dict
+    emby_config: dict,
+    user_ids_with_access: Optional[List[str]] = None
 ):
     """
     当一个新媒体项入库时，实时、精确地将其追加到所有
     相关用户的 user_collection_cache 中。
     修复了会覆盖原有权限的严重 Bug，并增加了防重复机制。
+    调用方已知有权限的用户时可通过 user_ids_with_access 传入，避免重复查询。
     """
     if not all([new_item_emby_id, new_item_tmdb_id, matching_collection_ids, emby_config]):
         return
@@ -533,11 +543,12 @@ def update_user_caches_on_item_add(
     logger.info(f"  ➜ 开始为新入库项目 《{new_item_name}》 更新用户权限缓存...")
     
     try:
-        user_ids_with_access = emby.get_user_ids_with_access_to_item(
-            item_id=new_item_emby_id,
-            base_url=emby_config['url'],
-            api_key=emby_config['api_key']
-        )
+        if user_ids_with_access is None:
+            user_ids_with_access = emby.get_user_ids_with_access_to_item(
+                item_id=new_item_emby_id,
+                base_url=emby_config['url'],
+                api_key=emby_config['api_key']
+            )
 
         if not user_ids_with_access:
             logger.warning(f"  ➜ 未找到任何有权访问新项目 《{new_item_name}》 的用户，跳过缓存更新。")
@@ -563,6 +574,7 @@ def update_user_caches_on_item_add(
                         AND collection_id = ANY(%s)
                         -- 4. ★★★ 关键条件：只有当新 ID 不存在于数组中时，才执行更新 ★★★
                         --    使用 @> 操作符检查数组是否包含指定的单个元素 JSONB 数组
+                        AND visible_bitmap IS NULL
                         AND NOT (visible_emby_ids_json @> %s::jsonb);
                 """
                 
@@ -578,12 +590,20 @@ def update_user_caches_on_item_add(
                 ))
                 
                 updated_rows = cursor.rowcount
+
+                # 位图格式的缓存：在成员索引末尾追加并置位
+                updated_rows += permission_db.add_item_to_collections(
+                    cursor, new_item_emby_id, matching_collection_ids, user_ids_with_access
+                )
                 
                 if updated_rows > 0:
                     logger.info(f"  ➜ 权限更新成功！在 {len(matching_collection_ids)} 个合集中，为 {len(user_ids_with_access)} 个相关用户更新了 {updated_rows} 条权限缓存记录。")
                 else:
                     logger.info(f"  ➜ 权限缓存检查完成。所有相关用户的缓存记录均已包含新项目《{new_item_name}》，无需更新。")
 
+        # 事务已提交，让反代的进程内缓存失效
+        if updated_rows > 0:
+            queries_db.invalidate_visible_ids_cache(collection_ids=matching_collection_ids, user_ids=user_ids_with_access)
 
     except Exception as e:
         logger.error(f"  ➜ 为新项目 《{new_item_name}》 更新用户缓存时发生严重错误: {e}", exc_info=True)
@@ -2,33 +2,379 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional
 
 import config_manager
 import constants
 
 logger = logging.getLogger(__name__)
 
+# ======================================================================
+# 模块: 连接池
+# ======================================================================
+# web_app 启动时已执行 gevent monkey.patch_all()，这里的 threading 原语
+# 会被替换为协程版本，因此等待空闲连接时只会挂起当前 greenlet，不会阻塞整个进程。
+
+class _AfterCommitConnection(psycopg2.extensions.connection):
+    """
+    连接池使用的连接类型：支持登记“当前事务提交成功后”才执行的回调，
+    供进程内缓存在数据确实落库后再更新。rollback() 会丢弃尚未执行的回调。
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._after_commit_callbacks = []
+
+    def commit(self):
+        super().commit()
+        callbacks, self._after_commit_callbacks = self._after_commit_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"  ➜ 执行事务提交后的回调时出错: {e}", exc_info=True)
+
+    def rollback(self):
+        self._after_commit_callbacks = []
+        super().rollback()
+
+def run_after_commit(conn, callback) -> bool:
+    """
+    在 conn 当前事务提交成功后执行 callback；autocommit 连接上立即执行。
+    conn 不支持提交回调时不执行并返回 False (调用方应把它当作“不更新缓存”)。
+    """
+    if getattr(conn, 'autocommit', False):
+        callback()
+        return True
+    if not isinstance(conn, _AfterCommitConnection):
+        return False
+    conn._after_commit_callbacks.append(callback)
+    return True
+
+class PooledConnection:
+    """
+    借出的数据库连接包装。
+    - 除 close() 与上下文管理外，所有属性/方法都透传给底层的 psycopg2 连接。
+    - `with get_db_connection() as conn:` 的语义与原生连接一致（成功提交、异常回滚），
+      区别在于退出 with 块后连接会被归还到池中，而不是等待 GC 关闭。
+    - close() 也只是把连接归还到池中，可以重复调用。
+    """
+    __slots__ = ('_pool', '_raw', '_released')
+
+    def __init__(self, pool: 'ConnectionPool', raw: psycopg2.extensions.connection):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_released', False)
+
+    def __getattr__(self, name):
+        if name in PooledConnection.__slots__:
+            raise AttributeError(name)
+        if self._released:
+            # 兼容 except 分支里的 `conn.closed` / `conn.status` 判断
+            if name == 'closed':
+                return 1
+            if name == 'status':
+                return psycopg2.extensions.STATUS_READY
+            raise psycopg2.InterfaceError("数据库连接已归还到连接池，不能继续使用")
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        # 例如 conn.autocommit = False
+        if self._released:
+            raise psycopg2.InterfaceError("数据库连接已归还到连接池，不能继续使用")
+        setattr(self._raw, name, value)
+
+    def rollback(self):
+        # 很多 except 分支会在 with 块退出后再调用一次 conn.rollback()，
+        # 此时事务已在归还时回滚，连接也可能已借给别人，这里直接忽略。
+        if self._released:
+            return
+        self._raw.rollback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            if not self._raw.closed:
+                if exc_type is None:
+                    self._raw.commit()
+                else:
+                    self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        if self._released:
+            return
+        object.__setattr__(self, '_released', True)
+        self._pool.release(self._raw)
+
+    def __del__(self):
+        # 兜底：调用方既没用 with 也没 close() 时，依然把连接还回池中
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    PostgreSQL 连接池。
+    - min_size/max_size: 常驻连接数与上限。
+    - wait_timeout: 池满时等待的秒数；超时后建立一个"溢出连接"，用完即关，保证嵌套借用不会死锁。
+    - 借出前对空闲较久的连接做 SELECT 1 探活；归还/借出时回收空闲过久的多余连接。
+    """
+    def __init__(self, connect_kwargs: Dict[str, Any], min_size: int, max_size: int, wait_timeout: float,
+                 idle_timeout: float = constants.DB_POOL_IDLE_TIMEOUT_SECONDS,
+                 health_check_interval: float = constants.DB_POOL_HEALTH_CHECK_INTERVAL_SECONDS):
+        self._connect_kwargs = connect_kwargs
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(0, min(int(min_size), self.max_size))
+        self.wait_timeout = max(0.0, float(wait_timeout))
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle: List[tuple] = []   # [(raw_conn, last_used_monotonic), ...]，末尾为最近归还
+        self._in_use: set = set()      # 池内借出连接的 id()
+        self._overflow: set = set()    # 溢出连接的 id()
+        self._pending = 0              # 正在建立中的连接数
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'reaped': 0,
+            'health_check_failures': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'overflow_created': 0,
+        }
+
+    # --- 内部工具 ---
+    def _connect(self) -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(connection_factory=_AfterCommitConnection, cursor_factory=RealDictCursor, **self._connect_kwargs)
+        self._stats['created'] += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self._stats['health_check_failures'] += 1
+            return False
+
+    def _reap_idle_locked(self, now: float) -> List:
+        """在持锁状态下挑出需要关闭的空闲连接，实际关闭放在锁外执行。"""
+        to_close = []
+        total = len(self._idle) + len(self._in_use)
+        keep = []
+        # _idle 越靠前越久未使用
+        for conn, last_used in self._idle:
+            if total > self.min_size and now - last_used > self.idle_timeout:
+                to_close.append(conn)
+                total -= 1
+            else:
+                keep.append((conn, last_used))
+        self._idle = keep
+        self._stats['reaped'] += len(to_close)
+        return to_close
+
+    # --- 公共接口 ---
+    def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        waited = False
+        while True:
+            candidate = None
+            last_used = 0.0
+            action = None  # 'reuse' | 'create' | 'overflow'
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("数据库连接池已关闭")
+                to_close = self._reap_idle_locked(time.monotonic())
+                if self._idle:
+                    candidate, last_used = self._idle.pop()
+                    self._in_use.add(id(candidate))
+                    action = 'reuse'
+                elif len(self._in_use) + self._pending < self.max_size:
+                    # 先占一个名额再在锁外建连，避免并发下超过 max_size
+                    self._pending += 1
+                    action = 'create'
+                else:
+                    remaining = self.wait_timeout - (time.monotonic() - start)
+                    if remaining > 0:
+                        waited = True
+                        self._cond.wait(remaining)
+                    else:
+                        action = 'overflow'
+
+            for conn in to_close:
+                self._close_quietly(conn)
+
+            if action == 'reuse':
+                if self._is_healthy(candidate, time.monotonic() - last_used):
+                    return self._checkout_done(candidate, start, waited)
+                with self._cond:
+                    self._in_use.discard(id(candidate))
+                    self._stats['discarded'] += 1
+                    self._cond.notify()
+                self._close_quietly(candidate)
+            elif action == 'create':
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._pending -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pending -= 1
+                    self._in_use.add(id(conn))
+                return self._checkout_done(conn, start, waited)
+            elif action == 'overflow':
+                conn = self._connect()
+                with self._cond:
+                    self._overflow.add(id(conn))
+                    self._stats['overflow_created'] += 1
+                logger.warning(f"  ➜ 数据库连接池已满 ({self.max_size})，等待 {self.wait_timeout:.1f}s 后仍无空闲连接，已临时建立溢出连接。")
+                return self._checkout_done(conn, start, waited)
+
+    def _checkout_done(self, conn, start: float, waited: bool) -> PooledConnection:
+        with self._cond:
+            self._stats['checkouts'] += 1
+            if waited:
+                elapsed = time.monotonic() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += elapsed
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], elapsed)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """归还连接：回滚未结束的事务、恢复 autocommit，然后放回空闲队列。"""
+        reusable = not conn.closed
+        if reusable:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                reusable = False
+
+        with self._cond:
+            conn_id = id(conn)
+            if conn_id in self._overflow:
+                self._overflow.discard(conn_id)
+                reusable = False
+            else:
+                self._in_use.discard(conn_id)
+                if reusable and not self._closed:
+                    self._idle.append((conn, time.monotonic()))
+                else:
+                    reusable = False
+                    self._stats['discarded'] += 1
+            self._cond.notify()
+
+        if not reusable:
+            self._close_quietly(conn)
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'overflow_in_use': len(self._overflow),
+            })
+        stats['wait_time_avg'] = (stats['wait_time_total'] / stats['waits']) if stats['waits'] else 0.0
+        return stats
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # 从全局配置中获取连接参数
+                cfg = config_manager.APP_CONFIG
+                connect_kwargs = {
+                    'host': cfg.get(constants.CONFIG_OPTION_DB_HOST),
+                    'port': cfg.get(constants.CONFIG_OPTION_DB_PORT),
+                    'user': cfg.get(constants.CONFIG_OPTION_DB_USER),
+                    'password': cfg.get(constants.CONFIG_OPTION_DB_PASSWORD),
+                    'dbname': cfg.get(constants.CONFIG_OPTION_DB_NAME),
+                }
+                _pool = ConnectionPool(
+                    connect_kwargs,
+                    min_size=cfg.get(constants.CONFIG_OPTION_DB_POOL_MIN_SIZE, constants.DEFAULT_DB_POOL_MIN_SIZE),
+                    max_size=cfg.get(constants.CONFIG_OPTION_DB_POOL_MAX_SIZE, constants.DEFAULT_DB_POOL_MAX_SIZE),
+                    wait_timeout=cfg.get(constants.CONFIG_OPTION_DB_POOL_WAIT_TIMEOUT, constants.DEFAULT_DB_POOL_WAIT_TIMEOUT),
+                )
+                logger.debug(f"  ➜ 数据库连接池已创建 (min={_pool.min_size}, max={_pool.max_size})。")
+    return _pool
+
+def get_pool_stats() -> Dict[str, Any]:
+    """返回连接池的运行指标（借出次数、等待次数/耗时、溢出连接数等）。"""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+def close_pool():
+    """关闭连接池中的所有空闲连接，用于应用退出。"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
 # ======================================================================
 # 模块: 中央数据访问 
 # ======================================================================
 
-def get_db_connection() -> psycopg2.extensions.connection:
+def get_db_connection() -> PooledConnection:
     """
-    【中央函数】获取一个配置好 RealDictCursor 的 PostgreSQL 数据库连接。
+    【中央函数】从连接池借出一个配置好 RealDictCursor 的 PostgreSQL 数据库连接。
     这是整个应用获取数据库连接的唯一入口。
+    用法不变：`with get_db_connection() as conn:`，退出 with 块后连接自动归还到池中。
     """
     try:
-        # 从全局配置中获取连接参数
-        cfg = config_manager.APP_CONFIG
-        conn = psycopg2.connect(
-            host=cfg.get(constants.CONFIG_OPTION_DB_HOST),
-            port=cfg.get(constants.CONFIG_OPTION_DB_PORT),
-            user=cfg.get(constants.CONFIG_OPTION_DB_USER),
-            password=cfg.get(constants.CONFIG_OPTION_DB_PASSWORD),
-            dbname=cfg.get(constants.CONFIG_OPTION_DB_NAME),
-            cursor_factory=RealDictCursor
-        )
-        return conn
+        return _get_pool().acquire()
     except psycopg2.Error as e:
         logger.error(f"获取 PostgreSQL 数据库连接失败: {e}", exc_info=True)
         raise
@@ -83,6 +429,18 @@ def init_db():
                         last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
                     )
                 """)
+                # TMDb 响应缓存：键为 endpoint + 规范化参数的摘要，按资源类别设置过期时间
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS tmdb_api_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        endpoint TEXT NOT NULL,
+                        response_json JSONB NOT NULL,
+                        etag TEXT,
+                        fetched_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                        expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_tmdb_api_cache_expires ON tmdb_api_cache (expires_at);")
 
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS app_settings (
@@ -166,6 +524,7 @@ def init_db():
                         user_id TEXT NOT NULL,
                         collection_id INTEGER NOT NULL,
                         visible_emby_ids_json JSONB,
+                        visible_bitmap BYTEA,
                         total_count INTEGER DEFAULT 0,
                         last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
                         PRIMARY KEY (user_id, collection_id)
@@ -173,6 +532,36 @@ def init_db():
                 """)
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_ucc_user_coll ON user_collection_cache (user_id, collection_id);")
 
+                logger.trace("  ➜ 正在创建 'emby_item_dense_ids' 表 (Emby 项目稠密整数ID)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS emby_item_dense_ids (
+                        dense_id INTEGER PRIMARY KEY,
+                        emby_id TEXT NOT NULL UNIQUE
+                    )
+                """)
+
+                logger.trace("  ➜ 正在创建 'user_permission_bitmaps' 表 (用户可访问项目位图/权限快照)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_permission_bitmaps (
+                        user_id TEXT PRIMARY KEY,
+                        permission_bitmap BYTEA NOT NULL,
+                        item_count INTEGER NOT NULL DEFAULT 0,
+                        policy_fingerprint TEXT,
+                        snapshot_at TIMESTAMP WITH TIME ZONE,
+                        last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                    )
+                """)
+
+                logger.trace("  ➜ 正在创建 'collection_member_index' 表 (合集成员顺序与位图)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS collection_member_index (
+                        collection_id INTEGER PRIMARY KEY,
+                        member_dense_ids INTEGER[] NOT NULL DEFAULT '{}',
+                        member_bitmap BYTEA NOT NULL DEFAULT ''::bytea,
+                        last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                    )
+                """)
+
                 logger.trace("  ➜ 正在创建 'media_metadata' 表...")
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS media_metadata (
@@ -241,6 +630,7 @@ def init_db():
                         watchlist_next_episode_json JSONB,
                         watchlist_missing_info_json JSONB,
                         watchlist_is_airing BOOLEAN DEFAULT FALSE,
+                        watchlist_tmdb_fingerprint_json JSONB,
 
                         -- 内部管理字段
                         last_synced_at TIMESTAMP WITH TIME ZONE,
@@ -251,6 +641,27 @@ def init_db():
                     )
                 """)
 
+                logger.trace("  ➜ 正在创建 'media_emby_id_map' 表 (Emby ID 反查索引)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS media_emby_id_map (
+                        emby_id TEXT PRIMARY KEY,
+                        tmdb_id TEXT NOT NULL,
+                        item_type TEXT NOT NULL
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_meim_media ON media_emby_id_map (tmdb_id, item_type);")
+
+                logger.trace("  ➜ 正在创建 'metadata_sync_queue' 表 (增量同步事件队列)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS metadata_sync_queue (
+                        emby_id TEXT PRIMARY KEY,
+                        event_type TEXT NOT NULL,
+                        item_type TEXT,
+                        series_emby_id TEXT,
+                        queued_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                    )
+                """)
+
                 logger.trace("  ➜ 正在创建 'person_identity_map' 表...")
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS person_identity_map (
@@ -340,6 +751,7 @@ def init_db():
                         reason TEXT,
                         matched_rule_id INTEGER,
                         last_checked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                        source_fingerprint TEXT, -- 代表资产 + 规则判定字段的指纹，用于增量刷新
 
                         -- 主键保持不变，但现在 season_number 有了默认值，不会再插入 NULL
                         PRIMARY KEY (tmdb_id, item_type, season_number)
@@ -522,7 +934,8 @@ def init_db():
                             "watchlist_tmdb_status": "TEXT",
                             "watchlist_next_episode_json": "JSONB",
                             "watchlist_missing_info_json": "JSONB",
-                            "watchlist_is_airing": "BOOLEAN DEFAULT FALSE"
+                            "watchlist_is_airing": "BOOLEAN DEFAULT FALSE",
+                            "watchlist_tmdb_fingerprint_json": "JSONB"
                         },
                         'resubscribe_rules': {
                             "resubscribe_subtitle_effect_only": "BOOLEAN DEFAULT FALSE",
@@ -533,6 +946,9 @@ def init_db():
                             "resubscribe_codec_include": "JSONB",
                             "resubscribe_subtitle_skip_if_audio_exists": "BOOLEAN DEFAULT FALSE"
                         },
+                        'resubscribe_index': {
+                            "source_fingerprint": "TEXT"
+                        },
                         'user_templates': {
                             "source_emby_user_id": "TEXT",
                             "emby_configuration_json": "JSONB",
@@ -542,6 +958,9 @@ def init_db():
                             "template_id": "INTEGER",
                             "telegram_chat_id": "TEXT"
                         },
+                        'user_collection_cache': {
+                            "visible_bitmap": "BYTEA"
+                        },
                         'actor_subscriptions': {
                             "config_main_role_only": "BOOLEAN NOT NULL DEFAULT FALSE",
                             "config_min_vote_count": "INTEGER NOT NULL DEFAULT 10",
@@ -579,6 +998,83 @@ def init_db():
                 except Exception as e_index:
                     logger.error(f"  ➜ 创建 'emby_item_id' 索引时出错: {e_index}", exc_info=True)
 
+                # --- 2.5 Emby ID 反查表的同步触发器 ---
+                # media_emby_id_map 是 media_metadata.emby_item_ids_json 的展开副本，
+                # 由触发器维护，因此所有写 emby_item_ids_json 的地方 (_upsert_media_metadata、
+                # 元数据同步、Webhook 删除清理等) 都无需额外代码即可保持一致。
+                logger.trace("  ➜ 正在创建/验证 'media_emby_id_map' 的同步触发器...")
+                try:
+                    cursor.execute("""
+                        CREATE OR REPLACE FUNCTION sync_media_emby_id_map() RETURNS TRIGGER AS $$
+                        BEGIN
+                            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                                DELETE FROM media_emby_id_map
+                                WHERE tmdb_id = OLD.tmdb_id AND item_type = OLD.item_type;
+                            END IF;
+                            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                                INSERT INTO media_emby_id_map (emby_id, tmdb_id, item_type)
+                                SELECT DISTINCT elem, NEW.tmdb_id, NEW.item_type
+                                FROM jsonb_array_elements_text(COALESCE(NEW.emby_item_ids_json, '[]'::jsonb)) AS elem
+                                ON CONFLICT (emby_id) DO UPDATE
+                                    SET tmdb_id = EXCLUDED.tmdb_id, item_type = EXCLUDED.item_type;
+                            END IF;
+                            RETURN NULL;
+                        END;
+                        $$ LANGUAGE plpgsql;
+                    """)
+                    cursor.execute("DROP TRIGGER IF EXISTS trg_mm_emby_id_map_insert ON media_metadata;")
+                    cursor.execute("""
+                        CREATE TRIGGER trg_mm_emby_id_map_insert
+                        AFTER INSERT ON media_metadata
+                        FOR EACH ROW EXECUTE FUNCTION sync_media_emby_id_map();
+                    """)
+                    cursor.execute("DROP TRIGGER IF EXISTS trg_mm_emby_id_map_update ON media_metadata;")
+                    cursor.execute("""
+                        CREATE TRIGGER trg_mm_emby_id_map_update
+                        AFTER UPDATE OF emby_item_ids_json, tmdb_id, item_type ON media_metadata
+                        FOR EACH ROW
+                        WHEN (OLD.emby_item_ids_json IS DISTINCT FROM NEW.emby_item_ids_json
+                              OR OLD.tmdb_id IS DISTINCT FROM NEW.tmdb_id
+                              OR OLD.item_type IS DISTINCT FROM NEW.item_type)
+                        EXECUTE FUNCTION sync_media_emby_id_map();
+                    """)
+                    cursor.execute("DROP TRIGGER IF EXISTS trg_mm_emby_id_map_delete ON media_metadata;")
+                    cursor.execute("""
+                        CREATE TRIGGER trg_mm_emby_id_map_delete
+                        AFTER DELETE ON media_metadata
+                        FOR EACH ROW EXECUTE FUNCTION sync_media_emby_id_map();
+                    """)
+                    # TRUNCATE 不会触发行级触发器 (数据库覆盖导入会用到)，单独处理
+                    cursor.execute("""
+                        CREATE OR REPLACE FUNCTION clear_media_emby_id_map() RETURNS TRIGGER AS $$
+                        BEGIN
+                            TRUNCATE media_emby_id_map;
+                            RETURN NULL;
+                        END;
+                        $$ LANGUAGE plpgsql;
+                    """)
+                    cursor.execute("DROP TRIGGER IF EXISTS trg_mm_emby_id_map_truncate ON media_metadata;")
+                    cursor.execute("""
+                        CREATE TRIGGER trg_mm_emby_id_map_truncate
+                        AFTER TRUNCATE ON media_metadata
+                        FOR EACH STATEMENT EXECUTE FUNCTION clear_media_emby_id_map();
+                    """)
+
+                    # 首次升级时，用现有数据回填
+                    cursor.execute("SELECT EXISTS (SELECT 1 FROM media_emby_id_map) AS has_rows")
+                    if not cursor.fetchone()['has_rows']:
+                        cursor.execute("""
+                            INSERT INTO media_emby_id_map (emby_id, tmdb_id, item_type)
+                            SELECT DISTINCT ON (elem) elem, m.tmdb_id, m.item_type
+                            FROM media_metadata m, jsonb_array_elements_text(m.emby_item_ids_json) AS elem
+                            ORDER BY elem, m.in_library DESC
+                            ON CONFLICT (emby_id) DO NOTHING
+                        """)
+                        if cursor.rowcount > 0:
+                            logger.info(f"    ➜ [数据库升级] 已为 'media_emby_id_map' 回填 {cursor.rowcount} 条 Emby ID 映射。")
+                except Exception as e_map:
+                    logger.error(f"  ➜ [数据库升级] 创建 'media_emby_id_map' 触发器时出错: {e_map}", exc_info=True)
+
                 # ======================================================================
                 # ★★★ 数据库自动修正补丁 (START) ★★★
                 # 修正 'media_metadata.in_library' 字段错误的默认值
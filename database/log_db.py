@@ -39,6 +39,22 @@ class LogDBManager:
         except Exception as e:
             logger.error(f"  ➜ 从已处理日志删除失败 for item {item_id}: {e}", exc_info=True)
 
+    def prune_processed_log(self, cursor: psycopg2.extensions.cursor, current_item_ids: List[str]) -> List[Dict[str, str]]:
+        """
+        一条语句对账 processed_log：删除所有不在 current_item_ids 中的记录。
+        ID 集合以数组参数整体下发，由 Postgres 做反连接，不再逐行 DELETE。
+        返回被删除的记录 [{'item_id', 'item_name'}]，供调用方批量同步内存缓存。
+        """
+        cursor.execute("""
+            DELETE FROM processed_log p
+            WHERE NOT EXISTS (
+                SELECT 1 FROM unnest(%s::text[]) AS current_ids(item_id)
+                WHERE current_ids.item_id = p.item_id
+            )
+            RETURNING p.item_id, p.item_name
+        """, (list(current_item_ids),))
+        return [{'item_id': row['item_id'], 'item_name': row['item_name']} for row in cursor.fetchall()]
+
     def remove_from_failed_log(self, cursor: psycopg2.extensions.cursor, item_id: str):
         
         try:
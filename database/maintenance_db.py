@@ -12,6 +12,8 @@ from .connection import get_db_connection
 from .log_db import LogDBManager
 from .collection_db import remove_tmdb_id_from_all_collections
 from .media_db import get_tmdb_id_from_emby_id
+from .actor_db import invalidate_translation_cache
+from . import queries_db, permission_db
 import constants
 
 logger = logging.getLogger(__name__)
@@ -30,6 +32,8 @@ def clear_table(table_name: str) -> int:
             cursor.execute(query)
             deleted_count = cursor.rowcount
             conn.commit()
+            if table_name == 'translation_cache':
+                invalidate_translation_cache()
             logger.info(f"清空表 {table_name}，删除了 {deleted_count} 行。")
             return deleted_count
     except Exception as e:
@@ -313,7 +317,9 @@ def prepare_for_library_rebuild() -> Dict[str, Dict]:
     """
     tables_to_truncate = [
         'emby_users', 'emby_users_extended', 'user_media_data', 'user_collection_cache',
-        'collections_info', 'watchlist', 'resubscribe_index', 'media_cleanup_tasks'
+        'collections_info', 'watchlist', 'resubscribe_index', 'media_cleanup_tasks',
+        'emby_item_dense_ids', 'user_permission_bitmaps', 'collection_member_index',
+        'metadata_sync_queue'
     ]
     columns_to_reset = {
         'media_metadata': 'emby_item_id', 'person_identity_map': 'emby_person_id',
@@ -341,6 +347,7 @@ def prepare_for_library_rebuild() -> Dict[str, Dict]:
                     affected_rows = cursor.rowcount
                     results["updated_columns"][f"{table_name}.{column_name}"] = f"重置了 {affected_rows} 行"
                     logger.info(f"    ➜ 操作完成，影响了 {affected_rows} 行。")
+        queries_db.invalidate_visible_ids_cache()
         return results
     except Exception as e:
         logger.error(f"执行 prepare_for_library_rebuild 时发生严重错误: {e}", exc_info=True)
@@ -522,8 +529,11 @@ def cleanup_deleted_media_item(item_id: str, item_name: str, item_type: str, ser
                             visible_emby_ids_json @> %s::jsonb;
                     """
                     cursor.execute(sql_cleanup_user_cache, (item_id, json.dumps([item_id])))
+                    # 位图格式的缓存：清除该项目在成员索引、用户位图中的位
+                    permission_db.remove_item_everywhere(cursor, item_id)
                     
                     conn.commit()
+                    queries_db.invalidate_visible_ids_cache()
 
             remove_tmdb_id_from_all_collections(target_tmdb_id_for_full_cleanup)
             logger.info(f"--- 对 TMDB ID: {target_tmdb_id_for_full_cleanup} 的完全清理已完成 ---")
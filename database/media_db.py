@@ -1,6 +1,7 @@
 # database/media_db.py
 import logging
-from typing import List, Dict, Optional, Any
+import os
+from typing import List, Dict, Optional, Any, Iterator, Tuple
 import json
 import psycopg2
 from .connection import get_db_connection
@@ -149,6 +150,82 @@ def get_all_media_metadata(item_type: str = 'Movie') -> List[Dict[str, Any]]:
         logger.error(f"获取所有媒体元数据时出错 (类型: {item_type}): {e}", exc_info=True)
         return []
 
+def library_path_patterns(library_paths: List[str]) -> List[str]:
+    """把媒体库源文件夹转成 LIKE 前缀模式，补齐末尾分隔符以免 /movies 误配 /movies2。"""
+    patterns = []
+    for library_path in library_paths or []:
+        if not library_path:
+            continue
+        prefix = os.path.join(library_path, "")
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        patterns.append(f"{escaped}%")
+    return patterns
+
+def iter_media_metadata_for_filter(item_types: List[str],
+                                   columns: Optional[List[str]] = None,
+                                   where_clause: Optional[str] = None,
+                                   params: Optional[List[Any]] = None,
+                                   library_paths: Optional[List[str]] = None,
+                                   media_keys: Optional[List[Tuple[str, str]]] = None,
+                                   batch_size: int = 2000) -> Iterator[Dict[str, Any]]:
+    """
+    一次查询、逐批流式返回多个类型的在库元数据，供筛选引擎边读边匹配。
+    - columns: 只取这些列 (调用方须保证来自白名单)，为空时取整行。
+    - where_clause: 由筛选引擎生成的宽松下推条件。
+    - library_paths: 媒体库源文件夹。电影按自身 asset_details_json 里的文件路径判断，
+      剧集按其任意一集在库分集的文件路径判断，完全不依赖 Emby 实时列表。
+    - media_keys: (item_type, tmdb_id) 列表，无法按路径判断时由调用方用 Emby 列表兜底。
+    使用服务端游标，内存占用只与 batch_size 有关。查询出错时抛出异常，由调用方决定如何处理。
+    """
+    if not item_types:
+        return
+    select_list = ", ".join(f"m.{c}" for c in columns) if columns else "m.*"
+    sql = f"SELECT {select_list} FROM media_metadata m WHERE m.item_type = ANY(%s) AND m.in_library = TRUE"
+    query_params: List[Any] = [list(item_types)]
+
+    if library_paths is not None:
+        patterns = library_path_patterns(library_paths)
+        if not patterns:
+            return
+        sql += """
+            AND CASE WHEN m.item_type = 'Series' THEN EXISTS (
+                    SELECT 1 FROM media_metadata ep
+                    CROSS JOIN LATERAL jsonb_array_elements(
+                        CASE WHEN jsonb_typeof(ep.asset_details_json) = 'array' THEN ep.asset_details_json ELSE '[]'::jsonb END
+                    ) AS asset
+                    WHERE ep.parent_series_tmdb_id = m.tmdb_id AND ep.item_type = 'Episode'
+                      AND ep.in_library = TRUE AND asset->>'path' LIKE ANY(%s)
+                ) ELSE EXISTS (
+                    SELECT 1 FROM jsonb_array_elements(
+                        CASE WHEN jsonb_typeof(m.asset_details_json) = 'array' THEN m.asset_details_json ELSE '[]'::jsonb END
+                    ) AS asset
+                    WHERE asset->>'path' LIKE ANY(%s)
+                ) END
+        """
+        query_params.extend([patterns, patterns])
+
+    if media_keys is not None:
+        if not media_keys:
+            return
+        sql += " AND (m.item_type, m.tmdb_id) IN (SELECT * FROM unnest(%s::text[], %s::text[]))"
+        query_params.extend([[k[0] for k in media_keys], [str(k[1]) for k in media_keys]])
+
+    if where_clause:
+        sql += f" AND ({where_clause})"
+        query_params.extend(params or [])
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(name="filter_engine_scan") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(sql, query_params)
+                for row in cursor:
+                    yield dict(row)
+    except psycopg2.Error as e:
+        # 不能吞掉：空结果会被当成“没有匹配项”而覆盖合集内容
+        logger.error(f"按筛选条件流式读取媒体元数据时出错 (类型: {item_types}): {e}", exc_info=True)
+        raise
+
 def get_media_in_library_status_by_tmdb_ids(tmdb_ids: List[str]) -> Dict[str, bool]:
     """ 根据 TMDB ID 列表，批量查询媒体的在库状态。"""
     if not tmdb_ids: return {}
@@ -610,6 +687,35 @@ def get_series_local_children_info(parent_tmdb_id: str) -> dict:
         logger.error(f"从本地数据库获取剧集 {parent_tmdb_id} 的子项目结构时失败: {e}")
         return {}
 
+def get_series_cached_tmdb_episodes(parent_tmdb_id: str, season_numbers: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    读取上次追剧检查时同步进来的分集 (不论是否在库)，按季号分组，
+    字段名与 TMDb 季详情里的 episodes 保持一致，供指纹未变的季直接复用。
+    """
+    if not parent_tmdb_id or not season_numbers:
+        return {}
+    sql = """
+        SELECT tmdb_id AS id, title AS name, overview, release_date AS air_date,
+               season_number, episode_number
+        FROM media_metadata
+        WHERE parent_series_tmdb_id = %s AND item_type = 'Episode' AND season_number = ANY(%s)
+        ORDER BY season_number, episode_number
+    """
+    episodes_by_season: Dict[int, List[Dict[str, Any]]] = {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (parent_tmdb_id, list(season_numbers)))
+            for row in cursor.fetchall():
+                episode = dict(row)
+                if episode['air_date'] is not None:
+                    episode['air_date'] = episode['air_date'].isoformat()
+                episodes_by_season.setdefault(episode['season_number'], []).append(episode)
+        return episodes_by_season
+    except Exception as e:
+        logger.error(f"从本地数据库读取剧集 {parent_tmdb_id} 的已缓存分集时失败: {e}")
+        return {}
+
 def get_series_local_episodes_overview(parent_tmdb_id: str) -> list:
     """
     【新】从本地数据库获取一个剧集所有分集的元数据，用于检查简介。
@@ -643,4 +749,121 @@ def update_episode_overview(emby_item_id: str, overview: str):
             cursor.execute(sql, (overview, json.dumps([emby_item_id])))
             conn.commit()
     except Exception as e:
-        logger.error(f"更新分集 {emby_item_id} 的本地简介缓存时失败: {e}")
\ No newline at end of file
+        logger.error(f"更新分集 {emby_item_id} 的本地简介缓存时失败: {e}")
+# ======================================================================
+# 模块: 增量同步 (变更队列与 Emby ID 反查)
+# ======================================================================
+
+def enqueue_metadata_sync_events(events: List[Dict[str, Any]]):
+    """
+    把 webhook 收到的新增/删除/元数据变更事件记入 metadata_sync_queue，
+    供下一次快速同步消费。同一个 Emby ID 只保留最新的一条。
+    """
+    if not events:
+        return
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                from psycopg2.extras import execute_values
+                rows = {
+                    str(e['emby_id']): (str(e['emby_id']), e.get('event_type'), e.get('item_type'), e.get('series_emby_id'))
+                    for e in events if e.get('emby_id')
+                }
+                execute_values(cursor, """
+                    INSERT INTO metadata_sync_queue (emby_id, event_type, item_type, series_emby_id, queued_at)
+                    VALUES %s
+                    ON CONFLICT (emby_id) DO UPDATE SET
+                        event_type = EXCLUDED.event_type,
+                        item_type = COALESCE(EXCLUDED.item_type, metadata_sync_queue.item_type),
+                        series_emby_id = COALESCE(EXCLUDED.series_emby_id, metadata_sync_queue.series_emby_id),
+                        queued_at = NOW()
+                """, list(rows.values()), template="(%s, %s, %s, %s, NOW())")
+    except Exception as e:
+        logger.error(f"DB: 写入增量同步事件队列失败: {e}", exc_info=True)
+
+def get_pending_metadata_sync_events() -> List[Dict[str, Any]]:
+    """读取增量同步事件队列中的全部待处理事件。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT emby_id, event_type, item_type, series_emby_id, queued_at FROM metadata_sync_queue ORDER BY queued_at")
+            return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"DB: 读取增量同步事件队列失败: {e}", exc_info=True)
+        return []
+
+def delete_metadata_sync_events(emby_ids: List[str], queued_before) -> int:
+    """
+    删除已消费的事件。只删除 queued_before 之前入队的记录，
+    同步过程中新到的事件会留给下一次。
+    """
+    if not emby_ids:
+        return 0
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM metadata_sync_queue WHERE emby_id = ANY(%s) AND queued_at <= %s",
+                (list(emby_ids), queued_before)
+            )
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"DB: 清理增量同步事件队列失败: {e}", exc_info=True)
+        return 0
+
+def clear_metadata_sync_queue(queued_before=None) -> int:
+    """清空事件队列（全量对账完成后调用，对账已经覆盖了这些事件）。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if queued_before is None:
+                cursor.execute("DELETE FROM metadata_sync_queue")
+            else:
+                cursor.execute("DELETE FROM metadata_sync_queue WHERE queued_at <= %s", (queued_before,))
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"DB: 清空增量同步事件队列失败: {e}", exc_info=True)
+        return 0
+
+def get_media_keys_by_emby_ids(emby_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    通过 media_emby_id_map 把 Emby ID 反查为本地媒体记录。
+    返回 {emby_id: {'tmdb_id', 'item_type', 'parent_series_tmdb_id'}}。
+    """
+    if not emby_ids:
+        return {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT map.emby_id, m.tmdb_id, m.item_type, m.parent_series_tmdb_id
+                FROM media_emby_id_map map
+                JOIN media_metadata m ON m.tmdb_id = map.tmdb_id AND m.item_type = map.item_type
+                WHERE map.emby_id = ANY(%s)
+            """, (list(emby_ids),))
+            return {row['emby_id']: dict(row) for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"DB: 通过 Emby ID 反查媒体记录失败: {e}", exc_info=True)
+        return {}
+
+def get_emby_ids_for_media_keys(keys: List[tuple]) -> Dict[tuple, List[str]]:
+    """
+    批量获取 (tmdb_id, item_type) 对应的全部 Emby ID（多版本时不止一个）。
+    """
+    if not keys:
+        return {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT tmdb_id, item_type, emby_id
+                FROM media_emby_id_map
+                WHERE (tmdb_id, item_type) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+            """, ([k[0] for k in keys], [k[1] for k in keys]))
+            result: Dict[tuple, List[str]] = {}
+            for row in cursor.fetchall():
+                result.setdefault((row['tmdb_id'], row['item_type']), []).append(row['emby_id'])
+            return result
+    except Exception as e:
+        logger.error(f"DB: 批量获取媒体的 Emby ID 失败: {e}", exc_info=True)
+        return {}
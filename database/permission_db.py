@@ -0,0 +1,318 @@
+# database/permission_db.py
+import psycopg2
+from psycopg2.extras import execute_values
+import logging
+from typing import List, Dict, Any, Iterable, Optional
+
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# ======================================================================
+# 模块: 虚拟库权限位图
+# ----------------------------------------------------------------------
+# - emby_item_dense_ids:      Emby 项目ID ↔ 稠密整数ID (dense_id)
+# - user_permission_bitmaps:  每个用户可访问项目的位图 (权限快照，附带 Policy 指纹)
+# - collection_member_index:  每个合集按顺序排列的成员 dense_id 及成员位图
+# - user_collection_cache.visible_bitmap = 用户位图 AND 合集成员位图
+#
+# 位图编码：小端字节序，第 n 位位于第 n // 8 字节的第 n % 8 位，
+# 与 PostgreSQL 的 get_bit / set_bit 编号完全一致，SQL 侧可直接读写。
+# 稀疏位图里大段的零字节会被 TOAST 压缩，落盘体积远小于 JSON 列表。
+# ======================================================================
+
+# 分配 dense_id 时使用的事务级咨询锁，保证并发分配不会撞号
+_DENSE_ID_LOCK_KEY = 7301001
+
+def ids_to_bitmap(dense_ids: Iterable[int]) -> int:
+    """把一组 dense_id 转成 Python 大整数位图。"""
+    buffer = bytearray()
+    for dense_id in dense_ids:
+        byte_index = dense_id >> 3
+        if byte_index >= len(buffer):
+            buffer.extend(b'\x00' * (byte_index + 1 - len(buffer)))
+        buffer[byte_index] |= 1 << (dense_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+def bitmap_to_bytes(bitmap: int) -> bytes:
+    return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+
+def bytes_to_bitmap(data) -> int:
+    return int.from_bytes(bytes(data or b''), 'little')
+
+def bitmap_count(bitmap: int) -> int:
+    return bin(bitmap).count('1')
+
+def _sql_bit_is_set(column: str, param: str = 'dense_id') -> str:
+    """SQL 片段：column 的第 dense_id 位是否为 1 (越界视为 0)。"""
+    return (f"(CASE WHEN octet_length({column}) * 8 > %({param})s "
+            f"THEN get_bit({column}, %({param})s) = 1 ELSE FALSE END)")
+
+def _sql_with_bit(column: str, value: int, param: str = 'dense_id') -> str:
+    """SQL 片段：返回把 column 的第 dense_id 位设为 value 后的新位图，长度不足时补零。"""
+    padded = (f"(CASE WHEN octet_length(COALESCE({column}, ''::bytea)) * 8 > %({param})s "
+              f"THEN COALESCE({column}, ''::bytea) "
+              f"ELSE COALESCE({column}, ''::bytea) || decode(repeat('00', %({param})s / 8 + 1 - octet_length(COALESCE({column}, ''::bytea))), 'hex') END)")
+    return f"set_bit({padded}, %({param})s, {value})"
+
+# --- dense_id 分配 ---
+def assign_dense_ids(cursor: psycopg2.extensions.cursor, emby_ids: Iterable[str]) -> Dict[str, int]:
+    """
+    为 emby_ids 中尚无编号的项目分配 dense_id，并返回全部传入ID的映射。
+    编号取当前最大值之后的连续整数，不依赖序列，导入备份后也不会撞号。
+    需由调用方提交事务。
+    """
+    id_list = list({str(e) for e in emby_ids if e})
+    if not id_list:
+        return {}
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (_DENSE_ID_LOCK_KEY,))
+    cursor.execute("""
+        INSERT INTO emby_item_dense_ids (dense_id, emby_id)
+        SELECT base.max_id + row_number() OVER (ORDER BY new_ids.emby_id), new_ids.emby_id
+        FROM (
+            SELECT c.emby_id FROM unnest(%s::text[]) AS c(emby_id)
+            WHERE NOT EXISTS (SELECT 1 FROM emby_item_dense_ids d WHERE d.emby_id = c.emby_id)
+        ) AS new_ids
+        CROSS JOIN (SELECT COALESCE(MAX(dense_id), -1) AS max_id FROM emby_item_dense_ids) AS base
+    """, (id_list,))
+    if cursor.rowcount:
+        logger.debug(f"  ➜ 为 {cursor.rowcount} 个新 Emby 项目分配了稠密ID。")
+    cursor.execute("SELECT emby_id, dense_id FROM emby_item_dense_ids WHERE emby_id = ANY(%s)", (id_list,))
+    return {row['emby_id']: row['dense_id'] for row in cursor.fetchall()}
+
+# --- 一次刷新中复用的用户位图 ---
+class UserPermissionBitmaps:
+    """
+    一次权限刷新中所有用户的可访问位图。
+    构建一次 (O(用户数 + 项目数))，之后每个合集只需做位图 AND。
+    """
+    def __init__(self, dense_ids: Dict[str, int], user_bitmaps: Dict[str, int]):
+        self.dense_ids = dense_ids
+        self.user_bitmaps = user_bitmaps
+
+    @classmethod
+    def build(cls, user_permissions_map: Dict[str, Iterable[str]],
+              policy_fingerprints: Optional[Dict[str, str]] = None,
+              reused_bitmaps: Optional[Dict[str, int]] = None) -> 'UserPermissionBitmaps':
+        """
+        user_permissions_map: 本次重新枚举的用户 {user_id: 可访问ID集合}，会连同 Policy 指纹一起写回快照。
+        reused_bitmaps:       直接沿用快照的用户 {user_id: 位图}，不再写库。
+        """
+        all_ids = set()
+        for permission_set in user_permissions_map.values():
+            all_ids.update(permission_set)
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            dense_ids = assign_dense_ids(cursor, all_ids)
+            user_bitmaps = {
+                user_id: ids_to_bitmap(dense_ids[e] for e in permission_set if e in dense_ids)
+                for user_id, permission_set in user_permissions_map.items()
+            }
+            save_user_permission_bitmaps(cursor, user_bitmaps, policy_fingerprints)
+            conn.commit()
+
+        if reused_bitmaps:
+            user_bitmaps.update(reused_bitmaps)
+        logger.debug(f"  ➜ 已为 {len(user_bitmaps)} 个用户准备权限位图 (重新枚举 {len(user_permissions_map)} 个)。")
+        return cls(dense_ids, user_bitmaps)
+
+    def ensure_dense_ids(self, cursor: psycopg2.extensions.cursor, emby_ids: Iterable[str]):
+        missing = [e for e in emby_ids if e and e not in self.dense_ids]
+        if missing:
+            self.dense_ids.update(assign_dense_ids(cursor, missing))
+
+    def __len__(self):
+        return len(self.user_bitmaps)
+
+def save_user_permission_bitmaps(cursor: psycopg2.extensions.cursor, user_bitmaps: Dict[str, int],
+                                 policy_fingerprints: Optional[Dict[str, str]] = None):
+    if not user_bitmaps:
+        return
+    policy_fingerprints = policy_fingerprints or {}
+    rows = [
+        (user_id, psycopg2.Binary(bitmap_to_bytes(bitmap)), bitmap_count(bitmap), policy_fingerprints.get(user_id))
+        for user_id, bitmap in user_bitmaps.items()
+    ]
+    execute_values(cursor, """
+        INSERT INTO user_permission_bitmaps (user_id, permission_bitmap, item_count, policy_fingerprint, snapshot_at, last_updated_at)
+        VALUES %s
+        ON CONFLICT (user_id) DO UPDATE SET
+            permission_bitmap = EXCLUDED.permission_bitmap,
+            item_count = EXCLUDED.item_count,
+            policy_fingerprint = EXCLUDED.policy_fingerprint,
+            snapshot_at = NOW(),
+            last_updated_at = NOW()
+    """, rows, template="(%s, %s, %s, %s, NOW(), NOW())")
+
+# --- 用户权限快照 ---
+def get_permission_snapshots(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """读取用户的权限快照：{user_id: {bitmap, item_count, policy_fingerprint, snapshot_at}}。"""
+    if not user_ids:
+        return {}
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT user_id, permission_bitmap, item_count, policy_fingerprint, snapshot_at
+            FROM user_permission_bitmaps WHERE user_id = ANY(%s)
+        """, (list(user_ids),))
+        return {
+            row['user_id']: {
+                'bitmap': bytes_to_bitmap(row['permission_bitmap']),
+                'item_count': row['item_count'],
+                'policy_fingerprint': row['policy_fingerprint'],
+                'snapshot_at': row['snapshot_at'],
+            }
+            for row in cursor.fetchall()
+        }
+
+def patch_snapshots_on_item_add(cursor: psycopg2.extensions.cursor, emby_id: str, user_ids: List[str]) -> int:
+    """新项目入库：在有权限用户的快照中置位，返回更新的用户数。"""
+    if not user_ids:
+        return 0
+    dense_id = assign_dense_ids(cursor, [emby_id]).get(emby_id)
+    if dense_id is None:
+        return 0
+    cursor.execute(f"""
+        UPDATE user_permission_bitmaps
+        SET permission_bitmap = {_sql_with_bit('permission_bitmap', 1)},
+            item_count = item_count + 1,
+            last_updated_at = NOW()
+        WHERE user_id = ANY(%(user_ids)s)
+          AND NOT {_sql_bit_is_set('permission_bitmap')}
+    """, {'dense_id': dense_id, 'user_ids': list(user_ids)})
+    return cursor.rowcount
+
+def has_permission_snapshots() -> bool:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM user_permission_bitmaps) AS has_rows")
+        return bool(cursor.fetchone()['has_rows'])
+
+def add_item_to_permission_snapshots(emby_id: str, user_ids: List[str]) -> int:
+    """Webhook 入库时增量修补权限快照，避免下次刷新因数量不一致而重新枚举。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            updated = patch_snapshots_on_item_add(cursor, emby_id, user_ids)
+            conn.commit()
+        return updated
+    except Exception as e:
+        logger.error(f"  ➜ 修补用户权限快照 (项目 {emby_id}) 时发生数据库错误: {e}", exc_info=True)
+        return 0
+
+# --- 合集级写入 ---
+def write_collection_visibility(cursor: psycopg2.extensions.cursor, collection_id: int,
+                                ordered_dense_ids: List[int], user_visible_bitmaps: Dict[str, int]):
+    """写入合集成员索引以及每个用户的可见位图 (旧的 JSON 列随之清空)。"""
+    member_bitmap = ids_to_bitmap(ordered_dense_ids)
+    cursor.execute("""
+        INSERT INTO collection_member_index (collection_id, member_dense_ids, member_bitmap, last_updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (collection_id) DO UPDATE SET
+            member_dense_ids = EXCLUDED.member_dense_ids,
+            member_bitmap = EXCLUDED.member_bitmap,
+            last_updated_at = NOW()
+    """, (collection_id, ordered_dense_ids, psycopg2.Binary(bitmap_to_bytes(member_bitmap))))
+
+    if not user_visible_bitmaps:
+        return
+    rows = [
+        (user_id, collection_id, psycopg2.Binary(bitmap_to_bytes(bitmap)), bitmap_count(bitmap))
+        for user_id, bitmap in user_visible_bitmaps.items()
+    ]
+    execute_values(cursor, """
+        INSERT INTO user_collection_cache (user_id, collection_id, visible_bitmap, total_count, visible_emby_ids_json, last_updated_at)
+        VALUES %s
+        ON CONFLICT (user_id, collection_id) DO UPDATE SET
+            visible_bitmap = EXCLUDED.visible_bitmap,
+            total_count = EXCLUDED.total_count,
+            visible_emby_ids_json = NULL,
+            last_updated_at = NOW()
+    """, rows, template="(%s, %s, %s, %s, NULL, NOW())")
+
+# --- 增量维护 ---
+def add_item_to_collections(cursor: psycopg2.extensions.cursor, emby_id: str,
+                            collection_ids: List[int], user_ids: List[str]) -> int:
+    """
+    新项目入库：追加到合集成员末尾，并在有权限用户的可见位图中置位。
+    用户权限快照由 patch_snapshots_on_item_add 单独维护。
+    只处理位图格式的记录，返回更新的 user_collection_cache 行数。
+    """
+    dense_id = assign_dense_ids(cursor, [emby_id]).get(emby_id)
+    if dense_id is None:
+        return 0
+    params = {'dense_id': dense_id, 'collection_ids': list(collection_ids), 'user_ids': list(user_ids)}
+
+    cursor.execute(f"""
+        UPDATE collection_member_index
+        SET member_dense_ids = array_append(member_dense_ids, %(dense_id)s),
+            member_bitmap = {_sql_with_bit('member_bitmap', 1)},
+            last_updated_at = NOW()
+        WHERE collection_id = ANY(%(collection_ids)s)
+          AND NOT {_sql_bit_is_set('member_bitmap')}
+    """, params)
+
+    cursor.execute(f"""
+        UPDATE user_collection_cache
+        SET visible_bitmap = {_sql_with_bit('visible_bitmap', 1)},
+            total_count = total_count + 1,
+            last_updated_at = NOW()
+        WHERE user_id = ANY(%(user_ids)s)
+          AND collection_id = ANY(%(collection_ids)s)
+          AND visible_bitmap IS NOT NULL
+          AND NOT {_sql_bit_is_set('visible_bitmap')}
+    """, params)
+    return cursor.rowcount
+
+def remove_item_everywhere(cursor: psycopg2.extensions.cursor, emby_id: str) -> int:
+    """项目被删除：从所有位图与合集成员索引中清除，返回更新的 user_collection_cache 行数。"""
+    cursor.execute("SELECT dense_id FROM emby_item_dense_ids WHERE emby_id = %s", (emby_id,))
+    row = cursor.fetchone()
+    if not row:
+        return 0
+    params = {'dense_id': row['dense_id']}
+
+    cursor.execute(f"""
+        UPDATE collection_member_index
+        SET member_dense_ids = array_remove(member_dense_ids, %(dense_id)s),
+            member_bitmap = set_bit(member_bitmap, %(dense_id)s, 0),
+            last_updated_at = NOW()
+        WHERE {_sql_bit_is_set('member_bitmap')}
+    """, params)
+
+    cursor.execute(f"""
+        UPDATE user_permission_bitmaps
+        SET permission_bitmap = set_bit(permission_bitmap, %(dense_id)s, 0),
+            item_count = item_count - 1,
+            last_updated_at = NOW()
+        WHERE {_sql_bit_is_set('permission_bitmap')}
+    """, params)
+
+    cursor.execute(f"""
+        UPDATE user_collection_cache
+        SET visible_bitmap = set_bit(visible_bitmap, %(dense_id)s, 0),
+            total_count = total_count - 1,
+            last_updated_at = NOW()
+        WHERE visible_bitmap IS NOT NULL
+          AND {_sql_bit_is_set('visible_bitmap')}
+    """, params)
+    return cursor.rowcount
+
+# --- 读取 ---
+# 位图格式的记录按合集成员顺序展开为 Emby ID 列表；尚未迁移的旧记录直接返回 JSON 列表。
+VISIBLE_IDS_SELECT_SQL = """
+    SELECT ucc.collection_id,
+           CASE WHEN ucc.visible_bitmap IS NULL THEN COALESCE(ucc.visible_emby_ids_json, '[]'::jsonb)
+           ELSE (
+               SELECT COALESCE(jsonb_agg(d.emby_id ORDER BY m.ord), '[]'::jsonb)
+               FROM collection_member_index cmi
+               CROSS JOIN LATERAL unnest(cmi.member_dense_ids) WITH ORDINALITY AS m(dense_id, ord)
+               JOIN emby_item_dense_ids d ON d.dense_id = m.dense_id
+               WHERE cmi.collection_id = ucc.collection_id
+                 AND CASE WHEN octet_length(ucc.visible_bitmap) * 8 > m.dense_id
+                          THEN get_bit(ucc.visible_bitmap, m.dense_id) = 1 ELSE FALSE END
+           ) END AS visible_emby_ids
+    FROM user_collection_cache ucc
+    WHERE ucc.user_id = %s AND ucc.collection_id = ANY(%s)
+"""
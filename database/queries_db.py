@@ -1,56 +1,247 @@
 # database/queries_db.py
 
 import logging
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple, Union
+
+from cachetools import LRUCache
+
+import config_manager
+import constants
 from .connection import get_db_connection
+from . import permission_db
 
 logger = logging.getLogger(__name__)
 
-def get_sorted_and_paginated_ids(all_emby_ids, sort_by, sort_order, limit, offset):
+# ======================================================================
+# 模块: 虚拟库可见ID的进程内缓存
+# ======================================================================
+# 反代在翻页、首页"最新"、切换排序时都需要用户在某个合集里的可见 Emby ID 列表。
+# 这里以 (user_id, collection_id) 为键缓存 user_collection_cache 的结果，
+# 纯数字 ID 压缩为 array('q') 存储 (每个 8 字节)，按字节预算做 LRU 淘汰。
+# 任何改写 user_collection_cache 的地方都必须调用 invalidate_visible_ids_cache()。
+
+CompactIds = Union[array, Tuple[str, ...]]
+
+_visible_ids_cache: Optional[LRUCache] = None
+_visible_ids_cache_lock = threading.Lock()
+# 失效计数器：查询期间如果发生了失效，就不把这次的结果写回缓存，避免写入过期数据
+_visible_ids_generation = 0
+
+def _compact_ids(emby_ids: List[str]) -> CompactIds:
+    """尽量把 ID 列表压缩为 int64 数组；只要有一个 ID 不是规范的十进制整数，就退回为 str 元组。"""
+    try:
+        packed = array('q', (int(x) for x in emby_ids))
+    except (TypeError, ValueError, OverflowError):
+        return tuple(emby_ids)
+    # 防止 "007" 这类 ID 在还原时丢失前导零
+    if any(str(v) != x for v, x in zip(packed, emby_ids)):
+        return tuple(emby_ids)
+    return packed
+
+def _expand_ids(compact: CompactIds) -> List[str]:
+    if isinstance(compact, array):
+        return [str(v) for v in compact]
+    return list(compact)
+
+def _sizeof_compact(compact: CompactIds) -> int:
+    if isinstance(compact, array):
+        return 64 + compact.itemsize * len(compact)
+    return 64 + sum(49 + len(x) for x in compact)
+
+def _get_visible_ids_cache() -> LRUCache:
+    global _visible_ids_cache
+    if _visible_ids_cache is None:
+        budget_mb = config_manager.APP_CONFIG.get(
+            constants.CONFIG_OPTION_PROXY_VISIBLE_IDS_CACHE_MB, constants.DEFAULT_PROXY_VISIBLE_IDS_CACHE_MB
+        )
+        _visible_ids_cache = LRUCache(maxsize=max(1, int(budget_mb)) * 1024 * 1024, getsizeof=_sizeof_compact)
+    return _visible_ids_cache
+
+def invalidate_visible_ids_cache(collection_ids: Optional[List[int]] = None, user_ids: Optional[List[str]] = None):
+    """
+    使可见ID缓存失效。
+    - 都不传: 清空全部。
+    - 只传 collection_ids / user_ids: 清除相关的所有条目。
+    - 都传: 只清除两者交叉的条目。
+    """
+    global _visible_ids_generation
+    collection_set = {int(c) for c in collection_ids} if collection_ids is not None else None
+    user_set = set(user_ids) if user_ids is not None else None
+    with _visible_ids_cache_lock:
+        _visible_ids_generation += 1
+        cache = _visible_ids_cache
+        if cache is None:
+            return
+        if collection_set is None and user_set is None:
+            cache.clear()
+            return
+        for key in list(cache.keys()):
+            user_id, collection_id = key
+            if collection_set is not None and collection_id not in collection_set:
+                continue
+            if user_set is not None and user_id not in user_set:
+                continue
+            cache.pop(key, None)
+
+def get_visible_emby_ids_for_collections(user_id: str, collection_ids: List[int]) -> Dict[int, List[str]]:
     """
-    在本地 media_metadata 表中执行排序和分页，只返回一页的 emby_id。
-    V5.7 版：适配 emby_item_ids_json 字段，能够查询 JSON 数组内的 ID。
+    批量获取用户在多个合集中的可见 Emby ID 列表 (保持合集内的原始顺序)。
+    命中缓存的直接返回，未命中的合集用一次查询补齐并回填缓存。
+    没有缓存行的合集返回空列表。
+    """
+    results: Dict[int, List[str]] = {}
+    missing: List[int] = []
+    with _visible_ids_cache_lock:
+        cache = _get_visible_ids_cache()
+        generation = _visible_ids_generation
+        for collection_id in collection_ids:
+            compact = cache.get((user_id, int(collection_id)))
+            if compact is None:
+                missing.append(int(collection_id))
+            else:
+                results[int(collection_id)] = compact
+
+    if missing:
+        fetched: Dict[int, CompactIds] = {c: () for c in missing}
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(permission_db.VISIBLE_IDS_SELECT_SQL, (user_id, missing))
+                for row in cursor.fetchall():
+                    fetched[row['collection_id']] = _compact_ids(row['visible_emby_ids'] or [])
+
+        with _visible_ids_cache_lock:
+            cache = _get_visible_ids_cache()
+            if generation == _visible_ids_generation:
+                for collection_id, compact in fetched.items():
+                    try:
+                        cache[(user_id, collection_id)] = compact
+                    except ValueError:
+                        # 单个条目超过整个预算，不缓存
+                        pass
+        results.update(fetched)
+
+    return {collection_id: _expand_ids(compact) for collection_id, compact in results.items()}
+
+def get_visible_emby_ids(user_id: str, collection_id: int) -> List[str]:
+    """获取用户在单个合集中的可见 Emby ID 列表 (带进程内缓存)。"""
+    return get_visible_emby_ids_for_collections(user_id, [collection_id]).get(int(collection_id), [])
+
+def get_visible_ids_cache_stats() -> Dict[str, int]:
+    with _visible_ids_cache_lock:
+        cache = _visible_ids_cache
+        if cache is None:
+            return {'entries': 0, 'bytes': 0, 'budget_bytes': 0}
+        return {'entries': len(cache), 'bytes': int(cache.currsize), 'budget_bytes': int(cache.maxsize)}
+
+# ======================================================================
+# 模块: 虚拟库本地排序分页引擎
+# ======================================================================
+# Emby 客户端发送的 SortBy 键 -> (SQL 排序表达式, 是否需要 user_media_data)
+# 表别名: m = media_metadata, u = 当前用户的 user_media_data, emby_id = 候选 Emby ID
+# 剧集取其在库分集的最新入库时间，其余类型取自身的入库时间
+_LAST_CONTENT_ADDED_SQL = (
+    "CASE WHEN m.item_type = 'Series' THEN COALESCE(("
+    "SELECT MAX(e.date_added) FROM media_metadata e "
+    "WHERE e.parent_series_tmdb_id = m.tmdb_id AND e.item_type = 'Episode' AND e.in_library = TRUE"
+    "), m.date_added) ELSE m.date_added END"
+)
+
+SORT_EXPRESSIONS: Dict[str, Tuple[str, bool]] = {
+    'SortName': ("m.title", False),
+    'Name': ("m.title", False),
+    'OriginalTitle': ("m.original_title", False),
+    'PremiereDate': ("m.release_date", False),
+    'StartDate': ("m.release_date", False),
+    'ProductionYear': ("m.release_year", False),
+    'DateCreated': ("m.date_added", False),
+    'DateLastContentAdded': (_LAST_CONTENT_ADDED_SQL, False),
+    'CommunityRating': ("m.rating", False),
+    'CriticRating': ("m.rating", False),
+    'OfficialRating': ("m.official_rating", False),
+    'Runtime': ("m.runtime_minutes", False),
+    'PlayCount': ("COALESCE(u.play_count, 0)", True),
+    'DatePlayed': ("u.last_played_date", True),
+    'IsFavoriteOrLiked': ("COALESCE(u.is_favorite, FALSE)", True),
+    'IsPlayed': ("COALESCE(u.played, FALSE)", True),
+    'IsUnplayed': ("NOT COALESCE(u.played, FALSE)", True),
+    'Random': ("random()", False),
+}
+
+def _build_order_by(sort_by: str, sort_order: str) -> Tuple[str, bool]:
+    """
+    把 Emby 的 SortBy/SortOrder 翻译成 ORDER BY 子句。
+    - SortOrder 也可以逗号分隔，与 SortBy 一一对应；不足时沿用第一个方向。
+    - 不认识的键直接忽略；一个都不认识时按 SortName 升序。
+    - 末尾固定追加 title、emby_id，保证分页时顺序稳定。
+    """
+    keys = [k.strip() for k in (sort_by or '').split(',') if k.strip()]
+    orders = [o.strip().lower() for o in (sort_order or '').split(',') if o.strip()] or ['ascending']
+
+    clauses = []
+    needs_user_data = False
+    for index, key in enumerate(keys):
+        if key not in SORT_EXPRESSIONS:
+            logger.trace(f"  ➜ 本地排序引擎不支持排序字段 '{key}'，已忽略。")
+            continue
+        expression, uses_user_data = SORT_EXPRESSIONS[key]
+        needs_user_data = needs_user_data or uses_user_data
+        direction = orders[index] if index < len(orders) else orders[0]
+        if direction == 'descending':
+            clauses.append(f"{expression} DESC NULLS LAST")
+        else:
+            clauses.append(f"{expression} ASC NULLS FIRST")
+
+    if not clauses:
+        clauses.append("m.title ASC NULLS FIRST")
+    clauses.append("m.title ASC")
+    clauses.append("emby_id ASC")
+    return ", ".join(clauses), needs_user_data
+
+def get_sorted_and_paginated_ids(all_emby_ids, sort_by, sort_order, limit, offset, user_id: Optional[str] = None):
+    """
+    在本地 media_metadata (以及 user_media_data) 上执行排序和分页，只返回一页的 emby_id。
+    - 支持 SORT_EXPRESSIONS 中列出的全部 Emby 排序键，支持多键排序。
+    - PlayCount/DatePlayed/IsFavoriteOrLiked 等用户数据排序需要传入 user_id。
     """
     if not all_emby_ids:
         return []
 
-    sort_column_map = {
-        'PremiereDate': 'release_date',
-        'DateCreated': 'date_added',
-        'CommunityRating': 'rating',
-        'ProductionYear': 'release_year',
-        'SortName': 'title'
-    }
+    order_by_sql, needs_user_data = _build_order_by(sort_by, sort_order)
+    if needs_user_data and not user_id:
+        logger.warning(f"  ➜ 排序字段 '{sort_by}' 需要用户数据，但未提供 user_id，用户数据将视为空。")
 
-    if sort_by not in sort_column_map:
-        logger.trace(f"  ➜ 不支持的本地排序字段: '{sort_by}'，将返回原始顺序分页。")
-        return all_emby_ids[offset : offset + limit]
+    # 候选 ID 作为单个 text[] 参数展开成临时关系，再通过 media_emby_id_map 的主键连接到 media_metadata，
+    # 避免对整张 media_metadata 做 jsonb 展开，也避免每页都生成一个巨大的 IN (...) 语句。
+    params: list = [list(all_emby_ids)]
+    user_data_join = ""
+    if needs_user_data:
+        user_data_join = "LEFT JOIN user_media_data u ON u.user_id = %s AND u.item_id = emby_id"
+        params.append(user_id)
 
-    sort_column = sort_column_map[sort_by]
-    order_direction = 'DESC' if sort_order.lower() == 'descending' else 'ASC'
-    nulls_order = 'NULLS LAST' if order_direction == 'DESC' else 'NULLS FIRST'
-    
-    # ★★★ 核心修正：重写 SQL 查询以处理 JSONB 数组 ★★★
     query = f"""
         SELECT emby_id
         FROM 
-            media_metadata, 
-            jsonb_array_elements_text(emby_item_ids_json) as emby_id
+            unnest(%s::text[]) AS c(emby_id)
+            JOIN media_emby_id_map map USING (emby_id)
+            JOIN media_metadata m ON m.tmdb_id = map.tmdb_id AND m.item_type = map.item_type
+            {user_data_join}
         WHERE 
-            emby_id IN %s AND in_library = TRUE
-        ORDER BY 
-            {sort_column} {order_direction} {nulls_order}, title ASC
+            m.in_library = TRUE
+        ORDER BY {order_by_sql}
         LIMIT %s OFFSET %s;
     """
+    params.extend([limit, offset])
     
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, (tuple(all_emby_ids), limit, offset))
+                cursor.execute(query, tuple(params))
                 results = cursor.fetchall()
-                # ★★★ 核心修正：返回的列名现在是 emby_id ★★★
                 return [row['emby_id'] for row in results]
     except Exception as e:
         logger.error(f"在本地数据库排序分页时出错: {e}", exc_info=True)
         # 增加一个回退机制，避免在数据库查询失败时前端完全卡死
         logger.warning("数据库排序失败，将回退到内存分页。")
-        return all_emby_ids[offset : offset + limit]
\ No newline at end of file
+        return all_emby_ids[offset : offset + limit]
@@ -7,6 +7,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timezone
 
 from .connection import get_db_connection
+from .media_db import library_path_patterns
 
 logger = logging.getLogger(__name__)
 
@@ -135,11 +136,12 @@ def update_resubscribe_rules_order(ordered_ids: List[int]) -> bool:
 def upsert_resubscribe_index_batch(items_data: List[Dict[str, Any]]):
     if not items_data: return
     sql = """
-        INSERT INTO resubscribe_index (tmdb_id, item_type, season_number, status, reason, matched_rule_id, last_checked_at)
-        VALUES (%(tmdb_id)s, %(item_type)s, %(season_number)s, %(status)s, %(reason)s, %(matched_rule_id)s, NOW())
+        INSERT INTO resubscribe_index (tmdb_id, item_type, season_number, status, reason, matched_rule_id, source_fingerprint, last_checked_at)
+        VALUES (%(tmdb_id)s, %(item_type)s, %(season_number)s, %(status)s, %(reason)s, %(matched_rule_id)s, %(source_fingerprint)s, NOW())
         ON CONFLICT (tmdb_id, item_type, season_number) DO UPDATE SET
             status = EXCLUDED.status, reason = EXCLUDED.reason,
-            matched_rule_id = EXCLUDED.matched_rule_id, last_checked_at = NOW();
+            matched_rule_id = EXCLUDED.matched_rule_id, source_fingerprint = EXCLUDED.source_fingerprint,
+            last_checked_at = NOW();
     """
     try:
         with get_db_connection() as conn:
@@ -151,6 +153,77 @@ def upsert_resubscribe_index_batch(items_data: List[Dict[str, Any]]):
         logger.error(f"  ➜ 批量更新洗版索引失败: {e}", exc_info=True)
         raise
 
+def get_resubscribe_candidates(rule_fingerprint: str,
+                               library_paths: Optional[List[str]] = None,
+                               emby_ids: Optional[List[str]] = None,
+                               force_full: bool = False) -> List[Dict[str, Any]]:
+    """
+    列出一条规则范围内的全部洗版判定单元 (每部电影一行、每一季一行)，附带当前指纹。
+    - 季以集号最小的在库分集为代表资产，语言豁免字段取自电影/剧集本身。
+    - fingerprint = md5(规则指纹 + 代表资产 + 原始语言 + 原始标题)。
+    - 只有指纹与索引中记录的不一致 (或 force_full) 时才返回 asset，其余行 asset 为 NULL，
+      调用方据此只重新判定发生变化的项目。
+    范围按 library_paths 的文件路径前缀 (优先) 或 emby_ids 经 media_emby_id_map 过滤。
+    """
+    scope_clause = ""
+    params: Dict[str, Any] = {'rule_fp': rule_fingerprint, 'force_full': force_full}
+    if library_paths is not None:
+        scope_clause += """
+            AND EXISTS (
+                SELECT 1 FROM jsonb_array_elements(t.asset_details_json) AS asset
+                WHERE asset->>'path' LIKE ANY(%(path_patterns)s)
+            )
+        """
+        params['path_patterns'] = library_path_patterns(library_paths)
+    if emby_ids is not None:
+        scope_clause += """
+            AND (t.tmdb_id, t.item_type) IN (
+                SELECT m.tmdb_id, m.item_type FROM media_emby_id_map m WHERE m.emby_id = ANY(%(emby_ids)s)
+            )
+        """
+        params['emby_ids'] = list(emby_ids)
+
+    base_clause = """
+        t.in_library = TRUE
+        AND jsonb_typeof(t.asset_details_json) = 'array'
+        AND jsonb_array_length(t.asset_details_json) > 0
+    """
+    sql = f"""
+        WITH reps AS (
+            SELECT t.tmdb_id, 'Movie' AS item_type, -1 AS season_number,
+                   'Movie' AS owner_type, t.asset_details_json->0 AS asset
+            FROM media_metadata AS t
+            WHERE t.item_type = 'Movie' AND {base_clause} {scope_clause}
+            UNION ALL
+            SELECT * FROM (
+                SELECT DISTINCT ON (t.parent_series_tmdb_id, t.season_number)
+                       t.parent_series_tmdb_id, 'Season', t.season_number,
+                       'Series', t.asset_details_json->0
+                FROM media_metadata AS t
+                WHERE t.item_type = 'Episode' AND t.parent_series_tmdb_id IS NOT NULL
+                  AND t.season_number IS NOT NULL AND {base_clause} {scope_clause}
+                ORDER BY t.parent_series_tmdb_id, t.season_number, t.episode_number NULLS LAST
+            ) AS seasons
+        ), fingerprinted AS (
+            SELECT r.tmdb_id, r.item_type, r.season_number, r.asset,
+                   p.title, p.original_language, p.original_title,
+                   md5(concat_ws('|', %(rule_fp)s, r.asset::text, p.original_language, p.original_title)) AS fingerprint
+            FROM reps AS r
+            JOIN media_metadata AS p ON p.tmdb_id = r.tmdb_id AND p.item_type = r.owner_type
+        )
+        SELECT f.tmdb_id, f.item_type, f.season_number, f.fingerprint,
+               f.title, f.original_language, f.original_title, idx.status,
+               CASE WHEN %(force_full)s OR idx.source_fingerprint IS DISTINCT FROM f.fingerprint
+                    THEN f.asset END AS asset
+        FROM fingerprinted AS f
+        LEFT JOIN resubscribe_index AS idx
+               ON idx.tmdb_id = f.tmdb_id AND idx.item_type = f.item_type AND idx.season_number = f.season_number
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
+
 def get_resubscribe_library_status(where_clause: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
     """【V11 - 拨乱反正最终版】废除所有复杂JOIN，回归简单、高效、正确的查询逻辑。"""
     try:
@@ -278,14 +351,14 @@ def get_resubscribe_cache_item(item_id: str) -> Optional[Dict[str, Any]]:
     return results[0] if results else None
 
 def update_resubscribe_item_status(item_id: str, new_status: str) -> bool:
-    """根据前端 item_id 更新单个项目的状态。"""
+    """根据前端 item_id 更新单个项目的状态。同时清空指纹，让下一次增量刷新重新判定该项目。"""
     key_tuple = _parse_item_id(item_id)
     if not key_tuple: return False
     
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            sql = "UPDATE resubscribe_index SET status = %s WHERE tmdb_id = %s AND item_type = %s AND season_number = %s"
+            sql = "UPDATE resubscribe_index SET status = %s, source_fingerprint = NULL WHERE tmdb_id = %s AND item_type = %s AND season_number = %s"
             cursor.execute(sql, (new_status, key_tuple[0], key_tuple[1], key_tuple[2]))
             return cursor.rowcount > 0
     except Exception as e:
@@ -305,7 +378,7 @@ def delete_resubscribe_index_by_rule_id(rule_id: int) -> int:
         raise
 
 def batch_update_resubscribe_index_status(item_keys: List[Tuple[str, str, int]], new_status: str) -> int:
-    """根据复合主键列表，批量更新索引状态。"""
+    """根据复合主键列表，批量更新索引状态。同时清空指纹，例如取消忽略后下一次增量刷新会重新判定。"""
     if not item_keys or not new_status: return 0
     
     # 准备数据，确保 season_number 是整数
@@ -315,7 +388,7 @@ def batch_update_resubscribe_index_status(item_keys: List[Tuple[str, str, int]],
         with get_db_connection() as conn:
             cursor = conn.cursor()
             sql = """
-                UPDATE resubscribe_index t SET status = data.new_status
+                UPDATE resubscribe_index t SET status = data.new_status, source_fingerprint = NULL
                 FROM (VALUES %s) AS data(new_status, tmdb_id, item_type, season_number)
                 WHERE t.tmdb_id = data.tmdb_id 
                   AND t.item_type = data.item_type
@@ -329,13 +402,18 @@ def batch_update_resubscribe_index_status(item_keys: List[Tuple[str, str, int]],
         logger.error(f"  ➜ 批量更新洗版索引状态时失败: {e}", exc_info=True)
         return 0
     
-def get_all_resubscribe_index_keys() -> set:
-    sql = "SELECT tmdb_id, item_type, season_number FROM resubscribe_index;"
+def get_all_resubscribe_index_keys(exclude_rule_ids: Optional[List[int]] = None) -> set:
+    """所有索引键；exclude_rule_ids 中规则匹配的行不返回 (例如本次范围拉取不完整的规则)。"""
+    sql = "SELECT tmdb_id, item_type, season_number FROM resubscribe_index"
+    params = ()
+    if exclude_rule_ids:
+        sql += " WHERE matched_rule_id IS NULL OR NOT (matched_rule_id = ANY(%s))"
+        params = (list(exclude_rule_ids),)
     keys = set()
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             for row in cursor.fetchall():
                 if row['item_type'] == 'Movie':
                     keys.add(row['tmdb_id'])
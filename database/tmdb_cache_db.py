@@ -0,0 +1,93 @@
+# database/tmdb_cache_db.py
+import psycopg2
+import logging
+import json
+from typing import Optional, Any, Dict
+
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# ======================================================================
+# 模块: TMDb 响应缓存数据访问
+# ======================================================================
+# 缓存层出错时只记日志并当作未命中处理，绝不能影响正常的 TMDb 请求。
+
+def get_cached_response(cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    读取一条缓存。返回 {'response_json', 'etag', 'is_fresh'}，不存在时返回 None。
+    过期的条目也会返回，由调用方决定是否做条件请求或在网络失败时兜底。
+    """
+    sql = """
+        SELECT response_json, etag, expires_at > NOW() AS is_fresh
+        FROM tmdb_api_cache WHERE cache_key = %s
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (cache_key,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    except psycopg2.Error as e:
+        logger.warning(f"  ➜ 读取 TMDb 缓存失败，将直接请求网络: {e}")
+        return None
+
+def save_cached_response(cache_key: str, endpoint: str, response: Any, etag: Optional[str], ttl_seconds: int):
+    """写入或覆盖一条缓存。"""
+    sql = """
+        INSERT INTO tmdb_api_cache (cache_key, endpoint, response_json, etag, fetched_at, expires_at)
+        VALUES (%s, %s, %s, %s, NOW(), NOW() + make_interval(secs => %s))
+        ON CONFLICT (cache_key) DO UPDATE SET
+            endpoint = EXCLUDED.endpoint,
+            response_json = EXCLUDED.response_json,
+            etag = EXCLUDED.etag,
+            fetched_at = EXCLUDED.fetched_at,
+            expires_at = EXCLUDED.expires_at
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (cache_key, endpoint, json.dumps(response, ensure_ascii=False), etag, int(ttl_seconds)))
+    except psycopg2.Error as e:
+        logger.warning(f"  ➜ 写入 TMDb 缓存失败 ({endpoint}): {e}")
+
+def touch_cached_response(cache_key: str, ttl_seconds: int):
+    """条件请求返回 304 时调用：内容未变，只顺延过期时间。"""
+    sql = """
+        UPDATE tmdb_api_cache
+        SET fetched_at = NOW(), expires_at = NOW() + make_interval(secs => %s)
+        WHERE cache_key = %s
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (int(ttl_seconds), cache_key))
+    except psycopg2.Error as e:
+        logger.warning(f"  ➜ 顺延 TMDb 缓存有效期失败: {e}")
+
+def purge_expired_responses(grace_days: int) -> int:
+    """删除过期超过 grace_days 天的缓存，返回删除的行数。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM tmdb_api_cache WHERE expires_at < NOW() - make_interval(days => %s)",
+                (int(grace_days),)
+            )
+            return cursor.rowcount
+    except psycopg2.Error as e:
+        logger.warning(f"  ➜ 清理过期的 TMDb 缓存失败: {e}")
+        return 0
+
+def get_cache_summary() -> Dict[str, int]:
+    """缓存表的条目数与其中仍在有效期内的条目数。"""
+    sql = "SELECT COUNT(*) AS entries, COUNT(*) FILTER (WHERE expires_at > NOW()) AS fresh_entries FROM tmdb_api_cache"
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            row = cursor.fetchone()
+            return {'entries': int(row['entries']), 'fresh_entries': int(row['fresh_entries'])}
+    except psycopg2.Error as e:
+        logger.warning(f"  ➜ 统计 TMDb 缓存条目失败: {e}")
+        return {'entries': 0, 'fresh_entries': 0}
@@ -2,9 +2,10 @@
 
 from flask import session, jsonify
 from functools import wraps
-from typing import Optional
+from typing import Optional, List
 import threading
 import time
+from cachetools import TTLCache
 
 # ======================================================================
 # 共享装饰器
@@ -142,4 +143,23 @@ if TYPE_CHECKING:
 SYSTEM_UPDATE_MARKERS = {}
 SYSTEM_UPDATE_LOCK = threading.Lock()
 # 抑制窗口期（秒），在这个时间内收到的相同用户的 policyupdated Webhook 将被忽略
-RECURSION_SUPPRESSION_WINDOW = 10
\ No newline at end of file
+RECURSION_SUPPRESSION_WINDOW = 10
+
+# ======================================================================
+# --- 反代主页视图 (Views) 缓存 ---
+# 每个用户预渲染好的 /Views 响应体，短 TTL 兜底 Emby 端库变化，
+# 合集增删改、用户权限变化、反代配置变化时显式失效。
+# 结构: {'user_id': '序列化后的 JSON 字符串'}
+# ======================================================================
+VIEWS_CACHE_TTL_SECONDS = 60
+VIEWS_CACHE = TTLCache(maxsize=2048, ttl=VIEWS_CACHE_TTL_SECONDS)
+VIEWS_CACHE_LOCK = threading.Lock()
+
+def invalidate_views_cache(user_ids: Optional[List[str]] = None):
+    """使主页视图缓存失效；不传 user_ids 时清空所有用户。"""
+    with VIEWS_CACHE_LOCK:
+        if user_ids is None:
+            VIEWS_CACHE.clear()
+        else:
+            for user_id in user_ids:
+                VIEWS_CACHE.pop(user_id, None)
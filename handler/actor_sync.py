@@ -58,6 +58,7 @@ class UnifiedSyncHandler:
                         if stop_event and stop_event.is_set(): 
                             raise InterruptedError("任务在处理批次时被中止")
                         
+                        persons_for_db = []
                         for person_emby in person_batch:
                             stats["total_from_emby"] += 1
                             emby_pid = str(person_emby.get("Id", "")).strip()
@@ -70,24 +71,22 @@ class UnifiedSyncHandler:
                             emby_server_ids.add(emby_pid) # 记录从 Emby 扫描到的 ID
                             
                             provider_ids = person_emby.get("ProviderIds", {})
-                            person_data_for_db = { 
+                            persons_for_db.append({ 
                                 "emby_id": emby_pid, 
                                 "name": person_name, 
                                 "tmdb_id": provider_ids.get("Tmdb"), 
                                 "imdb_id": provider_ids.get("Imdb"), 
                                 "douban_id": provider_ids.get("Douban"), 
-                            }
-                            
-                            try:
-                                # 使用你之前修复过的、能准确返回状态的 upsert_person 函数
-                                _, status = self.actor_db_manager.upsert_person(cursor, person_data_for_db, emby_config=emby_config_for_upsert)
-                                if status == "INSERTED": stats['db_inserted'] += 1
-                                elif status == "UPDATED": stats['db_updated'] += 1
-                                elif status == "UNCHANGED": stats['unchanged'] += 1
-                                elif status == "SKIPPED": stats['skipped'] += 1
-                            except Exception as e_upsert:
-                                stats['errors'] += 1
-                                logger.error(f"处理演员 {person_name} (ID: {emby_pid}) 的 upsert 时失败: {e_upsert}")
+                            })
+
+                        # 整批合并写入，每行仍返回准确的 INSERTED/UPDATED/UNCHANGED 状态
+                        results = self.actor_db_manager.bulk_upsert_persons(cursor, persons_for_db, emby_config=emby_config_for_upsert)
+                        for _, status in results:
+                            if status == "INSERTED": stats['db_inserted'] += 1
+                            elif status == "UPDATED": stats['db_updated'] += 1
+                            elif status == "UNCHANGED": stats['unchanged'] += 1
+                            elif status == "SKIPPED": stats['skipped'] += 1
+                            else: stats['errors'] += 1
 
                     # --- 阶段三：计算差异并清理本地数据库中过时的 Emby ID 关联 ---
                     ids_to_clean = local_emby_ids - emby_server_ids
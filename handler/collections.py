@@ -10,6 +10,7 @@ from database import collection_db, media_db, request_db
 import handler.emby as emby
 import handler.tmdb as tmdb
 import config_manager
+import constants
 
 logger = logging.getLogger(__name__)
 
@@ -64,7 +65,7 @@ def sync_and_subscribe_native_collections():
         details = tmdb.get_collection_details(tmdb_coll_id, tmdb_api_key)
         return collection.get('emby_collection_id'), details
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=constants.TMDB_MAX_WORKERS) as executor:
         future_to_coll = {executor.submit(fetch_tmdb_details, c): c for c in emby_collections}
         for future in concurrent.futures.as_completed(future_to_coll):
             emby_id, details = future.result()
@@ -178,9 +179,9 @@ def assemble_all_collection_details() -> List[Dict[str, Any]]:
     all_movie_tmdb_ids: Set[str] = set()
     tmdb_api_key = config_manager.APP_CONFIG.get("tmdb_api_key")
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=constants.TMDB_MAX_WORKERS) as executor:
         future_to_coll = {
-            executor.submit(tmdb.get_collection_details, coll.get('tmdb_collection_id'), tmdb_api_key): coll
+            executor.submit(tmdb.bind_priority(tmdb.get_collection_details), coll.get('tmdb_collection_id'), tmdb_api_key): coll
             for coll in all_collections_from_db if coll.get('tmdb_collection_id')
         }
         for future in concurrent.futures.as_completed(future_to_coll):
@@ -6,7 +6,7 @@ import re
 import os
 import sys
 import gevent
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import json
 from datetime import datetime, timedelta, date
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -677,147 +677,301 @@ class FilterEngine:
             logger.debug(f"  ➜ 缓存了 {len(self.airing_series_ids)} 个“连载中”剧集ID。")
         return self.airing_series_ids
 
-    def _item_matches_rules(self, item_metadata: Dict[str, Any], rules: List[Dict[str, Any]], logic: str) -> bool:
-        if not rules: return True
-        
-        results = []
-        for rule in rules:
-            field, op, value = rule.get("field"), rule.get("operator"), rule.get("value")
-            match = False
-            
-            # 1. 处理列表字段
-            if field in ['actors', 'directors', 'genres', 'countries', 'studios', 'tags', 'keywords']:
-                item_value_list = item_metadata.get(f"{field}_json")
-                if not item_value_list or not isinstance(item_value_list, list):
-                    results.append(False)
-                    continue
-
-                values_to_check = item_value_list
-                if op == 'is_primary':
-                    if field == 'actors':
-                        values_to_check = item_value_list[:3] #演员只取前3
-                    else:
-                        values_to_check = item_value_list[:1]
-                
-                try:
-                    if field in ['actors', 'directors']:
-                        if not isinstance(value, list):
-                            results.append(False); continue
-                        
-                        rule_person_ids = set(str(p['id']) for p in value if isinstance(p, dict) and 'id' in p)
-                        if not rule_person_ids:
-                            results.append(False); continue
+    # --- 规则编译 ---
+    # 每条规则在一次执行中只解析一次，预先算好集合、小写字符串和日期边界，
+    # 产出的闭包对每一行元数据只做最少的比较。语义与逐行解释规则的旧实现保持一致。
+    _LIST_FIELDS = ('actors', 'directors', 'genres', 'countries', 'studios', 'tags', 'keywords')
+
+    @staticmethod
+    def _never(item_metadata: Dict[str, Any]) -> bool:
+        return False
+
+    @staticmethod
+    def _to_date(item_date_val) -> Optional[date]:
+        if isinstance(item_date_val, datetime):
+            return item_date_val.date()
+        if isinstance(item_date_val, date):
+            return item_date_val
+        return datetime.strptime(str(item_date_val), '%Y-%m-%d').date()
+
+    def _compile_rule(self, rule: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+        field, op, value = rule.get("field"), rule.get("operator"), rule.get("value")
+
+        # 1. 列表字段
+        if field in self._LIST_FIELDS:
+            column = f"{field}_json"
+            if op == 'is_primary':
+                head = 3 if field == 'actors' else 1
+            else:
+                head = None
 
-                        item_person_ids = set()
+            def _values(item_metadata):
+                item_value_list = item_metadata.get(column)
+                if not item_value_list or not isinstance(item_value_list, list):
+                    return None
+                return item_value_list[:head] if head else item_value_list
+
+            if field in ('actors', 'directors'):
+                if not isinstance(value, list):
+                    return self._never
+                rule_person_ids = frozenset(str(p['id']) for p in value if isinstance(p, dict) and 'id' in p)
+                if not rule_person_ids or op not in ('is_one_of', 'contains', 'is_primary', 'is_none_of'):
+                    return self._never
+                want_overlap = op != 'is_none_of'
+
+                def _match_person(item_metadata):
+                    values_to_check = _values(item_metadata)
+                    if values_to_check is None:
+                        return False
+                    try:
+                        overlap = False
                         for p in values_to_check:
-                            person_id = p.get('tmdb_id') or p.get('id') # <-- 修正点！
-                            if person_id is not None:
-                                item_person_ids.add(str(person_id))
-                        
-                        if op in ['is_one_of', 'contains', 'is_primary']:
-                            if not rule_person_ids.isdisjoint(item_person_ids):
-                                match = True
-                        elif op == 'is_none_of':
-                            if rule_person_ids.isdisjoint(item_person_ids):
-                                match = True
-                    
-                    # 处理其他普通列表字段
-                    else:
-                        if op == 'is_primary':
-                            if values_to_check and values_to_check[0] == value:
-                                match = True
-                        elif op == 'is_one_of':
-                            if isinstance(value, list) and any(v in values_to_check for v in value):
-                                match = True
-                        elif op == 'is_none_of':
-                            if isinstance(value, list) and not any(v in values_to_check for v in value):
-                                match = True
-                        elif op == 'contains':
-                            if value in values_to_check:
-                                match = True
-
-                except (TypeError, KeyError) as e:
-                    logger.warning(f"  ➜ 处理 {field}_json 时遇到意外的格式错误: {e}, 内容: {item_value_list}")
-
-            # 2. 处理其他所有非列表字段
-            elif field in ['release_date', 'date_added']:
+                            person_id = p.get('tmdb_id') or p.get('id')
+                            if person_id is not None and str(person_id) in rule_person_ids:
+                                overlap = True
+                                break
+                    except (TypeError, AttributeError, KeyError) as e:
+                        logger.warning(f"  ➜ 处理 {column} 时遇到意外的格式错误: {e}, 内容: {item_metadata.get(column)}")
+                        return False
+                    return overlap == want_overlap
+                return _match_person
+
+            if op == 'is_primary':
+                return lambda item_metadata: bool(_values(item_metadata)) and _values(item_metadata)[0] == value
+            if op in ('is_one_of', 'is_none_of'):
+                if not isinstance(value, list):
+                    return self._never
+                want_any = op == 'is_one_of'
+
+                def _match_list(item_metadata):
+                    values_to_check = _values(item_metadata)
+                    if values_to_check is None:
+                        return False
+                    return any(v in values_to_check for v in value) == want_any
+                return _match_list
+            if op == 'contains':
+                def _match_contains(item_metadata):
+                    values_to_check = _values(item_metadata)
+                    return values_to_check is not None and value in values_to_check
+                return _match_contains
+            return self._never
+
+        # 2. 日期字段：截止日期在编译时算好
+        if field in ('release_date', 'date_added'):
+            if not str(value).isdigit() or op not in ('in_last_days', 'not_in_last_days'):
+                return self._never
+            today = datetime.now().date()
+            cutoff_date = today - timedelta(days=int(value))
+            in_window = op == 'in_last_days'
+
+            def _match_date(item_metadata):
                 item_date_val = item_metadata.get(field)
-                if item_date_val and str(value).isdigit():
-                    try:
-                        if isinstance(item_date_val, datetime):
-                            item_date = item_date_val.date()
-                        elif isinstance(item_date_val, date):
-                            item_date = item_date_val
-                        else:
-                            item_date = datetime.strptime(str(item_date_val), '%Y-%m-%d').date()
-
-                        today = datetime.now().date()
-                        days = int(value)
-                        cutoff_date = today - timedelta(days=days)
-
-                        if op == 'in_last_days':
-                            if cutoff_date <= item_date <= today:
-                                match = True
-                        elif op == 'not_in_last_days':
-                            if item_date < cutoff_date:
-                                match = True
-                    except (ValueError, TypeError):
-                        pass
-
-            # 3. 处理分级字段
-            elif field == 'unified_rating':
-                item_unified_rating = item_metadata.get('unified_rating')
-                if item_unified_rating:
-                    if op == 'is_one_of':
-                        if isinstance(value, list) and item_unified_rating in value:
-                            match = True
-                    elif op == 'is_none_of':
-                        if isinstance(value, list) and item_unified_rating not in value:
-                            match = True
-                    elif op == 'eq':
-                        if str(value) == item_unified_rating:
-                            match = True
-
-            # 5. 处理连载剧集
-            elif field == 'is_in_progress':
-                if item_metadata.get('item_type') == 'Series':
-                    airing_ids = self._get_airing_ids()
-                    is_item_airing = str(item_metadata.get('tmdb_id')) in airing_ids
-
-                    if (op == 'is' and value is True) or (op == 'is_not' and value is False):
-                        if is_item_airing:
-                            match = True
-                    elif (op == 'is' and value is False) or (op == 'is_not' and value is True):
-                        if not is_item_airing:
-                            match = True
-
-            elif field == 'title':
-                item_title = item_metadata.get('title')
-                if item_title and isinstance(value, str):
-                    item_title_lower = item_title.lower()
-                    value_lower = value.lower()
-                    if op == 'contains':
-                        if value_lower in item_title_lower: match = True
-                    elif op == 'does_not_contain':
-                        if value_lower not in item_title_lower: match = True
-                    elif op == 'starts_with':
-                        if item_title_lower.startswith(value_lower): match = True
-                    elif op == 'ends_with':
-                        if item_title_lower.endswith(value_lower): match = True
-            
+                if not item_date_val:
+                    return False
+                try:
+                    item_date = self._to_date(item_date_val)
+                except (ValueError, TypeError):
+                    return False
+                if in_window:
+                    return cutoff_date <= item_date <= today
+                return item_date < cutoff_date
+            return _match_date
+
+        # 3. 分级字段
+        if field == 'unified_rating':
+            if op in ('is_one_of', 'is_none_of'):
+                if not isinstance(value, list):
+                    return self._never
+                rating_values = list(value)
+                if op == 'is_one_of':
+                    return lambda item_metadata: bool(item_metadata.get('unified_rating')) and item_metadata['unified_rating'] in rating_values
+                return lambda item_metadata: bool(item_metadata.get('unified_rating')) and item_metadata['unified_rating'] not in rating_values
+            if op == 'eq':
+                expected = str(value)
+                return lambda item_metadata: bool(item_metadata.get('unified_rating')) and item_metadata['unified_rating'] == expected
+            return self._never
+
+        # 4. 连载剧集
+        if field == 'is_in_progress':
+            if (op == 'is' and value is True) or (op == 'is_not' and value is False):
+                want_airing = True
+            elif (op == 'is' and value is False) or (op == 'is_not' and value is True):
+                want_airing = False
             else:
+                return self._never
+            airing_ids = self._get_airing_ids()
+            return lambda item_metadata: (
+                item_metadata.get('item_type') == 'Series'
+                and (str(item_metadata.get('tmdb_id')) in airing_ids) == want_airing
+            )
+
+        # 5. 标题
+        if field == 'title':
+            if not isinstance(value, str):
+                return self._never
+            value_lower = value.lower()
+            title_ops = {
+                'contains': lambda t: value_lower in t,
+                'does_not_contain': lambda t: value_lower not in t,
+                'starts_with': lambda t: t.startswith(value_lower),
+                'ends_with': lambda t: t.endswith(value_lower),
+            }
+            check = title_ops.get(op)
+            if check is None:
+                return self._never
+            return lambda item_metadata: bool(item_metadata.get('title')) and check(item_metadata['title'].lower())
+
+        # 6. 其他数值/等值字段
+        if op in ('gte', 'lte'):
+            try:
+                threshold = float(value)
+            except (ValueError, TypeError):
+                return self._never
+            is_gte = op == 'gte'
+
+            def _match_number(item_metadata):
                 actual_item_value = item_metadata.get(field)
-                if actual_item_value is not None:
-                    try:
-                        if op == 'gte' and float(actual_item_value) >= float(value): match = True
-                        elif op == 'lte' and float(actual_item_value) <= float(value): match = True
-                        elif op == 'eq' and str(actual_item_value) == str(value): match = True
-                    except (ValueError, TypeError): pass
+                if actual_item_value is None:
+                    return False
+                try:
+                    actual = float(actual_item_value)
+                except (ValueError, TypeError):
+                    return False
+                return actual >= threshold if is_gte else actual <= threshold
+            return _match_number
+        if op == 'eq':
+            expected = str(value)
+            return lambda item_metadata: item_metadata.get(field) is not None and str(item_metadata.get(field)) == expected
+        return self._never
+
+    def compile_rules(self, rules: List[Dict[str, Any]], logic: str) -> Callable[[Dict[str, Any]], bool]:
+        """把规则列表编译成单个谓词函数，在一次执行中反复复用。"""
+        if not rules:
+            return lambda item_metadata: True
+        predicates = [self._compile_rule(rule) for rule in rules]
+        if logic.upper() == 'AND':
+            return lambda item_metadata: all(predicate(item_metadata) for predicate in predicates)
+        return lambda item_metadata: any(predicate(item_metadata) for predicate in predicates)
+
+    def _item_matches_rules(self, item_metadata: Dict[str, Any], rules: List[Dict[str, Any]], logic: str) -> bool:
+        return self.compile_rules(rules, logic)(item_metadata)
+
+    # --- SQL 下推 ---
+    # 只生成“宽松”的条件：凡是 Python 谓词会命中的行，SQL 条件一定为真。
+    # 数据库负责先剔除绝对不可能命中的行，最终结果仍以编译后的谓词为准。
+    _SQL_STRING_LIST_COLUMNS = {'genres': 'genres_json', 'countries': 'countries_json', 'studios': 'studios_json', 'keywords': 'keywords_json'}
+    _SQL_PERSON_LIST_COLUMNS = {'actors': 'actors_json', 'directors': 'directors_json'}
+    _SQL_NUMERIC_COLUMNS = {'rating', 'release_year', 'runtime_minutes'}
+
+    @staticmethod
+    def _escape_like(text: str) -> str:
+        return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def _rule_to_sql(self, rule: Dict[str, Any]) -> Optional[Tuple[str, List[Any]]]:
+        field, op, value = rule.get("field"), rule.get("operator"), rule.get("value")
+
+        if field in self._SQL_STRING_LIST_COLUMNS:
+            column = self._SQL_STRING_LIST_COLUMNS[field]
+            if op in ('is_one_of', 'is_none_of') and isinstance(value, list) and value and all(isinstance(v, str) for v in value):
+                if op == 'is_one_of':
+                    return f"{column} ?| %s::text[]", [value]
+                # 用 CASE 保证先判断类型，避免对非数组调用 jsonb_array_length 报错
+                return f"CASE WHEN jsonb_typeof({column}) = 'array' THEN jsonb_array_length({column}) > 0 AND NOT ({column} ?| %s::text[]) ELSE FALSE END", [value]
+            if op in ('contains', 'is_primary') and isinstance(value, str):
+                return f"{column} ? %s", [value]
+            return None
+
+        if field in self._SQL_PERSON_LIST_COLUMNS:
+            column = self._SQL_PERSON_LIST_COLUMNS[field]
+            if op in ('is_one_of', 'contains', 'is_primary') and isinstance(value, list):
+                person_ids = sorted({str(p['id']) for p in value if isinstance(p, dict) and 'id' in p})
+                if not person_ids:
+                    return None
+                return (f"CASE WHEN jsonb_typeof({column}) = 'array' THEN EXISTS (SELECT 1 FROM jsonb_array_elements({column}) AS person "
+                        f"WHERE jsonb_typeof(person) = 'object' AND (person->>'tmdb_id' = ANY(%s) OR person->>'id' = ANY(%s))) ELSE FALSE END"), [person_ids, person_ids]
+            return None
+
+        if field in ('release_date', 'date_added') and str(value).isdigit():
+            # 时区可能让日期差一天，两端各放宽一天
+            today = datetime.now().date()
+            cutoff_date = today - timedelta(days=int(value))
+            if op == 'in_last_days':
+                return f"({field})::date BETWEEN %s AND %s", [cutoff_date - timedelta(days=1), today + timedelta(days=1)]
+            if op == 'not_in_last_days':
+                return f"({field})::date < %s", [cutoff_date + timedelta(days=1)]
+            return None
+
+        if field == 'unified_rating':
+            if op == 'is_one_of' and isinstance(value, list):
+                return "unified_rating = ANY(%s)", [[str(v) for v in value]]
+            if op == 'eq':
+                return "unified_rating = %s", [str(value)]
+            return None
+
+        if field == 'title' and isinstance(value, str) and value.isascii():
+            pattern = self._escape_like(value)
+            patterns = {'contains': f"%{pattern}%", 'starts_with': f"{pattern}%", 'ends_with': f"%{pattern}"}
+            if op in patterns:
+                return "title ILIKE %s", [patterns[op]]
+            return None
 
-            results.append(match)
+        if field in self._SQL_NUMERIC_COLUMNS and op in ('gte', 'lte'):
+            try:
+                threshold = float(value)
+            except (ValueError, TypeError):
+                return None
+            # REAL 列与 float 参数比较存在精度误差，阈值向外放宽一点
+            if op == 'gte':
+                return f"{field} >= %s", [threshold - 1e-3]
+            return f"{field} <= %s", [threshold + 1e-3]
 
-        if logic.upper() == 'AND': return all(results)
-        else: return any(results)
+        return None
+
+    def build_sql_pushdown(self, rules: List[Dict[str, Any]], logic: str) -> Tuple[Optional[str], List[Any]]:
+        """
+        AND：能下推的规则全部下推，其余留给 Python。
+        OR：只有所有规则都能下推时才下推，否则任何一条都可能放行整行，只能全量加载。
+        """
+        fragments, params = [], []
+        is_and = logic.upper() == 'AND'
+        for rule in rules or []:
+            compiled = self._rule_to_sql(rule)
+            if compiled is None:
+                if is_and:
+                    continue
+                return None, []
+            fragment, fragment_params = compiled
+            fragments.append(f"({fragment})")
+            params.extend(fragment_params)
+        if not fragments:
+            return None, []
+        return (" AND " if is_and else " OR ").join(fragments), params
+
+    # --- 列裁剪 ---
+    # 规则字段到 media_metadata 列的白名单映射，只收录当前表结构中确实存在的列；
+    # 出现未知字段 (包括已废弃 tags_json 列的 tags) 时退回整行读取，保证语义不变。
+    _RULE_COLUMNS = {
+        'title': ('title',), 'release_year': ('release_year',), 'rating': ('rating',),
+        'unified_rating': ('unified_rating',), 'release_date': ('release_date',),
+        'date_added': ('date_added',), 'runtime_minutes': ('runtime_minutes',),
+        'is_in_progress': (),
+    }
+
+    def required_columns(self, rules: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """返回规则实际引用到的列 (总是包含 tmdb_id 与 item_type)，无法确定时返回 None。"""
+        columns = ['tmdb_id', 'item_type']
+        for rule in rules or []:
+            field = rule.get("field")
+            if field in self._SQL_STRING_LIST_COLUMNS:
+                needed = (self._SQL_STRING_LIST_COLUMNS[field],)
+            elif field in self._SQL_PERSON_LIST_COLUMNS:
+                needed = (self._SQL_PERSON_LIST_COLUMNS[field],)
+            elif field in self._RULE_COLUMNS:
+                needed = self._RULE_COLUMNS[field]
+            else:
+                return None
+            columns.extend(c for c in needed if c not in columns)
+        return columns
 
     def execute_filter(self, definition: Dict[str, Any]) -> List[Dict[str, str]]:
         logger.info("  ➜ 筛选引擎：开始执行合集生成...")
@@ -835,10 +989,14 @@ class FilterEngine:
         if not library_ids:
             library_ids = definition.get('target_library_ids')
 
-        all_media_metadata = []
+        columns = self.required_columns(rules)
+        where_clause, where_params = self.build_sql_pushdown(rules, logic)
+        if where_clause:
+            logger.debug(f"  ➜ 已将部分规则下推到数据库: {where_clause}")
+        scan_kwargs = {}
 
         if library_ids and isinstance(library_ids, list) and len(library_ids) > 0:
-            # --- 分支1：从指定的媒体库加载数据 ---
+            # --- 分支1：限定在指定的媒体库内 ---
             logger.info(f"  ➜ 已指定 {len(library_ids)} 个媒体库作为筛选范围。")
             
             cfg = config_manager.APP_CONFIG
@@ -848,51 +1006,57 @@ class FilterEngine:
             if not all([emby_url, emby_key, emby_user_id]):
                 logger.error("  ➜ Emby服务器配置不完整，无法从指定媒体库筛选。")
                 return []
-            emby_items = emby.get_emby_library_items(
-                base_url=emby_url, api_key=emby_key, user_id=emby_user_id,
-                library_ids=library_ids, media_type_filter=",".join(item_types_to_process)
-            )
-            if not emby_items:
-                logger.warning("  ➜ 从指定的媒体库中未能获取到任何媒体项。")
-                return []
-            tmdb_ids_from_libs = [
-                item['ProviderIds']['Tmdb']
-                for item in emby_items
-                if item.get('ProviderIds', {}).get('Tmdb')
-            ]
-            if not tmdb_ids_from_libs:
-                logger.warning("  ➜ 指定媒体库中的项目均缺少TMDb ID，无法进行筛选。")
-                return []
-            
-            logger.info(f"  ➜ 正在从本地缓存中查询这 {len(tmdb_ids_from_libs)} 个项目的元数据...")
-            for item_type in item_types_to_process:
-                media_metadata_map = media_db.get_media_details_by_tmdb_ids(tmdb_ids_from_libs)
-                metadata_for_type = [v for v in media_metadata_map.values() if v.get('item_type') == item_type]
-                all_media_metadata.extend(metadata_for_type)
+
+            library_paths = emby.get_library_source_paths(library_ids, emby_url, emby_key)
+            if library_paths is not None:
+                # 媒体库归属直接用本地缓存的文件路径判断，不再拉取整库列表
+                logger.info(f"  ➜ 将按 {len(library_paths)} 个源文件夹在本地缓存中判断媒体库归属...")
+                scan_kwargs['library_paths'] = library_paths
+            else:
+                # 媒体库没有可用的源文件夹 (例如合集文件夹)，回退到 Emby 列表，但元数据仍只查询一次
+                emby_items = emby.get_emby_library_items(
+                    base_url=emby_url, api_key=emby_key, user_id=emby_user_id,
+                    library_ids=library_ids, media_type_filter=",".join(item_types_to_process)
+                )
+                if not emby_items:
+                    logger.warning("  ➜ 从指定的媒体库中未能获取到任何媒体项。")
+                    return []
+                media_keys = list({
+                    (item.get('Type'), str(item['ProviderIds']['Tmdb']))
+                    for item in emby_items
+                    if item.get('Type') and item.get('ProviderIds', {}).get('Tmdb')
+                })
+                if not media_keys:
+                    logger.warning("  ➜ 指定媒体库中的项目均缺少TMDb ID，无法进行筛选。")
+                    return []
+                logger.info(f"  ➜ 正在从本地缓存中查询这 {len(media_keys)} 个项目的元数据...")
+                scan_kwargs['media_keys'] = media_keys
 
         else:
-            # --- 分支2：保持原有逻辑，扫描全库 ---
+            # --- 分支2：扫描全库 ---
             logger.info("  ➜ 未指定媒体库，将扫描所有媒体库的元数据缓存...")
-            for item_type in item_types_to_process:
-                all_media_metadata.extend(media_db.get_all_media_metadata(item_type=item_type))
 
-        # --- 后续的筛选逻辑保持不变 ---
-        matched_items = []
-        if not all_media_metadata:
-            logger.warning("  ➜ 未能加载任何媒体元数据进行筛选。")
-            return []
-        
-        logger.info(f"  ➜ 已加载 {len(all_media_metadata)} 条元数据，开始应用筛选规则...")
-        for media_metadata in all_media_metadata:
-            if self._item_matches_rules(media_metadata, rules, logic):
+        # --- 流式读取，每行只经过一次编译后的谓词 ---
+        matches = self.compile_rules(rules, logic)
+        unique_items: Dict[str, Dict[str, str]] = {}
+        scanned_count = 0
+        for media_metadata in media_db.iter_media_metadata_for_filter(
+            item_types_to_process, columns=columns,
+            where_clause=where_clause, params=where_params, **scan_kwargs
+        ):
+            scanned_count += 1
+            if matches(media_metadata):
                 tmdb_id = media_metadata.get('tmdb_id')
                 item_type = media_metadata.get('item_type')
                 if tmdb_id and item_type:
-                    matched_items.append({'id': str(tmdb_id), 'type': item_type})
-                    
-        unique_items = list({f"{item['type']}-{item['id']}": item for item in matched_items}.values())
-        logger.info(f"  ➜ 筛选完成！共找到 {len(unique_items)} 部匹配的媒体项目。")
-        return unique_items
+                    unique_items[f"{item_type}-{tmdb_id}"] = {'id': str(tmdb_id), 'type': item_type}
+
+        if scanned_count == 0:
+            logger.warning("  ➜ 未能加载任何媒体元数据进行筛选。")
+            return []
+
+        logger.info(f"  ➜ 筛选完成！共检查 {scanned_count} 条元数据，找到 {len(unique_items)} 部匹配的媒体项目。")
+        return list(unique_items.values())
     
     def find_matching_collections(self, item_metadata: Dict[str, Any], media_library_id: Optional[str] = None) -> List[Dict[str, Any]]:
         media_item_type = item_metadata.get('item_type')
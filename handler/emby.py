@@ -1,15 +1,21 @@
 # handler/emby.py
 
 import requests
+from requests.adapters import HTTPAdapter
 import concurrent.futures
 import os
+import re
+import json
+import hashlib
 import shutil
 import time
 import threading
+from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import config_manager
 import constants
+from handler.tmdb import LoggedRetry
 from typing import Optional, List, Dict, Any, Generator, Tuple, Set, Callable
 import logging
 logger = logging.getLogger(__name__)
@@ -26,6 +32,133 @@ class SimpleLogger:
 _emby_id_cache = {}
 _emby_season_cache = {}
 _emby_episode_cache = {}
+
+# ======================================================================
+# ★★★ 共享 Emby HTTP 客户端 ★★★
+# 所有对 Emby 的请求都走同一个 Session，复用 keep-alive 连接，
+# 避免全库扫描时每次调用都重新建立 TCP/TLS 连接。
+# 在 gevent monkey patch 之后 urllib3 的连接池是协程安全的，可直接在 greenlet 中共享。
+# ======================================================================
+class _EmbyLoggedRetry(LoggedRetry):
+    service_name = "Emby"
+
+# 未显式指定超时时按接口匹配的默认读超时 (秒)，按顺序匹配第一条
+_ENDPOINT_READ_TIMEOUTS = [
+    (re.compile(r'/Users/AuthenticateByName$', re.I), 15),
+    (re.compile(r'/Users/[^/]+/(Policy|Configuration|Password)$', re.I), 15),
+    (re.compile(r'/Users/New$', re.I), 15),
+    (re.compile(r'/Images/', re.I), 60),
+    (re.compile(r'/Refresh$', re.I), 30),
+    (re.compile(r'/System/Info', re.I), 10),
+]
+# 统计时把路径中的 ID 段归一化，避免每个条目各占一行
+_PATH_ID_SEGMENT = re.compile(r'/(?:[0-9a-fA-F]{32}|[0-9a-fA-F-]{36}|\d+)(?=/|$)')
+
+class EmbyHttpClient:
+    """
+    进程内共享的 Emby HTTP 客户端。
+    - 按主机复用连接池 (pool_maxsize 控制并发连接上限)。
+    - 连接错误与 502/503/504 自动退避重试；非幂等的 POST 只在连接阶段失败时重试。
+    - 连接超时与读超时分开，读超时可按接口设定默认值。
+    - 记录每个接口的调用次数、失败次数与耗时。
+    """
+    def __init__(self,
+                 pool_connections: int = constants.EMBY_HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = constants.EMBY_HTTP_POOL_MAXSIZE,
+                 max_retries: int = constants.EMBY_HTTP_MAX_RETRIES,
+                 backoff_factor: float = constants.EMBY_HTTP_BACKOFF_FACTOR):
+        retry = _EmbyLoggedRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS', 'TRACE']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _resolve_timeout(url: str, timeout):
+        connect_timeout = constants.EMBY_HTTP_CONNECT_TIMEOUT_SECONDS
+        if isinstance(timeout, tuple):
+            return timeout
+        if timeout is None:
+            path = url.split('?', 1)[0]
+            for pattern, read_timeout in _ENDPOINT_READ_TIMEOUTS:
+                if pattern.search(path):
+                    timeout = read_timeout
+                    break
+            else:
+                timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+        return (min(connect_timeout, timeout), timeout)
+
+    def _record(self, method: str, url: str, elapsed_ms: float, failed: bool):
+        path = _PATH_ID_SEGMENT.sub('/{id}', urlparse(url).path)
+        key = f"{method} {path}"
+        with self._stats_lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            entry["count"] += 1
+            if failed:
+                entry["errors"] += 1
+            entry["total_ms"] += elapsed_ms
+            if elapsed_ms > entry["max_ms"]:
+                entry["max_ms"] = elapsed_ms
+
+    def request(self, method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+        method = method.upper()
+        start = time.monotonic()
+        failed = True
+        try:
+            response = self.session.request(method, url, timeout=self._resolve_timeout(url, timeout), **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            self._record(method, url, (time.monotonic() - start) * 1000, failed)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            endpoints = {
+                key: {
+                    "count": int(v["count"]),
+                    "errors": int(v["errors"]),
+                    "avg_ms": round(v["total_ms"] / v["count"], 1) if v["count"] else 0.0,
+                    "max_ms": round(v["max_ms"], 1),
+                }
+                for key, v in self._stats.items()
+            }
+        return {
+            "total_requests": sum(v["count"] for v in endpoints.values()),
+            "total_errors": sum(v["errors"] for v in endpoints.values()),
+            "endpoints": dict(sorted(endpoints.items(), key=lambda kv: kv[1]["count"], reverse=True)),
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+# 全局唯一实例，整个程序通过它请求 Emby
+emby_client = EmbyHttpClient()
+
+def get_emby_http_stats() -> Dict[str, Any]:
+    """返回共享 Emby 客户端的请求统计。"""
+    return emby_client.get_stats()
 # ★★★ 模拟用户登录以获取临时 AccessToken 的辅助函数 ★★★
 def _login_and_get_token() -> tuple[Optional[str], Optional[str]]:
     """
@@ -51,7 +184,7 @@ def _login_and_get_token() -> tuple[Optional[str], Optional[str]]:
     payload = {"Username": admin_user, "Pw": admin_pass}
     
     try:
-        response = requests.post(auth_url, headers=headers, json=payload, timeout=15)
+        response = emby_client.post(auth_url, headers=headers, json=payload, timeout=15)
         response.raise_for_status()
         data = response.json()
         access_token = data.get("AccessToken")
@@ -110,7 +243,7 @@ def get_item_count(base_url: str, api_key: str, user_id: Optional[str], item_typ
     try:
         # ★★★ 核心修改 3/3: 在所有 requests 调用中动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         data = response.json()
         
@@ -148,7 +281,7 @@ def get_emby_item_details(item_id: str, emby_server_url: str, emby_api_key: str,
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(url, params=params, timeout=api_timeout)
+        response = emby_client.get(url, params=params, timeout=api_timeout)
 
         if response.status_code != 200:
             logger.trace(f"响应头部: {response.headers}")
@@ -221,7 +354,7 @@ def find_emby_item_by_provider_id(provider_name: str, provider_id: str, base_url
 
     try:
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(url, headers=headers, params=params, timeout=api_timeout)
+        response = emby_client.get(url, headers=headers, params=params, timeout=api_timeout)
         response.raise_for_status()
         
         data = response.json()
@@ -363,7 +496,7 @@ def update_person_details(person_id: str, new_data: Dict[str, Any], emby_server_
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
         logger.trace(f"准备获取 Person 详情 (ID: {person_id}, UserID: {user_id}) at {api_url}")
-        response_get = requests.get(api_url, params=params, timeout=api_timeout)
+        response_get = emby_client.get(api_url, params=params, timeout=api_timeout)
         response_get.raise_for_status()
         person_to_update = response_get.json()
     except requests.exceptions.RequestException as e:
@@ -380,7 +513,7 @@ def update_person_details(person_id: str, new_data: Dict[str, Any], emby_server_
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response_post = requests.post(update_url, json=person_to_update, headers=headers, params=params, timeout=api_timeout)
+        response_post = emby_client.post(update_url, json=person_to_update, headers=headers, params=params, timeout=api_timeout)
         response_post.raise_for_status()
         logger.trace(f"  ➜ 成功更新 Person (ID: {person_id}) 的信息。")
         return True
@@ -403,7 +536,7 @@ def get_library_series_ids(library_id: str, emby_server_url: str, emby_api_key:
     try:
         # 注意：这里为了保持函数独立性，使用了固定的超时时间。
         # 如果需要，也可以像其他函数一样从全局配置读取。
-        response = requests.get(api_url, params=params, timeout=30)
+        response = emby_client.get(api_url, params=params, timeout=30)
         response.raise_for_status()
         items = response.json().get("Items", [])
         series_ids = [item["Id"] for item in items]
@@ -425,7 +558,7 @@ def get_emby_libraries(emby_server_url, emby_api_key, user_id):
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
         logger.trace(f"  ➜ 正在从 {target_url} 获取媒体库和合集...")
-        response = requests.get(target_url, params=params, timeout=api_timeout)
+        response = emby_client.get(target_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         data = response.json()
         
@@ -455,7 +588,7 @@ def get_all_library_versions(
     - 支持扫描指定媒体库列表 (library_ids) 或指定父对象 (parent_id)。
     """
     all_items = []
-    session = requests.Session()
+    session = emby_client
     api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
     
     target_ids = []
@@ -530,6 +663,148 @@ def get_all_library_versions(
         update_status_callback(80, "媒体项索引完成，即将进行本地数据比对...")
         
     return all_items
+# ✨✨✨ 分页流式获取媒体库项目，每次产出一页 ✨✨✨
+def iter_emby_library_items(
+    base_url: str,
+    api_key: str,
+    library_ids: Optional[List[str]],
+    media_type_filter: Optional[str] = None,
+    user_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "Descending",
+    page_size: Optional[int] = None,
+    max_items: Optional[int] = None,
+    prefetch_pages: int = 0,
+    stop_event: Optional[threading.Event] = None,
+    force_user_endpoint: bool = False,
+    library_name_map: Optional[Dict[str, str]] = None,
+    extra_params: Optional[Dict[str, Any]] = None,
+    raise_on_error: bool = False
+) -> Generator[List[Dict[str, Any]], None, None]:
+    """
+    按页 (StartIndex/Limit) 从 Emby 拉取媒体库项目，逐页 yield，避免一次性把整个库读进内存。
+    - page_size: 每页条数，默认读取配置 emby_page_size。
+    - max_items: 每个媒体库最多拉取的条数 (等价于旧版的 Limit)。
+    - prefetch_pages: 并行预取的页数，0 为严格顺序拉取。
+    - stop_event: 每页之间检查一次；调用方提前 break/close 同样会停止后续请求。
+    - 为每个项目注入来源库ID `_SourceLibraryId`，并剔除翻页期间库变动造成的重复项。
+    - extra_params: 附加的查询参数，例如增量同步使用的 MinDateLastSaved。
+    - raise_on_error: 默认某个库拉取失败时记录日志并继续下一个库；为 True 时直接抛出，
+      供依赖“完整列表”做删除判断或推进水位线的调用方使用。
+    """
+    if not base_url or not api_key or not library_ids:
+        return
+
+    page_size = page_size or config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_PAGE_SIZE, constants.DEFAULT_EMBY_PAGE_SIZE)
+    page_size = max(1, int(page_size))
+    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+    fields_to_request = fields if fields else "ProviderIds,Name,Type,MediaStreams,ChildCount,Path,OriginalTitle"
+
+    for lib_id in library_ids:
+        if not lib_id or not lib_id.strip():
+            continue
+        if stop_event and stop_event.is_set():
+            return
+
+        library_name = library_name_map.get(lib_id, lib_id) if library_name_map else lib_id
+        params = {
+            "api_key": api_key, "Recursive": "true", "ParentId": lib_id,
+            "Fields": fields_to_request,
+        }
+        if media_type_filter:
+            params["IncludeItemTypes"] = media_type_filter
+        if extra_params:
+            params.update(extra_params)
+        if sort_by:
+            params["SortBy"] = sort_by
+        if sort_order and sort_by:
+            params["SortOrder"] = sort_order
+
+        if force_user_endpoint and user_id:
+            api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+        else:
+            api_url = f"{base_url.rstrip('/')}/Items"
+            if user_id:
+                params["UserId"] = user_id
+
+        def fetch_page(start_index: int, count: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+            page_params = dict(params, StartIndex=start_index, Limit=count)
+            response = emby_client.get(api_url, params=page_params, timeout=api_timeout)
+            response.raise_for_status()
+            data = response.json()
+            return data.get("Items", []), data.get("TotalRecordCount")
+
+        logger.trace(f"  ➜ 开始分页拉取媒体库 '{library_name}' (ID: {lib_id})，每页 {page_size} 条。")
+
+        seen_ids: Set[str] = set()
+        fetched = 0
+        executor = None
+        pending: List[concurrent.futures.Future] = []
+        try:
+            first_count = page_size if max_items is None else min(page_size, max_items)
+            if first_count <= 0:
+                continue
+            items, total = fetch_page(0, first_count)
+
+            # target 为本库应拉取的条数上限；拿不到总数时退化为“直到出现不满页为止”
+            target = total
+            if max_items is not None:
+                target = max_items if target is None else min(target, max_items)
+            use_prefetch = prefetch_pages > 0 and total is not None
+            if use_prefetch:
+                executor = ThreadPoolExecutor(max_workers=prefetch_pages, thread_name_prefix="EmbyPagePrefetch")
+
+            next_offset = len(items)
+            requested = first_count
+            while True:
+                if items:
+                    page = []
+                    for item in items:
+                        item_id = item.get('Id')
+                        if item_id:
+                            if item_id in seen_ids:
+                                continue
+                            seen_ids.add(item_id)
+                        item['_SourceLibraryId'] = lib_id
+                        page.append(item)
+                    fetched += len(items)
+                    if page:
+                        yield page
+
+                if stop_event and stop_event.is_set():
+                    logger.info(f"  ➜ 收到停止信号，已停止分页拉取媒体库 '{library_name}'。")
+                    return
+                if not use_prefetch and len(items) < requested:
+                    break
+
+                if use_prefetch:
+                    while len(pending) < prefetch_pages and next_offset < target:
+                        count = min(page_size, target - next_offset)
+                        pending.append(executor.submit(fetch_page, next_offset, count))
+                        next_offset += count
+                    if not pending:
+                        break
+                    items, _ = pending.pop(0).result()
+                else:
+                    if target is not None and next_offset >= target:
+                        break
+                    requested = page_size if target is None else min(page_size, target - next_offset)
+                    items, _ = fetch_page(next_offset, requested)
+                    next_offset += requested
+        except Exception as e:
+            logger.error(f"分页请求库 '{library_name}' 中的项目失败 (已获取 {fetched} 条): {e}", exc_info=True)
+            if raise_on_error:
+                raise
+            continue
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor:
+                executor.shutdown(wait=False)
+
+        logger.trace(f"  ➜ 媒体库 '{library_name}' 分页拉取完成，共 {len(seen_ids) or fetched} 条。")
+
 # ✨✨✨ 获取项目，并为每个项目添加来源库ID ✨✨✨
 def get_emby_library_items(
     base_url: str,
@@ -546,6 +821,10 @@ def get_emby_library_items(
     limit: Optional[int] = None,
     force_user_endpoint: bool = False
 ) -> Optional[List[Dict[str, Any]]]:
+    """
+    一次性返回所有项目的列表。内部已改为分页拉取；
+    大库请优先使用 iter_emby_library_items 逐页消费。
+    """
     if not base_url or not api_key:
         logger.error("get_emby_library_items: base_url 或 api_key 未提供。")
         return None
@@ -565,7 +844,7 @@ def get_emby_library_items(
             "Limit": 100
         }
         try:
-            response = requests.get(api_url, params=params, timeout=api_timeout)
+            response = emby_client.get(api_url, params=params, timeout=api_timeout)
             response.raise_for_status()
             items = response.json().get("Items", [])
             logger.info(f"搜索到 {len(items)} 个匹配项。")
@@ -578,51 +857,13 @@ def get_emby_library_items(
         return []
 
     all_items_from_selected_libraries: List[Dict[str, Any]] = []
-    for lib_id in library_ids:
-        if not lib_id or not lib_id.strip():
-            continue
-        
-        library_name = library_name_map.get(lib_id, lib_id) if library_name_map else lib_id
-        
-        try:
-            fields_to_request = fields if fields else "ProviderIds,Name,Type,MediaStreams,ChildCount,Path,OriginalTitle"
-
-            params = {
-                "api_key": api_key, "Recursive": "true", "ParentId": lib_id,
-                "Fields": fields_to_request,
-            }
-            if media_type_filter:
-                params["IncludeItemTypes"] = media_type_filter
-            
-            # ★★★ 核心修复：应用服务器端优化参数 ★★★
-            if sort_by:
-                params["SortBy"] = sort_by
-            if sort_order and sort_by: # 只有在指定排序时才需要排序顺序
-                params["SortOrder"] = sort_order
-            if limit is not None:
-                params["Limit"] = limit
-
-            if force_user_endpoint and user_id:
-                api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
-            else:
-                api_url = f"{base_url.rstrip('/')}/Items"
-                if user_id:
-                    params["UserId"] = user_id
-
-            logger.trace(f"Requesting items from library '{library_name}' (ID: {lib_id}) using URL: {api_url}.")
-            
-            response = requests.get(api_url, params=params, timeout=api_timeout)
-            response.raise_for_status()
-            items_in_lib = response.json().get("Items", [])
-            
-            if items_in_lib:
-                for item in items_in_lib:
-                    item['_SourceLibraryId'] = lib_id
-                all_items_from_selected_libraries.extend(items_in_lib)
-        
-        except Exception as e:
-            logger.error(f"请求库 '{library_name}' 中的项目失败: {e}", exc_info=True)
-            continue
+    for page in iter_emby_library_items(
+        base_url, api_key, library_ids,
+        media_type_filter=media_type_filter, user_id=user_id, fields=fields,
+        sort_by=sort_by, sort_order=sort_order, max_items=limit,
+        force_user_endpoint=force_user_endpoint, library_name_map=library_name_map
+    ):
+        all_items_from_selected_libraries.extend(page)
 
     type_to_chinese = {"Movie": "电影", "Series": "电视剧", "Video": "视频", "MusicAlbum": "音乐专辑"}
     media_type_in_chinese = ""
@@ -648,7 +889,7 @@ def get_library_items_for_cleanup(
 ) -> Optional[List[Dict[str, Any]]]:
     """
     【媒体清理专用】根据媒体库ID列表，高效获取所有项目。
-    - 循环请求每个媒体库以确保稳定性。
+    - 逐个媒体库分页请求以确保稳定性。
     - 自动为每个项目注入来源库ID `_SourceLibraryId`。
     """
     if not base_url or not api_key:
@@ -658,43 +899,12 @@ def get_library_items_for_cleanup(
     if not library_ids:
         return []
 
-    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
     all_items = []
-    
-    # 循环遍历每个媒体库ID，而不是用逗号拼接，以提高稳定性
-    for lib_id in library_ids:
-        if not lib_id or not lib_id.strip():
-            continue
-        
-        try:
-            # 为本次请求构建参数
-            params = {
-                "api_key": api_key,
-                "Recursive": "true",
-                "ParentId": lib_id,
-                "Fields": fields,
-                "IncludeItemTypes": media_type_filter,
-            }
-            
-            # 默认使用 /Items 端点，如果提供了 user_id 则作为参数传入
-            api_url = f"{base_url.rstrip('/')}/Items"
-            if user_id:
-                params["UserId"] = user_id
-
-            logger.trace(f"正在从媒体库 ID: {lib_id} 获取项目...")
-            
-            response = requests.get(api_url, params=params, timeout=api_timeout)
-            response.raise_for_status()
-            items_in_lib = response.json().get("Items", [])
-            
-            # 为每个项目注入来源库ID，以便上层逻辑使用
-            for item in items_in_lib:
-                item['_SourceLibraryId'] = lib_id
-            all_items.extend(items_in_lib)
-        
-        except Exception as e:
-            logger.error(f"请求库 ID: {lib_id} 中的项目失败: {e}", exc_info=True)
-            continue # 一个库失败了，继续处理下一个
+    for page in iter_emby_library_items(
+        base_url, api_key, library_ids,
+        media_type_filter=media_type_filter, user_id=user_id, fields=fields
+    ):
+        all_items.extend(page)
 
     logger.debug(f"  ➜ 总共从 {len(library_ids)} 个选定库中获取到 {len(all_items)} 个项目。")
     return all_items
@@ -739,7 +949,7 @@ def refresh_emby_item_metadata(item_emby_id: str,
             update_url = f"{emby_server_url.rstrip('/')}/Items/{item_emby_id}"
             update_params = {"api_key": emby_api_key}
             headers = {'Content-Type': 'application/json'}
-            update_response = requests.post(update_url, json=item_data, headers=headers, params=update_params, timeout=api_timeout)
+            update_response = emby_client.post(update_url, json=item_data, headers=headers, params=update_params, timeout=api_timeout)
             update_response.raise_for_status()
             logger.trace(f"  ➜ 成功更新 {log_identifier} 的锁状态。")
         else:
@@ -760,7 +970,7 @@ def refresh_emby_item_metadata(item_emby_id: str,
     }
     
     try:
-        response = requests.post(refresh_url, params=params, timeout=api_timeout)
+        response = emby_client.post(refresh_url, params=params, timeout=api_timeout)
         if response.status_code == 204:
             logger.info(f"  ➜ 已成功为 {log_identifier} 刷新演员表。")
             return True
@@ -853,7 +1063,7 @@ def get_all_persons_from_emby(
         count_url = f"{base_url.rstrip('/')}/Items"
         count_params = {"api_key": api_key, "IncludeItemTypes": "Person", "Recursive": "true", "Limit": 0}
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(count_url, params=count_params, timeout=api_timeout)
+        response = emby_client.get(count_url, params=count_params, timeout=api_timeout)
         response.raise_for_status()
         total_count = response.json().get("TotalRecordCount", 0)
         logger.info(f"Emby Person 总数: {total_count}")
@@ -882,7 +1092,7 @@ def get_all_persons_from_emby(
         request_params["Limit"] = batch_size
         
         try:
-            response = requests.get(api_url, headers=headers, params=request_params, timeout=api_timeout)
+            response = emby_client.get(api_url, headers=headers, params=request_params, timeout=api_timeout)
             response.raise_for_status()
             items = response.json().get("Items", [])
             
@@ -928,7 +1138,7 @@ def get_series_children(
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         data = response.json()
         children = data.get("Items", [])
@@ -989,7 +1199,7 @@ def get_season_children(
     logger.debug(f"  ➜ 准备获取季 {season_id} 的子项目...")
     try:
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         data = response.json()
         children = data.get("Items", [])
@@ -1073,7 +1283,7 @@ def download_emby_image(
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        with requests.get(image_url, params=params, stream=True, timeout=api_timeout) as r:
+        with emby_client.get(image_url, params=params, stream=True, timeout=api_timeout) as r:
             r.raise_for_status()
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             with open(save_path, 'wb') as f:
@@ -1106,7 +1316,7 @@ def get_all_collections_from_emby_generic(base_url: str, api_key: str, user_id:
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         all_collections = response.json().get("Items", [])
         logger.debug(f"  ➜ 成功从 Emby 获取到 {len(all_collections)} 个合集。")
@@ -1134,7 +1344,7 @@ def get_all_collections_with_items(base_url: str, api_key: str, user_id: str) ->
     api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
 
     try:
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         all_collections_from_emby = response.json().get("Items", [])
         
@@ -1161,7 +1371,7 @@ def get_all_collections_with_items(base_url: str, api_key: str, user_id: str) ->
                 "Fields": "ProviderIds"
             }
             try:
-                children_response = requests.get(children_url, params=children_params, timeout=api_timeout)
+                children_response = emby_client.get(children_url, params=children_params, timeout=api_timeout)
                 children_response.raise_for_status()
                 media_in_collection = children_response.json().get("Items", [])
                 
@@ -1208,7 +1418,7 @@ def get_all_native_collections_from_emby(base_url: str, api_key: str, user_id: s
         # 步骤 1: 获取服务器上所有的媒体库 (过滤掉顶层合集文件夹)
         libraries_url = f"{base_url}/Library/VirtualFolders"
         lib_params = {"api_key": api_key}
-        lib_response = requests.get(libraries_url, params=lib_params, timeout=30)
+        lib_response = emby_client.get(libraries_url, params=lib_params, timeout=30)
         lib_response.raise_for_status()
         all_libraries_raw = lib_response.json()
         
@@ -1230,7 +1440,7 @@ def get_all_native_collections_from_emby(base_url: str, api_key: str, user_id: s
             params = { "ParentId": library_id, "IncludeItemTypes": "BoxSet", "Recursive": "true", "fields": "ProviderIds,Name,Id,ImageTags", "api_key": api_key }
             
             try:
-                response = requests.get(collections_url, params=params, timeout=60)
+                response = emby_client.get(collections_url, params=params, timeout=60)
                 response.raise_for_status()
                 collections_in_library = response.json().get("Items", [])
                 
@@ -1286,7 +1496,7 @@ def get_emby_server_info(base_url: str, api_key: str) -> Optional[Dict[str, Any]
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         data = response.json()
         return data
@@ -1313,7 +1523,7 @@ def get_collection_members(collection_id: str, base_url: str, api_key: str, user
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         items = response.json().get("Items", [])
         return [item['Id'] for item in items]
@@ -1328,7 +1538,7 @@ def add_items_to_collection(collection_id: str, item_ids: List[str], base_url: s
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.post(api_url, params=params, timeout=api_timeout)
+        response = emby_client.post(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         return True
     except requests.RequestException:
@@ -1341,7 +1551,7 @@ def remove_items_from_collection(collection_id: str, item_ids: List[str], base_u
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.delete(api_url, params=params, timeout=api_timeout)
+        response = emby_client.delete(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         return True
     except requests.RequestException:
@@ -1425,7 +1635,7 @@ def create_or_update_collection_with_emby_ids(
             
             # ★★★ 核心修改: 动态获取超时时间 ★★★
             api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-            response = requests.post(api_url, params=params, data=payload, timeout=api_timeout)
+            response = emby_client.post(api_url, params=params, data=payload, timeout=api_timeout)
             response.raise_for_status()
             new_collection_info = response.json()
             emby_collection_id = new_collection_info.get('Id')
@@ -1441,7 +1651,8 @@ def get_emby_items_by_id(
     api_key: str,
     user_id: str, # 参数保留以兼容旧的调用，但内部不再使用
     item_ids: List[str],
-    fields: Optional[str] = None
+    fields: Optional[str] = None,
+    raise_on_error: bool = False
 ) -> List[Dict[str, Any]]:
     """
     【V4 - 4.9+ 终极兼容版】
@@ -1449,6 +1660,7 @@ def get_emby_items_by_id(
     - 核心变更: 适配 Emby 4.9+ API, 切换到 /Items 端点。
     - 关键修正: 在查询 Person 等全局项目时，不能传递 UserId，否则新版API会返回空结果。
       此函数现在不再将 UserId 传递给 API，以确保能获取到演员详情。
+    - raise_on_error: 默认单个批次失败时跳过继续；为 True 时直接抛出，避免调用方把不完整的结果当成完整结果。
     """
     if not all([base_url, api_key]) or not item_ids: # UserId 不再是必须检查的参数
         return []
@@ -1480,7 +1692,7 @@ def get_emby_items_by_id(
             
             if len(id_chunks) > 1:
                 logger.trace(f"  ➜ 正在请求批次 {i+1}/{len(id_chunks)} (包含 {len(batch_ids)} 个ID)...")
-            response = requests.get(api_url, params=params, timeout=api_timeout)
+            response = emby_client.get(api_url, params=params, timeout=api_timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -1490,6 +1702,8 @@ def get_emby_items_by_id(
         except requests.exceptions.RequestException as e:
             # 记录当前批次的错误，但继续处理下一批
             logger.error(f"根据ID列表批量获取Emby项目时，处理批次 {i+1} 失败: {e}")
+            if raise_on_error:
+                raise
             continue
 
     logger.trace(f"  ➜ 所有批次请求完成，共获取到 {len(all_items)} 个媒体项。")
@@ -1508,7 +1722,7 @@ def append_item_to_collection(collection_id: str, item_emby_id: str, base_url: s
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.post(api_url, params=params, timeout=api_timeout)
+        response = emby_client.post(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         
         logger.trace(f"成功发送追加请求：将项目 {item_emby_id} 添加到合集 {collection_id}。")
@@ -1531,7 +1745,7 @@ def get_all_libraries_with_paths(base_url: str, api_key: str) -> List[Dict[str,
         params = {"api_key": api_key}
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(folders_url, params=params, timeout=api_timeout)
+        response = emby_client.get(folders_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         virtual_folders_data = response.json()
 
@@ -1561,6 +1775,22 @@ def get_all_libraries_with_paths(base_url: str, api_key: str) -> List[Dict[str,
         logger.error(f"实时获取媒体库路径时发生错误: {e}", exc_info=True)
         return []
 
+def get_library_source_paths(library_ids: List[str], base_url: str, api_key: str) -> Optional[List[str]]:
+    """
+    取指定媒体库的全部源文件夹，供本地按文件路径判断媒体库归属。
+    只要有一个媒体库拿不到路径 (例如合集文件夹) 就返回 None，由调用方回退到 Emby 列表。
+    """
+    libraries = get_all_libraries_with_paths(base_url, api_key)
+    paths_by_id = {str(lib['info']['Id']): lib.get('paths') or [] for lib in libraries}
+    library_paths = []
+    for library_id in library_ids:
+        paths = paths_by_id.get(str(library_id))
+        if not paths:
+            logger.debug(f"  ➜ 媒体库 {library_id} 没有可用的源文件夹路径，将回退到 Emby 列表。")
+            return None
+        library_paths.extend(paths)
+    return library_paths
+
 def get_library_root_for_item(item_id: str, base_url: str, api_key: str, user_id: str) -> Optional[Dict[str, Any]]:
     logger.debug("  ➜ 正在为项目ID {item_id} 定位媒体库...")
     try:
@@ -1575,16 +1805,7 @@ def get_library_root_for_item(item_id: str, base_url: str, api_key: str, user_id
             return None
         item_path = item_details["Path"]
 
-        best_match_library = None
-        longest_match_length = 0
-        for lib_data in all_libraries_data:
-            for library_source_path in lib_data["paths"]:
-                source_path_with_slash = os.path.join(library_source_path, "")
-                if item_path.startswith(source_path_with_slash):
-                    if len(source_path_with_slash) > longest_match_length:
-                        longest_match_length = len(source_path_with_slash)
-                        best_match_library = lib_data["info"]
-        
+        best_match_library = _match_library_by_path(item_path, all_libraries_data)
         if best_match_library:
             logger.info(f"  ➜ 匹配到媒体库 '{best_match_library.get('Name')}'。")
             return best_match_library
@@ -1619,7 +1840,7 @@ def update_emby_item_details(item_id: str, new_data: Dict[str, Any], emby_server
 
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response_post = requests.post(update_url, json=item_to_update, headers=headers, params=params, timeout=api_timeout)
+        response_post = emby_client.post(update_url, json=item_to_update, headers=headers, params=params, timeout=api_timeout)
         response_post.raise_for_status()
         
         logger.info(f"✅ 成功更新项目 '{item_name_for_log}' 的详情。")
@@ -1660,7 +1881,7 @@ def delete_item_sy(item_id: str, emby_server_url: str, emby_api_key: str, user_i
     api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
     
     try:
-        response = requests.post(api_url, headers=headers, params=params, timeout=api_timeout)
+        response = emby_client.post(api_url, headers=headers, params=params, timeout=api_timeout)
         response.raise_for_status()
         logger.info(f"  ✅ 成功删除 Emby 媒体项 ID: {item_id}。")
         return True
@@ -1699,7 +1920,7 @@ def delete_item(item_id: str, emby_server_url: str, emby_api_key: str, user_id:
     api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
     
     try:
-        response = requests.post(api_url, headers=headers, params=params, timeout=api_timeout)
+        response = emby_client.post(api_url, headers=headers, params=params, timeout=api_timeout)
         response.raise_for_status()
         logger.info(f"  ✅ 成功删除 Emby 媒体项 ID: {item_id}。")
         return True
@@ -1743,7 +1964,7 @@ def delete_person_custom_api(base_url: str, api_key: str, person_id: str) -> boo
     
     try:
         # 这个接口是 POST 请求
-        response = requests.post(api_url, headers=headers, params=params, timeout=api_timeout)
+        response = emby_client.post(api_url, headers=headers, params=params, timeout=api_timeout)
         response.raise_for_status()
         logger.info(f"  ✅ 成功删除演员 ID: {person_id}。")
         return True
@@ -1774,7 +1995,7 @@ def get_all_emby_users_from_server(base_url: str, api_key: str) -> Optional[List
     logger.debug("正在从 Emby 服务器获取所有用户列表...")
     try:
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response = emby_client.get(api_url, params=params, timeout=api_timeout)
         response.raise_for_status()
         users = response.json()
         logger.info(f"  ➜ 成功从 Emby 获取到 {len(users)} 个用户。")
@@ -1821,7 +2042,7 @@ def get_all_user_view_data(user_id: str, base_url: str, api_key: str) -> Optiona
             request_params["StartIndex"] = start_index
             request_params["Limit"] = batch_size
             
-            response = requests.get(api_url, params=request_params, timeout=api_timeout)
+            response = emby_client.get(api_url, params=request_params, timeout=api_timeout)
             response.raise_for_status()
             data = response.json()
             items = data.get("Items", [])
@@ -1853,6 +2074,39 @@ def get_all_user_view_data(user_id: str, base_url: str, api_key: str) -> Optiona
     logger.debug(f"为用户 {user_id} 的全量同步完成，共找到 {len(all_items_with_data)} 个有状态的媒体项。")
     return all_items_with_data
 
+# 用户权限快照统计的媒体类型，枚举与计数必须一致
+PERMISSION_ITEM_TYPES = "Movie,Series,Video"
+
+# Policy 中影响"能看到哪些媒体项"的字段，其余字段 (下载、转码等) 变化不需要重建快照
+_POLICY_ACCESS_KEYS = (
+    "IsAdministrator", "IsDisabled",
+    "EnableAllFolders", "EnabledFolders", "ExcludedSubFolders", "BlockedMediaFolders",
+    "EnableAllChannels", "EnabledChannels", "BlockedChannels",
+    "MaxParentalRating", "BlockUnratedItems",
+    "BlockedTags", "AllowedTags", "IsTagBlockingModeInclusive",
+)
+
+def get_user_policy_fingerprint(user: Dict[str, Any], base_url: str, api_key: str) -> Optional[str]:
+    """
+    根据用户 Policy 中与媒体访问相关的字段计算指纹。
+    /Users 列表通常已携带 Policy，缺失时回退到 get_user_details。
+    """
+    policy = user.get("Policy")
+    if policy is None:
+        details = get_user_details(user.get("Id"), base_url, api_key)
+        if not details:
+            return None
+        policy = details.get("Policy") or {}
+
+    access_policy = {}
+    for key in _POLICY_ACCESS_KEYS:
+        value = policy.get(key)
+        if isinstance(value, list):
+            value = sorted(str(v) for v in value)
+        access_policy[key] = value
+    raw = json.dumps(access_policy, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
 def get_all_accessible_item_ids_for_user_optimized(base_url: str, api_key: str, user_id: str) -> Optional[Set[str]]:
     """
     【V5.8 优化版 - 基于已有逻辑】
@@ -1874,7 +2128,7 @@ def get_all_accessible_item_ids_for_user_optimized(base_url: str, api_key: str,
     params = {
         "api_key": api_key,
         "Recursive": "true",
-        "IncludeItemTypes": "Movie,Series,Video", # 您可以根据需要调整
+        "IncludeItemTypes": PERMISSION_ITEM_TYPES,
         "Fields": "Id",  # ★★★ 优化点：只请求ID，速度最快
         "UserId": user_id 
     }
@@ -1890,7 +2144,7 @@ def get_all_accessible_item_ids_for_user_optimized(base_url: str, api_key: str,
             request_params["StartIndex"] = start_index
             request_params["Limit"] = batch_size
             
-            response = requests.get(api_url, params=request_params, timeout=api_timeout)
+            response = emby_client.get(api_url, params=request_params, timeout=api_timeout)
             response.raise_for_status()
             data = response.json()
             items = data.get("Items", [])
@@ -1915,64 +2169,190 @@ def get_all_accessible_item_ids_for_user_optimized(base_url: str, api_key: str,
     logger.trace(f"  ➜ 成功为用户 {user_id} 获取到 {len(accessible_ids)} 个原生可访问的媒体项ID。")
     return accessible_ids
 
-def get_user_ids_with_access_to_item(item_id: str, base_url: str, api_key: str) -> List[str]:
+# --- 基于 Policy 的访问权限解析 ---
+# 用户列表 (含 Policy) 与媒体库路径的短期缓存，同一批 Webhook 内只拉取一次
+_user_policy_cache: Dict[str, Dict[str, Any]] = {}
+_user_policy_cache_lock = threading.Lock()
+
+def invalidate_user_policy_cache():
+    with _user_policy_cache_lock:
+        _user_policy_cache.clear()
+
+def _get_users_and_libraries_cached(base_url: str, api_key: str) -> Tuple[Optional[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    now = time.monotonic()
+    with _user_policy_cache_lock:
+        cached = _user_policy_cache.get(base_url)
+        if cached and now - cached['fetched_at'] < constants.EMBY_USER_POLICY_CACHE_TTL_SECONDS:
+            return cached['users'], cached['libraries']
+
+    users = get_all_emby_users_from_server(base_url, api_key)
+    libraries = get_all_libraries_with_paths(base_url, api_key)
+    if users is not None:
+        with _user_policy_cache_lock:
+            _user_policy_cache[base_url] = {'users': users, 'libraries': libraries, 'fetched_at': now}
+    return users, libraries
+
+def _match_library_by_path(item_path: str, libraries: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """按最长前缀把文件路径匹配到媒体库。"""
+    best_match_library = None
+    longest_match_length = 0
+    for lib_data in libraries:
+        for library_source_path in lib_data["paths"]:
+            source_path_with_slash = os.path.join(library_source_path, "")
+            if item_path.startswith(source_path_with_slash) and len(source_path_with_slash) > longest_match_length:
+                longest_match_length = len(source_path_with_slash)
+                best_match_library = lib_data["info"]
+    return best_match_library
+
+def _resolve_access_by_policy(policy: Dict[str, Any], item: Dict[str, Any], library_id: Optional[str]) -> Optional[bool]:
     """
-    获取对特定媒体项拥有原生访问权限的所有用户ID列表。
-    通过并发查询每个用户的视图来实现，效率较高。
+    仅根据 Policy 和项目自身信息判断用户能否访问。
+    返回 True/False；无法在本地确定时返回 None，由调用方回退到 Emby 实时查询。
     """
-    if not all([item_id, base_url, api_key]):
-        logger.error("get_user_ids_with_access_to_item: 缺少必要参数。")
-        return []
+    if not policy:
+        return None
+    if policy.get("IsDisabled"):
+        return False
 
-    all_users = get_all_emby_users_from_server(base_url, api_key)
-    if not all_users:
-        logger.error("无法获取用户列表，无法确定项目访问权限。")
-        return []
+    # 1. 媒体库
+    if not policy.get("EnableAllFolders", True):
+        if not library_id:
+            return None
+        if library_id not in (policy.get("EnabledFolders") or []):
+            return False
+    if policy.get("ExcludedSubFolders") or policy.get("BlockedMediaFolders"):
+        # 子文件夹/旧版按名称屏蔽的规则无法在本地可靠判断
+        return None
 
-    user_ids_with_access = []
-    # 使用线程锁来确保并发写入列表时的线程安全
-    lock = threading.Lock()
+    item_type = item.get("Type")
+    top_level = item_type in ("Movie", "Series", "Video")
 
-    def check_access_for_user(user: Dict[str, Any]):
-        """在单个线程中为单个用户检查权限"""
-        user_id = user.get("Id")
-        if not user_id:
-            return
+    # 2. 标签
+    if policy.get("AllowedTags") and policy.get("IsTagBlockingModeInclusive"):
+        return None
+    blocked_tags = {str(t).lower() for t in (policy.get("BlockedTags") or [])}
+    if blocked_tags:
+        if not top_level:
+            # 分集/季会继承剧集的标签，本地信息不全
+            return None
+        item_tags = {str(t).lower() for t in (item.get("Tags") or [])}
+        item_tags.update(str(t.get("Name", "")).lower() for t in (item.get("TagItems") or []) if isinstance(t, dict))
+        if blocked_tags & item_tags:
+            return False
 
-        # 我们查询用户的 /Items 接口，如果能查到这个 item_id，就说明有权限
-        api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+    # 3. 家长控制
+    official_rating = item.get("OfficialRating")
+    if official_rating:
+        if policy.get("MaxParentalRating") is not None:
+            # 分级到数值的映射由服务器决定
+            return None
+    else:
+        block_unrated = policy.get("BlockUnratedItems") or []
+        if block_unrated or policy.get("MaxParentalRating") is not None:
+            if not top_level:
+                return None
+            if item_type in block_unrated or (item_type == "Video" and "Movie" in block_unrated):
+                return False
+
+    return True
+
+def _probe_user_access(user_id: str, item_ids: List[str], base_url: str, api_key: str) -> Optional[Set[str]]:
+    """回退方案：用一次 /Users/{id}/Items?Ids= 查询该用户能看到哪些项目。"""
+    api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 30)
+    visible = set()
+    for i in range(0, len(item_ids), 100):
+        chunk = item_ids[i:i + 100]
+        params = {"api_key": api_key, "Ids": ",".join(chunk), "Fields": "Id"}
+        try:
+            response = emby_client.get(api_url, params=params, timeout=api_timeout)
+            response.raise_for_status()
+            visible.update(item["Id"] for item in response.json().get("Items", []) if item.get("Id"))
+        except Exception as e:
+            logger.warning(f"  ➜ 为用户 {user_id} 实时检查项目访问权限时出错: {e}")
+            return None
+    return visible
+
+def get_user_ids_with_access_to_items(item_ids: List[str], base_url: str, api_key: str) -> Dict[str, List[str]]:
+    """
+    批量获取对每个媒体项拥有原生访问权限的用户ID列表：{item_id: [user_id, ...]}。
+    优先根据缓存的用户 Policy 与项目所在媒体库、分级、标签在本地判定，
+    只有无法确定的 (用户, 项目) 组合才向 Emby 实时查询，且每个用户只查询一次。
+    """
+    item_ids = list(dict.fromkeys(i for i in item_ids if i))
+    if not item_ids or not base_url or not api_key:
+        logger.error("get_user_ids_with_access_to_items: 缺少必要参数。")
+        return {}
+
+    all_users, libraries = _get_users_and_libraries_cached(base_url, api_key)
+    if not all_users:
+        logger.error("无法获取用户列表，无法确定项目访问权限。")
+        return {}
+
+    # 1. 一次性取回所有项目的路径、分级、标签
+    items_by_id: Dict[str, Dict[str, Any]] = {}
+    api_url = f"{base_url.rstrip('/')}/Items"
+    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 30)
+    for i in range(0, len(item_ids), 100):
         params = {
             "api_key": api_key,
-            "Ids": item_id,
-            "Limit": 1,
-            "Fields": "Id"  # 只请求最少的数据以提高效率
+            "Ids": ",".join(item_ids[i:i + 100]),
+            "Fields": "Path,OfficialRating,Tags,TagItems",
         }
-        api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 30)
-
         try:
-            response = requests.get(api_url, params=params, timeout=api_timeout)
-            # 只要成功返回200，就说明在用户视图内
-            if response.status_code == 200:
-                data = response.json()
-                # 再次确认 Items 列表不为空
-                if data.get("Items"):
-                    with lock:
-                        user_ids_with_access.append(user_id)
-                    logger.trace(f"  ➜ 权限检查：用户 '{user.get('Name')}' 可以访问项目 {item_id}。")
+            response = emby_client.get(api_url, params=params, timeout=api_timeout)
+            response.raise_for_status()
+            for item in response.json().get("Items", []):
+                items_by_id[item.get("Id")] = item
         except Exception as e:
-            logger.warning(f"  ➜ 为用户 '{user.get('Name')}' 检查项目 {item_id} 访问权限时出错: {e}")
+            logger.warning(f"  ➜ 批量获取项目信息失败，相关项目将回退为实时查询: {e}")
+
+    # 2. 本地判定
+    access: Dict[str, List[str]] = {item_id: [] for item_id in item_ids}
+    ambiguous: Dict[str, List[str]] = {}
+    for item_id in item_ids:
+        item = items_by_id.get(item_id)
+        library = _match_library_by_path(item["Path"], libraries) if item and item.get("Path") else None
+        library_id = library.get("Id") if library else None
+        for user in all_users:
+            user_id = user.get("Id")
+            if not user_id:
+                continue
+            decision = _resolve_access_by_policy(user.get("Policy") or {}, item, library_id) if item else None
+            if decision is None:
+                ambiguous.setdefault(user_id, []).append(item_id)
+            elif decision:
+                access[item_id].append(user_id)
+
+    # 3. 回退：每个存在不确定项目的用户只发一次请求
+    if ambiguous:
+        logger.debug(f"  ➜ {len(ambiguous)} 个用户的权限无法在本地判定，回退为实时查询。")
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            future_to_user = {
+                executor.submit(_probe_user_access, user_id, ids, base_url, api_key): (user_id, ids)
+                for user_id, ids in ambiguous.items()
+            }
+            for future in as_completed(future_to_user):
+                user_id, ids = future_to_user[future]
+                visible = future.result()
+                if not visible:
+                    continue
+                for item_id in ids:
+                    if item_id in visible:
+                        access[item_id].append(user_id)
+
+    logger.debug(f"  ➜ 权限检查完成：{len(item_ids)} 个项目，{len(all_users)} 个用户，实时查询 {len(ambiguous)} 次。")
+    return access
 
-    logger.debug(f"  ➜ 开始为 {len(all_users)} 个用户并发检查新项目 {item_id} 的访问权限...")
-    # 使用 concurrent.futures.ThreadPoolExecutor 来并发执行检查
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # 提交所有用户的检查任务
-        futures = [executor.submit(check_access_for_user, user) for user in all_users]
-        # 等待所有任务完成
-        for future in concurrent.futures.as_completed(futures):
-            pass  # 我们不需要处理返回值，因为函数内部直接操作列表
-    
-    logger.debug(f"  ➜ 权限检查完成，共有 {len(user_ids_with_access)} 个用户可以访问新项目。")
-    return user_ids_with_access
+def get_user_ids_with_access_to_item(item_id: str, base_url: str, api_key: str) -> List[str]:
+    """
+    获取对特定媒体项拥有原生访问权限的所有用户ID列表。
+    单项目版本，内部走 get_user_ids_with_access_to_items。
+    """
+    if not all([item_id, base_url, api_key]):
+        logger.error("get_user_ids_with_access_to_item: 缺少必要参数。")
+        return []
+    return get_user_ids_with_access_to_items([item_id], base_url, api_key).get(item_id, [])
 
 # --- 用户管理模块 ---
 def create_user_with_policy(
@@ -1999,7 +2379,7 @@ def create_user_with_policy(
     
     try:
         # ★★★ 3. 请求体不再包含 Policy ★★★
-        response = requests.post(create_url, headers=headers, json=create_payload, timeout=15)
+        response = emby_client.post(create_url, headers=headers, json=create_payload, timeout=15)
         
         if response.status_code == 200:
             new_user_data = response.json()
@@ -2017,7 +2397,7 @@ def create_user_with_policy(
                 "NewPw": password
             }
             
-            pw_response = requests.post(password_url, headers=headers, json=password_payload, timeout=15)
+            pw_response = emby_client.post(password_url, headers=headers, json=password_payload, timeout=15)
             
             if pw_response.status_code == 204:
                 logger.info(f"  ✅ 成功为用户 '{username}' 设置密码。")
@@ -2068,7 +2448,7 @@ def set_user_disabled_status(
             "Content-Type": "application/json"
         }
         
-        response = requests.post(policy_update_url, headers=headers, json=current_policy, timeout=15)
+        response = emby_client.post(policy_update_url, headers=headers, json=current_policy, timeout=15)
         
         if response.status_code == 204:
             logger.info(f"✅ 成功{action_text}用户 '{user_name_for_log}'。")
@@ -2095,7 +2475,7 @@ def get_user_details(user_id: str, base_url: str, api_key: str) -> Optional[Dict
     # 1. 总是先调用基础的用户信息接口
     user_info_url = f"{base_url}/Users/{user_id}"
     try:
-        response = requests.get(user_info_url, headers=headers, timeout=10)
+        response = emby_client.get(user_info_url, headers=headers, timeout=10)
         response.raise_for_status()
         user_data = response.json()
         details.update(user_data)
@@ -2113,7 +2493,7 @@ def get_user_details(user_id: str, base_url: str, api_key: str) -> Optional[Dict
     logger.trace(f"  ➜ 主用户接口未返回 Configuration，尝试请求专用接口 (新版 Emby 模式)...")
     config_url = f"{base_url}/Users/{user_id}/Configuration"
     try:
-        response = requests.get(config_url, headers=headers, timeout=10)
+        response = emby_client.get(config_url, headers=headers, timeout=10)
         response.raise_for_status()
         details['Configuration'] = response.json()
     except requests.RequestException as e:
@@ -2135,7 +2515,7 @@ def force_set_user_configuration(user_id: str, configuration_dict: Dict[str, Any
     url = f"{base_url}/Users/{user_id}/Configuration"
     headers = {"X-Emby-Token": api_key, "Content-Type": "application/json"}
     try:
-        response = requests.post(url, headers=headers, json=configuration_dict, timeout=15)
+        response = emby_client.post(url, headers=headers, json=configuration_dict, timeout=15)
         response.raise_for_status()
         logger.info(f"  ➜ 成功为用户 {user_id} 应用了个性化配置 (新版接口)。")
         return True
@@ -2156,7 +2536,7 @@ def force_set_user_configuration(user_id: str, configuration_dict: Dict[str, Any
             
             # c. 提交这个完整的对象进行更新
             update_url = f"{base_url}/Users/{user_id}"
-            update_response = requests.post(update_url, headers=headers, json=full_user_object, timeout=15)
+            update_response = emby_client.post(update_url, headers=headers, json=full_user_object, timeout=15)
             
             try:
                 update_response.raise_for_status()
@@ -2210,7 +2590,7 @@ def force_set_user_policy(user_id: str, policy: Dict[str, Any], base_url: str, a
     }
     
     try:
-        response = requests.post(policy_update_url, headers=headers, json=policy, timeout=15)
+        response = emby_client.post(policy_update_url, headers=headers, json=policy, timeout=15)
         
         if response.status_code == 204: # 204 No Content 表示成功
             logger.info(f"  ✅ 成功为用户 '{user_name_for_log}' 应用了新的权限策略。")
@@ -2257,7 +2637,7 @@ def delete_emby_user(user_id: str) -> bool:
     api_timeout = config.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
     
     try:
-        response = requests.delete(api_url, headers=headers, timeout=api_timeout)
+        response = emby_client.delete(api_url, headers=headers, timeout=api_timeout)
         response.raise_for_status()
         logger.info(f"  ✅ 成功删除 Emby 用户 '{user_name_for_log}' (ID: {user_id})。")
         return True
@@ -2309,7 +2689,7 @@ def authenticate_emby_user(username: str, password: str) -> Optional[Dict[str, A
     
     try:
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.post(auth_url, headers=headers, json=payload, timeout=api_timeout)
+        response = emby_client.post(auth_url, headers=headers, json=payload, timeout=api_timeout)
         
         logger.debug(f"  ➜ Emby 服务器响应状态码: {response.status_code}")
 
@@ -5,13 +5,20 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import json
 import time
+import re
+import hashlib
+import functools
 import concurrent.futures
+from contextlib import contextmanager
+from flask import has_request_context
+from datetime import date, datetime, timedelta
 from utils import contains_chinese, normalize_name_for_matching
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Any, Callable, Tuple
 import logging
 import config_manager
 import constants
 import threading
+from database import tmdb_cache_db
 logger = logging.getLogger(__name__)
 
 # ★★★ 自定义的重试类，用于输出更友好的日志 ★★★
@@ -19,7 +26,10 @@ class LoggedRetry(Retry):
     """
     一个继承自 urllib3.Retry 的自定义类，
     用于在每次重试时记录一条更清晰、更友好的日志消息。
+    子类可以覆盖 service_name，让日志标明是哪个服务在重试。
     """
+    service_name = "TMDb"
+
     def increment(self, method, url, response=None, error=None, _pool=None, _stacktrace=None):
         # 首先，调用父类的 increment 方法。
         # 如果不应该重试了（例如，达到最大次数），它会抛出异常，
@@ -43,20 +53,139 @@ class LoggedRetry(Retry):
         
         # 记录一条警告级别的日志，这样既能引起注意又不会像错误一样吓人
         logger.warning(
-            f"  ➜ TMDb API 请求失败 ({reason})。将在 {backoff_time:.2f} 秒后重试... (第 {attempt_number}/{self.total} 次)"
+            f"  ➜ {self.service_name} API 请求失败 ({reason})。将在 {backoff_time:.2f} 秒后重试... (第 {attempt_number}/{self.total} 次)"
         )
 
         return new_retry
 
 
+# --- 全进程共享的 TMDb 限流 ---
+# 所有经过 tmdb_session 的请求 (包括 urllib3 自动重试之外的每一次发送) 都先从同一个令牌桶取令牌，
+# 不论有多少个线程池、多少个任务同时在跑，总速率都不会超过配置的上限。
+# 令牌不足时按优先级排队：界面交互 > Webhook > 计划任务/批量任务。
+PRIORITY_INTERACTIVE = 0
+PRIORITY_WEBHOOK = 1
+PRIORITY_BATCH = 2
+_PRIORITY_NAMES = ("interactive", "webhook", "batch")
+
+class TmdbRateLimiter:
+    """带优先级的令牌桶。低优先级的请求只有在没有更高优先级请求等待时才能拿到令牌。"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = max(0.1, float(rate_per_second))
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._cond = threading.Condition(threading.Lock())
+        self._waiting = [0] * len(_PRIORITY_NAMES)
+        self._stats = [{"granted": 0, "waited": 0, "wait_time_total": 0.0, "wait_time_max": 0.0} for _ in _PRIORITY_NAMES]
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, priority: int = PRIORITY_BATCH):
+        priority = min(max(int(priority), 0), len(_PRIORITY_NAMES) - 1)
+        started_at = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    self._refill(time.monotonic())
+                    higher_waiting = any(self._waiting[:priority])
+                    if self._tokens >= 1 and not higher_waiting:
+                        self._tokens -= 1
+                        break
+                    # 有令牌但要让位给更高优先级时，短暂等待后再检查
+                    timeout = 0.05 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started_at
+            stats = self._stats[priority]
+            stats["granted"] += 1
+            if waited > 0.001:
+                stats["waited"] += 1
+                stats["wait_time_total"] += waited
+                stats["wait_time_max"] = max(stats["wait_time_max"], waited)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_second": self.rate,
+                "burst": int(self.capacity),
+                "tokens_available": round(self._tokens, 2),
+                "priorities": {
+                    name: {
+                        "granted": stats["granted"],
+                        "waited": stats["waited"],
+                        "waiting_now": self._waiting[i],
+                        "avg_wait_ms": round(stats["wait_time_total"] / stats["waited"] * 1000, 1) if stats["waited"] else 0.0,
+                        "max_wait_ms": round(stats["wait_time_max"] * 1000, 1),
+                    }
+                    for i, (name, stats) in enumerate(zip(_PRIORITY_NAMES, self._stats))
+                },
+            }
+
+tmdb_rate_limiter = TmdbRateLimiter(constants.TMDB_RATE_LIMIT_PER_SECOND, constants.TMDB_RATE_LIMIT_BURST)
+_priority_local = threading.local()
+
+@contextmanager
+def request_priority(priority: int):
+    """在当前线程内临时指定 TMDb 请求的优先级。"""
+    previous = getattr(_priority_local, "value", None)
+    _priority_local.value = priority
+    try:
+        yield
+    finally:
+        _priority_local.value = previous
+
+def current_request_priority() -> int:
+    """显式指定的优先级优先；否则在 Flask 请求内视为界面交互，其余一律按批量任务处理。"""
+    explicit = getattr(_priority_local, "value", None)
+    if explicit is not None:
+        return explicit
+    return PRIORITY_INTERACTIVE if has_request_context() else PRIORITY_BATCH
+
+def with_priority(priority: int, func: Callable) -> Callable:
+    """包装一个函数，使其内部发出的 TMDb 请求都使用指定优先级。"""
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        with request_priority(priority):
+            return func(*args, **kwargs)
+    return _wrapper
+
+def bind_priority(func: Callable) -> Callable:
+    """把调用方当前的优先级绑定到函数上，供提交到线程池时使用 (线程池里的线程不会继承优先级)。"""
+    return with_priority(current_request_priority(), func)
+
+def get_tmdb_rate_limiter_stats() -> Dict[str, Any]:
+    """返回 TMDb 限流器的运行指标。"""
+    return tmdb_rate_limiter.get_stats()
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+    """每次发送前先向限流器申请令牌的 HTTPAdapter。"""
+
+    def __init__(self, rate_limiter: TmdbRateLimiter, *args, **kwargs):
+        self._rate_limiter = rate_limiter
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        self._rate_limiter.acquire(current_request_priority())
+        return super().send(request, **kwargs)
+
 # ★★★ 创建带重试功能的 Session (已修改为使用 LoggedRetry) ★★★
 def requests_retry_session(
     retries=3,
     backoff_factor=0.5,
     status_forcelist=(500, 502, 503, 504),
     session=None,
+    rate_limiter: Optional[TmdbRateLimiter] = None,
 ):
-    """创建一个配置了重试策略的 requests.Session 对象"""
+    """创建一个配置了重试策略的 requests.Session 对象，传入 rate_limiter 时所有请求都会先经过限流。"""
     session = session or requests.Session()
     retry = LoggedRetry(
         total=retries,
@@ -66,14 +195,14 @@ def requests_retry_session(
         status_forcelist=status_forcelist,
         allowed_methods=frozenset(['HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS', 'TRACE', 'POST']),
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = RateLimitedHTTPAdapter(rate_limiter, max_retries=retry) if rate_limiter else HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
 # 创建一个全局的、可复用的、带重试功能的 session 实例
-# 整个程序将通过这个实例来请求 TMDB API
-tmdb_session = requests_retry_session()
+# 整个程序将通过这个实例来请求 TMDB API；429 也会按 Retry-After 自动重试
+tmdb_session = requests_retry_session(status_forcelist=(429, 500, 502, 503, 504), rate_limiter=tmdb_rate_limiter)
 
 def get_tmdb_api_base_url() -> str:
     """
@@ -86,29 +215,138 @@ DEFAULT_LANGUAGE = "zh-CN"
 DEFAULT_REGION = "CN"
 
 
-def _tmdb_request(endpoint: str, api_key: str, params: Optional[Dict[str, Any]] = None, use_default_language: bool = True) -> Optional[Dict[str, Any]]:
-    """【V2.1 - 最终驱魔版】增加了 use_default_language 开关，用于控制是否添加默认语言参数。"""
-    if not api_key:
-        logger.error("TMDb API Key 未提供，无法发起请求。")
-        return None
+# --- 持久化响应缓存 ---
+# 所有经过 _tmdb_request 的 GET 都先查 tmdb_api_cache 表：
+# - 键为 endpoint + 规范化后的参数 (去掉 api_key、空值，按键排序)，与参数书写顺序无关。
+# - 有效期按资源类别决定，见 _cache_ttl_for。
+# - 过期条目带 ETag 时发条件请求，304 只顺延有效期；网络失败时用过期条目兜底。
+# - 同一个键同时只有一个请求真正访问网络，其余等待后直接读缓存。
+_CACHE_EXCLUDED_PARAMS = frozenset({"api_key"})
+_MOVIE_ENDPOINT_RE = re.compile(r"^/movie/\d+$")
+_TV_ENDPOINT_RE = re.compile(r"^/tv/\d+$")
+_SEASON_ENDPOINT_RE = re.compile(r"^/tv/\d+/season/-?\d+$")
+_EPISODE_ENDPOINT_RE = re.compile(r"^/tv/\d+/season/-?\d+/episode/-?\d+$")
+_PERSON_ENDPOINT_RE = re.compile(r"^/person/\d+(/[a-z_]+)?$")
+_REFERENCE_ENDPOINT_RE = re.compile(r"^/(genre/|collection/\d+$|company/\d+$)")
+_LISTING_ENDPOINT_PREFIXES = ("/search/", "/discover/", "/find/", "/list/", "/trending/", "/movie/popular", "/tv/popular")
+_TV_STABLE_STATUSES = frozenset({"Ended", "Canceled"})
+
+_cache_stats_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale_served": 0, "coalesced": 0, "bypassed": 0}
+_inflight_lock = threading.Lock()
+_inflight_keys: Dict[str, list] = {}   # cache_key -> [Lock, 等待者数量]
+_last_purge_at = 0.0
+_PURGE_INTERVAL_SECONDS = 3600
+
+def _count_cache(event: str):
+    with _cache_stats_lock:
+        _cache_stats[event] += 1
+
+def get_tmdb_cache_stats() -> Dict[str, Any]:
+    """返回 TMDb 响应缓存的命中统计与缓存表规模。"""
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    served_locally = stats["hits"] + stats["coalesced"] + stats["revalidated"]
+    lookups = served_locally + stats["misses"] + stats["stale_served"]
+    stats["hit_ratio"] = round(served_locally / lookups, 4) if lookups else 0.0
+    stats["enabled"] = _cache_enabled()
+    stats.update(tmdb_cache_db.get_cache_summary())
+    return stats
+
+def _cache_enabled() -> bool:
+    return bool(config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_TMDB_CACHE_ENABLED, True))
+
+def _cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    normalized = sorted(
+        (str(k), str(v)) for k, v in params.items()
+        if k not in _CACHE_EXCLUDED_PARAMS and v is not None and v != ""
+    )
+    raw = f"{endpoint}?{json.dumps(normalized, ensure_ascii=False)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
-    tmdb_base_url = get_tmdb_api_base_url()
-    full_url = f"{tmdb_base_url}{endpoint}"
-    base_params = {
-        "api_key": api_key,
-    }
-    # 只有当开启 use_default_language 时，才添加默认语言参数
-    if use_default_language:
-        base_params["language"] = DEFAULT_LANGUAGE
-    if params:
-        base_params.update(params)
+def _parse_tmdb_date(value: Any) -> Optional[date]:
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").date() if value else None
+    except ValueError:
+        return None
 
+def _aired_long_ago(air_dates: List[Optional[date]]) -> bool:
+    """所有日期都已知且早于“最近播出”窗口时才算稳定。"""
+    if not air_dates or any(d is None for d in air_dates):
+        return False
+    cutoff = date.today() - timedelta(days=constants.TMDB_CACHE_RECENT_AIR_DAYS)
+    return max(air_dates) < cutoff
+
+def _cache_ttl_for(endpoint: str, data: Any) -> int:
+    """按资源类别与内容决定缓存有效期 (秒)。"""
+    if not isinstance(data, dict):
+        return constants.TMDB_CACHE_TTL_DEFAULT_SECONDS
+    stable, active = constants.TMDB_CACHE_TTL_STABLE_SECONDS, constants.TMDB_CACHE_TTL_ACTIVE_SECONDS
+
+    if _MOVIE_ENDPOINT_RE.match(endpoint):
+        release_date = _parse_tmdb_date(data.get("release_date"))
+        if release_date and release_date < date.today() - timedelta(days=constants.TMDB_CACHE_RECENT_RELEASE_DAYS):
+            return stable
+        return active
+    if _TV_ENDPOINT_RE.match(endpoint):
+        return stable if data.get("status") in _TV_STABLE_STATUSES else active
+    if _SEASON_ENDPOINT_RE.match(endpoint):
+        episodes = data.get("episodes") or []
+        return stable if _aired_long_ago([_parse_tmdb_date(ep.get("air_date")) for ep in episodes]) else active
+    if _EPISODE_ENDPOINT_RE.match(endpoint):
+        return stable if _aired_long_ago([_parse_tmdb_date(data.get("air_date"))]) else active
+    if _PERSON_ENDPOINT_RE.match(endpoint):
+        return constants.TMDB_CACHE_TTL_PERSON_SECONDS
+    if _REFERENCE_ENDPOINT_RE.match(endpoint):
+        return constants.TMDB_CACHE_TTL_REFERENCE_SECONDS
+    if endpoint.startswith(_LISTING_ENDPOINT_PREFIXES):
+        return constants.TMDB_CACHE_TTL_LISTING_SECONDS
+    return constants.TMDB_CACHE_TTL_DEFAULT_SECONDS
+
+@contextmanager
+def _single_flight(cache_key: str):
+    """同一个缓存键同一时刻只允许一个调用者访问网络。"""
+    with _inflight_lock:
+        entry = _inflight_keys.get(cache_key)
+        if entry is None:
+            entry = [threading.Lock(), 0]
+            _inflight_keys[cache_key] = entry
+        entry[1] += 1
+    waited = not entry[0].acquire(blocking=False)
+    if waited:
+        entry[0].acquire()
+    try:
+        yield waited
+    finally:
+        entry[0].release()
+        with _inflight_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _inflight_keys.pop(cache_key, None)
+
+def _maybe_purge_cache():
+    global _last_purge_at
+    now = time.monotonic()
+    if _last_purge_at and now - _last_purge_at < _PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge_at = now
+    removed = tmdb_cache_db.purge_expired_responses(constants.TMDB_CACHE_PURGE_GRACE_DAYS)
+    if removed:
+        logger.debug(f"  ➜ 已清理 {removed} 条早已过期的 TMDb 缓存。")
+
+def _tmdb_fetch(full_url: str, params: Dict[str, Any], etag: Optional[str] = None) -> Optional[Tuple[int, Any, Optional[str]]]:
+    """
+    真正访问网络。成功时返回 (状态码, 数据, ETag)，304 时数据为 None；失败返回 None。
+    """
+    headers = {"If-None-Match": etag} if etag else None
+    response = None
     try:
         proxies = config_manager.get_proxies_for_requests()
-        response = tmdb_session.get(full_url, params=base_params, timeout=15, proxies=proxies)
+        response = tmdb_session.get(full_url, params=params, timeout=15, proxies=proxies, headers=headers)
+        if response.status_code == 304:
+            return 304, None, etag
         response.raise_for_status()
-        data = response.json()
-        return data
+        return response.status_code, response.json(), response.headers.get("ETag")
     except requests.exceptions.HTTPError as e:
         error_details = ""
         try:
@@ -122,8 +360,69 @@ def _tmdb_request(endpoint: str, api_key: str, params: Optional[Dict[str, Any]]
         logger.error(f"  ➜ 所有重试后 TMDb API 请求均出现错误: {e}. URL: {full_url}", exc_info=False)
         return None
     except json.JSONDecodeError as e:
-        logger.error(f"  ➜ TMDb API JSON 解码错误: {e}. URL: {full_url}. Response: {response.text[:200] if response else 'N/A'}", exc_info=False)
+        logger.error(f"  ➜ TMDb API JSON 解码错误: {e}. URL: {full_url}. Response: {response.text[:200] if response is not None else 'N/A'}", exc_info=False)
+        return None
+
+def _tmdb_request(endpoint: str, api_key: str, params: Optional[Dict[str, Any]] = None, use_default_language: bool = True, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    【V3 - 缓存版】增加了 use_default_language 开关，用于控制是否添加默认语言参数。
+    use_cache=False 时跳过持久化缓存，直接请求网络 (结果也不写回缓存)。
+    """
+    if not api_key:
+        logger.error("TMDb API Key 未提供，无法发起请求。")
         return None
+
+    tmdb_base_url = get_tmdb_api_base_url()
+    full_url = f"{tmdb_base_url}{endpoint}"
+    base_params = {
+        "api_key": api_key,
+    }
+    # 只有当开启 use_default_language 时，才添加默认语言参数
+    if use_default_language:
+        base_params["language"] = DEFAULT_LANGUAGE
+    if params:
+        base_params.update(params)
+
+    if not use_cache or not _cache_enabled():
+        _count_cache("bypassed")
+        result = _tmdb_fetch(full_url, base_params)
+        return result[1] if result else None
+
+    cache_key = _cache_key(endpoint, base_params)
+    cached = tmdb_cache_db.get_cached_response(cache_key)
+    if cached and cached["is_fresh"]:
+        _count_cache("hits")
+        return cached["response_json"]
+
+    with _single_flight(cache_key) as waited:
+        # 等锁期间别的调用者可能已经刷新了这条缓存
+        if waited:
+            refreshed = tmdb_cache_db.get_cached_response(cache_key)
+            if refreshed and refreshed["is_fresh"]:
+                _count_cache("coalesced")
+                return refreshed["response_json"]
+            cached = refreshed or cached
+
+        result = _tmdb_fetch(full_url, base_params, etag=cached.get("etag") if cached else None)
+        if result is None:
+            if cached:
+                _count_cache("stale_served")
+                logger.warning(f"  ➜ TMDb 请求失败，暂用已过期的缓存数据: {endpoint}")
+                return cached["response_json"]
+            return None
+
+        status, data, etag = result
+        if status == 304 and cached:
+            _count_cache("revalidated")
+            tmdb_cache_db.touch_cached_response(cache_key, _cache_ttl_for(endpoint, cached["response_json"]))
+            return cached["response_json"]
+        if data is None:
+            return None
+
+        _count_cache("misses")
+        tmdb_cache_db.save_cached_response(cache_key, endpoint, data, etag, _cache_ttl_for(endpoint, data))
+        _maybe_purge_cache()
+        return data
 # --- 获取电影的详细信息 ---
 def get_movie_details(movie_id: int, api_key: str, append_to_response: Optional[str] = "credits,videos,images,keywords,external_ids,translations,release_dates") -> Optional[Dict[str, Any]]:
     """
@@ -159,9 +458,10 @@ def get_movie_details(movie_id: int, api_key: str, append_to_response: Optional[
 
     return details
 # --- 获取电视剧的详细信息 ---
-def get_tv_details(tv_id: int, api_key: str, append_to_response: Optional[str] = "credits,videos,images,keywords,external_ids,translations,content_ratings") -> Optional[Dict[str, Any]]:
+def get_tv_details(tv_id: int, api_key: str, append_to_response: Optional[str] = "credits,videos,images,keywords,external_ids,translations,content_ratings", use_cache: bool = True) -> Optional[Dict[str, Any]]:
     """
     【已升级】获取电视剧的详细信息。
+    use_cache=False 时绕过持久化缓存，供追剧刷新、新季检查等必须看到最新状态的调用方使用。
     """
     endpoint = f"/tv/{tv_id}"
     params = {
@@ -170,7 +470,7 @@ def get_tv_details(tv_id: int, api_key: str, append_to_response: Optional[str] =
         "append_to_response": append_to_response or "" 
     }
     logger.trace(f"TMDb: 获取电视剧详情 (ID: {tv_id})")
-    details = _tmdb_request(endpoint, api_key, params)
+    details = _tmdb_request(endpoint, api_key, params, use_cache=use_cache)
     
     # 同样可以为剧集补充英文标题
     if details and details.get("original_language") != "en" and DEFAULT_LANGUAGE.startswith("zh"):
@@ -183,7 +483,7 @@ def get_tv_details(tv_id: int, api_key: str, append_to_response: Optional[str] =
         if not details.get("english_name"):
             logger.trace(f"  尝试获取剧集 {tv_id} 的英文名...")
             en_params = {"language": "en-US"}
-            en_details = _tmdb_request(f"/tv/{tv_id}", api_key, en_params)
+            en_details = _tmdb_request(f"/tv/{tv_id}", api_key, en_params, use_cache=use_cache)
             if en_details and en_details.get("name"):
                 details["english_name"] = en_details.get("name")
                 logger.trace(f"  通过请求英文版补充剧集英文名: {details['english_name']}")
@@ -217,9 +517,10 @@ def get_person_details_tmdb(person_id: int, api_key: str, append_to_response: Op
 
     return details
 # --- 获取电视剧某一季的详细信息 ---
-def get_season_details_tmdb(tv_id: int, season_number: int, api_key: str, append_to_response: Optional[str] = "credits", item_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+def get_season_details_tmdb(tv_id: int, season_number: int, api_key: str, append_to_response: Optional[str] = "credits", item_name: Optional[str] = None, use_cache: bool = True) -> Optional[Dict[str, Any]]:
     """
     【已升级】获取电视剧某一季的详细信息，并支持 item_name 用于日志。
+    use_cache=False 时绕过持久化缓存。
     """
     endpoint = f"/tv/{tv_id}/season/{season_number}"
     params = {
@@ -230,9 +531,9 @@ def get_season_details_tmdb(tv_id: int, season_number: int, api_key: str, append
     item_name_for_log = f"'{item_name}' " if item_name else ""
     logger.debug(f"  ➜ TMDb API: 获取电视剧 {item_name_for_log}(ID: {tv_id}) 第 {season_number} 季的详情...")
     
-    return _tmdb_request(endpoint, api_key, params)
+    return _tmdb_request(endpoint, api_key, params, use_cache=use_cache)
 # --- 获取电视剧某一季的详细信息，简化调用版 ---
-def get_tv_season_details(tv_id: int, season_number: int, api_key: str) -> Optional[Dict[str, Any]]:
+def get_tv_season_details(tv_id: int, season_number: int, api_key: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
     """
     获取电视剧某一季的详细信息。
     这是 get_season_details_tmdb 的一个更简洁的别名，用于简化调用并获取海报。
@@ -243,19 +544,20 @@ def get_tv_season_details(tv_id: int, season_number: int, api_key: str) -> Optio
         tv_id=tv_id,
         season_number=season_number,
         api_key=api_key,
-        append_to_response=None
+        append_to_response=None,
+        use_cache=use_cache
     )
 # --- 接收一个剧集 TMDB ID 列表，并发地获取所有这些剧集的完整子项（季、集）信息 ---
 def batch_get_full_series_details_tmdb(
     series_tmdb_ids: List[str], 
     api_key: str, 
-    max_workers: int = 5, # <-- 将默认并发数从10降低到5，更加安全
+    max_workers: int = constants.TMDB_MAX_WORKERS,
     progress_callback: Optional[Callable] = None
 ) -> Dict[str, List[Dict]]:
     """
-    【V1.2 - 稳定防崩溃版】
+    【V1.3 - 全局限流版】
     接收一个剧集 TMDB ID 列表，并发地获取所有这些剧集的完整子项（季、集）信息。
-    通过降低默认并发数和增加请求间隔，防止触发TMDb的速率限制。
+    速率由全局 TMDb 限流器控制，这里不再自行延时。
     """
     if not series_tmdb_ids or not api_key:
         return {}
@@ -285,10 +587,6 @@ def batch_get_full_series_details_tmdb(
                 season_details = get_season_details_tmdb(tv_id, season_num, api_key)
                 if season_details and season_details.get("episodes"):
                     children.extend(season_details["episodes"])
-                
-                # ★★★ 核心修复 2/2：在这里加入一个微小的延时 ★★★
-                # 这会极大地增加程序的稳定性，避免被服务器拒绝连接。
-                time.sleep(0.05) # 暂停 50 毫秒
 
             return children
         except Exception as e:
@@ -296,7 +594,8 @@ def batch_get_full_series_details_tmdb(
             return None
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_id = {executor.submit(_fetch_one_series_all_children, tv_id): tv_id for tv_id in series_tmdb_ids}
+        fetch_one = bind_priority(_fetch_one_series_all_children)
+        future_to_id = {executor.submit(fetch_one, tv_id): tv_id for tv_id in series_tmdb_ids}
         
         for future in concurrent.futures.as_completed(future_to_id):
             tv_id = future_to_id[future]
@@ -321,7 +620,7 @@ def batch_get_full_series_details_tmdb(
 def aggregate_full_series_data_from_tmdb(
     tv_id: int,
     api_key: str,
-    max_workers: int = 5  # ★★★ 并发数，可以从外部配置传入 ★★★
+    max_workers: int = constants.TMDB_MAX_WORKERS  # ★★★ 并发数，可以从外部配置传入 ★★★
 ) -> Optional[Dict[str, Any]]:
     """
     【V1 - 并发聚合版】
@@ -366,14 +665,16 @@ def aggregate_full_series_data_from_tmdb(
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 使用字典来映射 future 和它的任务描述，方便后续处理
         future_to_task = {}
+        fetch_season = bind_priority(get_season_details_tmdb)
+        fetch_episode = bind_priority(get_episode_details_tmdb)
         for task in tasks:
             if task[0] == "season":
                 _, tvid, s_num = task
-                future = executor.submit(get_season_details_tmdb, tvid, s_num, api_key)
+                future = executor.submit(fetch_season, tvid, s_num, api_key)
                 future_to_task[future] = f"S{s_num}"
             elif task[0] == "episode":
                 _, tvid, s_num, e_num = task
-                future = executor.submit(get_episode_details_tmdb, tvid, s_num, e_num, api_key)
+                future = executor.submit(fetch_episode, tvid, s_num, e_num, api_key)
                 future_to_task[future] = f"S{s_num}E{e_num}"
 
         # 收集结果
@@ -431,7 +732,7 @@ def find_person_by_external_id(external_id: str, api_key: str, source: str = "im
     logger.debug(f"TMDb: 正在通过 {source} '{external_id}' 查找人物...")
     try:
         proxies = config_manager.get_proxies_for_requests()
-        response = requests.get(api_url, params=params, timeout=10, proxies=proxies)
+        response = tmdb_session.get(api_url, params=params, timeout=10, proxies=proxies)
         response.raise_for_status()
         data = response.json()
         person_results = data.get("person_results", [])
@@ -640,7 +941,7 @@ def get_tmdb_id_by_imdb_id(imdb_id: str, api_key: str, media_type: str) -> Optio
         "api_key": api_key,
         "external_source": "imdb_id"
     }
-    resp = requests.get(url, params=params)
+    resp = tmdb_session.get(url, params=params, timeout=15, proxies=config_manager.get_proxies_for_requests())
     if resp.status_code == 200:
         data = resp.json()
         if media_type.lower() == 'movie' and data.get('movie_results'):
@@ -0,0 +1,315 @@
+# log_index.py
+"""
+日志搜索索引。
+在日志目录下维护一个 SQLite 旁路索引 (FTS5 trigram)，按文件 inode 跟踪每个 app.log* 已入库的字节数：
+- 活动日志只追加新写入的完整行；
+- 轮转只是改名，inode 不变，已入库的内容直接沿用；
+- 被轮转淘汰的文件，其索引行随之删除。
+搜索时先做一次增量刷新，再用索引分页查询，避免每次都逐行扫描全部日志。
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE_PREFIX = "app.log"
+INDEX_FILE_NAME = ".log_search_index.db"
+
+TIMESTAMP_REGEX = re.compile(r"^(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})")
+START_MARKER = re.compile(r"(开始处理|手动处理)\s'(.+?)'\s\(TMDb ID: \d+\)")
+END_MARKER = re.compile(r"处理完成\s'(.+?)'")
+
+# 每写入这么多行提交一次，并让出一次协程，避免首次建索引时长时间阻塞其他请求
+_INDEX_BATCH_LINES = 5000
+# 用文件开头这么多字节的摘要识别 inode 被复用的情况
+_HEAD_FINGERPRINT_BYTES = 256
+# trigram 分词至少需要 3 个字符才能走全文索引，更短的关键词退回 LIKE
+_FTS_MIN_QUERY_LENGTH = 3
+
+_refresh_lock = threading.Lock()
+
+
+def _file_order(filename: str) -> int:
+    """app.log 为 0，app.log.N 为 N，其余排在最后。数字越大越旧。"""
+    if filename == LOG_FILE_PREFIX:
+        return 0
+    suffix = filename[len(LOG_FILE_PREFIX) + 1:]
+    return int(suffix) if suffix.isdigit() else 1_000_000
+
+
+def _head_fingerprint(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(_HEAD_FINGERPRINT_BYTES)).hexdigest()
+
+
+def _connect(log_directory: str) -> Tuple[sqlite3.Connection, bool]:
+    """打开索引库并确保表结构存在，返回 (连接, 是否支持 FTS5 trigram)。"""
+    conn = sqlite3.connect(os.path.join(log_directory, INDEX_FILE_NAME), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS log_files (
+            file_key TEXT PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            head_fingerprint TEXT,
+            indexed_bytes INTEGER NOT NULL DEFAULT 0,
+            line_count INTEGER NOT NULL DEFAULT 0,
+            last_ts TEXT
+        );
+        CREATE TABLE IF NOT EXISTS log_lines (
+            id INTEGER PRIMARY KEY,
+            file_key TEXT NOT NULL,
+            line_num INTEGER NOT NULL,
+            ts TEXT,
+            content TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_log_lines_file ON log_lines (file_key, line_num);
+        CREATE INDEX IF NOT EXISTS idx_log_lines_ts ON log_lines (ts);
+    """)
+    try:
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(
+                content, content='log_lines', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS log_lines_ai AFTER INSERT ON log_lines BEGIN
+                INSERT INTO log_fts(rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS log_lines_ad AFTER DELETE ON log_lines BEGIN
+                INSERT INTO log_fts(log_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+        """)
+        fts_supported = True
+    except sqlite3.OperationalError as e:
+        # 旧版 SQLite 不支持 trigram 分词，退回 LIKE，仍然比逐行读文件快
+        logger.debug(f"  ➜ 当前 SQLite 不支持 FTS5 trigram，日志搜索将使用 LIKE: {e}")
+        fts_supported = False
+    return conn, fts_supported
+
+
+def _drop_file(conn: sqlite3.Connection, file_key: str):
+    conn.execute("DELETE FROM log_lines WHERE file_key = ?", (file_key,))
+    conn.execute("DELETE FROM log_files WHERE file_key = ?", (file_key,))
+
+
+def _index_file_tail(conn: sqlite3.Connection, file_key: str, file_name: str, path: str, state: Optional[sqlite3.Row]):
+    """从上次入库的位置继续读取，只索引以换行结尾的完整行。"""
+    offset = state['indexed_bytes'] if state else 0
+    line_num = state['line_count'] if state else 0
+    last_ts = state['last_ts'] if state else None
+
+    if not state:
+        conn.execute(
+            "INSERT INTO log_files (file_key, file_name, head_fingerprint) VALUES (?, ?, ?)",
+            (file_key, file_name, _head_fingerprint(path))
+        )
+
+    batch = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # 半行留到下次，等写完再入库
+            offset += len(raw)
+            line_num += 1
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if not line:
+                continue
+            match = TIMESTAMP_REGEX.search(line)
+            if match:
+                last_ts = match.group(1)
+            # 没有时间戳的行（例如异常堆栈）沿用上一行的时间，便于按时间范围过滤
+            batch.append((file_key, line_num, last_ts, line))
+            if len(batch) >= _INDEX_BATCH_LINES:
+                _flush_batch(conn, file_key, file_name, batch, offset, line_num, last_ts)
+                batch = []
+                time.sleep(0)
+    _flush_batch(conn, file_key, file_name, batch, offset, line_num, last_ts)
+
+
+def _flush_batch(conn, file_key, file_name, batch, offset, line_num, last_ts):
+    if batch:
+        conn.executemany("INSERT INTO log_lines (file_key, line_num, ts, content) VALUES (?, ?, ?, ?)", batch)
+    conn.execute(
+        "UPDATE log_files SET file_name = ?, indexed_bytes = ?, line_count = ?, last_ts = ? WHERE file_key = ?",
+        (file_name, offset, line_num, last_ts, file_key)
+    )
+    conn.commit()
+
+
+def refresh_index(log_directory: str):
+    """让索引与日志目录保持一致：新增文件入库、活动文件追加、已淘汰文件删除。"""
+    with _refresh_lock:
+        conn, _ = _connect(log_directory)
+        try:
+            current: Dict[str, Tuple[str, int]] = {}
+            for name in os.listdir(log_directory):
+                if not name.startswith(LOG_FILE_PREFIX):
+                    continue
+                st = os.stat(os.path.join(log_directory, name))
+                current[f"{st.st_dev}:{st.st_ino}"] = (name, st.st_size)
+
+            known = {row['file_key']: row for row in conn.execute("SELECT * FROM log_files")}
+            for file_key in set(known) - set(current):
+                _drop_file(conn, file_key)
+            conn.commit()
+
+            # 从最旧的文件开始入库，使行 ID 大致按时间递增
+            for file_key, (name, size) in sorted(current.items(), key=lambda kv: _file_order(kv[1][0]), reverse=True):
+                path = os.path.join(log_directory, name)
+                state = known.get(file_key)
+                if state and (size < state['indexed_bytes'] or state['head_fingerprint'] != _head_fingerprint(path)):
+                    # 文件被截断或 inode 被新文件复用，整文件重建
+                    _drop_file(conn, file_key)
+                    state = None
+                if state and size == state['indexed_bytes']:
+                    if state['file_name'] != name:
+                        conn.execute("UPDATE log_files SET file_name = ? WHERE file_key = ?", (name, file_key))
+                        conn.commit()
+                    continue
+                _index_file_tail(conn, file_key, name, path, state)
+        finally:
+            conn.close()
+
+
+def _match_clause(query: str, fts_supported: bool) -> Tuple[str, List[Any]]:
+    if fts_supported and len(query) >= _FTS_MIN_QUERY_LENGTH:
+        phrase = '"' + query.replace('"', '""') + '"'
+        return "l.id IN (SELECT rowid FROM log_fts WHERE log_fts MATCH ?)", [phrase]
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return "l.content LIKE ? ESCAPE '\\'", [f"%{escaped}%"]
+
+
+def _time_clause(since: Optional[str], until: Optional[str]) -> Tuple[str, List[Any]]:
+    clauses, params = [], []
+    if since:
+        clauses.append("l.ts >= ?")
+        params.append(since)
+    if until:
+        # 只给日期时包含当天全部日志
+        clauses.append("l.ts <= ?")
+        params.append(until if len(until) > 10 else f"{until} 23:59:59")
+    return (" AND " + " AND ".join(clauses)) if clauses else "", params
+
+
+def search_lines(log_directory: str, query: str, since: Optional[str] = None, until: Optional[str] = None,
+                 limit: int = constants.LOG_SEARCH_MAX_RESULTS, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    按时间倒序分页返回包含关键词的日志行（不区分大小写）。
+    返回 (本页结果, 是否还有下一页)。
+    """
+    refresh_index(log_directory)
+    conn, fts_supported = _connect(log_directory)
+    try:
+        match_sql, params = _match_clause(query, fts_supported)
+        time_sql, time_params = _time_clause(since, until)
+        rows = conn.execute(f"""
+            SELECT f.file_name, l.line_num, l.content
+            FROM log_lines l JOIN log_files f ON f.file_key = l.file_key
+            WHERE {match_sql}{time_sql}
+            ORDER BY l.ts DESC, l.id DESC
+            LIMIT ? OFFSET ?
+        """, params + time_params + [limit + 1, offset])
+
+        results = []
+        for row in rows:
+            if len(results) == limit:
+                return results, True
+            match = TIMESTAMP_REGEX.search(row['content'])
+            results.append({
+                "file": row['file_name'],
+                "line_num": row['line_num'],
+                "content": row['content'],
+                "date": match.group(1) if match else ""
+            })
+        return results, False
+    finally:
+        conn.close()
+
+
+def _find_block_spans(conn: sqlite3.Connection, query: str, fts_supported: bool, since: Optional[str], until: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    找出所有“开始处理 '片名' ... 处理完成 '片名'”的完整处理块的位置。
+    按文件内行号顺序推进，跟踪中遇到的其他起始标记被忽略，遇到任何结束标记即结束跟踪，
+    与逐行扫描的状态机结果一致。
+    """
+    match_sql, params = _match_clause(query, fts_supported)
+    time_sql, time_params = _time_clause(since, until)
+    candidates = conn.execute(f"""
+        SELECT l.file_key, f.file_name, l.line_num, l.content
+        FROM log_lines l JOIN log_files f ON f.file_key = l.file_key
+        WHERE {match_sql}{time_sql}
+          AND (l.content LIKE '%开始处理%' OR l.content LIKE '%手动处理%')
+        ORDER BY l.file_key, l.line_num
+    """, params + time_params).fetchall()
+
+    query_lower = query.lower()
+    spans = []
+    tracked_until: Dict[str, float] = {}
+    for row in candidates:
+        if row['line_num'] <= tracked_until.get(row['file_key'], 0):
+            continue
+        start_match = START_MARKER.search(row['content'])
+        if not start_match or query_lower not in start_match.group(2).lower():
+            continue
+        item_name = start_match.group(2)
+
+        end_line, end_name = None, None
+        for end_row in conn.execute("""
+            SELECT line_num, content FROM log_lines
+            WHERE file_key = ? AND line_num > ? AND content LIKE '%处理完成%'
+            ORDER BY line_num
+        """, (row['file_key'], row['line_num'])):
+            end_match = END_MARKER.search(end_row['content'])
+            if end_match:
+                end_line, end_name = end_row['line_num'], end_match.group(1)
+                break
+
+        if end_line is None:
+            # 没有闭环，一直跟踪到文件末尾
+            tracked_until[row['file_key']] = float('inf')
+            continue
+        tracked_until[row['file_key']] = end_line
+        if end_name != item_name:
+            continue
+
+        ts_match = TIMESTAMP_REGEX.search(row['content'])
+        spans.append({
+            "file_key": row['file_key'],
+            "file": row['file_name'],
+            "start": row['line_num'],
+            "end": end_line,
+            "date": ts_match.group(1).split(' ')[0] if ts_match else "Unknown Date",
+            "sort_key": ts_match.group(1) if ts_match else ""
+        })
+    return spans
+
+
+def search_blocks(log_directory: str, query: str, since: Optional[str] = None, until: Optional[str] = None,
+                  limit: int = constants.LOG_SEARCH_CONTEXT_MAX_BLOCKS, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+    """按时间倒序分页返回匹配片名的完整处理块。返回 (本页结果, 是否还有下一页)。"""
+    refresh_index(log_directory)
+    conn, fts_supported = _connect(log_directory)
+    try:
+        spans = _find_block_spans(conn, query, fts_supported, since, until)
+        spans.sort(key=lambda s: s['sort_key'], reverse=True)
+        page = spans[offset:offset + limit]
+
+        results = []
+        for span in page:
+            lines = [r['content'] for r in conn.execute(
+                "SELECT content FROM log_lines WHERE file_key = ? AND line_num BETWEEN ? AND ? ORDER BY line_num",
+                (span['file_key'], span['start'], span['end'])
+            )]
+            results.append({"file": span['file'], "date": span['date'], "lines": lines})
+        return results, len(spans) > offset + limit
+    finally:
+        conn.close()
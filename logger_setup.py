@@ -1,6 +1,11 @@
 # logger_setup.py
 import logging
 import sys
+import time
+import queue
+import atexit
+import threading
+from logging.handlers import QueueHandler, QueueListener
 from collections import deque
 import constants
 import os
@@ -22,23 +27,150 @@ def trace(self, message, *args, **kws):
 logging.Logger.trace = trace
 # ★★★ 新增部分结束 ★★★
 
-# --- 前端队列和 Handler ---
-frontend_log_queue = deque(maxlen=100)
+# --- 前端日志环形缓冲区 ---
+class FrontendLogBuffer:
+    """
+    有界环形缓冲区，只保存 LogRecord，读取时才格式化（前端每次轮询只取最近的几十条）。
+    满了之后最旧的记录被挤掉，这是正常的滚动显示，不算丢弃。
+    """
+    def __init__(self, maxlen: int, formatter: logging.Formatter):
+        self._records = deque(maxlen=maxlen)
+        self._formatter = formatter
+        self._lock = threading.Lock()
+
+    def append(self, record: logging.LogRecord):
+        with self._lock:
+            self._records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        with self._lock:
+            records = list(self._records)
+        entries = []
+        for record in records:
+            try:
+                entries.append(self._formatter.format(record))
+            except Exception:
+                entries.append(str(record.msg))
+        return iter(entries)
 
 class FrontendQueueHandler(logging.Handler):
-    def __init__(self, *args, **kwargs):
+    """把 INFO 及以上的记录放进前端缓冲区，不在这里格式化。"""
+    def __init__(self, buffer: FrontendLogBuffer, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.buffer = buffer
 
     def emit(self, record):
         try:
-            log_entry = self.format(record)
-            # ★★★ 新增部分 2: 确保 TRACE 级别的日志不会进入前端 ★★★
+            # ★★★ 确保 TRACE 级别的日志不会进入前端 ★★★
             # 前端只应显示 INFO 及以上级别，所以这里加一个判断
             if record.levelno >= logging.INFO:
-                frontend_log_queue.append(log_entry)
+                self.buffer.append(record)
         except Exception:
             self.handleError(record)
 
+# --- 异步日志管道 ---
+class AsyncQueueHandler(QueueHandler):
+    """
+    业务线程只把 LogRecord 放进有界队列，格式化和写文件/控制台都由监听线程完成。
+    - 进程内队列不需要序列化，因此跳过 QueueHandler.prepare 的预格式化。
+    - 队列满时丢弃 WARNING 以下的记录并计数；WARNING 及以上的记录最多等待 LOG_QUEUE_PUT_TIMEOUT_SECONDS 再入队。
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported_drops = 0
+        self._drop_lock = threading.Lock()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self._unreported_drops:
+            with self._drop_lock:
+                dropped, self._unreported_drops = self._unreported_drops, 0
+            if dropped:
+                summary = logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"  ➜ 日志队列已满，已丢弃 {dropped} 条日志（累计 {self.dropped} 条）。"
+                })
+                try:
+                    self.queue.put_nowait(summary)
+                except queue.Full:
+                    with self._drop_lock:
+                        self._unreported_drops += dropped
+        self._put_or_drop(record)
+
+    def _put_or_drop(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.WARNING:
+            try:
+                # 重要日志等待监听线程腾出空间，但不无限阻塞（例如监听线程已退出）
+                self.queue.put(record, timeout=constants.LOG_QUEUE_PUT_TIMEOUT_SECONDS)
+                return
+            except queue.Full:
+                pass
+        with self._drop_lock:
+            self.dropped += 1
+            self._unreported_drops += 1
+
+class RepetitiveMessageFilter(logging.Filter):
+    """
+    对带有 extra={'sample_key': ...} 的重复性日志限流：每个 sample_key 在一个时间窗口内
+    只放行前 LOG_SAMPLE_BURST 条，其余折叠计数，下一条放行的日志会附上被折叠的数量。
+    未设置 sample_key 的日志不受影响。
+    只挂在控制台和前端 Handler 上，文件日志始终完整；同一条记录只判定一次，
+    折叠数量记在 record.sample_suppressed 上，由 SampledMessageFormatter 输出，不改动原始消息。
+    """
+    def __init__(self, window_seconds: float, burst: int):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.enabled = True
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        sample_key = getattr(record, 'sample_key', None)
+        if not self.enabled or sample_key is None:
+            return True
+        # 多个 Handler 共用同一个过滤器，已判定过的记录直接复用结果，避免重复计数
+        decided = getattr(record, 'sample_passed', None)
+        if decided is not None:
+            return decided
+        now = time.monotonic()
+        with self._lock:
+            window_start, passed, suppressed = self._state.get(sample_key, (now, 0, 0))
+            if now - window_start >= self.window_seconds:
+                window_start, passed = now, 0
+            if passed < self.burst:
+                self._state[sample_key] = (window_start, passed + 1, 0)
+                record.sample_suppressed = suppressed
+                record.sample_passed = True
+                return True
+            self._state[sample_key] = (window_start, passed, suppressed + 1)
+            record.sample_passed = False
+            return False
+
+class SampledMessageFormatter(logging.Formatter):
+    """在被限流的日志后面附上此前折叠的条数，只用于控制台和前端。"""
+    def format(self, record):
+        message = super().format(record)
+        suppressed = getattr(record, 'sample_suppressed', 0)
+        if suppressed:
+            message = f"{message}（此前 {suppressed} 条同类日志已折叠）"
+        return message
+
 # ★★★ 新增部分 1: 定义 httpx 日志降级过滤器 ★★★
 class DowngradeHttpx200Filter(logging.Filter):
     """
@@ -67,27 +199,45 @@ logger.setLevel(TRACE_LEVEL)
 if logger.hasHandlers():
     logger.handlers.clear()
 
-# --- 初始化基础 Handler ---
+# --- 初始化基础 Handler（由监听线程调用） ---
 
 # 1. 控制台 Handler
 stream_handler = logging.StreamHandler(sys.stdout)
 # ★★★ 修改部分 2: 在 DEBUG_MODE 下，让控制台显示 TRACE 级别的日志 ★★★
 stream_handler.setLevel(TRACE_LEVEL if constants.DEBUG_MODE else logging.INFO)
-console_formatter = logging.Formatter(
+console_formatter = SampledMessageFormatter(
     '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 stream_handler.setFormatter(console_formatter)
-logger.addHandler(stream_handler)
-
-# 2. 前端队列 Handler
-try:
-    frontend_handler = FrontendQueueHandler()
-    frontend_handler.setLevel(logging.INFO)
-    frontend_formatter = logging.Formatter('[%(asctime)s] %(message)s', datefmt='%H:%M:%S')
-    frontend_handler.setFormatter(frontend_formatter)
-    logger.addHandler(frontend_handler)
-except Exception as e:
-    logging.error(f"Failed to add FrontendQueueHandler: {e}", exc_info=True)
+
+# 2. 前端缓冲区 Handler
+frontend_log_queue = FrontendLogBuffer(
+    constants.FRONTEND_LOG_BUFFER_SIZE,
+    SampledMessageFormatter('[%(asctime)s] %(message)s', datefmt='%H:%M:%S')
+)
+
+frontend_handler = FrontendQueueHandler(frontend_log_queue)
+frontend_handler.setLevel(logging.INFO)
+
+# 3. 根 logger 上只挂一个入队 Handler，真正的输出在 log_listener 线程中完成
+log_record_queue = queue.Queue(maxsize=constants.LOG_QUEUE_MAX_SIZE)
+queue_handler = AsyncQueueHandler(log_record_queue)
+# 低于所有输出端最低级别的记录直接在入队前丢弃
+queue_handler.setLevel(TRACE_LEVEL if constants.DEBUG_MODE else logging.DEBUG)
+logger.addHandler(queue_handler)
+
+# 重复日志限流只作用于控制台和前端，文件日志保持完整
+repetitive_message_filter = RepetitiveMessageFilter(constants.LOG_SAMPLE_WINDOW_SECONDS, constants.LOG_SAMPLE_BURST)
+stream_handler.addFilter(repetitive_message_filter)
+frontend_handler.addFilter(repetitive_message_filter)
+
+log_listener = QueueListener(log_record_queue, stream_handler, frontend_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+def configure_log_sampling(enabled: bool):
+    """开启/关闭重复日志限流，由启动流程按配置调用。"""
+    repetitive_message_filter.enabled = bool(enabled)
 
 # ★★★ 新增部分 2: 获取 httpx logger 并应用过滤器 ★★★
 # 获取名为 'httpx' 的 logger
@@ -128,8 +278,9 @@ def add_file_handler(log_directory: str,
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
         
-        if not any(isinstance(h, ConcurrentRotatingFileHandler) for h in logger.handlers):
-            logger.addHandler(file_handler)
+        if not any(isinstance(h, ConcurrentRotatingFileHandler) for h in log_listener.handlers):
+            # 文件写入同样交给监听线程，业务线程不再直接做磁盘 I/O
+            log_listener.handlers = log_listener.handlers + (file_handler,)
             # 在日志中明确打印出当前生效的配置
             logging.info(f"  ➜ 文件日志功能已配置。轮转策略: {log_size_mb}MB * {log_backups}个备份。日志路径: {log_file_path}")
         else:
@@ -8,6 +8,7 @@ from flask import Flask, request, Response
 from urllib.parse import urlparse, urlunparse
 import time
 import uuid 
+import hashlib
 from gevent import spawn, joinall
 from websocket import create_connection
 from database import collection_db, user_db, queries_db
@@ -18,6 +19,7 @@ import handler.emby as emby
 logger = logging.getLogger(__name__)
 
 MIMICKED_ID_BASE = 900000
+VIEW_GUID_NAMESPACE = uuid.UUID('6f1c5a52-3c0e-4d8e-9a57-2f4b0c1e7d31')
 def to_mimicked_id(db_id): return str(-(MIMICKED_ID_BASE + db_id))
 def from_mimicked_id(mimicked_id): return -(int(mimicked_id)) - MIMICKED_ID_BASE
 def is_mimicked_id(item_id):
@@ -42,7 +44,7 @@ def _fetch_items_in_chunks(base_url, api_key, user_id, item_ids, fields):
     def fetch_chunk(chunk):
         params = {'api_key': api_key, 'Ids': ",".join(chunk), 'Fields': fields}
         try:
-            resp = requests.get(target_url, params=params, timeout=20)
+            resp = emby.emby_client.get(target_url, params=params, timeout=20)
             resp.raise_for_status()
             return resp.json().get("Items", [])
         except Exception as e:
@@ -55,67 +57,24 @@ def _fetch_items_in_chunks(base_url, api_key, user_id, item_ids, fields):
         if g.value: all_items.extend(g.value)
     return all_items
 
-def _fetch_sorted_items_via_emby_proxy(user_id, item_ids, sort_by, sort_order, limit, offset, fields, total_record_count):
+def _fetch_page_via_local_sort(user_id, item_ids, sort_by, sort_order, limit, offset, fields):
     """
-    - 引入“内存排序安全回退”机制。
-    - 决策流程:
-        1. [GET优先] 如果ID列表不超长，使用高效的GET请求让Emby排序。
-        2. [安全回退] 如果ID列表超长，则分块获取所有媒体的详情(包含排序字段)，
-           然后在内存中进行排序和分页，确保结果准确且无414错误。
+    - 排序与分页全部在本地 media_metadata/user_media_data 上完成。
+    - 只把当前这一页的 ID 交给 Emby 补全详情，并按本地排序结果重新排列。
     """
-    base_url, api_key = _get_real_emby_url_and_key()
-    
-    # --- 核心规避逻辑：动态选择 GET 或 内存排序回退 ---
-    estimated_ids_length = len(item_ids) * 40
-    URL_LENGTH_THRESHOLD = 2000 
-
-    try:
-        if estimated_ids_length < URL_LENGTH_THRESHOLD:
-            # --- 路径 A: ID列表较短，使用 GET 请求 (快速路径) ---
-            logger.trace(f"  ➜ [Emby 代理排序] ID列表长度较短，使用 GET 方法。")
-            target_url = f"{base_url}/emby/Users/{user_id}/Items"
-            emby_params = {
-                'api_key': api_key, 'Ids': ",".join(item_ids), 'Fields': fields,
-                'SortBy': sort_by, 'SortOrder': sort_order,
-                'StartIndex': offset, 'Limit': limit,
-            }
-            resp = requests.get(target_url, params=emby_params, timeout=25)
-            resp.raise_for_status()
-            emby_data = resp.json()
-            emby_data['TotalRecordCount'] = total_record_count
-            return emby_data
-        else:
-            # --- 路径 B: ID列表超长，启动内存排序安全回退 ---
-            logger.trace(f"  ➜ [内存排序回退] ID列表超长 (估算 > {URL_LENGTH_THRESHOLD})，启动内存排序。")
-            
-            # 1. 获取所有媒体的详细信息，确保包含排序所需的字段
-            primary_sort_by = sort_by.split(',')[0]
-            fields_for_sorting = f"{fields},{primary_sort_by}"
-            all_items_details = _fetch_items_in_chunks(base_url, api_key, user_id, item_ids, fields_for_sorting)
-
-            # 2. 在内存中排序
-            try:
-                is_desc = sort_order == 'Descending'
-                # 为不同类型的排序字段提供安全的默认值
-                if any(s in primary_sort_by.lower() for s in ['date', 'year']):
-                    default_value = "1900-01-01T00:00:00.000Z"
-                elif any(s in primary_sort_by.lower() for s in ['rating', 'count']):
-                    default_value = 0
-                else: # SortName, Name etc.
-                    default_value = ""
-                
-                all_items_details.sort(key=lambda x: x.get(primary_sort_by, default_value) or default_value, reverse=is_desc)
-            except Exception as sort_e:
-                logger.error(f"  ➜ 内存排序时发生错误: {sort_e}", exc_info=True)
-            
-            # 3. 在内存中分页
-            paginated_items = all_items_details[offset : offset + limit]
-            
-            return {"Items": paginated_items, "TotalRecordCount": total_record_count}
+    if sort_by == 'original':
+        paginated_ids = item_ids[offset : offset + limit]
+    else:
+        paginated_ids = queries_db.get_sorted_and_paginated_ids(
+            item_ids, sort_by, sort_order, limit, offset, user_id=user_id
+        )
+    if not paginated_ids:
+        return []
 
-    except Exception as e:
-        logger.error(f"  ➜ Emby代理排序或内存回退时失败: {e}", exc_info=True)
-        return {"Items": [], "TotalRecordCount": total_record_count}
+    base_url, api_key = _get_real_emby_url_and_key()
+    items_from_emby = _fetch_items_in_chunks(base_url, api_key, user_id, paginated_ids, fields)
+    items_map = {item['Id']: item for item in items_from_emby}
+    return [items_map[id] for id in paginated_ids if id in items_map]
 
 def _get_final_item_ids_for_view(user_id, collection_info):
     """
@@ -125,19 +84,9 @@ def _get_final_item_ids_for_view(user_id, collection_info):
     collection_id = collection_info['id']
     definition = collection_info.get('definition_json') or {}
     
-    # --- 步骤 1: 直接从本地数据库中查询用户专属列表 ---
-    from database.connection import get_db_connection
-    base_ordered_emby_ids = []
+    # --- 步骤 1: 获取用户专属列表 (优先命中进程内缓存，未命中才查库) ---
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT visible_emby_ids_json FROM user_collection_cache WHERE user_id = %s AND collection_id = %s",
-                    (user_id, collection_id)
-                )
-                row = cursor.fetchone()
-                if row and row['visible_emby_ids_json']:
-                    base_ordered_emby_ids = row['visible_emby_ids_json']
+        base_ordered_emby_ids = queries_db.get_visible_emby_ids(user_id, collection_id)
     except Exception as e:
         logger.error(f"  ➜ 查询用户 {user_id} 在合集 {collection_id} 的权限缓存时出错: {e}", exc_info=True)
         return []
@@ -158,10 +107,114 @@ def _get_final_item_ids_for_view(user_id, collection_info):
 
     return final_emby_ids_to_process
 
+def _collection_view_versions(coll):
+    """
+    由合集内容派生稳定的版本号，代替原先每次请求都变化的 time.time()。
+    - image_version 只在封面可能变化时改变 (Emby 实体变更或重新同步)，客户端可以放心缓存海报。
+    - etag 额外覆盖名称、类型、数量等会影响视图展示的字段。
+    """
+    definition = coll.get('definition_json') or {}
+    last_synced_at = coll.get('last_synced_at')
+    synced_marker = last_synced_at.isoformat() if hasattr(last_synced_at, 'isoformat') else str(last_synced_at or '')
+    image_source = f"{coll.get('emby_collection_id')}|{synced_marker}"
+    etag_source = "|".join([
+        image_source, str(coll.get('name')), str(coll.get('in_library_count')),
+        json.dumps(definition.get('item_type'), sort_keys=True),
+        json.dumps(definition.get('merged_libraries', []), sort_keys=True),
+    ])
+    image_version = hashlib.md5(image_source.encode('utf-8')).hexdigest()[:12]
+    etag = hashlib.md5(etag_source.encode('utf-8')).hexdigest()
+    return image_version, etag
+
+def _build_views_payload(user_id, real_server_id):
+    """为单个用户构建完整的 /Views 响应体 (虚拟库 + 合并的原生库)。"""
+    user_visible_native_libs = emby.get_emby_libraries(
+        config_manager.APP_CONFIG.get("emby_server_url", ""),
+        config_manager.APP_CONFIG.get("emby_api_key", ""),
+        user_id
+    )
+    if user_visible_native_libs is None: user_visible_native_libs = []
+
+    collections = collection_db.get_all_active_custom_collections()
+    fake_views_items = []
+    for coll in collections:
+        # 1. 物理检查：库在Emby里有实体吗？
+        real_emby_collection_id = coll.get('emby_collection_id')
+        if not real_emby_collection_id:
+            logger.debug(f"  ➜ 虚拟库 '{coll['name']}' 被隐藏，原因: 无对应Emby实体")
+            continue
+
+        # 2. 权限检查：用户在不在邀请函上？
+        allowed_users = coll.get('allowed_user_ids')
+        if allowed_users and isinstance(allowed_users, list):
+            if user_id not in allowed_users:
+                logger.debug(f"  ➜ 虚拟库 '{coll['name']}' 被隐藏，原因: 用户不在可见列表中 (权限)。")
+                continue
+        
+        # --- 所有检查通过，直接生成虚拟库 ---
+        db_id = coll['id']
+        mimicked_id = to_mimicked_id(db_id)
+        image_version, etag = _collection_view_versions(coll)
+        image_tags = {"Primary": f"{real_emby_collection_id}?v={image_version}"}
+        definition = coll.get('definition_json') or {}
+        
+        merged_libraries = definition.get('merged_libraries', [])
+        name_suffix = f" (合并库: {len(merged_libraries)}个)" if merged_libraries else ""
+        
+        item_type_from_db = definition.get('item_type', 'Movie')
+        collection_type = "mixed"
+        if not (isinstance(item_type_from_db, list) and len(item_type_from_db) > 1):
+             authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
+             collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
+
+        stable_guid = str(uuid.uuid5(VIEW_GUID_NAMESPACE, f"view-{db_id}"))
+        fake_view = {
+            "Name": coll['name'] + name_suffix, "ServerId": real_server_id, "Id": mimicked_id,
+            "Guid": stable_guid, "Etag": etag,
+            "DateCreated": "2025-01-01T00:00:00.0000000Z", "CanDelete": False, "CanDownload": False,
+            "SortName": coll['name'], "ExternalUrls": [], "ProviderIds": {}, "IsFolder": True,
+            "ParentId": "2", "Type": "CollectionFolder", "PresentationUniqueKey": stable_guid,
+            "DisplayPreferencesId": f"custom-{db_id}", "ForcedSortName": coll['name'],
+            "Taglines": [], "RemoteTrailers": [],
+            "UserData": {"PlaybackPositionTicks": 0, "IsFavorite": False, "Played": False},
+            "ChildCount": coll.get('in_library_count', 1), # 给个默认值，避免显示为0
+            "PrimaryImageAspectRatio": 1.7777777777777777, 
+            "CollectionType": collection_type, "ImageTags": image_tags, "BackdropImageTags": [], 
+            "LockedFields": [], "LockData": False
+        }
+        fake_views_items.append(fake_view)
+    
+    logger.debug(f"  ➜ 已为用户 {user_id} 生成 {len(fake_views_items)} 个可见的虚拟库。")
+
+    # --- 原生库合并逻辑 (保持不变) ---
+    native_views_items = []
+    should_merge_native = config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True)
+    if should_merge_native:
+        all_native_views = user_visible_native_libs
+        raw_selection = config_manager.APP_CONFIG.get('proxy_native_view_selection', '')
+        selected_native_view_ids = [x.strip() for x in raw_selection.split(',') if x.strip()] if isinstance(raw_selection, str) else raw_selection
+        if not selected_native_view_ids:
+            native_views_items = all_native_views
+        else:
+            native_views_items = [view for view in all_native_views if view.get("Id") in selected_native_view_ids]
+    
+    final_items = []
+    native_order = config_manager.APP_CONFIG.get('proxy_native_view_order', 'before')
+    if native_order == 'after':
+        final_items.extend(fake_views_items)
+        final_items.extend(native_views_items)
+    else:
+        final_items.extend(native_views_items)
+        final_items.extend(fake_views_items)
+
+    final_response = {"Items": final_items, "TotalRecordCount": len(final_items)}
+    return json.dumps(final_response)
+
 def handle_get_views():
     """
     - 移除所有动态库的空壳检查，将主页加载速度置于最高优先级。
     - 可见性现在只由两个核心条件决定：1. 库在Emby中真实存在。 2. 用户拥有访问权限。
+    - 每个用户的响应体预渲染后缓存在 extensions.VIEWS_CACHE 中，合集/权限/配置变化时显式失效。
     """
     real_server_id = extensions.EMBY_SERVER_ID
     if not real_server_id:
@@ -173,85 +226,16 @@ def handle_get_views():
             return "Could not determine user from request path", 400
         user_id = user_id_match.group(1)
 
-        user_visible_native_libs = emby.get_emby_libraries(
-            config_manager.APP_CONFIG.get("emby_server_url", ""),
-            config_manager.APP_CONFIG.get("emby_api_key", ""),
-            user_id
-        )
-        if user_visible_native_libs is None: user_visible_native_libs = []
-
-        collections = collection_db.get_all_active_custom_collections()
-        fake_views_items = []
-        for coll in collections:
-            # 1. 物理检查：库在Emby里有实体吗？
-            real_emby_collection_id = coll.get('emby_collection_id')
-            if not real_emby_collection_id:
-                logger.debug(f"  ➜ 虚拟库 '{coll['name']}' 被隐藏，原因: 无对应Emby实体")
-                continue
-
-            # 2. 权限检查：用户在不在邀请函上？
-            allowed_users = coll.get('allowed_user_ids')
-            if allowed_users and isinstance(allowed_users, list):
-                if user_id not in allowed_users:
-                    logger.debug(f"  ➜ 虚拟库 '{coll['name']}' 被隐藏，原因: 用户不在可见列表中 (权限)。")
-                    continue
-            
-            # --- 所有检查通过，直接生成虚拟库 ---
-            db_id = coll['id']
-            mimicked_id = to_mimicked_id(db_id)
-            image_tags = {"Primary": f"{real_emby_collection_id}?timestamp={int(time.time())}"}
-            definition = coll.get('definition_json') or {}
-            
-            merged_libraries = definition.get('merged_libraries', [])
-            name_suffix = f" (合并库: {len(merged_libraries)}个)" if merged_libraries else ""
-            
-            item_type_from_db = definition.get('item_type', 'Movie')
-            collection_type = "mixed"
-            if not (isinstance(item_type_from_db, list) and len(item_type_from_db) > 1):
-                 authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
-                 collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
-
-            fake_view = {
-                "Name": coll['name'] + name_suffix, "ServerId": real_server_id, "Id": mimicked_id,
-                "Guid": str(uuid.uuid4()), "Etag": f"{db_id}{int(time.time())}",
-                "DateCreated": "2025-01-01T00:00:00.0000000Z", "CanDelete": False, "CanDownload": False,
-                "SortName": coll['name'], "ExternalUrls": [], "ProviderIds": {}, "IsFolder": True,
-                "ParentId": "2", "Type": "CollectionFolder", "PresentationUniqueKey": str(uuid.uuid4()),
-                "DisplayPreferencesId": f"custom-{db_id}", "ForcedSortName": coll['name'],
-                "Taglines": [], "RemoteTrailers": [],
-                "UserData": {"PlaybackPositionTicks": 0, "IsFavorite": False, "Played": False},
-                "ChildCount": coll.get('in_library_count', 1), # 给个默认值，避免显示为0
-                "PrimaryImageAspectRatio": 1.7777777777777777, 
-                "CollectionType": collection_type, "ImageTags": image_tags, "BackdropImageTags": [], 
-                "LockedFields": [], "LockData": False
-            }
-            fake_views_items.append(fake_view)
-        
-        logger.debug(f"  ➜ 已为用户 {user_id} 生成 {len(fake_views_items)} 个可见的虚拟库。")
-
-        # --- 原生库合并逻辑 (保持不变) ---
-        native_views_items = []
-        should_merge_native = config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True)
-        if should_merge_native:
-            all_native_views = user_visible_native_libs
-            raw_selection = config_manager.APP_CONFIG.get('proxy_native_view_selection', '')
-            selected_native_view_ids = [x.strip() for x in raw_selection.split(',') if x.strip()] if isinstance(raw_selection, str) else raw_selection
-            if not selected_native_view_ids:
-                native_views_items = all_native_views
-            else:
-                native_views_items = [view for view in all_native_views if view.get("Id") in selected_native_view_ids]
-        
-        final_items = []
-        native_order = config_manager.APP_CONFIG.get('proxy_native_view_order', 'before')
-        if native_order == 'after':
-            final_items.extend(fake_views_items)
-            final_items.extend(native_views_items)
-        else:
-            final_items.extend(native_views_items)
-            final_items.extend(fake_views_items)
+        with extensions.VIEWS_CACHE_LOCK:
+            cached_payload = extensions.VIEWS_CACHE.get(user_id)
+        if cached_payload is not None:
+            logger.trace(f"  ➜ 用户 {user_id} 的主页视图命中缓存。")
+            return Response(cached_payload, mimetype='application/json')
 
-        final_response = {"Items": final_items, "TotalRecordCount": len(final_items)}
-        return Response(json.dumps(final_response), mimetype='application/json')
+        payload = _build_views_payload(user_id, real_server_id)
+        with extensions.VIEWS_CACHE_LOCK:
+            extensions.VIEWS_CACHE[user_id] = payload
+        return Response(payload, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"[PROXY] 获取视图数据时出错: {e}", exc_info=True)
@@ -342,7 +326,7 @@ def handle_mimicked_library_metadata_endpoint(path, mimicked_id, params):
         new_params['ParentId'] = real_emby_collection_id
         new_params['api_key'] = api_key
         
-        resp = requests.get(target_url, headers=headers, params=new_params, timeout=15)
+        resp = emby.emby_client.get(target_url, headers=headers, params=new_params, timeout=15)
         resp.raise_for_status()
         
         return Response(resp.content, resp.status_code, content_type=resp.headers.get('Content-Type'))
@@ -353,8 +337,8 @@ def handle_mimicked_library_metadata_endpoint(path, mimicked_id, params):
     
 def handle_get_mimicked_library_items(user_id, mimicked_id, params):
     """
-    - 将Emby代理排序的逻辑提取到独立的、健壮的辅助函数中。
-    - 该函数能智能选择GET或POST，彻底解决因ID列表过长导致的414错误。
+    - 所有排序键都在本地排序引擎中完成排序和分页，不再依赖 Emby 排序或内存排序回退。
+    - 只有当前页的 ID 会被交给 Emby 补全详情，ID 列表再长也不会触发 414。
     """
     try:
         real_db_id = from_mimicked_id(mimicked_id)
@@ -378,43 +362,15 @@ def handle_get_mimicked_library_items(user_id, mimicked_id, params):
             final_sort_by = params.get('SortBy') or 'SortName'
             final_sort_order = params.get('SortOrder') or 'Ascending'
         
-        primary_sort_by = final_sort_by.split(',')[0]
-        SUPPORTED_LOCAL_SORT_FIELDS = ['PremiereDate', 'DateCreated', 'CommunityRating', 'ProductionYear', 'SortName', 'original']
-        
         limit = int(params.get('Limit', 50))
         offset = int(params.get('StartIndex', 0))
 
-        use_local_sort = (primary_sort_by in SUPPORTED_LOCAL_SORT_FIELDS) and (defined_sort_by != 'none')
-
-        if use_local_sort:
-            # --- 分支 A: [快速路径] 本地高性能排序 (逻辑不变) ---
-            logger.trace(f"  ➜ 使用本地数据库排序 (SortBy={primary_sort_by})。")
-            paginated_ids = []
-            if primary_sort_by == 'original':
-                paginated_ids = final_visible_ids[offset : offset + limit]
-            else:
-                paginated_ids = queries_db.get_sorted_and_paginated_ids(
-                    final_visible_ids, primary_sort_by, final_sort_order, limit, offset
-                )
-            if not paginated_ids:
-                return Response(json.dumps({"Items": [], "TotalRecordCount": total_record_count}), mimetype='application/json')
-
-            base_url, api_key = _get_real_emby_url_and_key()
-            full_fields = "PrimaryImageAspectRatio,ProviderIds,UserData,Name,ProductionYear,CommunityRating,DateCreated,PremiereDate,Type,RecursiveItemCount,SortName,ChildCount"
-            items_from_emby = _fetch_items_in_chunks(base_url, api_key, user_id, paginated_ids, full_fields)
-            items_map = {item['Id']: item for item in items_from_emby}
-            final_items = [items_map[id] for id in paginated_ids if id in items_map]
-            return Response(json.dumps({"Items": final_items, "TotalRecordCount": total_record_count}), mimetype='application/json')
-
-        else:
-            # --- 分支 B: [Emby 代理排序路径] - 调用新的健壮函数 ---
-            logger.trace(f"  ➜ 使用 Emby 进行远程排序或内存排序 (SortBy={primary_sort_by})。")
-            full_fields = "PrimaryImageAspectRatio,ProviderIds,UserData,Name,ProductionYear,CommunityRating,DateCreated,PremiereDate,Type,RecursiveItemCount,SortName,ChildCount"
-            
-            sorted_data = _fetch_sorted_items_via_emby_proxy(
-                user_id, final_visible_ids, final_sort_by, final_sort_order, limit, offset, full_fields, total_record_count
-            )
-            return Response(json.dumps(sorted_data), mimetype='application/json')
+        logger.trace(f"  ➜ 使用本地数据库排序 (SortBy={final_sort_by})。")
+        full_fields = "PrimaryImageAspectRatio,ProviderIds,UserData,Name,ProductionYear,CommunityRating,DateCreated,PremiereDate,Type,RecursiveItemCount,SortName,ChildCount"
+        final_items = _fetch_page_via_local_sort(
+            user_id, final_visible_ids, final_sort_by, final_sort_order, limit, offset, full_fields
+        )
+        return Response(json.dumps({"Items": final_items, "TotalRecordCount": total_record_count}), mimetype='application/json')
 
     except Exception as e:
         logger.error(f"  ➜ 处理虚拟库 '{collection_info.get('name', mimicked_id)}' 时发生严重错误: {e}", exc_info=True)
@@ -423,7 +379,7 @@ def handle_get_mimicked_library_items(user_id, mimicked_id, params):
 def handle_get_latest_items(user_id, params):
     """
     - 直接从数据库筛选合集ID。
-    - 同样调用新的健壮辅助函数来处理剧集的最新排序。
+    - 剧集的 DateLastContentAdded 排序同样由本地排序引擎完成。
     """
     try:
         base_url, api_key = _get_real_emby_url_and_key()
@@ -458,19 +414,8 @@ def handle_get_latest_items(user_id, params):
             limit = int(params.get('Limit', 24))
             fields = params.get('Fields', "PrimaryImageAspectRatio,BasicSyncInfo,DateCreated,UserData")
 
-            if 'DateLastContentAdded' in sort_by_str:
-                sorted_data = _fetch_sorted_items_via_emby_proxy(
-                    user_id, final_visible_ids, sort_by_str, sort_order, limit, 0, fields, len(final_visible_ids)
-                )
-                return Response(json.dumps(sorted_data.get("Items", [])), mimetype='application/json')
-            else:
-                latest_ids = queries_db.get_sorted_and_paginated_ids(final_visible_ids, sort_by_str.split(',')[0], sort_order, limit, 0)
-                if not latest_ids: return Response(json.dumps([]), mimetype='application/json')
-                
-                items_from_emby = _fetch_items_in_chunks(base_url, api_key, user_id, latest_ids, fields)
-                items_map = {item['Id']: item for item in items_from_emby}
-                final_items = [items_map[id] for id in latest_ids if id in items_map]
-                return Response(json.dumps(final_items), mimetype='application/json')
+            final_items = _fetch_page_via_local_sort(user_id, final_visible_ids, sort_by_str, sort_order, limit, 0, fields)
+            return Response(json.dumps(final_items), mimetype='application/json')
 
         # ======================================================================
         # 场景二：处理【全局】“最近添加”请求 (例如，Emby 主页最顶部的“最新媒体”)
@@ -487,16 +432,10 @@ def handle_get_latest_items(user_id, params):
 
             # 后续逻辑不变，但现在它处理的是一个预先被高效筛选过的ID列表
             all_possible_ids = set()
-            from database.connection import get_db_connection
             try:
-                with get_db_connection() as conn:
-                    with conn.cursor() as cursor:
-                        sql = "SELECT visible_emby_ids_json FROM user_collection_cache WHERE user_id = %s AND collection_id = ANY(%s)"
-                        cursor.execute(sql, (user_id, included_collection_ids))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            if row['visible_emby_ids_json']:
-                                all_possible_ids.update(row['visible_emby_ids_json'])
+                visible_ids_by_collection = queries_db.get_visible_emby_ids_for_collections(user_id, included_collection_ids)
+                for visible_ids in visible_ids_by_collection.values():
+                    all_possible_ids.update(visible_ids)
             except Exception as e:
                 logger.error(f"  ➜ 聚合用户 {user_id} 的所有可见媒体ID时出错: {e}", exc_info=True)
                 return Response(json.dumps([]), mimetype='application/json')
@@ -505,15 +444,8 @@ def handle_get_latest_items(user_id, params):
                 return Response(json.dumps([]), mimetype='application/json')
 
             limit = int(params.get('Limit', 100))
-            latest_ids = queries_db.get_sorted_and_paginated_ids(list(all_possible_ids), 'DateCreated', 'Descending', limit, 0)
-
-            if not latest_ids: 
-                return Response(json.dumps([]), mimetype='application/json')
-
             fields = params.get('Fields', "PrimaryImageAspectRatio,BasicSyncInfo,DateCreated,UserData")
-            items_from_emby = _fetch_items_in_chunks(base_url, api_key, user_id, latest_ids, fields)
-            items_map = {item['Id']: item for item in items_from_emby}
-            final_items = [items_map[id] for id in latest_ids if id in items_map]
+            final_items = _fetch_page_via_local_sort(user_id, list(all_possible_ids), 'DateCreated', 'Descending', limit, 0, fields)
             
             logger.trace(f"  ➜ 为用户 {user_id} 的全局“最新媒体”请求成功返回 {len(final_items)} 个项目。")
             return Response(json.dumps(final_items), mimetype='application/json')
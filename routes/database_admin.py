@@ -25,6 +25,9 @@ logger = logging.getLogger(__name__)
 def json_datetime_serializer(obj):
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        # BYTEA 列 (权限位图) 按 PostgreSQL 的十六进制格式导出，导入时可直接写回
+        return '\\x' + bytes(obj).hex()
     raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 # --- 数据看板 (拆分版 API) ---
@@ -3,10 +3,12 @@
 from flask import Blueprint, request, jsonify, abort, Response
 import logging
 import os
+import json
 from werkzeug.utils import secure_filename
-import re
 
 import config_manager
+import constants
+import log_index
 from extensions import admin_required
 
 logs_bp = Blueprint('logs', __name__, url_prefix='/api/logs')
@@ -68,64 +70,52 @@ def view_log_file():
         logging.error(f"API: 读取日志文件 '{filename}' 时出错: {e}", exc_info=True)
         abort(500, f"读取文件 '{filename}' 时发生内部错误。")
 
+def _parse_search_window(default_limit: int):
+    """解析分页与时间范围参数：limit/offset/since/until。limit 不会超过 default_limit。"""
+    try:
+        limit = int(request.args.get('limit', default_limit))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return None
+    limit = max(1, min(limit, default_limit))
+    offset = max(0, offset)
+    since = request.args.get('since', '').strip() or None
+    until = request.args.get('until', '').strip() or None
+    return limit, offset, since, until
+
+def _stream_json_page(results: list, has_more: bool, offset: int) -> Response:
+    """把一页结果按条流式输出为 JSON 数组，分页信息放在响应头里，前端仍按数组解析。"""
+    def generate():
+        yield '['
+        for i, item in enumerate(results):
+            yield (',' if i else '') + json.dumps(item, ensure_ascii=False)
+        yield ']'
+    response = Response(generate(), mimetype='application/json')
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    response.headers['X-Next-Offset'] = str(offset + len(results))
+    return response
+
 @logs_bp.route('/search', methods=['GET'])
 @admin_required
 def search_all_logs():
     """
     在所有日志文件 (app.log*) 中搜索关键词。
+    - 基于日志目录下的增量索引，按时间倒序分页返回。
+    - 参数: q, limit (不超过 LOG_SEARCH_MAX_RESULTS), offset, since/until (YYYY-MM-DD[ HH:MM:SS])。
     """
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify({"error": "搜索关键词不能为空"}), 400
-    TIMESTAMP_REGEX = re.compile(r"^(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})")
+    window = _parse_search_window(constants.LOG_SEARCH_MAX_RESULTS)
+    if not window:
+        return jsonify({"error": "分页参数无效"}), 400
+    limit, offset, since, until = window
 
-    search_results = []
-    
     try:
-        # 1. 获取并排序所有日志文件，确保从新到旧搜索
-        all_files = os.listdir(config_manager.LOG_DIRECTORY)
-        log_files = [f for f in all_files if f.startswith('app.log')]
-        
-        # --- 代码修改点 ---
-        # 简化了排序键，不再处理 .gz 后缀
-        def sort_key(filename):
-            if filename == 'app.log':
-                return -1  # app.log 永远排在最前面
-            parts = filename.split('.')
-            # 适用于 app.log.1, app.log.2 等格式
-            if len(parts) == 3 and parts[0] == 'app' and parts[1] == 'log' and parts[2].isdigit():
-                return int(parts[2])
-            return float('inf') # 其他不符合格式的文件排在最后
-        
-        log_files.sort(key=sort_key)
-
-        # 2. 遍历每个文件进行搜索
-        for filename in log_files:
-            full_path = os.path.join(config_manager.LOG_DIRECTORY, filename)
-            try:
-                # --- 代码修改点 ---
-                # 移除了 opener 的判断，直接使用 open 函数
-                with open(full_path, 'rt', encoding='utf-8', errors='ignore') as f:
-                    # 逐行读取，避免内存爆炸
-                    for line_num, line in enumerate(f, 1):
-                        # 不区分大小写搜索
-                        if query.lower() in line.lower():
-                            match = TIMESTAMP_REGEX.search(line)
-                            line_date = match.group(1) if match else "" # 如果匹配失败则为空字符串
-                            
-                            # 2. 将提取到的日期添加到返回结果中
-                            search_results.append({
-                                "file": filename,
-                                "line_num": line_num,
-                                "content": line.strip(),
-                                "date": line_date  # <--- 新增的日期字段
-                            })
-            except Exception as e:
-                # 如果单个文件读取失败，记录错误并继续
-                logging.warning(f"API: 搜索时无法读取文件 '{filename}': {e}")
-
-        search_results.sort(key=lambda x: x['date'], reverse=True)
-        return jsonify(search_results)
+        results, has_more = log_index.search_lines(
+            config_manager.LOG_DIRECTORY, query, since=since, until=until, limit=limit, offset=offset
+        )
+        return _stream_json_page(results, has_more, offset)
 
     except Exception as e:
         logging.error(f"API: 全局日志搜索时发生严重错误: {e}", exc_info=True)
@@ -135,87 +125,23 @@ def search_all_logs():
 @admin_required
 def search_logs_with_context():
     """
-    【V9 - 最终无干扰版】在所有日志文件中定位与关键词匹配的、完整的、未被中断的处理块。
-    此版本能正确忽略在目标块内部出现的、不相关的其他处理块起始标记。
+    在所有日志文件中定位与关键词匹配的、完整的、未被中断的处理块。
+    跟踪某个块期间出现的其他处理块起始标记会被忽略。
+    - 与 /search 共用索引，参数相同，limit 不超过 LOG_SEARCH_CONTEXT_MAX_BLOCKS。
     """
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify({"error": "搜索关键词不能为空"}), 400
+    window = _parse_search_window(constants.LOG_SEARCH_CONTEXT_MAX_BLOCKS)
+    if not window:
+        return jsonify({"error": "分页参数无效"}), 400
+    limit, offset, since, until = window
 
-    START_MARKER = re.compile(r"(开始处理|手动处理)\s'(.+?)'\s\(TMDb ID: \d+\)")
-    END_MARKER = re.compile(r"处理完成\s'(.+?)'")
-    TIMESTAMP_REGEX = re.compile(r"^(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})")
-
-    found_blocks = []
-    
     try:
-        all_files = os.listdir(config_manager.LOG_DIRECTORY)
-        log_files = sorted([f for f in all_files if f.startswith('app.log')], reverse=True)
-
-        for filename in log_files:
-            full_path = os.path.join(config_manager.LOG_DIRECTORY, filename)
-            
-            current_block = []
-            active_item_name = None # 状态变量：记录当前正在追踪的片名
-
-            try:
-                with open(full_path, 'rt', encoding='utf-8', errors='ignore') as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line: continue
-
-                        start_match = START_MARKER.search(line)
-                        end_match = END_MARKER.search(line)
-
-                        # ★★★★★★★★★★★★★★★ 核心逻辑修正 ★★★★★★★★★★★★★★★
-                        if not active_item_name and start_match:
-                            # 状态：当前未追踪任何块，并且遇到了一个起始标记
-                            start_item_name = start_match.group(2)
-                            if query.lower() in start_item_name.lower():
-                                # 关键词匹配！开始追踪
-                                active_item_name = start_item_name
-                                current_block = [line]
-                        
-                        elif active_item_name and end_match:
-                            # 状态：正在追踪一个块，并且遇到了一个结束标记
-                            end_item_name = end_match.group(1)
-                            
-                            if end_item_name == active_item_name:
-                                # 完美闭环！保存
-                                current_block.append(line)
-                                
-                                block_date = "Unknown Date"
-                                if current_block:
-                                    match = TIMESTAMP_REGEX.search(current_block[0])
-                                    if match:
-                                        block_date = match.group(1).split(' ')[0]
-
-                                found_blocks.append({
-                                    "file": filename,
-                                    "date": block_date,
-                                    "lines": current_block
-                                })
-                                
-                                # 任务完成，重置状态
-                                active_item_name = None
-                                current_block = []
-                            else:
-                                # 结束的片名不匹配，说明日志错乱，抛弃当前块
-                                active_item_name = None
-                                current_block = []
-
-                        elif active_item_name:
-                            # 状态：正在追踪一个块，当前行是普通日志，追加
-                            current_block.append(line)
-                        
-                        # 如果 active_item_name 为空，且当前行不是匹配的 start_match，则什么都不做，直接忽略
-
-            except Exception as e:
-                logging.warning(f"API: 上下文搜索时无法读取文件 '{filename}': {e}")
-        
-        found_blocks.sort(key=lambda x: x['date'], reverse=True)
-        
-        return jsonify(found_blocks)
+        results, has_more = log_index.search_blocks(
+            config_manager.LOG_DIRECTORY, query, since=since, until=until, limit=limit, offset=offset
+        )
+        return _stream_json_page(results, has_more, offset)
 
     except Exception as e:
         logging.error(f"API: 上下文日志搜索时发生严重错误: {e}", exc_info=True)
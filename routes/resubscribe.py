@@ -115,12 +115,14 @@ def get_library_status():
 @admin_required
 @task_lock_required
 def trigger_refresh_status():
-    """触发缓存刷新任务。"""
+    """触发缓存刷新任务。请求体带 force_full_update=true 时无视指纹全量重新判定。"""
     try:
+        force_full_update = bool((request.get_json(silent=True) or {}).get('force_full_update', False))
         task_manager.submit_task(
             tasks.task_update_resubscribe_cache, 
-            task_name="刷新媒体洗版状态",
-            processor_type='media'
+            task_name="全量刷新媒体洗版状态" if force_full_update else "刷新媒体洗版状态",
+            processor_type='media',
+            force_full_update=force_full_update
         )
         return jsonify({"message": "刷新媒体洗版状态任务已提交！"}), 202
     except Exception as e:
@@ -12,9 +12,10 @@ import task_manager
 from logger_setup import frontend_log_queue
 import config_manager
 import handler.emby as emby
+import handler.tmdb as tmdb
 # 导入共享模块
 import extensions
-from database import collection_db
+from database import collection_db, connection
 from extensions import admin_required, task_lock_required
 import constants
 import handler.github as github
@@ -50,6 +51,30 @@ def api_handle_trigger_stop_task():
     else:
         return jsonify({"error": "核心处理器未就绪"}), 503
 
+# --- 数据库连接池运行指标 ---
+@system_bp.route('/system/db_pool_stats', methods=['GET'])
+@admin_required
+def api_get_db_pool_stats():
+    return jsonify(connection.get_pool_stats())
+
+# --- Emby HTTP 客户端运行指标 ---
+@system_bp.route('/system/emby_http_stats', methods=['GET'])
+@admin_required
+def api_get_emby_http_stats():
+    return jsonify(emby.get_emby_http_stats())
+
+# --- TMDb 响应缓存运行指标 ---
+@system_bp.route('/system/tmdb_cache_stats', methods=['GET'])
+@admin_required
+def api_get_tmdb_cache_stats():
+    return jsonify(tmdb.get_tmdb_cache_stats())
+
+# --- TMDb 全局限流器运行指标 ---
+@system_bp.route('/system/tmdb_rate_limit_stats', methods=['GET'])
+@admin_required
+def api_get_tmdb_rate_limit_stats():
+    return jsonify(tmdb.get_tmdb_rate_limiter_stats())
+
 # --- API 端点：获取当前配置 ---
 @system_bp.route('/config', methods=['GET'])
 def api_get_config():
@@ -7,7 +7,7 @@ import re
 import time
 from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify
-from typing import Optional, List
+from typing import Optional, List, Dict
 from gevent import spawn_later
 
 import task_manager
@@ -23,8 +23,9 @@ from tasks import (
 )
 from handler.custom_collection import FilterEngine
 from services.cover_generator import CoverGeneratorService
-from database import collection_db, settings_db, user_db, maintenance_db, media_db
+from database import collection_db, settings_db, user_db, maintenance_db, media_db, permission_db
 from database.log_db import LogDBManager
+import handler.tmdb as tmdb
 from handler.tmdb import get_movie_details, get_tv_details
 import logging
 logger = logging.getLogger(__name__)
@@ -42,10 +43,31 @@ UPDATE_DEBOUNCE_TIMERS = {}
 UPDATE_DEBOUNCE_LOCK = threading.Lock()
 UPDATE_DEBOUNCE_TIME = 15
 
-def _handle_full_processing_flow(processor: 'MediaProcessor', item_id: str, force_full_update: bool, new_episode_ids: Optional[List[str]] = None):
+def _patch_permission_snapshots_for_new_items(processor: 'MediaProcessor', item_ids: List[str]) -> Dict[str, List[str]]:
+    """
+    新项目入库时，把它们增量加入有权限用户的权限快照。
+    整批项目只做一次权限解析，返回 {item_id: 有权限的用户ID列表}，后面补票时复用。
+    """
+    if not item_ids:
+        return {}
+    try:
+        access_map = emby.get_user_ids_with_access_to_items(item_ids, processor.emby_url, processor.emby_api_key)
+        if access_map and permission_db.has_permission_snapshots():
+            for item_id, user_ids in access_map.items():
+                if user_ids:
+                    permission_db.add_item_to_permission_snapshots(item_id, user_ids)
+            logger.debug(f"  ➜ 已将 {len(access_map)} 个新项目加入用户权限快照。")
+        return access_map
+    except Exception as e:
+        logger.error(f"  ➜ 修补用户权限快照时发生错误: {e}", exc_info=True)
+        return {}
+
+def _handle_full_processing_flow(processor: 'MediaProcessor', item_id: str, force_full_update: bool, new_episode_ids: Optional[List[str]] = None,
+                                 user_ids_with_access: Optional[List[str]] = None):
     """
     【Webhook 专用】编排一个新入库媒体项的完整处理流程。
     包括：元数据处理 -> 自定义合集匹配 -> 封面生成。
+    user_ids_with_access 由批量处理预先解析并已写入权限快照；为 None 时在这里单独解析。
     """
     if not processor:
         logger.error(f"完整处理流程中止：核心处理器 (MediaProcessor) 未初始化。")
@@ -58,6 +80,10 @@ def _handle_full_processing_flow(processor: 'MediaProcessor', item_id: str, forc
     
     item_name_for_log = item_details.get("Name", f"ID:{item_id}")
 
+    # 先修补用户权限快照，得到的有权限用户列表后面补票时复用
+    if user_ids_with_access is None and item_details.get("Type") in emby.PERMISSION_ITEM_TYPES.split(","):
+        user_ids_with_access = _patch_permission_snapshots_for_new_items(processor, [item_id]).get(item_id)
+
     processor.check_and_add_to_watchlist(item_details)
 
     processed_successfully = processor.process_single_item(item_id, force_full_update=force_full_update)
@@ -214,7 +240,8 @@ def _handle_full_processing_flow(processor: 'MediaProcessor', item_id: str, forc
                 new_item_tmdb_id=tmdb_id,
                 new_item_name=item_name,
                 matching_collection_ids=all_matching_collection_ids,
-                emby_config=emby_config
+                emby_config=emby_config,
+                user_ids_with_access=user_ids_with_access
             )
 
     except Exception as e:
@@ -239,6 +266,10 @@ def _handle_full_processing_flow(processor: 'MediaProcessor', item_id: str, forc
     logger.trace(f"  ➜ Webhook 任务及所有后续流程完成: '{item_name_for_log}'")
 
 # --- 辅助函数 ---
+def _submit_webhook_task(task_function, task_name: str, *args, **kwargs) -> bool:
+    """Webhook 触发的任务以 webhook 优先级访问 TMDb：排在界面请求之后、计划任务之前。"""
+    return task_manager.submit_task(tmdb.with_priority(tmdb.PRIORITY_WEBHOOK, task_function), task_name, *args, **kwargs)
+
 def _process_batch_webhook_events():
     global WEBHOOK_BATCH_DEBOUNCER
     with WEBHOOK_BATCH_LOCK:
@@ -289,6 +320,14 @@ def _process_batch_webhook_events():
 
     logger.info(f"  ➜ 批量事件去重后，将为 {len(parent_items)} 个独立媒体项分派任务。")
 
+    # 整批首次入库的项目一起解析用户访问权限，避免逐个项目逐个用户查询
+    new_parent_ids = [
+        parent_id for parent_id, item_info in parent_items.items()
+        if parent_id not in extensions.media_processor_instance.processed_items_cache
+        and item_info['type'] in emby.PERMISSION_ITEM_TYPES.split(",")
+    ]
+    access_map = _patch_permission_snapshots_for_new_items(extensions.media_processor_instance, new_parent_ids)
+
     for parent_id, item_info in parent_items.items():
         parent_name = item_info['name']
         parent_type = item_info['type']
@@ -330,12 +369,13 @@ def _process_batch_webhook_events():
                 force_full_update_for_new_item = False
             
             logger.info(f"  ➜ 为 '{parent_name}' 分派【完整处理】任务 (原因: 首次入库)。")
-            task_manager.submit_task(
+            _submit_webhook_task(
                 _handle_full_processing_flow,
                 task_name=f"Webhook完整处理: {parent_name}",
                 item_id=parent_id,
                 force_full_update=force_full_update_for_new_item,
-                new_episode_ids=list(item_info["episode_ids"]) 
+                new_episode_ids=list(item_info["episode_ids"]),
+                user_ids_with_access=access_map.get(parent_id)
             )
         else:
             # ★★★ 核心修复：恢复正确的追更处理逻辑 ★★★
@@ -345,7 +385,7 @@ def _process_batch_webhook_events():
                 # 只有在确实有新分集入库时才执行任务
                 if not episode_ids_to_update:
                     logger.info(f"  ➜ 剧集 '{parent_name}' 有更新事件，但未发现具体的新增分集，将触发一次轻量元数据缓存更新。")
-                    task_manager.submit_task(
+                    _submit_webhook_task(
                         task_sync_metadata_cache,
                         task_name=f"Webhook元数据更新: {parent_name}",
                         processor_type='media',
@@ -355,14 +395,14 @@ def _process_batch_webhook_events():
                     continue
 
                 logger.info(f"  ➜ 为 '{parent_name}' 分派【轻量化更新】任务 (原因: 追更)，将处理 {len(episode_ids_to_update)} 个新分集。")
-                task_manager.submit_task(
+                _submit_webhook_task(
                     task_apply_main_cast_to_episodes,
                     task_name=f"轻量化同步演员表: {parent_name}",
                     processor_type='media',
                     series_id=parent_id,
                     episode_ids=episode_ids_to_update # <-- 现在传递的是具体的分集ID列表
                 )
-                task_manager.submit_task(
+                _submit_webhook_task(
                     task_sync_metadata_cache,
                     task_name=f"Webhook增量元数据更新: {parent_name}",
                     processor_type='media',
@@ -372,7 +412,7 @@ def _process_batch_webhook_events():
                 )
             else: # 电影等其他类型
                 logger.info(f"  ➜ 媒体项 '{parent_name}' 已处理过，将触发一次轻量元数据缓存更新。")
-                task_manager.submit_task(
+                _submit_webhook_task(
                     task_sync_metadata_cache,
                     task_name=f"Webhook元数据更新: {parent_name}",
                     processor_type='media',
@@ -385,7 +425,7 @@ def _process_batch_webhook_events():
 def _trigger_metadata_update_task(item_id, item_name):
     """触发元数据同步任务"""
     logger.info(f"  ➜ 防抖计时器到期，为 '{item_name}' (ID: {item_id}) 执行元数据缓存同步任务。")
-    task_manager.submit_task(
+    _submit_webhook_task(
         task_sync_all_metadata,
         task_name=f"元数据同步: {item_name}",
         processor_type='media',
@@ -396,7 +436,7 @@ def _trigger_metadata_update_task(item_id, item_name):
 def _trigger_images_update_task(item_id, item_name, update_description, sync_timestamp_iso):
     """触发图片备份任务"""
     logger.info(f"  ➜ 防抖计时器到期，为 '{item_name}' (ID: {item_id}) 执行图片备份任务。")
-    task_manager.submit_task(
+    _submit_webhook_task(
         task_sync_images,
         task_name=f"图片备份: {item_name}",
         processor_type='media',
@@ -442,6 +482,10 @@ def emby_webhook():
         if not updated_user_id:
             return jsonify({"status": "event_ignored_no_user_id"}), 200
 
+        # 用户可见的原生库可能变了，丢弃该用户预渲染的主页视图
+        extensions.invalidate_views_cache([updated_user_id])
+        emby.invalidate_user_policy_cache()
+
         # ★★★ 核心逻辑: 在处理前，先检查信号旗 ★★★
         with SYSTEM_UPDATE_LOCK:
             last_update_time = SYSTEM_UPDATE_MARKERS.get(updated_user_id)
@@ -455,7 +499,7 @@ def emby_webhook():
         
         # 如果上面的检查通过了（即这是一个正常的手动操作），才继续执行原来的逻辑
         logger.info(f"  ➜ 检测到用户 '{updated_user_name}' 的权限策略已更新，将分派后台任务检查模板同步。")
-        task_manager.submit_task(
+        _submit_webhook_task(
             task_auto_sync_template_on_policy_change,
             task_name=f"自动同步权限 (源: {updated_user_name})",
             processor_type='media',
@@ -561,6 +605,15 @@ def emby_webhook():
         logger.debug(f"  ➜ Webhook事件 '{event_type}' (项目: {original_item_name}, 类型: {original_item_type}) 被忽略。")
         return jsonify({"status": "event_ignored_no_id_or_wrong_type"}), 200
 
+    # 删除与元数据变更无法从 Emby 的变更流中可靠获得，记入队列供下一次增量同步兜底
+    if event_type in ["library.deleted", "metadata.update"]:
+        media_db.enqueue_metadata_sync_events([{
+            "emby_id": original_item_id,
+            "event_type": event_type,
+            "item_type": original_item_type,
+            "series_emby_id": item_from_webhook.get("SeriesId") if original_item_type == "Episode" else None
+        }])
+
     if event_type == "library.deleted":
             try:
                 series_id_from_webhook = item_from_webhook.get("SeriesId") if original_item_type == "Episode" else None
@@ -127,20 +127,23 @@ class CoverGeneratorService:
         
         api_limit = limit * 5 if limit < 10 else limit * 2 
 
-        all_items = emby.get_emby_library_items(
-            base_url=base_url, api_key=api_key, user_id=user_id,
-            library_ids=[library_id],
+        # 逐页拉取，凑够 limit 张有图的项目就停止，最多翻 5 页
+        valid_items = []
+        for page in emby.iter_emby_library_items(
+            base_url, api_key, [library_id],
             media_type_filter=media_type_to_fetch,
+            user_id=user_id,
             fields="Id,Name,Type,ImageTags,BackdropImageTags,DateCreated,PrimaryImageTag,PrimaryImageItemId",
             sort_by=sort_by_param,
             sort_order=sort_order_param, # ★ 新增此行，明确传递排序顺序
-            limit=api_limit,
+            page_size=api_limit,
+            max_items=api_limit * 5,
             force_user_endpoint=True
-        )
-        
-        if not all_items: return []
-        valid_items = [item for item in all_items if self.__get_image_url(item)]
-        if not valid_items: return []
+        ):
+            valid_items.extend(item for item in page if self.__get_image_url(item))
+            if len(valid_items) >= limit:
+                break
+
         return valid_items[:limit]
 
     def __get_image_url(self, item: Dict[str, Any]) -> str:
@@ -268,35 +268,56 @@ def task_actor_translation(processor):
         # ======================================================================
         # 阶段 3: 分批翻译并并发写回 (逻辑与原版类似，但使用新的数据)
         # ======================================================================
-        all_names_list = list(texts_to_translate)
+        # 先批量查询翻译缓存，命中的词条直接写回，不再提交给 AI
+        cached_translation_map = {}
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cached_entries = processor.actor_db_manager.get_translations_from_db(cursor, texts_to_translate)
+        for text, entry in cached_entries.items():
+            if entry.get('translated_text'):
+                cached_translation_map[text] = entry['translated_text']
+        if cached_translation_map:
+            logger.info(f"  ➜ 翻译缓存命中 {len(cached_translation_map)} 个词条，其余 {len(texts_to_translate) - len(cached_translation_map)} 个将提交给 AI。")
+
+        all_names_list = [text for text in texts_to_translate if text not in cached_translation_map]
         TRANSLATION_BATCH_SIZE = 50
         total_names_to_process = len(all_names_list)
-        total_batches = (total_names_to_process + TRANSLATION_BATCH_SIZE - 1) // TRANSLATION_BATCH_SIZE
+        # 第 0 批是缓存命中的结果，其余每批调用一次 AI
+        batches = [cached_translation_map] if cached_translation_map else []
+        batches.extend(all_names_list[i:i + TRANSLATION_BATCH_SIZE] for i in range(0, total_names_to_process, TRANSLATION_BATCH_SIZE))
+        total_batches = len(batches)
         
         total_updated_count = 0
 
-        for i in range(0, total_names_to_process, TRANSLATION_BATCH_SIZE):
+        for batch_index, batch in enumerate(batches):
             if processor.is_stop_requested():
                 logger.info("任务在翻译阶段被用户中断。")
                 break
 
-            current_batch_names = all_names_list[i:i + TRANSLATION_BATCH_SIZE]
-            batch_num = (i // TRANSLATION_BATCH_SIZE) + 1
+            batch_num = batch_index + 1
             
-            progress = int(20 + (i / total_names_to_process) * 80)
+            progress = int(20 + (batch_index / total_batches) * 80)
             task_manager.update_status_from_thread(
                 progress, 
                 f"阶段 3/3: 正在翻译批次 {batch_num}/{total_batches} (已成功 {total_updated_count} 个)"
             )
             
-            try:
-                # 使用 "音译" 模式，因为它对人名更友好
-                translation_map = processor.ai_translator.batch_translate(
-                    texts=current_batch_names, mode="transliterate"
-                )
-            except Exception as e_trans:
-                logger.error(f"翻译批次 {batch_num} 时发生错误: {e_trans}，将跳过此批次。")
-                continue
+            if isinstance(batch, dict):
+                translation_map = batch
+            else:
+                try:
+                    # 使用 "音译" 模式，因为它对人名更友好
+                    translation_map = processor.ai_translator.batch_translate(
+                        texts=batch, mode="transliterate"
+                    )
+                except Exception as e_trans:
+                    logger.error(f"翻译批次 {batch_num} 时发生错误: {e_trans}，将跳过此批次。")
+                    continue
+
+                if translation_map:
+                    with get_db_connection() as conn:
+                        with conn.cursor() as cursor:
+                            processor.actor_db_manager.save_translations_to_db(cursor, translation_map, processor.ai_translator.provider)
 
             if not translation_map:
                 logger.warning(f"翻译批次 {batch_num} 未能返回任何结果。")
@@ -309,7 +330,8 @@ def task_actor_translation(processor):
             update_tasks = []
             for original_name, translated_name in translation_map.items():
                 if not translated_name or original_name == translated_name: continue
-                persons_to_update = name_to_persons_map.get(original_name, [])
+                emby_name = original_to_emby_name_map.get(original_name, original_name)
+                persons_to_update = name_to_persons_map.get(emby_name, [])
                 for person in persons_to_update:
                     update_tasks.append((person.get("Id"), translated_name))
 
@@ -5,7 +5,6 @@ import logging
 import json
 from functools import cmp_to_key
 from typing import List, Dict, Any, Optional
-from psycopg2 import sql
 from collections import defaultdict
 import task_manager
 import handler.emby as emby
@@ -240,6 +239,83 @@ def _determine_best_version_by_rules(versions: List[Dict[str, Any]]) -> Optional
     
     return sorted_versions[0]['id'] if sorted_versions else None
 
+def _analyze_cleanup_item(item: Dict[str, Any], keep_one_per_res: bool) -> Optional[Dict[str, Any]]:
+    """
+    分析一组多版本媒体，需要清理时返回清理索引条目，否则返回 None。
+    """
+    raw_versions = item['asset_details_json'] or []
+    unique_versions_map = {}
+    for v in raw_versions:
+        eid = v.get('emby_item_id')
+        if eid:
+            unique_versions_map[eid] = v
+    
+    versions_from_db = list(unique_versions_map.values())
+
+    # ★★★ 二次检查：去重后如果只剩1个版本，说明是脏数据，直接跳过 ★★★
+    if len(versions_from_db) < 2: return None
+
+    # =================================================
+    # ★★★ 核心逻辑分叉 ★★★
+    # =================================================
+    best_id_or_ids = None
+    
+    if keep_one_per_res:
+        # --- 模式 A: 保留每种分辨率的最佳版本 ---
+        
+        # 1. 按分辨率分组
+        res_groups = defaultdict(list)
+        for v in versions_from_db:
+            # 获取标准化后的分辨率 (例如 "4K", "1080p")
+            props = _get_properties_for_comparison(v)
+            res_key = props.get('resolution', 'unknown')
+            res_groups[res_key].append(v)
+        
+        # 2. 在每组内选出最佳
+        best_ids_set = set()
+        for res, group_versions in res_groups.items():
+            best_in_group = _determine_best_version_by_rules(group_versions)
+            if best_in_group:
+                best_ids_set.add(best_in_group)
+        
+        # 3. 判断是否需要清理
+        # 如果选出的最佳版本数量 等于 总版本数量，说明每个版本都是它那个分辨率的独苗，无需清理
+        if len(best_ids_set) == len(versions_from_db):
+            return None
+        
+        # 4. 将多个 ID 序列化为 JSON 字符串存储
+        # 数据库字段 best_version_id 是 TEXT 类型，存 JSON 字符串完全没问题
+        best_id_or_ids = json.dumps(list(best_ids_set))
+        
+    else:
+        # --- 模式 B: 传统模式 (只留一个) ---
+        best_id_or_ids = _determine_best_version_by_rules(versions_from_db)
+
+    # 构建前端展示用的精简信息
+    versions_for_frontend = []
+    for v in versions_from_db:
+        props = _get_properties_for_comparison(v)
+        versions_for_frontend.append({
+            'id': v.get('emby_item_id'),
+            'path': v.get('path'),
+            'filesize': v.get('size_bytes', 0),
+            'quality': props.get('quality'), # 使用标准化后的
+            'resolution': props.get('resolution'),
+            'effect': props.get('effect'),
+            'video_bitrate_mbps': props.get('video_bitrate_mbps'),
+            'bit_depth': props.get('bit_depth'),
+            'frame_rate': props.get('frame_rate'),
+            'runtime_minutes': props.get('runtime_minutes'),
+            'codec': props.get('codec')
+        })
+
+    return {
+        "tmdb_id": item['tmdb_id'], 
+        "item_type": item['item_type'],
+        "versions_info_json": versions_for_frontend,
+        "best_version_id": best_id_or_ids,
+    }
+
 # ======================================================================
 # 任务函数
 # ======================================================================
@@ -256,44 +332,38 @@ def task_scan_for_cleanup_issues(processor):
         library_ids_to_scan = settings_db.get_setting('media_cleanup_library_ids') or []
         keep_one_per_res = settings_db.get_setting('media_cleanup_keep_one_per_res') or False
         
+        library_paths = None
+        item_ids_in_scope = None
         if library_ids_to_scan:
             logger.info(f"  ➜ 将仅扫描指定的 {len(library_ids_to_scan)} 个媒体库。")
-            items_in_scope = emby.get_library_items_for_cleanup(
-                base_url=processor.emby_url,
-                api_key=processor.emby_api_key,
-                user_id=processor.emby_user_id,
-                library_ids=library_ids_to_scan,
-                media_type_filter="Movie,Series,Episode",
-                fields="Id"
-            )
-            item_ids_in_scope = {item['Id'] for item in items_in_scope}
-            
-            if not item_ids_in_scope:
-                task_manager.update_status_from_thread(100, "扫描中止：指定的媒体库为空。")
-                return
-            
-            where_clause = "AND EXISTS (SELECT 1 FROM jsonb_array_elements_text(t.emby_item_ids_json) AS elem WHERE elem = ANY(%(item_ids)s))"
-            params = {'item_ids': list(item_ids_in_scope)}
+            # 优先按媒体库源文件夹在数据库内判断归属，无需向 Emby 拉取整库列表
+            library_paths = emby.get_library_source_paths(library_ids_to_scan, processor.emby_url, processor.emby_api_key)
+
+            if library_paths is None:
+                # 回退：分页流式拉取，只收集 ID，不在内存中保留整库的项目列表
+                item_ids_in_scope = set()
+                for page in emby.iter_emby_library_items(
+                    processor.emby_url, processor.emby_api_key, library_ids_to_scan,
+                    media_type_filter="Movie,Series,Episode",
+                    user_id=processor.emby_user_id,
+                    fields="Id",
+                    prefetch_pages=2,
+                    stop_event=processor.get_stop_event()
+                ):
+                    item_ids_in_scope.update(item['Id'] for item in page if item.get('Id'))
+                    task_manager.update_status_from_thread(5, f"正在索引指定媒体库... 已获取 {len(item_ids_in_scope)} 项")
+
+                if processor.is_stop_requested():
+                    logger.info(f"  ➜ '{task_name}' 任务在索引媒体库阶段被中止。")
+                    return
+                
+                if not item_ids_in_scope:
+                    task_manager.update_status_from_thread(100, "扫描中止：指定的媒体库为空。")
+                    return
         else:
             logger.info("  ➜ 未指定媒体库，将扫描所有媒体库。")
-            where_clause = ""
-            params = {}
-
-        sql_query = sql.SQL("""
-            SELECT t.tmdb_id, t.item_type, t.asset_details_json
-            FROM media_metadata AS t
-            WHERE 
-                t.in_library = TRUE 
-                AND jsonb_array_length(t.asset_details_json) > 1
-                {where_clause}
-        """).format(where_clause=sql.SQL(where_clause))
-
-        with connection.get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql_query, params)
-                multi_version_items = cursor.fetchall()
-
-        total_items = len(multi_version_items)
+
+        total_items = cleanup_db.count_multi_version_items(library_paths=library_paths, emby_ids=item_ids_in_scope)
         if total_items == 0:
             cleanup_db.clear_pending_cleanup_tasks()
             task_manager.update_status_from_thread(100, "扫描完成：未发现任何多版本媒体。")
@@ -302,90 +372,21 @@ def task_scan_for_cleanup_issues(processor):
         task_manager.update_status_from_thread(10, f"发现 {total_items} 组多版本媒体，开始分析...")
         
         cleanup_index_entries = []
-        for i, item in enumerate(multi_version_items):
-            progress = 10 + int((i / total_items) * 80)
-            # 获取标题用于日志
-            with connection.get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("SELECT title FROM media_metadata WHERE tmdb_id = %s AND item_type = %s", (item['tmdb_id'], item['item_type']))
-                    title_row = cursor.fetchone()
-                    display_title = title_row['title'] if title_row else '未知媒体'
-            
-            task_manager.update_status_from_thread(progress, f"({i+1}/{total_items}) 正在分析: {display_title}")
-
-            versions_from_db = item['asset_details_json']
-            raw_versions = item['asset_details_json']
-            unique_versions_map = {}
-            for v in raw_versions:
-                eid = v.get('emby_item_id')
-                if eid:
-                    unique_versions_map[eid] = v
-            
-            versions_from_db = list(unique_versions_map.values())
+        processed = 0
+        for batch in cleanup_db.iter_multi_version_item_batches(library_paths=library_paths, emby_ids=item_ids_in_scope):
+            if processor.is_stop_requested():
+                logger.info(f"  ➜ '{task_name}' 任务在分析阶段被中止，本次结果不写入。")
+                return
 
-            # ★★★ 二次检查：去重后如果只剩1个版本，说明是脏数据，直接跳过 ★★★
-            if len(versions_from_db) < 2: continue
+            for item in batch:
+                entry = _analyze_cleanup_item(item, keep_one_per_res)
+                if entry:
+                    cleanup_index_entries.append(entry)
 
-            # =================================================
-            # ★★★ 核心逻辑分叉 ★★★
-            # =================================================
-            best_id_or_ids = None
-            
-            if keep_one_per_res:
-                # --- 模式 A: 保留每种分辨率的最佳版本 ---
-                
-                # 1. 按分辨率分组
-                res_groups = defaultdict(list)
-                for v in versions_from_db:
-                    # 获取标准化后的分辨率 (例如 "4K", "1080p")
-                    props = _get_properties_for_comparison(v)
-                    res_key = props.get('resolution', 'unknown')
-                    res_groups[res_key].append(v)
-                
-                # 2. 在每组内选出最佳
-                best_ids_set = set()
-                for res, group_versions in res_groups.items():
-                    best_in_group = _determine_best_version_by_rules(group_versions)
-                    if best_in_group:
-                        best_ids_set.add(best_in_group)
-                
-                # 3. 判断是否需要清理
-                # 如果选出的最佳版本数量 等于 总版本数量，说明每个版本都是它那个分辨率的独苗，无需清理
-                if len(best_ids_set) == len(versions_from_db):
-                    continue 
-                
-                # 4. 将多个 ID 序列化为 JSON 字符串存储
-                # 数据库字段 best_version_id 是 TEXT 类型，存 JSON 字符串完全没问题
-                best_id_or_ids = json.dumps(list(best_ids_set))
-                
-            else:
-                # --- 模式 B: 传统模式 (只留一个) ---
-                best_id_or_ids = _determine_best_version_by_rules(versions_from_db)
-
-            # 构建前端展示用的精简信息
-            versions_for_frontend = []
-            for v in versions_from_db:
-                props = _get_properties_for_comparison(v)
-                versions_for_frontend.append({
-                    'id': v.get('emby_item_id'),
-                    'path': v.get('path'),
-                    'filesize': v.get('size_bytes', 0),
-                    'quality': props.get('quality'), # 使用标准化后的
-                    'resolution': props.get('resolution'),
-                    'effect': props.get('effect'),
-                    'video_bitrate_mbps': props.get('video_bitrate_mbps'),
-                    'bit_depth': props.get('bit_depth'),
-                    'frame_rate': props.get('frame_rate'),
-                    'runtime_minutes': props.get('runtime_minutes'),
-                    'codec': props.get('codec')
-                })
-
-            cleanup_index_entries.append({
-                "tmdb_id": item['tmdb_id'], 
-                "item_type": item['item_type'],
-                "versions_info_json": versions_for_frontend,
-                "best_version_id": best_id_or_ids,
-            })
+            processed += len(batch)
+            progress = 10 + int((min(processed, total_items) / total_items) * 80)
+            display_title = batch[-1].get('title') or '未知媒体'
+            task_manager.update_status_from_thread(progress, f"({processed}/{total_items}) 正在分析: {display_title}")
 
         task_manager.update_status_from_thread(90, f"分析完成，正在写入数据库...")
 
@@ -5,15 +5,16 @@ import json
 import logging
 import pytz
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 
 # 导入需要的底层模块和共享实例
 import handler.emby as emby
 import task_manager
+import constants
 import handler.tmdb as tmdb
-from database import collection_db, connection, settings_db, media_db, request_db
+from database import collection_db, connection, settings_db, media_db, request_db, queries_db, permission_db
 from handler.custom_collection import ListImporter, FilterEngine
 from handler import collections
 from services.cover_generator import CoverGeneratorService
@@ -313,53 +314,103 @@ def _get_cover_badge_text_for_collection(collection_db_info: Dict[str, Any]) ->
     # 如果不是榜单类型，或者榜单类型不匹配任何特殊规则，则返回数字角标
     return item_count_to_pass
 
+# --- 用户权限快照 ---
+def _load_user_permission_bitmaps(processor, all_emby_users: list) -> Optional[permission_db.UserPermissionBitmaps]:
+    """
+    获取所有用户的权限位图，优先沿用数据库中的权限快照。
+    只有以下情况才重新枚举该用户的全部可访问项目：
+    - 没有快照，或快照超过 PERMISSION_SNAPSHOT_MAX_AGE_HOURS；
+    - Policy 指纹变化 (可访问的库、家长控制、标签等)；
+    - Emby 返回的可访问项目总数与快照不一致 (有 Webhook 未覆盖到的增删)。
+    """
+    snapshots = permission_db.get_permission_snapshots([u['Id'] for u in all_emby_users if u.get('Id')])
+    max_age = timedelta(hours=constants.PERMISSION_SNAPSHOT_MAX_AGE_HOURS)
+    now = datetime.now(timezone.utc)
+
+    def _resolve_user(user):
+        user_id = user['Id']
+        fingerprint = emby.get_user_policy_fingerprint(user, processor.emby_url, processor.emby_api_key)
+        snapshot = snapshots.get(user_id)
+        if (snapshot and fingerprint and snapshot['policy_fingerprint'] == fingerprint
+                and snapshot['snapshot_at'] and now - snapshot['snapshot_at'] < max_age):
+            current_count = emby.get_item_count(processor.emby_url, processor.emby_api_key, user_id, emby.PERMISSION_ITEM_TYPES)
+            if current_count is not None and current_count == snapshot['item_count']:
+                return fingerprint, None, snapshot['bitmap']
+        permission_set = emby.get_all_accessible_item_ids_for_user_optimized(processor.emby_url, processor.emby_api_key, user_id)
+        return fingerprint, permission_set, None
+
+    user_permissions_map = {}
+    policy_fingerprints = {}
+    reused_bitmaps = {}
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        future_to_user = {executor.submit(_resolve_user, user): user for user in all_emby_users if user.get('Id')}
+        for future in as_completed(future_to_user):
+            user = future_to_user[future]
+            try:
+                fingerprint, permission_set, reused_bitmap = future.result()
+                if reused_bitmap is not None:
+                    reused_bitmaps[user['Id']] = reused_bitmap
+                elif permission_set is not None:
+                    user_permissions_map[user['Id']] = permission_set
+                    if fingerprint:
+                        policy_fingerprints[user['Id']] = fingerprint
+            except Exception as e: logger.error(f"为用户 '{user['Name']}' 获取权限时出错: {e}")
+
+    if not user_permissions_map and not reused_bitmaps:
+        return None
+    logger.info(f"  ➜ 用户权限：{len(reused_bitmaps)} 个用户沿用快照，{len(user_permissions_map)} 个用户重新枚举。")
+    return permission_db.UserPermissionBitmaps.build(user_permissions_map, policy_fingerprints, reused_bitmaps)
+
 # --- 可复用的权限更新函数 ---
-def update_user_permissions_for_collection(collection_id: int, global_ordered_emby_ids: list, user_permissions_map: dict):
+def update_user_permissions_for_collection(collection_id: int, global_ordered_emby_ids: list,
+                                           user_permissions: Union[dict, permission_db.UserPermissionBitmaps]):
     """
     为单个自定义合集，计算所有用户的专属可见媒体列表，并批量更新到 user_collection_cache 表。
     这是一个可被多处调用的独立、可复用函数。
+    user_permissions 可以是 {user_id: 可访问ID集合}，也可以是预先构建好的 UserPermissionBitmaps；
+    批量任务应传入后者，避免每个合集都重建一次用户位图。
     """
     logger.debug(f"  ➜ 正在为合集ID {collection_id} 计算并更新用户权限缓存...")
-    if not user_permissions_map:
+    if not user_permissions:
         logger.warning("  ➜ 未提供用户权限映射，跳过权限计算。")
         return
 
-    user_collection_cache_data_to_upsert = []
-    for user_id, permission_set in user_permissions_map.items():
-        # 计算交集，得到该用户在此合集中可见的媒体ID
-        visible_emby_ids = [emby_id for emby_id in global_ordered_emby_ids if emby_id in permission_set]
-        user_collection_cache_data_to_upsert.append({
-            "user_id": user_id,
-            "collection_id": collection_id,
-            "visible_emby_ids_json": json.dumps(visible_emby_ids),
-            "total_count": len(visible_emby_ids),
-        })
-
-    if not user_collection_cache_data_to_upsert:
-        logger.debug(f"  ➜ 合集ID {collection_id} 无需更新任何用户权限缓存。")
-        return
+    try:
+        if not isinstance(user_permissions, permission_db.UserPermissionBitmaps):
+            user_permissions = permission_db.UserPermissionBitmaps.build(user_permissions)
 
-    # 批量写入数据库
-    with connection.get_db_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            cols = ["user_id", "collection_id", "visible_emby_ids_json", "total_count"]
-            cols_str = ", ".join(cols)
-            placeholders_str = ", ".join([f"%({k})s" for k in cols])
-            update_cols = [f"{col} = EXCLUDED.{col}" for col in cols]
-            update_str = ", ".join(update_cols)
-            sql = f"""
-                INSERT INTO user_collection_cache ({cols_str}, last_updated_at)
-                VALUES ({placeholders_str}, NOW())
-                ON CONFLICT (user_id, collection_id) DO UPDATE SET {update_str}, last_updated_at = NOW()
-            """
-            from psycopg2.extras import execute_batch
-            execute_batch(cursor, sql, user_collection_cache_data_to_upsert)
-            conn.commit()
-            logger.info(f"  ✅ 成功为 {len(user_permissions_map)} 个用户更新了合集ID {collection_id} 的权限缓存。")
-        except Exception as e_db:
-            logger.error(f"批量写入用户合集权限缓存 (合集ID: {collection_id}) 时发生数据库错误: {e_db}", exc_info=True)
-            conn.rollback()
+        with connection.get_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # 合集成员中可能有尚未编号的项目 (没有任何用户能看到)，也为其分配 dense_id，保证成员顺序完整
+                user_permissions.ensure_dense_ids(cursor, global_ordered_emby_ids)
+                dense_ids = user_permissions.dense_ids
+
+                ordered_dense_ids = []
+                seen = set()
+                for emby_id in global_ordered_emby_ids:
+                    dense_id = dense_ids.get(emby_id)
+                    if dense_id is not None and dense_id not in seen:
+                        seen.add(dense_id)
+                        ordered_dense_ids.append(dense_id)
+                member_bitmap = permission_db.ids_to_bitmap(ordered_dense_ids)
+
+                # 计算交集：用户位图 AND 合集成员位图
+                user_visible_bitmaps = {
+                    user_id: user_bitmap & member_bitmap
+                    for user_id, user_bitmap in user_permissions.user_bitmaps.items()
+                }
+
+                permission_db.write_collection_visibility(cursor, collection_id, ordered_dense_ids, user_visible_bitmaps)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        queries_db.invalidate_visible_ids_cache(collection_ids=[collection_id])
+        logger.info(f"  ✅ 成功为 {len(user_permissions)} 个用户更新了合集ID {collection_id} 的权限缓存。")
+    except Exception as e_db:
+        logger.error(f"批量写入用户合集权限缓存 (合集ID: {collection_id}) 时发生数据库错误: {e_db}", exc_info=True)
 
 # ★★★ 一键生成所有合集的后台任务 ★★★
 def task_process_all_custom_collections(processor):
@@ -375,15 +426,8 @@ def task_process_all_custom_collections(processor):
         all_emby_users = emby.get_all_emby_users_from_server(processor.emby_url, processor.emby_api_key)
         if not all_emby_users: raise RuntimeError("无法从Emby获取用户列表")
         
-        user_permissions_map = {}
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_user = {executor.submit(emby.get_all_accessible_item_ids_for_user_optimized, processor.emby_url, processor.emby_api_key, user['Id']): user for user in all_emby_users}
-            for future in as_completed(future_to_user):
-                user = future_to_user[future]
-                try:
-                    permission_set = future.result()
-                    if permission_set is not None: user_permissions_map[user['Id']] = permission_set
-                except Exception as e: logger.error(f"为用户 '{user['Name']}' 获取权限时出错: {e}")
+        # 用户位图只构建一次，所有合集复用
+        user_permission_bitmaps = _load_user_permission_bitmaps(processor, all_emby_users)
         
         task_manager.update_status_from_thread(10, "正在获取所有启用的合集定义...")
         active_collections = collection_db.get_all_active_custom_collections()
@@ -458,7 +502,7 @@ def task_process_all_custom_collections(processor):
                     prefetched_collection_map=prefetched_collection_map
                 )
 
-                update_user_permissions_for_collection(collection_id, global_ordered_emby_ids, user_permissions_map)
+                update_user_permissions_for_collection(collection_id, global_ordered_emby_ids, user_permission_bitmaps)
 
                 update_data = {
                     "emby_collection_id": emby_collection_id,
@@ -533,15 +577,7 @@ def process_single_custom_collection(processor, custom_collection_id: int):
         all_emby_users = emby.get_all_emby_users_from_server(processor.emby_url, processor.emby_api_key)
         if not all_emby_users: raise RuntimeError("无法获取用户列表")
         
-        user_permissions_map = {}
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_user = {executor.submit(emby.get_all_accessible_item_ids_for_user_optimized, processor.emby_url, processor.emby_api_key, user['Id']): user for user in all_emby_users}
-            for future in as_completed(future_to_user):
-                user = future_to_user[future]
-                try:
-                    permission_set = future.result()
-                    if permission_set is not None: user_permissions_map[user['Id']] = permission_set
-                except Exception as e: logger.error(f"为用户 '{user['Name']}' 获取权限时出错: {e}")
+        user_permission_bitmaps = _load_user_permission_bitmaps(processor, all_emby_users)
         
         task_manager.update_status_from_thread(20, "正在读取合集定义...")
         collection = collection_db.get_custom_collection_by_id(custom_collection_id)
@@ -596,7 +632,7 @@ def process_single_custom_collection(processor, custom_collection_id: int):
         )
 
         task_manager.update_status_from_thread(90, "正在为所有用户更新此合集的权限缓存...")
-        update_user_permissions_for_collection(custom_collection_id, global_ordered_emby_ids, user_permissions_map)
+        update_user_permissions_for_collection(custom_collection_id, global_ordered_emby_ids, user_permission_bitmaps)
 
         update_data = {
             "emby_collection_id": emby_collection_id,
@@ -13,7 +13,7 @@ import task_manager
 from .actors import (task_sync_person_map, task_enrich_aliases, task_actor_translation, 
                      task_process_actor_subscriptions, task_purge_unregistered_actors, task_merge_duplicate_actors,
                      task_purge_ghost_actors)
-from .media import task_role_translation, task_populate_metadata_cache, task_apply_main_cast_to_episodes 
+from .media import task_role_translation, task_populate_metadata_cache, task_reconcile_metadata_cache, task_apply_main_cast_to_episodes 
 from .watchlist import task_process_watchlist, task_run_new_season_check, task_scan_library_gaps
 from .collections import task_refresh_collections, task_process_all_custom_collections, process_single_custom_collection
 from .subscriptions import task_auto_subscribe, task_manual_subscribe_batch
@@ -108,7 +108,8 @@ def _task_run_chain_internal(processor, task_name: str, sequence_config_key: str
                     'role-translation', 
                     'enrich-aliases', 
                     'process-watchlist', 
-                    'populate-metadata'
+                    'populate-metadata',
+                    'update-resubscribe-cache'
                 ]
                 
                 if task_key in tasks_requiring_force_flag:
@@ -180,6 +181,7 @@ def get_task_registry(context: str = 'all'):
         'sync-person-map': (task_sync_person_map, "同步演员数据", 'media', True),
         'enrich-aliases': (task_enrich_aliases, "演员数据补充", 'media', True),
         'populate-metadata': (task_populate_metadata_cache, "同步媒体数据", 'media', True),
+        'reconcile-metadata': (task_reconcile_metadata_cache, "媒体数据对账", 'media', True),
         'role-translation': (task_role_translation, "中文化角色名", 'media', True),
         'actor-translation': (task_actor_translation, "中文化演员名", 'media', True),
         'process-watchlist': (task_process_watchlist, "刷新智能追剧", 'watchlist', True),
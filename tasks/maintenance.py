@@ -7,7 +7,7 @@ import logging
 from typing import List, Dict, Any
 
 # 导入需要的底层模块和共享实例
-from database import connection, maintenance_db, settings_db
+from database import connection, maintenance_db, settings_db, queries_db, actor_db
 from psycopg2 import sql
 from psycopg2.extras import execute_values, Json
 
@@ -31,7 +31,8 @@ def _prepare_data_for_insert(table_name: str, table_data: List[Dict[str, Any]])
             'pre_cached_tags_json', 'pre_cached_extra_json', 'genres_json', 
             'actors_json', 'directors_json', 'studios_json', 'countries_json', 
             'keywords_json', 'next_episode_to_air_json', 'last_episode_to_air_json',
-            'watchlist_next_episode_json', 'watchlist_missing_info_json', 'asset_details_json'
+            'watchlist_next_episode_json', 'watchlist_missing_info_json', 'asset_details_json',
+            'watchlist_tmdb_fingerprint_json'
         },
         'actor_subscriptions': {'config_genres_include_json', 'config_genres_exclude_json', 'last_scanned_tmdb_ids_json'},
         'resubscribe_rules': {
@@ -40,6 +41,7 @@ def _prepare_data_for_insert(table_name: str, table_data: List[Dict[str, Any]])
             'resubscribe_effect_include', 'resubscribe_codec_include'
         },
         'media_cleanup_tasks': {'versions_info_json'},
+        'tmdb_api_cache': {'response_json'},
         'user_templates': {'emby_policy_json', 'emby_configuration_json'}
     }
 
@@ -47,12 +49,18 @@ def _prepare_data_for_insert(table_name: str, table_data: List[Dict[str, Any]])
         'actor_subscriptions': {'config_media_types'}
     }
 
+    # 原生 PostgreSQL 数组列：列表原样交给 psycopg2 适配为 ARRAY
+    ARRAY_COLUMNS = {
+        'collection_member_index': {'member_dense_ids'}
+    }
+
     if not table_data:
         return [], []
 
     columns = list(table_data[0].keys())
     table_json_rules = JSONB_COLUMNS.get(table_name.lower(), set())
     table_list_to_string_rules = LIST_TO_STRING_COLUMNS.get(table_name.lower(), set())
+    table_array_rules = ARRAY_COLUMNS.get(table_name.lower(), set())
     
     prepared_rows = []
     for row_dict in table_data:
@@ -63,6 +71,9 @@ def _prepare_data_for_insert(table_name: str, table_data: List[Dict[str, Any]])
             if col_name in table_json_rules and value is not None:
                 # 1. 如果是指定的 JSONB 列，使用 Json() 包装器
                 value = Json(value)
+            elif col_name in table_array_rules and isinstance(value, list):
+                # 2. 原生数组列，保持列表
+                pass
             elif col_name in table_list_to_string_rules and isinstance(value, list):
                 # 2. 如果是指定的需要转为字符串的列表列
                 value = ','.join(map(str, value))
@@ -285,7 +296,12 @@ def task_import_database(processor, file_content: str, tables_to_import: List[st
         'user_templates': '用户权限模板', 
         'invitations': '邀请码', 
         'emby_users_extended': 'Emby用户扩展信息',
-        'user_collection_cache': 'Emby用户权限缓存'
+        'user_collection_cache': 'Emby用户权限缓存',
+        'emby_item_dense_ids': 'Emby项目稠密ID',
+        'user_permission_bitmaps': '用户权限位图',
+        'collection_member_index': '合集成员索引',
+        'metadata_sync_queue': '元数据同步队列',
+        'tmdb_api_cache': 'TMDb响应缓存'
     }
     summary_lines = []
     conn = None
@@ -376,6 +392,8 @@ def task_import_database(processor, file_content: str, tables_to_import: List[st
                 logger.info("="*36)
                 conn.commit()
                 logger.info(f"  ➜  数据库事务已成功提交！任务 '{task_name}' 完成。")
+                queries_db.invalidate_visible_ids_cache()
+                actor_db.invalidate_translation_cache()
                 # --- 触发自动校准任务 ---
                 try:
                     logger.info("  ➜ 数据导入成功，将自动触发ID计数器校准任务以确保数据一致性...")
@@ -5,8 +5,8 @@ import time
 import json
 import logging
 import psycopg2
-from typing import Optional, List
-from datetime import datetime, timezone
+from typing import Optional, List, Tuple
+from datetime import datetime, timezone, timedelta
 import concurrent.futures
 from collections import defaultdict
 
@@ -15,7 +15,8 @@ import task_manager
 import handler.tmdb as tmdb
 import handler.emby as emby
 import handler.telegram as telegram
-from database import connection
+import constants
+from database import connection, settings_db, media_db
 from utils import translate_country_list, get_unified_rating
 from .helpers import parse_full_asset_details
 
@@ -197,450 +198,671 @@ def task_reprocess_all_review_items(processor):
         logger.error(f"重新处理所有待复核项时发生严重错误: {e}", exc_info=True)
         task_manager.update_status_from_thread(-1, "任务失败")
 
-# ★★★ 重量级的元数据缓存填充任务 ★★★
-def task_populate_metadata_cache(processor, batch_size: int = 50, force_full_update: bool = False):
+
+# 元数据同步时向 Emby 请求的完整字段
+METADATA_SYNC_FIELDS = "ProviderIds,Type,DateCreated,Name,OriginalTitle,PremiereDate,CommunityRating,Genres,Studios,Tags,DateModified,OfficialRating,ProductionYear,Path,PrimaryImageAspectRatio,Overview,MediaStreams,Container,Size,SeriesId,ParentIndexNumber,IndexNumber,ParentId,RunTimeTicks"
+# 增量同步探测变更时只需要的轻量字段
+METADATA_CHANGE_FEED_FIELDS = "ProviderIds,Type,SeriesId,ParentId,DateCreated,DateModified"
+# app_settings 中保存增量同步水位线的键
+METADATA_SYNC_WATERMARK_KEY = 'metadata_sync_watermark'
+
+def _load_metadata_sync_watermark() -> Optional[datetime]:
+    """读取上次同步成功的时间点，没有或无法解析时返回 None（触发全量比对）。"""
+    state = settings_db.get_setting(METADATA_SYNC_WATERMARK_KEY) or {}
+    last_sync_at = state.get('last_sync_at')
+    if not last_sync_at:
+        return None
+    try:
+        return datetime.fromisoformat(last_sync_at)
+    except ValueError:
+        logger.warning(f"  ➜ 无法解析增量同步水位线 '{last_sync_at}'，本次将执行全量比对。")
+        return None
+
+def _save_metadata_sync_watermark(sync_started_at: datetime, mode: str):
+    """以本次同步的开始时间作为新水位线，同步期间发生的变更会在下一次被重新拉取。"""
+    settings_db.save_setting(METADATA_SYNC_WATERMARK_KEY, {
+        'last_sync_at': sync_started_at.isoformat(),
+        'mode': mode
+    })
+
+def _sync_top_level_groups(processor, items_to_process: List[list], series_to_seasons_map: dict, series_to_episode_map: dict, batch_size: int) -> Tuple[int, int]:
     """
-    - 重量级的元数据缓存填充任务。
-    - 逻辑升级：
-      1. 记录本次扫描到的所有 Emby ID。
-      2. 计算 (库内已知 ID - 本次扫描 ID) = 已删除的 ID。
-      3. 如果发现已删除的 ID，反查其所属的父级剧集，并将该剧集标记为“待更新”。
-      4. 这样即使只删了一集，该剧集也会进入处理队列，从而触发子集离线清理逻辑。
+    第三阶段：为每组顶层项目（同一 TMDb 项目的所有版本）拉取 TMDb 详情、
+    构建 媒体/季/集 记录并写库，同时对已处理的剧集做子集离线对账。
+    返回 (新增/更新数, 标记离线数)。
     """
-    task_name = "同步媒体元数据"
-    sync_mode = "深度同步 (全量)" if force_full_update else "快速同步 (增量)"
-    logger.info(f"--- 模式: {sync_mode} (分批大小: {batch_size}) ---")
-    
-    # --- 统计计数器 ---
     total_updated_count = 0
     total_offline_count = 0
 
-    try:
-        task_manager.update_status_from_thread(0, f"阶段1/3: 建立差异基准 ({sync_mode})...")
-        
-        libs_to_process_ids = processor.config.get("libraries_to_process", [])
-        if not libs_to_process_ids:
-            raise ValueError("未在配置中指定要处理的媒体库。")
+    total_to_process = len(items_to_process)
+    task_manager.update_status_from_thread(20, f"阶段3/3: 正在同步 {total_to_process} 个变更项目...")
+    logger.info(f"  ➜ 最终处理队列: {total_to_process} 个顶层项目")
 
-        # 1. 获取数据库中所有已知的 Emby ID (用于比对)
-        known_emby_ids = set()
-        if not force_full_update:
-            with connection.get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT jsonb_array_elements_text(emby_item_ids_json) AS emby_id
-                    FROM media_metadata 
-                    WHERE in_library = TRUE
-                """)
-                known_emby_ids = set(row['emby_id'] for row in cursor.fetchall())
-            logger.info(f"  ➜ 基准建立完成，库内已知 {len(known_emby_ids)} 个 Emby 媒体项 ID。")
-
-        # 2. 扫描 Emby
-        task_manager.update_status_from_thread(10, f"阶段2/3: 扫描 Emby 并计算差异...")
-        emby_items_index = emby.get_all_library_versions(
-            base_url=processor.emby_url, api_key=processor.emby_api_key, user_id=processor.emby_user_id,
-            media_type_filter="Movie,Series,Season,Episode",
-            library_ids=libs_to_process_ids,
-            fields="ProviderIds,Type,DateCreated,Name,OriginalTitle,PremiereDate,CommunityRating,Genres,Studios,Tags,DateModified,OfficialRating,ProductionYear,Path,PrimaryImageAspectRatio,Overview,MediaStreams,Container,Size,SeriesId,ParentIndexNumber,IndexNumber,ParentId,RunTimeTicks",
-            update_status_callback=task_manager.update_status_from_thread
-        ) or []
-        
-        # 3. 构建索引 & 识别变动
-        top_level_items_map = defaultdict(list)       
-        series_to_seasons_map = defaultdict(list)     
-        series_to_episode_map = defaultdict(list)     
-        
-        emby_top_level_keys = set() 
-        
-        # 记录哪些剧集(TMDb ID)需要刷新
-        dirty_series_tmdb_ids = set()
-        emby_sid_to_tmdb_id = {}
+    # 7. 批量处理
+    processed_count = 0
+    for i in range(0, total_to_process, batch_size):
+        if processor.is_stop_requested(): break
+        batch_item_groups = items_to_process[i:i + batch_size]
         
-        # 记录本次扫描到的所有 Emby ID (用于反向比对删除)
-        current_scan_emby_ids = set()
-
-        # 先遍历一遍建立 Series ID 映射
-        for item in emby_items_index:
-            # 记录 ID
-            if item.get("Id"):
-                current_scan_emby_ids.add(str(item.get("Id")))
-
-            if item.get("Type") == "Series":
-                t_id = item.get("ProviderIds", {}).get("Tmdb")
-                e_id = str(item.get("Id"))
-                if t_id and e_id:
-                    emby_sid_to_tmdb_id[e_id] = str(t_id)
-
-        scan_count = len(emby_items_index)
-        
-        for item in emby_items_index:
+        # --- 并发获取 TMDB 详情 ---
+        tmdb_details_map = {}
+        def fetch_tmdb_details(item_group):
+            item = item_group[0]
+            t_id = item.get("ProviderIds", {}).get("Tmdb")
+            i_type = item.get("Type")
+            if not t_id: return None, None
+            details = None
+            try:
+                if i_type == 'Movie': details = tmdb.get_movie_details(t_id, processor.tmdb_api_key)
+                elif i_type == 'Series': details = tmdb.get_tv_details(t_id, processor.tmdb_api_key)
+            except Exception: pass
+            return str(t_id), details
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=constants.TMDB_MAX_WORKERS) as executor:
+            futures = {executor.submit(fetch_tmdb_details, grp): grp for grp in batch_item_groups}
+            for future in concurrent.futures.as_completed(futures):
+                t_id_str, details = future.result()
+                if t_id_str and details: tmdb_details_map[t_id_str] = details
+
+        metadata_batch = []
+        series_ids_processed_in_batch = set()
+
+        for item_group in batch_item_groups:
+            item = item_group[0]
+            tmdb_id_str = str(item.get("ProviderIds", {}).get("Tmdb"))
             item_type = item.get("Type")
-            item_emby_id = str(item.get("Id"))
-            tmdb_id = item.get("ProviderIds", {}).get("Tmdb")
-            
-            # --- 正向差异检测 (新增) ---
-            is_new_item = False
-            if not force_full_update:
-                if item_emby_id not in known_emby_ids:
-                    is_new_item = True
+            tmdb_details = tmdb_details_map.get(tmdb_id_str)
             
-            # A. 顶层媒体
-            if item_type in ["Movie", "Series"]:
-                if tmdb_id:
-                    composite_key = (str(tmdb_id), item_type)
-                    top_level_items_map[composite_key].append(item)
-                    emby_top_level_keys.add(composite_key)
-                    
-                    if item_type == "Series" and is_new_item:
-                        dirty_series_tmdb_ids.add(str(tmdb_id))
-
-            # B. 子集媒体 (Season)
-            elif item_type == 'Season':
-                s_id = str(item.get('SeriesId') or item.get('ParentId'))
-                if s_id: 
-                    series_to_seasons_map[s_id].append(item)
-                    if is_new_item and s_id in emby_sid_to_tmdb_id:
-                        dirty_series_tmdb_ids.add(emby_sid_to_tmdb_id[s_id])
-
-            # C. 子集媒体 (Episode)
-            elif item_type == 'Episode':
-                s_id = str(item.get('SeriesId'))
-                if s_id: 
-                    series_to_episode_map[s_id].append(item)
-                    if is_new_item and s_id in emby_sid_to_tmdb_id:
-                        dirty_series_tmdb_ids.add(emby_sid_to_tmdb_id[s_id])
-
-        # ★★★ 反向差异检测 (删除) - V15 核心新增 ★★★
-        if not force_full_update:
-            # 算出哪些 ID 在库里有，但 Emby 没扫到
-            missing_emby_ids = known_emby_ids - current_scan_emby_ids
-            if missing_emby_ids:
-                logger.info(f"  ➜ 检测到 {len(missing_emby_ids)} 个 Emby ID 已消失，正在反查所属剧集...")
-                missing_ids_list = list(missing_emby_ids)
+            # --- 1. 构建顶层记录 ---
+            asset_details_list = []
+            if item_type == "Movie":
+                asset_details_list = [parse_full_asset_details(v) for v in item_group]
+
+            emby_runtime = round(item['RunTimeTicks'] / 600000000) if item.get('RunTimeTicks') else None
+
+            top_record = {
+                "tmdb_id": tmdb_id_str, "item_type": item_type, "title": item.get('Name'),
+                "original_title": item.get('OriginalTitle'), "release_year": item.get('ProductionYear'),
+                "in_library": True, 
+                "emby_item_ids_json": json.dumps(list(set(v.get('Id') for v in item_group if v.get('Id'))), ensure_ascii=False),
+                "asset_details_json": json.dumps(asset_details_list, ensure_ascii=False),
+                "rating": item.get('CommunityRating'),
+                "date_added": item.get('DateCreated'),
+                "genres_json": json.dumps(item.get('Genres', []), ensure_ascii=False),
+                "official_rating": item.get('OfficialRating'), 
+                "unified_rating": get_unified_rating(item.get('OfficialRating')),
+                "runtime_minutes": emby_runtime if (item_type == 'Movie' and emby_runtime) else tmdb_details.get('runtime') if (item_type == 'Movie' and tmdb_details) else None
+            }
+            if tmdb_details:
+                top_record['poster_path'] = tmdb_details.get('poster_path')
+                top_record['overview'] = tmdb_details.get('overview')
+                top_record['studios_json'] = json.dumps([s['name'] for s in tmdb_details.get('production_companies', [])], ensure_ascii=False)
+                if item_type == 'Movie':
+                    top_record['runtime_minutes'] = tmdb_details.get('runtime')
+                
+                directors, countries, keywords = [], [], []
+                if item_type == 'Movie':
+                    credits_data = tmdb_details.get("credits", {}) or tmdb_details.get("casts", {})
+                    directors = [{'id': p.get('id'), 'name': p.get('name')} for p in credits_data.get('crew', []) if p.get('job') == 'Director']
+                    country_codes = [c.get('iso_3166_1') for c in tmdb_details.get('production_countries', [])]
+                    countries = translate_country_list(country_codes)
+                    keywords_data = tmdb_details.get('keywords', {})
+                    keyword_list = keywords_data.get('keywords', []) if isinstance(keywords_data, dict) else []
+                    keywords = [k['name'] for k in keyword_list if k.get('name')]
+                elif item_type == 'Series':
+                    directors = [{'id': c.get('id'), 'name': c.get('name')} for c in tmdb_details.get('created_by', [])]
+                    countries = translate_country_list(tmdb_details.get('origin_country', []))
+                    keywords_data = tmdb_details.get('keywords', {})
+                    keyword_list = keywords_data.get('results', []) if isinstance(keywords_data, dict) else []
+                    keywords = [k['name'] for k in keyword_list if k.get('name')]
+                top_record['directors_json'] = json.dumps(directors, ensure_ascii=False)
+                top_record['countries_json'] = json.dumps(countries, ensure_ascii=False)
+                top_record['keywords_json'] = json.dumps(keywords, ensure_ascii=False)
+            else:
+                top_record['poster_path'] = None
+                top_record['studios_json'] = '[]'
+                top_record['directors_json'] = '[]'; top_record['countries_json'] = '[]'; top_record['keywords_json'] = '[]'
+
+            metadata_batch.append(top_record)
+
+            # --- 2. 处理 Series 的子集 ---
+            if item_type == "Series":
+                series_ids_processed_in_batch.add(tmdb_id_str)
+                
+                series_emby_ids = [str(v.get('Id')) for v in item_group if v.get('Id')]
+                my_seasons = []
+                my_episodes = []
+                for s_id in series_emby_ids:
+                    my_seasons.extend(series_to_seasons_map.get(s_id, []))
+                    my_episodes.extend(series_to_episode_map.get(s_id, []))
+                
+                tmdb_children_map = {}
+                
+                if tmdb_details and 'seasons' in tmdb_details:
+                    for s_info in tmdb_details.get('seasons', []):
+                        s_num = s_info.get('season_number')
+                        if s_num is None: continue
+                        matched_emby_seasons = [s for s in my_seasons if s.get('IndexNumber') == s_num]
+                        
+                        if matched_emby_seasons:
+                            real_season_tmdb_id = str(s_info.get('id'))
+
+                            # 优先使用季海报，如果没有则回退使用父剧集海报
+                            season_poster = s_info.get('poster_path')
+                            if not season_poster and tmdb_details:
+                                season_poster = tmdb_details.get('poster_path')
+
+                            season_record = {
+                                "tmdb_id": real_season_tmdb_id,
+                                "item_type": "Season",
+                                "parent_series_tmdb_id": tmdb_id_str,
+                                "season_number": s_num,
+                                "title": s_info.get('name'),
+                                "overview": s_info.get('overview'),
+                                "poster_path": season_poster,
+                                "in_library": True,
+                                "emby_item_ids_json": json.dumps([s.get('Id') for s in matched_emby_seasons]),
+                                "ignore_reason": None
+                            }
+                            metadata_batch.append(season_record)
+                            tmdb_children_map[f"S{s_num}"] = s_info
+
+                            has_eps = any(e.get('ParentIndexNumber') == s_num for e in my_episodes)
+                            if has_eps:
+                                try:
+                                    s_details = tmdb.get_tv_season_details(tmdb_id_str, s_num, processor.tmdb_api_key)
+                                    if s_details and 'episodes' in s_details:
+                                        for ep in s_details['episodes']:
+                                            if ep.get('episode_number') is not None:
+                                                tmdb_children_map[f"S{s_num}E{ep.get('episode_number')}"] = ep
+                                except: pass
+
+                ep_grouped = defaultdict(list)
+                for ep in my_episodes:
+                    s_n, e_n = ep.get('ParentIndexNumber'), ep.get('IndexNumber')
+                    if s_n is not None and e_n is not None:
+                        ep_grouped[(s_n, e_n)].append(ep)
                 
-                # 从数据库反查这些消失的 ID 属于哪些剧集
-                with connection.get_db_connection() as conn:
-                    cursor = conn.cursor()
-                    # 查找包含这些 ID 的 Season/Episode 的 parent_series_tmdb_id
-                    cursor.execute("""
-                        SELECT DISTINCT parent_series_tmdb_id AS pid
-                        FROM media_metadata 
-                        WHERE item_type IN ('Season', 'Episode') 
-                          AND in_library = TRUE 
-                          AND EXISTS (
-                              SELECT 1 
-                              FROM jsonb_array_elements_text(emby_item_ids_json) as eid 
-                              WHERE eid = ANY(%s)
-                          )
-                    """, (missing_ids_list,))
+                for (s_n, e_n), versions in ep_grouped.items():
+                    emby_ep = versions[0]
+                    emby_ep_runtime = round(emby_ep['RunTimeTicks'] / 600000000) if emby_ep.get('RunTimeTicks') else None
+                    lookup_key = f"S{s_n}E{e_n}"
+                    tmdb_ep_info = tmdb_children_map.get(lookup_key)
                     
-                    affected_parents = set(row['pid'] for row in cursor.fetchall() if row['pid'])
+                    child_record = {
+                        "item_type": "Episode",
+                        "parent_series_tmdb_id": tmdb_id_str,
+                        "season_number": s_n,
+                        "episode_number": e_n,
+                        "in_library": True,
+                        "emby_item_ids_json": json.dumps([v.get('Id') for v in versions]),
+                        "asset_details_json": json.dumps([parse_full_asset_details(v) for v in versions], ensure_ascii=False),
+                        "ignore_reason": None
+                    }
+
+                    if tmdb_ep_info and tmdb_ep_info.get('id'):
+                        child_record['tmdb_id'] = str(tmdb_ep_info.get('id'))
+                        child_record['title'] = tmdb_ep_info.get('name')
+                        child_record['overview'] = tmdb_ep_info.get('overview')
+                        child_record['poster_path'] = tmdb_ep_info.get('still_path')
+                        child_record['runtime_minutes'] = emby_ep_runtime if emby_ep_runtime else tmdb_ep_info.get('runtime')
+                    else:
+                        child_record['tmdb_id'] = f"{tmdb_id_str}-S{s_n}E{e_n}"
+                        child_record['title'] = versions[0].get('Name')
+                        child_record['overview'] = versions[0].get('Overview')
+                        child_record['runtime_minutes'] = emby_ep_runtime
                     
-                    if affected_parents:
-                        logger.info(f"  ➜ 因内容删除，{len(affected_parents)} 部剧集被标记为待刷新。")
-                        dirty_series_tmdb_ids.update(affected_parents)
+                    metadata_batch.append(child_record)
 
-        logger.info(f"  ➜ Emby 扫描完成，共 {scan_count} 个项。共 {len(dirty_series_tmdb_ids)} 部剧集涉及变更(新增/删除)。")
+        # 7. 写入数据库 & 子集离线对账
+        if metadata_batch:
+            total_updated_count += len(metadata_batch)
 
-        # 4. 数据库比对 (用于检测顶层离线)
+            with connection.get_db_connection() as conn:
+                cursor = conn.cursor()
+                
+                # --- A. 执行写入 ---
+                for idx, metadata in enumerate(metadata_batch):
+                    savepoint_name = f"sp_{idx}"
+                    try:
+                        cursor.execute(f"SAVEPOINT {savepoint_name};")
+                        columns = [k for k, v in metadata.items() if v is not None]
+                        values = [v for v in metadata.values() if v is not None]
+                        cols_str = ', '.join(columns)
+                        vals_str = ', '.join(['%s'] * len(values))
+                        
+                        update_clauses = []
+                        for col in columns:
+                            if col in ('tmdb_id', 'item_type', 'subscription_sources_json'): continue
+                            update_clauses.append(f"{col} = EXCLUDED.{col}")
+                        
+                        sql = f"""
+                            INSERT INTO media_metadata ({cols_str}, last_synced_at) 
+                            VALUES ({vals_str}, NOW()) 
+                            ON CONFLICT (tmdb_id, item_type) 
+                            DO UPDATE SET {', '.join(update_clauses)}, last_synced_at = NOW()
+                        """
+                        cursor.execute(sql, tuple(values))
+                    except Exception as e:
+                        cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint_name};")
+                        logger.error(f"写入失败 {metadata.get('tmdb_id')}: {e}")
+                
+                # --- B. 执行子集离线对账 ---
+                if series_ids_processed_in_batch:
+                    active_child_ids = {
+                        m['tmdb_id'] for m in metadata_batch 
+                        if m['item_type'] in ('Season', 'Episode')
+                    }
+                    active_child_ids_list = list(active_child_ids)
+                    
+                    if active_child_ids_list:
+                        cursor.execute("""
+                            UPDATE media_metadata
+                            SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb
+                            WHERE parent_series_tmdb_id = ANY(%s)
+                              AND item_type IN ('Season', 'Episode')
+                              AND in_library = TRUE
+                              AND tmdb_id != ALL(%s)
+                        """, (list(series_ids_processed_in_batch), active_child_ids_list))
+                        total_offline_count += cursor.rowcount
+                    else:
+                        cursor.execute("""
+                            UPDATE media_metadata
+                            SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb
+                            WHERE parent_series_tmdb_id = ANY(%s)
+                              AND item_type IN ('Season', 'Episode')
+                              AND in_library = TRUE
+                        """, (list(series_ids_processed_in_batch),))
+                        total_offline_count += cursor.rowcount
+
+                conn.commit()
+
+        processed_count += len(batch_item_groups)
+        task_manager.update_status_from_thread(20 + int((processed_count / total_to_process) * 80), f"处理进度 {processed_count}/{total_to_process}...")
+
+    return total_updated_count, total_offline_count
+
+def _get_db_top_level_keys() -> set:
+    """库内所有在库的顶层项目 (tmdb_id, item_type)。"""
+    with connection.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT tmdb_id, item_type FROM media_metadata WHERE in_library = TRUE AND item_type IN ('Movie', 'Series')")
+        return {(row["tmdb_id"], row["item_type"]) for row in cursor.fetchall()}
+
+def _mark_top_level_offline(keys_to_delete: set) -> int:
+    """将已从 Emby 中完全消失的电影/剧集 (连同剧集的季/集) 标记为离线，返回顶层项目数。"""
+    if not keys_to_delete:
+        return 0
+    logger.info(f"  ➜ 发现 {len(keys_to_delete)} 个顶层项目已完全离线，正在清理...")
+    
+    ids_to_del = defaultdict(list)
+    for t_id, t_type in keys_to_delete:
+        ids_to_del[t_type].append(t_id)
+    
+    with connection.get_db_connection() as conn:
+        cursor = conn.cursor()
+        for i_type, id_list in ids_to_del.items():
+            cursor.execute(
+                "UPDATE media_metadata SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb WHERE item_type = %s AND tmdb_id = ANY(%s)",
+                (i_type, id_list)
+            )
+            if i_type == 'Series':
+                cursor.execute(
+                    "UPDATE media_metadata SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb WHERE parent_series_tmdb_id = ANY(%s)",
+                    (id_list,)
+                )
+        conn.commit()
+    return len(keys_to_delete)
+
+def _run_full_listing_sync(processor, libs_to_process_ids: List[str], batch_size: int, force_full_update: bool) -> Tuple[int, int]:
+    """
+    列出媒体库中全部 Movie/Series/Season/Episode 并与本地比对。
+    - force_full_update=True：全部重新处理。
+    - 否则只处理新增项目，以及因新增/删除子集而变脏的剧集，并清理顶层离线项目。
+    """
+    sync_mode = "深度同步 (全量)" if force_full_update else "全量比对"
+    logger.info(f"--- 模式: {sync_mode} (分批大小: {batch_size}) ---")
+
+    total_updated_count = 0
+    total_offline_count = 0
+
+    task_manager.update_status_from_thread(0, f"阶段1/3: 建立差异基准 ({sync_mode})...")
+
+    # 1. 获取数据库中所有已知的 Emby ID (用于比对)
+    known_emby_ids = set()
+    if not force_full_update:
         with connection.get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT tmdb_id, item_type FROM media_metadata WHERE in_library = TRUE AND item_type IN ('Movie', 'Series')")
-            db_top_level_keys = {(row["tmdb_id"], row["item_type"]) for row in cursor.fetchall()}
+            cursor.execute("""
+                SELECT jsonb_array_elements_text(emby_item_ids_json) AS emby_id
+                FROM media_metadata 
+                WHERE in_library = TRUE
+            """)
+            known_emby_ids = set(row['emby_id'] for row in cursor.fetchall())
+        logger.info(f"  ➜ 基准建立完成，库内已知 {len(known_emby_ids)} 个 Emby 媒体项 ID。")
+
+    # 2. 扫描 Emby
+    task_manager.update_status_from_thread(10, f"阶段2/3: 扫描 Emby 并计算差异...")
+    emby_items_index = emby.get_all_library_versions(
+        base_url=processor.emby_url, api_key=processor.emby_api_key, user_id=processor.emby_user_id,
+        media_type_filter="Movie,Series,Season,Episode",
+        library_ids=libs_to_process_ids,
+        fields=METADATA_SYNC_FIELDS,
+        update_status_callback=task_manager.update_status_from_thread
+    ) or []
+    
+    # 3. 构建索引 & 识别变动
+    top_level_items_map = defaultdict(list)       
+    series_to_seasons_map = defaultdict(list)     
+    series_to_episode_map = defaultdict(list)     
+    
+    emby_top_level_keys = set() 
+    
+    # 记录哪些剧集(TMDb ID)需要刷新
+    dirty_series_tmdb_ids = set()
+    emby_sid_to_tmdb_id = {}
+    
+    # 记录本次扫描到的所有 Emby ID (用于反向比对删除)
+    current_scan_emby_ids = set()
+
+    # 先遍历一遍建立 Series ID 映射
+    for item in emby_items_index:
+        # 记录 ID
+        if item.get("Id"):
+            current_scan_emby_ids.add(str(item.get("Id")))
+
+        if item.get("Type") == "Series":
+            t_id = item.get("ProviderIds", {}).get("Tmdb")
+            e_id = str(item.get("Id"))
+            if t_id and e_id:
+                emby_sid_to_tmdb_id[e_id] = str(t_id)
+
+    scan_count = len(emby_items_index)
+    
+    for item in emby_items_index:
+        item_type = item.get("Type")
+        item_emby_id = str(item.get("Id"))
+        tmdb_id = item.get("ProviderIds", {}).get("Tmdb")
         
-        # 5. 处理顶层离线 (整部剧或电影被删)
-        keys_to_delete = db_top_level_keys - emby_top_level_keys
-        if keys_to_delete:
-            count_top_offline = len(keys_to_delete)
-            total_offline_count += count_top_offline
-            logger.info(f"  ➜ 发现 {count_top_offline} 个顶层项目已完全离线，正在清理...")
-            
-            ids_to_del = defaultdict(list)
-            for t_id, t_type in keys_to_delete:
-                ids_to_del[t_type].append(t_id)
+        # --- 正向差异检测 (新增) ---
+        is_new_item = False
+        if not force_full_update:
+            if item_emby_id not in known_emby_ids:
+                is_new_item = True
+        
+        # A. 顶层媒体
+        if item_type in ["Movie", "Series"]:
+            if tmdb_id:
+                composite_key = (str(tmdb_id), item_type)
+                top_level_items_map[composite_key].append(item)
+                emby_top_level_keys.add(composite_key)
+                
+                if item_type == "Series" and is_new_item:
+                    dirty_series_tmdb_ids.add(str(tmdb_id))
+
+        # B. 子集媒体 (Season)
+        elif item_type == 'Season':
+            s_id = str(item.get('SeriesId') or item.get('ParentId'))
+            if s_id: 
+                series_to_seasons_map[s_id].append(item)
+                if is_new_item and s_id in emby_sid_to_tmdb_id:
+                    dirty_series_tmdb_ids.add(emby_sid_to_tmdb_id[s_id])
+
+        # C. 子集媒体 (Episode)
+        elif item_type == 'Episode':
+            s_id = str(item.get('SeriesId'))
+            if s_id: 
+                series_to_episode_map[s_id].append(item)
+                if is_new_item and s_id in emby_sid_to_tmdb_id:
+                    dirty_series_tmdb_ids.add(emby_sid_to_tmdb_id[s_id])
+
+    # ★★★ 反向差异检测 (删除) - V15 核心新增 ★★★
+    if not force_full_update:
+        # 算出哪些 ID 在库里有，但 Emby 没扫到
+        missing_emby_ids = known_emby_ids - current_scan_emby_ids
+        if missing_emby_ids:
+            logger.info(f"  ➜ 检测到 {len(missing_emby_ids)} 个 Emby ID 已消失，正在反查所属剧集...")
+            missing_ids_list = list(missing_emby_ids)
             
+            # 从数据库反查这些消失的 ID 属于哪些剧集
             with connection.get_db_connection() as conn:
                 cursor = conn.cursor()
-                for i_type, id_list in ids_to_del.items():
-                    cursor.execute(
-                        "UPDATE media_metadata SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb WHERE item_type = %s AND tmdb_id = ANY(%s)",
-                        (i_type, id_list)
-                    )
-                    if i_type == 'Series':
-                        cursor.execute(
-                            "UPDATE media_metadata SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb WHERE parent_series_tmdb_id = ANY(%s)",
-                            (id_list,)
-                        )
-                conn.commit()
+                # 查找包含这些 ID 的 Season/Episode 的 parent_series_tmdb_id
+                cursor.execute("""
+                    SELECT DISTINCT parent_series_tmdb_id AS pid
+                    FROM media_metadata 
+                    WHERE item_type IN ('Season', 'Episode') 
+                      AND in_library = TRUE 
+                      AND EXISTS (
+                          SELECT 1 
+                          FROM jsonb_array_elements_text(emby_item_ids_json) as eid 
+                          WHERE eid = ANY(%s)
+                      )
+                """, (missing_ids_list,))
+                
+                affected_parents = set(row['pid'] for row in cursor.fetchall() if row['pid'])
+                
+                if affected_parents:
+                    logger.info(f"  ➜ 因内容删除，{len(affected_parents)} 部剧集被标记为待刷新。")
+                    dirty_series_tmdb_ids.update(affected_parents)
 
-        if processor.is_stop_requested(): return
+    logger.info(f"  ➜ Emby 扫描完成，共 {scan_count} 个项。共 {len(dirty_series_tmdb_ids)} 部剧集涉及变更(新增/删除)。")
 
-        # 6. 确定处理队列 (精准过滤)
-        items_to_process = []
-        if force_full_update:
-            items_to_process = [items for items in top_level_items_map.values()]
-        else:
-            keys_new_tmdb = emby_top_level_keys - db_top_level_keys
+    # 4 & 5. 数据库比对并处理顶层离线 (整部剧或电影被删)
+    db_top_level_keys = _get_db_top_level_keys()
+    total_offline_count += _mark_top_level_offline(db_top_level_keys - emby_top_level_keys)
+
+    if processor.is_stop_requested(): return total_updated_count, total_offline_count
+
+    # 6. 确定处理队列 (精准过滤)
+    items_to_process = []
+    if force_full_update:
+        items_to_process = [items for items in top_level_items_map.values()]
+    else:
+        keys_new_tmdb = emby_top_level_keys - db_top_level_keys
+        
+        for composite_key, items in top_level_items_map.items():
+            tmdb_id, item_type = composite_key
             
-            for composite_key, items in top_level_items_map.items():
-                tmdb_id, item_type = composite_key
-                
-                should_process = False
-                # 规则1: 顶层本身是新的
-                if composite_key in keys_new_tmdb:
-                    should_process = True
-                # 规则2: 剧集被标记为脏 (含新增子集 或 删除子集)
-                elif item_type == 'Series' and tmdb_id in dirty_series_tmdb_ids:
-                    should_process = True
-                
-                if should_process:
-                    items_to_process.append(items)
-
-        total_to_process = len(items_to_process)
-        task_manager.update_status_from_thread(20, f"阶段3/3: 正在同步 {total_to_process} 个变更项目...")
-        logger.info(f"  ➜ 最终处理队列: {total_to_process} 个顶层项目")
-
-        # 7. 批量处理
-        processed_count = 0
-        for i in range(0, total_to_process, batch_size):
-            if processor.is_stop_requested(): break
-            batch_item_groups = items_to_process[i:i + batch_size]
+            should_process = False
+            # 规则1: 顶层本身是新的
+            if composite_key in keys_new_tmdb:
+                should_process = True
+            # 规则2: 剧集被标记为脏 (含新增子集 或 删除子集)
+            elif item_type == 'Series' and tmdb_id in dirty_series_tmdb_ids:
+                should_process = True
             
-            # --- 并发获取 TMDB 详情 ---
-            tmdb_details_map = {}
-            def fetch_tmdb_details(item_group):
-                item = item_group[0]
-                t_id = item.get("ProviderIds", {}).get("Tmdb")
-                i_type = item.get("Type")
-                if not t_id: return None, None
-                details = None
-                try:
-                    if i_type == 'Movie': details = tmdb.get_movie_details(t_id, processor.tmdb_api_key)
-                    elif i_type == 'Series': details = tmdb.get_tv_details(t_id, processor.tmdb_api_key)
-                except Exception: pass
-                return str(t_id), details
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                futures = {executor.submit(fetch_tmdb_details, grp): grp for grp in batch_item_groups}
-                for future in concurrent.futures.as_completed(futures):
-                    t_id_str, details = future.result()
-                    if t_id_str and details: tmdb_details_map[t_id_str] = details
-
-            metadata_batch = []
-            series_ids_processed_in_batch = set()
-
-            for item_group in batch_item_groups:
-                item = item_group[0]
-                tmdb_id_str = str(item.get("ProviderIds", {}).get("Tmdb"))
-                item_type = item.get("Type")
-                tmdb_details = tmdb_details_map.get(tmdb_id_str)
-                
-                # --- 1. 构建顶层记录 ---
-                asset_details_list = []
-                if item_type == "Movie":
-                    asset_details_list = [parse_full_asset_details(v) for v in item_group]
-
-                emby_runtime = round(item['RunTimeTicks'] / 600000000) if item.get('RunTimeTicks') else None
-
-                top_record = {
-                    "tmdb_id": tmdb_id_str, "item_type": item_type, "title": item.get('Name'),
-                    "original_title": item.get('OriginalTitle'), "release_year": item.get('ProductionYear'),
-                    "in_library": True, 
-                    "emby_item_ids_json": json.dumps(list(set(v.get('Id') for v in item_group if v.get('Id'))), ensure_ascii=False),
-                    "asset_details_json": json.dumps(asset_details_list, ensure_ascii=False),
-                    "rating": item.get('CommunityRating'),
-                    "date_added": item.get('DateCreated'),
-                    "genres_json": json.dumps(item.get('Genres', []), ensure_ascii=False),
-                    "official_rating": item.get('OfficialRating'), 
-                    "unified_rating": get_unified_rating(item.get('OfficialRating')),
-                    "runtime_minutes": emby_runtime if (item_type == 'Movie' and emby_runtime) else tmdb_details.get('runtime') if (item_type == 'Movie' and tmdb_details) else None
-                }
-                if tmdb_details:
-                    top_record['poster_path'] = tmdb_details.get('poster_path')
-                    top_record['overview'] = tmdb_details.get('overview')
-                    top_record['studios_json'] = json.dumps([s['name'] for s in tmdb_details.get('production_companies', [])], ensure_ascii=False)
-                    if item_type == 'Movie':
-                        top_record['runtime_minutes'] = tmdb_details.get('runtime')
-                    
-                    directors, countries, keywords = [], [], []
-                    if item_type == 'Movie':
-                        credits_data = tmdb_details.get("credits", {}) or tmdb_details.get("casts", {})
-                        directors = [{'id': p.get('id'), 'name': p.get('name')} for p in credits_data.get('crew', []) if p.get('job') == 'Director']
-                        country_codes = [c.get('iso_3166_1') for c in tmdb_details.get('production_countries', [])]
-                        countries = translate_country_list(country_codes)
-                        keywords_data = tmdb_details.get('keywords', {})
-                        keyword_list = keywords_data.get('keywords', []) if isinstance(keywords_data, dict) else []
-                        keywords = [k['name'] for k in keyword_list if k.get('name')]
-                    elif item_type == 'Series':
-                        directors = [{'id': c.get('id'), 'name': c.get('name')} for c in tmdb_details.get('created_by', [])]
-                        countries = translate_country_list(tmdb_details.get('origin_country', []))
-                        keywords_data = tmdb_details.get('keywords', {})
-                        keyword_list = keywords_data.get('results', []) if isinstance(keywords_data, dict) else []
-                        keywords = [k['name'] for k in keyword_list if k.get('name')]
-                    top_record['directors_json'] = json.dumps(directors, ensure_ascii=False)
-                    top_record['countries_json'] = json.dumps(countries, ensure_ascii=False)
-                    top_record['keywords_json'] = json.dumps(keywords, ensure_ascii=False)
-                else:
-                    top_record['poster_path'] = None
-                    top_record['studios_json'] = '[]'
-                    top_record['directors_json'] = '[]'; top_record['countries_json'] = '[]'; top_record['keywords_json'] = '[]'
-
-                metadata_batch.append(top_record)
-
-                # --- 2. 处理 Series 的子集 ---
-                if item_type == "Series":
-                    series_ids_processed_in_batch.add(tmdb_id_str)
-                    
-                    series_emby_ids = [str(v.get('Id')) for v in item_group if v.get('Id')]
-                    my_seasons = []
-                    my_episodes = []
-                    for s_id in series_emby_ids:
-                        my_seasons.extend(series_to_seasons_map.get(s_id, []))
-                        my_episodes.extend(series_to_episode_map.get(s_id, []))
-                    
-                    tmdb_children_map = {}
-                    
-                    if tmdb_details and 'seasons' in tmdb_details:
-                        for s_info in tmdb_details.get('seasons', []):
-                            s_num = s_info.get('season_number')
-                            if s_num is None: continue
-                            matched_emby_seasons = [s for s in my_seasons if s.get('IndexNumber') == s_num]
-                            
-                            if matched_emby_seasons:
-                                real_season_tmdb_id = str(s_info.get('id'))
-
-                                # 优先使用季海报，如果没有则回退使用父剧集海报
-                                season_poster = s_info.get('poster_path')
-                                if not season_poster and tmdb_details:
-                                    season_poster = tmdb_details.get('poster_path')
-
-                                season_record = {
-                                    "tmdb_id": real_season_tmdb_id,
-                                    "item_type": "Season",
-                                    "parent_series_tmdb_id": tmdb_id_str,
-                                    "season_number": s_num,
-                                    "title": s_info.get('name'),
-                                    "overview": s_info.get('overview'),
-                                    "poster_path": season_poster,
-                                    "in_library": True,
-                                    "emby_item_ids_json": json.dumps([s.get('Id') for s in matched_emby_seasons]),
-                                    "ignore_reason": None
-                                }
-                                metadata_batch.append(season_record)
-                                tmdb_children_map[f"S{s_num}"] = s_info
-
-                                has_eps = any(e.get('ParentIndexNumber') == s_num for e in my_episodes)
-                                if has_eps:
-                                    try:
-                                        s_details = tmdb.get_tv_season_details(tmdb_id_str, s_num, processor.tmdb_api_key)
-                                        if s_details and 'episodes' in s_details:
-                                            for ep in s_details['episodes']:
-                                                if ep.get('episode_number') is not None:
-                                                    tmdb_children_map[f"S{s_num}E{ep.get('episode_number')}"] = ep
-                                    except: pass
-
-                    ep_grouped = defaultdict(list)
-                    for ep in my_episodes:
-                        s_n, e_n = ep.get('ParentIndexNumber'), ep.get('IndexNumber')
-                        if s_n is not None and e_n is not None:
-                            ep_grouped[(s_n, e_n)].append(ep)
-                    
-                    for (s_n, e_n), versions in ep_grouped.items():
-                        emby_ep = versions[0]
-                        emby_ep_runtime = round(emby_ep['RunTimeTicks'] / 600000000) if emby_ep.get('RunTimeTicks') else None
-                        lookup_key = f"S{s_n}E{e_n}"
-                        tmdb_ep_info = tmdb_children_map.get(lookup_key)
-                        
-                        child_record = {
-                            "item_type": "Episode",
-                            "parent_series_tmdb_id": tmdb_id_str,
-                            "season_number": s_n,
-                            "episode_number": e_n,
-                            "in_library": True,
-                            "emby_item_ids_json": json.dumps([v.get('Id') for v in versions]),
-                            "asset_details_json": json.dumps([parse_full_asset_details(v) for v in versions], ensure_ascii=False),
-                            "ignore_reason": None
-                        }
-
-                        if tmdb_ep_info and tmdb_ep_info.get('id'):
-                            child_record['tmdb_id'] = str(tmdb_ep_info.get('id'))
-                            child_record['title'] = tmdb_ep_info.get('name')
-                            child_record['overview'] = tmdb_ep_info.get('overview')
-                            child_record['poster_path'] = tmdb_ep_info.get('still_path')
-                            child_record['runtime_minutes'] = emby_ep_runtime if emby_ep_runtime else tmdb_ep_info.get('runtime')
-                        else:
-                            child_record['tmdb_id'] = f"{tmdb_id_str}-S{s_n}E{e_n}"
-                            child_record['title'] = versions[0].get('Name')
-                            child_record['overview'] = versions[0].get('Overview')
-                            child_record['runtime_minutes'] = emby_ep_runtime
-                        
-                        metadata_batch.append(child_record)
+            if should_process:
+                items_to_process.append(items)
 
-            # 7. 写入数据库 & 子集离线对账
-            if metadata_batch:
-                total_updated_count += len(metadata_batch)
+    updated, offline = _sync_top_level_groups(processor, items_to_process, series_to_seasons_map, series_to_episode_map, batch_size)
+    return total_updated_count + updated, total_offline_count + offline
 
-                with connection.get_db_connection() as conn:
-                    cursor = conn.cursor()
-                    
-                    # --- A. 执行写入 ---
-                    for idx, metadata in enumerate(metadata_batch):
-                        savepoint_name = f"sp_{idx}"
-                        try:
-                            cursor.execute(f"SAVEPOINT {savepoint_name};")
-                            columns = [k for k, v in metadata.items() if v is not None]
-                            values = [v for v in metadata.values() if v is not None]
-                            cols_str = ', '.join(columns)
-                            vals_str = ', '.join(['%s'] * len(values))
-                            
-                            update_clauses = []
-                            for col in columns:
-                                if col in ('tmdb_id', 'item_type', 'subscription_sources_json'): continue
-                                update_clauses.append(f"{col} = EXCLUDED.{col}")
-                            
-                            sql = f"""
-                                INSERT INTO media_metadata ({cols_str}, last_synced_at) 
-                                VALUES ({vals_str}, NOW()) 
-                                ON CONFLICT (tmdb_id, item_type) 
-                                DO UPDATE SET {', '.join(update_clauses)}, last_synced_at = NOW()
-                            """
-                            cursor.execute(sql, tuple(values))
-                        except Exception as e:
-                            cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint_name};")
-                            logger.error(f"写入失败 {metadata.get('tmdb_id')}: {e}")
-                    
-                    # --- B. 执行子集离线对账 ---
-                    if series_ids_processed_in_batch:
-                        active_child_ids = {
-                            m['tmdb_id'] for m in metadata_batch 
-                            if m['item_type'] in ('Season', 'Episode')
-                        }
-                        active_child_ids_list = list(active_child_ids)
-                        
-                        if active_child_ids_list:
-                            cursor.execute("""
-                                UPDATE media_metadata
-                                SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb
-                                WHERE parent_series_tmdb_id = ANY(%s)
-                                  AND item_type IN ('Season', 'Episode')
-                                  AND in_library = TRUE
-                                  AND tmdb_id != ALL(%s)
-                            """, (list(series_ids_processed_in_batch), active_child_ids_list))
-                            total_offline_count += cursor.rowcount
-                        else:
-                            cursor.execute("""
-                                UPDATE media_metadata
-                                SET in_library = FALSE, emby_item_ids_json = '[]'::jsonb, asset_details_json = '[]'::jsonb
-                                WHERE parent_series_tmdb_id = ANY(%s)
-                                  AND item_type IN ('Season', 'Episode')
-                                  AND in_library = TRUE
-                            """, (list(series_ids_processed_in_batch),))
-                            total_offline_count += cursor.rowcount
-
-                    conn.commit()
-
-            processed_count += len(batch_item_groups)
-            task_manager.update_status_from_thread(20 + int((processed_count / total_to_process) * 80), f"处理进度 {processed_count}/{total_to_process}...")
+def _run_incremental_sync(processor, libs_to_process_ids: List[str], batch_size: int, since: datetime, sync_started_at: datetime) -> Tuple[int, int]:
+    """
+    增量同步：只拉取水位线之后在 Emby 中保存过的项目，加上 webhook 队列里的事件，
+    再只为受影响的顶层项目（及其季/集）拉取完整字段。删除整部影片/剧集由 webhook
+    即时清理；为防 webhook 遗漏，每次还会只取顶层项目的 ID 与本地比对一次，
+    子集层面的遗漏交给定期的全量对账。
+    变更流或详情拉取出错时直接抛出，由上层判定任务失败且不推进水位线。
+    """
+    overlap = timedelta(minutes=constants.METADATA_SYNC_WATERMARK_OVERLAP_MINUTES)
+    since_iso = (since - overlap).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.0000000Z')
+
+    task_manager.update_status_from_thread(0, "阶段1/3: 读取变更记录...")
+    logger.info(f"  ➜ 增量同步水位线: {since.isoformat()}，拉取此后保存过的项目...")
+
+    # --- 1. 变更探测：Emby 变更流 + webhook 事件队列 ---
+    changed_items = []
+    for page in emby.iter_emby_library_items(
+        base_url=processor.emby_url, api_key=processor.emby_api_key,
+        library_ids=libs_to_process_ids,
+        media_type_filter="Movie,Series,Season,Episode",
+        fields=METADATA_CHANGE_FEED_FIELDS,
+        extra_params={"MinDateLastSaved": since_iso},
+        # 变更流不完整时必须失败，否则水位线前移后漏掉的变更再也不会被拉取
+        raise_on_error=True
+    ):
+        changed_items.extend(page)
+        if processor.is_stop_requested(): return 0, 0
+
+    # 顶层删除兜底：只列出 Movie/Series 的 ProviderIds，开销远小于全量列举。
+    # 列表不完整时跳过本次清理，否则仍在库中的项目会被误标离线；下次快速同步会再次比对。
+    total_offline_count = 0
+    emby_top_level_keys = set()
+    try:
+        for page in emby.iter_emby_library_items(
+            base_url=processor.emby_url, api_key=processor.emby_api_key,
+            library_ids=libs_to_process_ids,
+            media_type_filter="Movie,Series",
+            fields="ProviderIds",
+            raise_on_error=True
+        ):
+            for item in page:
+                tmdb_id = item.get("ProviderIds", {}).get("Tmdb")
+                if tmdb_id and item.get("Type") in ("Movie", "Series"):
+                    emby_top_level_keys.add((str(tmdb_id), item.get("Type")))
+            if processor.is_stop_requested(): return 0, 0
+    except Exception as e:
+        logger.warning(f"  ➜ 顶层项目列表拉取不完整，本次跳过离线清理: {e}")
+    else:
+        total_offline_count = _mark_top_level_offline(_get_db_top_level_keys() - emby_top_level_keys)
+
+    queued_events = media_db.get_pending_metadata_sync_events()
+    logger.info(f"  ➜ Emby 变更 {len(changed_items)} 项，webhook 队列事件 {len(queued_events)} 条。")
+
+    top_level_emby_ids = set()
+    series_tmdb_ids_to_resolve = set()
+    for item in changed_items:
+        item_type = item.get("Type")
+        if item_type in ("Movie", "Series"):
+            top_level_emby_ids.add(str(item.get("Id")))
+        elif item_type == "Season":
+            parent = item.get("SeriesId") or item.get("ParentId")
+            if parent: top_level_emby_ids.add(str(parent))
+        elif item_type == "Episode" and item.get("SeriesId"):
+            top_level_emby_ids.add(str(item.get("SeriesId")))
+
+    # 队列事件只处理本地已知的项目（新入库的项目已经出现在按媒体库过滤的变更流里）
+    queued_ids = [e['emby_id'] for e in queued_events]
+    known_media = media_db.get_media_keys_by_emby_ids(queued_ids)
+    for event in queued_events:
+        emby_id = event['emby_id']
+        if event.get('series_emby_id'):
+            top_level_emby_ids.add(event['series_emby_id'])
+            continue
+        media = known_media.get(emby_id)
+        if not media:
+            continue
+        if media['item_type'] in ('Season', 'Episode'):
+            if media.get('parent_series_tmdb_id'):
+                series_tmdb_ids_to_resolve.add(media['parent_series_tmdb_id'])
+        elif event.get('event_type') != 'library.deleted':
+            top_level_emby_ids.add(emby_id)
+
+    # --- 2. 补齐多版本：同一 TMDb 项目在其他库/版本中的 Emby ID 也要一起刷新 ---
+    task_manager.update_status_from_thread(10, f"阶段2/3: 拉取 {len(top_level_emby_ids)} 个受影响项目的详情...")
+    fetched = emby.get_emby_items_by_id(
+        processor.emby_url, processor.emby_api_key, processor.emby_user_id,
+        list(top_level_emby_ids), fields=METADATA_SYNC_FIELDS, raise_on_error=True
+    ) if top_level_emby_ids else []
+    top_level_items = {str(i.get("Id")): i for i in fetched if i.get("Type") in ("Movie", "Series")}
+
+    media_keys = {
+        (str(i.get("ProviderIds", {}).get("Tmdb")), i.get("Type"))
+        for i in top_level_items.values() if i.get("ProviderIds", {}).get("Tmdb")
+    }
+    media_keys.update((tmdb_id, 'Series') for tmdb_id in series_tmdb_ids_to_resolve)
+    sibling_ids = {
+        emby_id
+        for ids in media_db.get_emby_ids_for_media_keys(list(media_keys)).values()
+        for emby_id in ids
+    } - set(top_level_items)
+    if sibling_ids:
+        for i in emby.get_emby_items_by_id(
+            processor.emby_url, processor.emby_api_key, processor.emby_user_id,
+            list(sibling_ids), fields=METADATA_SYNC_FIELDS, raise_on_error=True
+        ):
+            if i.get("Type") in ("Movie", "Series"):
+                top_level_items[str(i.get("Id"))] = i
+
+    top_level_items_map = defaultdict(list)
+    for item in top_level_items.values():
+        tmdb_id = item.get("ProviderIds", {}).get("Tmdb")
+        if tmdb_id:
+            top_level_items_map[(str(tmdb_id), item.get("Type"))].append(item)
+
+    if processor.is_stop_requested(): return 0, 0
+
+    # --- 3. 只为受影响的剧集拉取季/集 ---
+    series_emby_ids = [
+        str(i.get("Id")) for items in top_level_items_map.values() for i in items if i.get("Type") == "Series"
+    ]
+    series_to_seasons_map = defaultdict(list)
+    series_to_episode_map = defaultdict(list)
+    if series_emby_ids:
+        for page in emby.iter_emby_library_items(
+            base_url=processor.emby_url, api_key=processor.emby_api_key,
+            library_ids=series_emby_ids,
+            media_type_filter="Season,Episode",
+            fields=METADATA_SYNC_FIELDS,
+            # 子集列表不完整会让剧集的分集被误判为离线
+            raise_on_error=True
+        ):
+            for child in page:
+                if child.get("Type") == "Season":
+                    s_id = str(child.get('SeriesId') or child.get('ParentId'))
+                    series_to_seasons_map[s_id].append(child)
+                elif child.get("Type") == "Episode" and child.get('SeriesId'):
+                    series_to_episode_map[str(child.get('SeriesId'))].append(child)
+            if processor.is_stop_requested(): return 0, 0
+
+    items_to_process = list(top_level_items_map.values())
+    updated, offline = _sync_top_level_groups(processor, items_to_process, series_to_seasons_map, series_to_episode_map, batch_size)
+
+    if queued_ids and not processor.is_stop_requested():
+        media_db.delete_metadata_sync_events(queued_ids, sync_started_at)
+    return updated, total_offline_count + offline
+
+# ★★★ 重量级的元数据缓存填充任务 ★★★
+def task_populate_metadata_cache(processor, batch_size: int = 50, force_full_update: bool = False):
+    """
+    - 重量级的元数据缓存填充任务。
+    - 快速同步 (增量)：有水位线时只处理水位线之后变更的项目和 webhook 队列中的事件，
+      耗时与变更量成正比；首次运行或没有水位线时退回全量比对。
+    - 深度同步 (全量)：列出全部项目并全部重新处理。
+    - 全量比对逻辑：
+      1. 记录本次扫描到的所有 Emby ID。
+      2. 计算 (库内已知 ID - 本次扫描 ID) = 已删除的 ID。
+      3. 如果发现已删除的 ID，反查其所属的父级剧集，并将该剧集标记为“待更新”。
+      4. 这样即使只删了一集，该剧集也会进入处理队列，从而触发子集离线清理逻辑。
+    """
+    task_name = "同步媒体元数据"
+    sync_started_at = datetime.now(timezone.utc)
+
+    try:
+        libs_to_process_ids = processor.config.get("libraries_to_process", [])
+        if not libs_to_process_ids:
+            raise ValueError("未在配置中指定要处理的媒体库。")
+
+        watermark = None if force_full_update else _load_metadata_sync_watermark()
+        if watermark:
+            logger.info(f"--- 模式: 快速同步 (增量) (分批大小: {batch_size}) ---")
+            total_updated_count, total_offline_count = _run_incremental_sync(
+                processor, libs_to_process_ids, batch_size, watermark, sync_started_at
+            )
+        else:
+            total_updated_count, total_offline_count = _run_full_listing_sync(
+                processor, libs_to_process_ids, batch_size, force_full_update
+            )
+
+        if processor.is_stop_requested():
+            return
+
+        _save_metadata_sync_watermark(sync_started_at, 'incremental' if watermark else 'full')
+        if not watermark:
+            # 全量列举已经覆盖了队列中的全部事件
+            media_db.clear_metadata_sync_queue(sync_started_at)
 
         # 最终日志
         final_msg = f"同步完成！新增/更新: {total_updated_count} 个媒体项, 标记离线: {total_offline_count} 个媒体项。"
@@ -651,6 +873,36 @@ def task_populate_metadata_cache(processor, batch_size: int = 50, force_full_upd
         logger.error(f"执行 '{task_name}' 任务时发生严重错误: {e}", exc_info=True)
         task_manager.update_status_from_thread(-1, f"任务失败: {e}")
 
+def task_reconcile_metadata_cache(processor, batch_size: int = 50):
+    """
+    全量对账：无视水位线，列出全部项目与本地比对，补上增量同步可能遗漏的新增与删除，
+    完成后重置水位线并清空事件队列。频率应明显低于快速同步（建议放在低频任务链）。
+    """
+    task_name = "媒体数据对账"
+    sync_started_at = datetime.now(timezone.utc)
+
+    try:
+        libs_to_process_ids = processor.config.get("libraries_to_process", [])
+        if not libs_to_process_ids:
+            raise ValueError("未在配置中指定要处理的媒体库。")
+
+        total_updated_count, total_offline_count = _run_full_listing_sync(
+            processor, libs_to_process_ids, batch_size, force_full_update=False
+        )
+        if processor.is_stop_requested():
+            return
+
+        _save_metadata_sync_watermark(sync_started_at, 'reconcile')
+        media_db.clear_metadata_sync_queue(sync_started_at)
+
+        final_msg = f"对账完成！新增/更新: {total_updated_count} 个媒体项, 标记离线: {total_offline_count} 个媒体项。"
+        logger.info(f"  ✅ {final_msg}")
+        task_manager.update_status_from_thread(100, final_msg)
+
+    except Exception as e:
+        logger.error(f"执行 '{task_name}' 任务时发生严重错误: {e}", exc_info=True)
+        task_manager.update_status_from_thread(-1, f"任务失败: {e}")
+
 def task_apply_main_cast_to_episodes(processor, series_id: str, episode_ids: list):
     """
     【V2 - 文件中心化重构版】
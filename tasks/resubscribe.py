@@ -4,8 +4,10 @@
 import os
 import re 
 import time
+import json
+import hashlib
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed 
 from collections import defaultdict
 
@@ -15,7 +17,7 @@ import handler.emby as emby
 import handler.moviepilot as moviepilot
 import config_manager 
 import constants  
-from database import resubscribe_db, settings_db, media_db, maintenance_db
+from database import resubscribe_db, settings_db, maintenance_db
 
 # 从 helpers 导入的辅助函数和常量
 from .helpers import (
@@ -35,181 +37,145 @@ logger = logging.getLogger(__name__)
 # 核心任务：刷新洗版状态
 # ======================================================================
 
-def task_update_resubscribe_cache(processor): # <--- 移除 force_full_update 参数
+def _rule_fingerprint(rule: dict) -> str:
+    """规则中影响判定结果的字段的指纹。名称、排序、目标库的变化不影响判定，不计入。"""
+    relevant = {k: v for k, v in rule.items() if k == 'id' or k.startswith('resubscribe_')}
+    payload = json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+def _resolve_rule_scope(processor, library_ids: List[str]) -> Tuple[Optional[List[str]], Optional[List[str]], bool]:
     """
-    【V6 - 最终统一扫描版】
-    废除快速/深度模式，每次都执行全量、高效的数据库中心化扫描。
+    确定一条规则的扫描范围，返回 (library_paths, emby_ids, is_complete)，前两者只有一个不为 None。
+    优先用媒体库源文件夹在数据库内按路径判断；拿不到路径时回退为分页拉取 Emby ID。
+    回退列表拉取出错时 is_complete 为 False，已拿到的部分仍可用于判定，但不能用来清理旧索引。
     """
-    task_name = "刷新媒体洗版状态" # <--- 简化任务名
-    logger.info(f"--- 开始执行 '{task_name}' 任务 ---")
+    library_paths = emby.get_library_source_paths(library_ids, processor.emby_url, processor.emby_api_key)
+    if library_paths is not None:
+        return library_paths, None, True
+
+    emby_ids = set()
+    try:
+        for page in emby.iter_emby_library_items(
+            processor.emby_url, processor.emby_api_key, library_ids,
+            media_type_filter="Movie,Episode",
+            user_id=processor.emby_user_id,
+            fields="Id",
+            prefetch_pages=2,
+            stop_event=processor.get_stop_event(),
+            raise_on_error=True
+        ):
+            emby_ids.update(item['Id'] for item in page if item.get('Id'))
+    except Exception as e:
+        logger.warning(f"  ➜ 媒体库列表拉取不完整 ({len(emby_ids)} 项)，本次不清理该范围内的旧索引: {e}")
+        return None, list(emby_ids), False
+    return None, list(emby_ids), True
+
+def task_update_resubscribe_cache(processor, force_full_update: bool = False):
+    """
+    【V7 - 增量刷新版】
+    - 增量模式 (默认)：索引中为每部电影/每一季记录 source_fingerprint
+      (代表资产 + 语言豁免字段 + 规则判定字段)，只重新判定指纹变化的项目。
+      媒体库范围按源文件夹路径在数据库内确定，不再拉取 Emby 全量列表。
+    - 全量模式 (force_full_update=True)：无视指纹重新判定范围内的全部项目，仅在手动触发时使用。
+    """
+    task_name = "刷新媒体洗版状态"
+    mode_name = "全量" if force_full_update else "增量"
+    logger.info(f"--- 开始执行 '{task_name}' 任务 ({mode_name}) ---")
     
     try:
-        # --- 步骤 1: 加载规则和确定扫描范围 (逻辑不变) ---
+        # --- 步骤 1: 加载规则和确定扫描范围 ---
         task_manager.update_status_from_thread(0, "正在加载规则并确定扫描范围...")
         all_enabled_rules = [rule for rule in resubscribe_db.get_all_resubscribe_rules() if rule.get('enabled')]
         
         library_to_rule_map = {}
-        all_target_lib_ids = set()
         for rule in reversed(all_enabled_rules):
             if target_libs := rule.get('target_library_ids'):
-                all_target_lib_ids.update(target_libs)
                 for lib_id in target_libs:
                     library_to_rule_map[lib_id] = rule
         
-        if not all_target_lib_ids:
+        if not library_to_rule_map:
             task_manager.update_status_from_thread(100, "任务跳过：没有规则指定任何媒体库")
             return
 
-        # --- 步骤 2: 获取Emby全量数据 (逻辑不变) ---
-        task_manager.update_status_from_thread(10, f"正在从 {len(all_target_lib_ids)} 个目标库中建立媒体索引...")
-        emby_index = emby.get_all_library_versions(
-            base_url=processor.emby_url, api_key=processor.emby_api_key, user_id=processor.emby_user_id,
-            media_type_filter="Movie,Series,Episode", library_ids=list(all_target_lib_ids),
-            fields="Id,Type,ProviderIds,SeriesId,ParentIndexNumber,_SourceLibraryId,Name",
-            update_status_callback=task_manager.update_status_from_thread
-        ) or []
-
-        # ★★★ 步骤 3: 预处理Emby数据，清晰分类 ★★★
-        movies_to_process = []
-        series_to_process = []
-        # 使用 series_emby_id 作为键，值为该剧集的所有分集列表
-        series_episodes_map = defaultdict(list)
-        
-        for item in emby_index:
-            item_type = item.get('Type')
-            if item_type == 'Movie':
-                movies_to_process.append(item)
-            elif item_type == 'Series':
-                series_to_process.append(item)
-            elif item_type == 'Episode' and item.get('SeriesId'):
-                series_episodes_map[item['SeriesId']].append(item)
-
-        # --- 步骤 4: 批量获取数据库元数据 (逻辑优化) ---
-        tmdb_ids_in_scope = {str(item['ProviderIds']['Tmdb']) for item in movies_to_process + series_to_process if item.get('ProviderIds', {}).get('Tmdb')}
-        if not tmdb_ids_in_scope:
+        libs_by_rule_id = defaultdict(list)
+        for lib_id, rule in library_to_rule_map.items():
+            libs_by_rule_id[rule['id']].append(lib_id)
+        rules_in_scope = [rule for rule in all_enabled_rules if rule['id'] in libs_by_rule_id]
+
+        # --- 步骤 2: 按规则列出判定单元及其指纹 ---
+        # 同一项目出现在多条规则的媒体库中时，以排序靠前的规则为准
+        candidates = {}
+        incomplete_rule_ids = []
+        for i, rule in enumerate(rules_in_scope):
+            if processor.is_stop_requested():
+                return
+            progress = 5 + int((i / len(rules_in_scope)) * 15)
+            task_manager.update_status_from_thread(progress, f"正在确定规则 '{rule.get('name')}' 的媒体范围...")
+
+            library_paths, emby_ids, is_complete = _resolve_rule_scope(processor, libs_by_rule_id[rule['id']])
+            if processor.is_stop_requested():
+                return
+            if not is_complete:
+                incomplete_rule_ids.append(rule['id'])
+
+            rows = resubscribe_db.get_resubscribe_candidates(
+                _rule_fingerprint(rule), library_paths=library_paths, emby_ids=emby_ids,
+                force_full=force_full_update
+            )
+            for row in rows:
+                item_key = (str(row['tmdb_id']), row['item_type'], int(row['season_number']))
+                candidates.setdefault(item_key, (row, rule))
+
+        if not candidates:
             task_manager.update_status_from_thread(100, "任务完成：目标媒体库为空。")
             return
 
-        logger.info(f"  ➜ 正在从本地数据库批量获取 {len(tmdb_ids_in_scope)} 个媒体项的详细元数据...")
-        metadata_map = media_db.get_media_details_by_tmdb_ids(list(tmdb_ids_in_scope))
-        
-        series_tmdb_ids = {meta['tmdb_id'] for meta in metadata_map.values() if meta.get('item_type') == 'Series'}
-        all_episodes_from_db = media_db.get_episodes_for_series(list(series_tmdb_ids))
-        episodes_metadata_map = defaultdict(list)
-        for ep in all_episodes_from_db:
-            episodes_metadata_map[ep['parent_series_tmdb_id']].append(ep)
-
-        # --- 步骤 5: 清理Emby中已删除的旧索引 (逻辑不变) ---
+        # --- 步骤 3: 清理已不在库中的旧索引 (范围不完整的规则所匹配的行不参与) ---
         logger.info("  ➜ 正在比对并清理陈旧的洗版索引...")
-        indexed_keys = resubscribe_db.get_all_resubscribe_index_keys()
-        current_emby_keys = set()
-        for item in movies_to_process:
-            if tmdb_id := item.get('ProviderIds', {}).get('Tmdb'):
-                current_emby_keys.add(str(tmdb_id))
-        for series_item in series_to_process:
-            if tmdb_id := series_item.get('ProviderIds', {}).get('Tmdb'):
-                # 确定这部剧实际存在哪些季
-                seasons_in_series = {ep.get('ParentIndexNumber') for ep in series_episodes_map.get(series_item.get('Id'), []) if ep.get('ParentIndexNumber') is not None}
-                for season_num in seasons_in_series:
-                    current_emby_keys.add(f"{tmdb_id}-S{season_num}")
-        
-        deleted_keys = indexed_keys - current_emby_keys
+        indexed_keys = resubscribe_db.get_all_resubscribe_index_keys(exclude_rule_ids=incomplete_rule_ids)
+        current_keys = {
+            tmdb_id if item_type == 'Movie' else f"{tmdb_id}-S{season_number}"
+            for tmdb_id, item_type, season_number in candidates
+        }
+        deleted_keys = indexed_keys - current_keys
         if deleted_keys:
             resubscribe_db.delete_resubscribe_index_by_keys(list(deleted_keys))
 
-        # ★★★ 步骤 6: 全新、高效的全量处理流程 ★★★
-        total = len(movies_to_process) + len(series_to_process)
-        if total == 0:
-            task_manager.update_status_from_thread(100, "任务完成：无需处理任何项目。")
-            return
+        # --- 步骤 4: 只对指纹变化的项目重新判定 ---
+        # asset 为空表示指纹未变；已被用户忽略或订阅的项目不覆盖其状态
+        items_to_evaluate = [
+            (row, rule) for row, rule in candidates.values()
+            if row.get('asset') and row.get('status') not in ['ignored', 'subscribed']
+        ]
+        total = len(items_to_evaluate)
+        logger.info(f"  ➜ 范围内共 {len(candidates)} 个电影/季，其中 {total} 个的资产或规则有变化，需要重新判定。")
 
-        logger.info(f"  ➜ 将对 {len(movies_to_process)} 部电影和 {len(series_to_process)} 部剧集按规则检查洗版状态...")
         index_update_batch = []
-        processed_count = 0
-
-        # ★★★在处理前，预先加载所有已存在的状态 ★★★
-        logger.info("  ➜ 正在获取当前所有项目的状态以保留用户操作...")
-        current_statuses = resubscribe_db.get_current_index_statuses()
-
-        # --- 6a. 处理所有电影 ---
-        for movie_index in movies_to_process:
+        for processed_count, (row, rule) in enumerate(items_to_evaluate, start=1):
             if processor.is_stop_requested(): break
-            processed_count += 1
             progress = int(20 + (processed_count / total) * 80)
-            task_manager.update_status_from_thread(progress, f"({processed_count}/{total}) 正在分析电影: {movie_index.get('Name')}")
-
-            tmdb_id = movie_index.get('ProviderIds', {}).get('Tmdb')
-            metadata = metadata_map.get(tmdb_id)
-            rule = library_to_rule_map.get(movie_index.get('_SourceLibraryId'))
+            label = "电影" if row['item_type'] == 'Movie' else f"剧集 第{row['season_number']}季"
+            task_manager.update_status_from_thread(progress, f"({processed_count}/{total}) 正在分析{label}: {row.get('title')}")
 
-            if not all([tmdb_id, metadata, rule]) or not metadata.get('asset_details_json'):
-                continue
-            
-            if metadata.get('item_type') != 'Movie':
-                logger.warning(f"  ➜ 检测到项目 '{metadata.get('title')}' (TMDB ID: {tmdb_id}) 被Emby错误识别为电影，实际类型为 '{metadata.get('item_type')}'。已跳过。")
-                continue
-
-            asset = metadata['asset_details_json'][0]
-            needs, reason = _item_needs_resubscribe(asset, rule, metadata)
+            media_metadata = {
+                'title': row.get('title'),
+                'original_language': row.get('original_language'),
+                'original_title': row.get('original_title'),
+            }
+            needs, reason = _item_needs_resubscribe(row['asset'], rule, media_metadata)
             status = 'needed' if needs else 'ok'
 
-            # ★★★ 检查现有状态，如果已被用户操作，则跳过 ★★★
-            item_key = (str(tmdb_id), "Movie", -1)
-            if current_statuses.get(item_key) in ['ignored', 'subscribed']:
-                continue # 尊重用户的忽略或已订阅状态，不进行覆盖
-            
             index_update_batch.append({
-                "tmdb_id": tmdb_id, "item_type": "Movie", "season_number": -1,
-                "status": status, "reason": reason, "matched_rule_id": rule.get('id')
+                "tmdb_id": row['tmdb_id'], "item_type": row['item_type'], "season_number": row['season_number'],
+                "status": status, "reason": reason, "matched_rule_id": rule.get('id'),
+                "source_fingerprint": row['fingerprint']
             })
 
-        # --- 6b. 处理所有剧集 ---
-        for series_index in series_to_process:
-            if processor.is_stop_requested(): break
-            processed_count += 1
-            progress = int(20 + (processed_count / total) * 80)
-            task_manager.update_status_from_thread(progress, f"({processed_count}/{total}) 正在分析剧集: {series_index.get('Name')}")
-
-            tmdb_id = series_index.get('ProviderIds', {}).get('Tmdb')
-            series_metadata = metadata_map.get(tmdb_id)
-            rule = library_to_rule_map.get(series_index.get('_SourceLibraryId'))
-            
-            # 获取该剧集在数据库中所有分集的元数据
-            episodes_for_series_from_db = episodes_metadata_map.get(tmdb_id)
-
-            if not all([tmdb_id, series_metadata, rule, episodes_for_series_from_db]):
-                continue
-
-            # 按季号对数据库中的分集元数据进行分组
-            episodes_by_season = defaultdict(list)
-            for ep_meta in episodes_for_series_from_db:
-                episodes_by_season[ep_meta.get('season_number')].append(ep_meta)
-
-            for season_num, episodes_in_season_meta in episodes_by_season.items():
-                if season_num is None or not episodes_in_season_meta: continue
-                
-                # 选取第一集作为代表进行分析
-                representative_episode_meta = episodes_in_season_meta[0]
-                if not representative_episode_meta.get('asset_details_json'): continue
-                
-                asset = representative_episode_meta['asset_details_json'][0]
-                needs, reason = _item_needs_resubscribe(asset, rule, series_metadata)
-                status = 'needed' if needs else 'ok'
-
-                # ★★★ 检查现有状态，如果已被用户操作，则跳过 ★★★
-                item_key = (str(tmdb_id), "Season", int(season_num))
-                if current_statuses.get(item_key) in ['ignored', 'subscribed']:
-                    continue # 尊重用户的忽略或已订阅状态，不进行覆盖
-
-                index_update_batch.append({
-                    "tmdb_id": tmdb_id, "item_type": "Season", "season_number": season_num,
-                    "status": status, "reason": reason, "matched_rule_id": rule.get('id')
-                })
-
+        # 中止时也写入已判定的部分，下次增量运行会跳过它们
         if index_update_batch:
             resubscribe_db.upsert_resubscribe_index_batch(index_update_batch)
             
-        final_message = "媒体洗版状态刷新完成！"
+        final_message = f"媒体洗版状态刷新完成！重新判定 {len(index_update_batch)} 项，{len(candidates) - total} 项无变化。"
         if processor.is_stop_requested(): final_message = "任务已中止。"
         task_manager.update_status_from_thread(100, final_message)
 
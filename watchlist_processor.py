@@ -4,7 +4,7 @@ import time
 import json
 import os
 import concurrent.futures
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta, timezone
 import threading
 
@@ -41,6 +41,9 @@ def translate_internal_status(status: str) -> str:
     """★★★ 新增：一个辅助函数，用于翻译内部状态，用于日志显示 ★★★"""
     return INTERNAL_STATUS_TRANSLATION.get(status, status)
 
+# 全进程共享的季详情拉取名额：不论同时有多少部剧在处理，并发的季请求都不会超过上限
+_season_fetch_slots = threading.BoundedSemaphore(constants.WATCHLIST_SEASON_FETCH_CONCURRENCY)
+
 class WatchlistProcessor:
     """
     【V13 - media_metadata 适配版】
@@ -88,7 +91,8 @@ class WatchlistProcessor:
             'missing_info_json': 'watchlist_missing_info_json',
             'last_episode_to_air_json': 'last_episode_to_air_json', # 这个字段是主元数据的一部分
             'is_airing': 'watchlist_is_airing',
-            'force_ended': 'force_ended'
+            'force_ended': 'force_ended',
+            'tmdb_fingerprint_json': 'watchlist_tmdb_fingerprint_json'
         }
         
         # 使用映射转换 updates 字典
@@ -209,13 +213,14 @@ class WatchlistProcessor:
                 def worker_process_series(series: dict):
                     if self.is_stop_requested(): return "任务已停止"
                     try:
-                        self._process_one_series(series)
+                        # 单项刷新与深度模式都不复用上次的季数据
+                        self._process_one_series(series, force_full_update=force_full_update or bool(tmdb_id))
                         return "处理成功"
                     except Exception as e:
                         logger.error(f"处理剧集 {series.get('item_name')} 时发生错误: {e}", exc_info=False)
                         return f"处理失败: {e}"
 
-                with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=constants.WATCHLIST_SERIES_WORKERS) as executor:
                     future_to_series = {executor.submit(worker_process_series, series): series for series in active_series}
                     
                     for future in concurrent.futures.as_completed(future_to_series):
@@ -271,7 +276,7 @@ class WatchlistProcessor:
                 series_name = series['item_name']
                 self.progress_callback(progress, f"检查中: {series_name[:20]}... ({i+1}/{total})")
 
-                tmdb_details = tmdb.get_tv_details(series['tmdb_id'], self.tmdb_api_key)
+                tmdb_details = tmdb.get_tv_details(series['tmdb_id'], self.tmdb_api_key, use_cache=False)
                 if not tmdb_details: continue
 
                 last_episode_info = series.get('last_episode_to_air_json')
@@ -283,7 +288,7 @@ class WatchlistProcessor:
 
                 if new_total_seasons > old_season_number:
                     new_season_to_check_num = old_season_number + 1
-                    season_details = tmdb.get_tv_season_details(series['tmdb_id'], new_season_to_check_num, self.tmdb_api_key)
+                    season_details = tmdb.get_tv_season_details(series['tmdb_id'], new_season_to_check_num, self.tmdb_api_key, use_cache=False)
                     
                     if season_details and (air_date_str := season_details.get('air_date')):
                         try:
@@ -345,6 +350,7 @@ class WatchlistProcessor:
                 last_episode_to_air_json,
                 watchlist_tmdb_status AS tmdb_status,
                 watchlist_missing_info_json AS missing_info_json,
+                watchlist_tmdb_fingerprint_json AS tmdb_fingerprint,
                 subscription_status
             FROM media_metadata
         """
@@ -431,7 +437,7 @@ class WatchlistProcessor:
         return final_series_to_process
             
     # ★★★ 核心处理逻辑：单个剧集的所有操作在此完成 ★★★
-    def _process_one_series(self, series_data: Dict[str, Any]):
+    def _process_one_series(self, series_data: Dict[str, Any], force_full_update: bool = False):
         tmdb_id = series_data['tmdb_id']
         # ★★★ 关键修改：emby_item_ids_json 是一个列表，我们取第一个作为代表ID ★★★
         emby_ids = series_data.get('emby_item_ids_json', [])
@@ -453,19 +459,35 @@ class WatchlistProcessor:
 
         # 步骤2: 从TMDb获取权威数据 (逻辑不变)
         logger.debug(f"  ➜ 正在从TMDb API获取 '{item_name}' 的最新详情...")
-        latest_series_data = tmdb.get_tv_details(tmdb_id, self.tmdb_api_key)
+        latest_series_data = tmdb.get_tv_details(tmdb_id, self.tmdb_api_key, use_cache=False)
         if not latest_series_data:
             logger.error(f"  ➜ 无法获取 '{item_name}' 的TMDb详情，本次处理中止。")
             return
         
+        # 只重新拉取指纹变化的季，其余季直接复用上次同步到本地的分集
+        fingerprint = self._build_tmdb_fingerprint(latest_series_data)
+        previous_fingerprint = series_data.get('tmdb_fingerprint') or {}
+        season_numbers = [int(k) for k in fingerprint["seasons"]]
+        cached_episodes = media_db.get_series_cached_tmdb_episodes(tmdb_id, season_numbers)
+        seasons_to_fetch = self._plan_season_fetches(latest_series_data, fingerprint, previous_fingerprint, cached_episodes, force_full_update)
+        if len(seasons_to_fetch) < len(season_numbers):
+            logger.debug(f"  ➜ '{item_name}' 共 {len(season_numbers)} 季，TMDb 指纹有变化需重新获取的季: {seasons_to_fetch or '无'}")
+
+        fetched_episodes, failed_seasons = self._fetch_seasons(tmdb_id, seasons_to_fetch)
+        if failed_seasons:
+            # 拉取失败的季暂用旧数据，并从指纹中去掉，保证下次一定重新拉取
+            logger.warning(f"  ➜ '{item_name}' 的第 {failed_seasons} 季获取失败，本次暂用本地已缓存的分集。")
+            for season_num in failed_seasons:
+                fingerprint["seasons"].pop(str(season_num), None)
+
         all_tmdb_episodes = []
-        for season_summary in latest_series_data.get("seasons", []):
-            season_num = season_summary.get("season_number")
-            if season_num is None or season_num == 0: continue
-            season_details = tmdb.get_season_details_tmdb(tmdb_id, season_num, self.tmdb_api_key)
-            if season_details and season_details.get("episodes"):
-                all_tmdb_episodes.extend(season_details.get("episodes", []))
-            time.sleep(0.1)
+        refreshed_episodes = []
+        for season_num in season_numbers:
+            if season_num in fetched_episodes:
+                all_tmdb_episodes.extend(fetched_episodes[season_num])
+                refreshed_episodes.extend(fetched_episodes[season_num])
+            else:
+                all_tmdb_episodes.extend(cached_episodes.get(season_num, []))
 
         # ★★★ 步骤3: 从本地数据库获取媒体库数据 (核心重构) ★★★
         # 不再调用 emby.get_series_children，而是调用 media_db
@@ -574,7 +596,8 @@ class WatchlistProcessor:
             "next_episode_to_air_json": json.dumps(real_next_episode_to_air) if real_next_episode_to_air else None,
             "missing_info_json": json.dumps(missing_info),
             "last_episode_to_air_json": json.dumps(last_episode_to_air) if last_episode_to_air else None,
-            "is_airing": is_truly_airing
+            "is_airing": is_truly_airing,
+            "tmdb_fingerprint_json": json.dumps(fingerprint, ensure_ascii=False)
         }
         self._update_watchlist_entry(tmdb_id, item_name, updates_to_db)
 
@@ -752,16 +775,93 @@ class WatchlistProcessor:
         try:
             logger.debug(f"  ➜ 正在为 '{item_name}' 更新 '媒体数据缓存' 中的子项目详情...")
             
+            # 复用的分集本来就来自 media_metadata，只需写回重新拉取的部分
             media_db.sync_series_children_metadata(
                 parent_tmdb_id=tmdb_id,
                 seasons=latest_series_data.get("seasons", []),
-                episodes=all_tmdb_episodes,
+                episodes=refreshed_episodes,
                 local_in_library_info=emby_seasons
             )
             
         except Exception as e_sync:
             logger.error(f"  ➜ [追剧联动] 在同步 '{item_name}' 的子项目详情到 '媒体数据缓存' 时发生错误: {e_sync}", exc_info=True)
 
+    # --- TMDb 变更指纹 ---
+    @staticmethod
+    def _build_tmdb_fingerprint(series_details: Dict[str, Any]) -> Dict[str, Any]:
+        """从剧集详情中提取能反映内容变化的字段，季级别记录 [首播日期, 集数]。"""
+        next_episode = series_details.get("next_episode_to_air") or {}
+        return {
+            "last_air_date": series_details.get("last_air_date"),
+            "number_of_episodes": series_details.get("number_of_episodes"),
+            "number_of_seasons": series_details.get("number_of_seasons"),
+            "status": series_details.get("status"),
+            "next_episode": [next_episode.get("season_number"), next_episode.get("episode_number"), next_episode.get("air_date")] if next_episode else None,
+            "seasons": {
+                str(season["season_number"]): [season.get("air_date"), season.get("episode_count")]
+                for season in series_details.get("seasons", [])
+                if season.get("season_number") not in (None, 0)
+            },
+        }
+
+    def _plan_season_fetches(self, series_details: Dict[str, Any], fingerprint: Dict[str, Any], previous: Dict[str, Any],
+                             cached_episodes: Dict[int, List[Dict]], force_full_update: bool) -> List[int]:
+        """
+        决定哪些季需要重新拉取：
+        - 深度模式或没有旧指纹：全部拉取。
+        - 季指纹 (首播日期/集数) 变了。
+        - 剧集级指纹变了，且该季正是最近播出/即将播出的季。
+        - 本地缓存的分集数不足，或有已播出的分集仍缺简介 (等 TMDb 补全)。
+        """
+        season_numbers = [int(k) for k in fingerprint["seasons"]]
+        if force_full_update or not previous:
+            return season_numbers
+
+        series_changed = any(previous.get(k) != v for k, v in fingerprint.items() if k != "seasons")
+        live_seasons = {
+            (series_details.get(key) or {}).get("season_number")
+            for key in ("last_episode_to_air", "next_episode_to_air")
+        }
+        previous_seasons = previous.get("seasons") or {}
+        today_str = datetime.now(timezone.utc).date().isoformat()
+
+        seasons_to_fetch = []
+        for season_num in season_numbers:
+            current = fingerprint["seasons"][str(season_num)]
+            episodes = cached_episodes.get(season_num, [])
+            if (previous_seasons.get(str(season_num)) != current
+                    or (series_changed and season_num in live_seasons)
+                    or len(episodes) < (current[1] or 0)
+                    or any(ep.get("air_date") and ep["air_date"] <= today_str and not ep.get("overview") for ep in episodes)):
+                seasons_to_fetch.append(season_num)
+        return seasons_to_fetch
+
+    def _fetch_seasons(self, tmdb_id: str, season_numbers: List[int]) -> Tuple[Dict[int, List[Dict]], List[int]]:
+        """并发拉取若干季的分集，返回 ({季号: 分集列表}, [拉取失败的季号])。"""
+        if not season_numbers:
+            return {}, []
+
+        def _fetch_one(season_num: int) -> Optional[Dict[str, Any]]:
+            with _season_fetch_slots:
+                return tmdb.get_season_details_tmdb(tmdb_id, season_num, self.tmdb_api_key, use_cache=False)
+
+        fetched, failed = {}, []
+        max_workers = min(len(season_numbers), constants.WATCHLIST_SEASON_FETCH_CONCURRENCY)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_season = {executor.submit(_fetch_one, season_num): season_num for season_num in season_numbers}
+            for future in concurrent.futures.as_completed(future_to_season):
+                season_num = future_to_season[future]
+                try:
+                    season_details = future.result()
+                except Exception as e:
+                    logger.error(f"  ➜ 获取剧集 {tmdb_id} 第 {season_num} 季详情时发生错误: {e}")
+                    season_details = None
+                if season_details is None:
+                    failed.append(season_num)
+                else:
+                    fetched[season_num] = season_details.get("episodes") or []
+        return fetched, sorted(failed)
+
     # --- 统一的、公开的追剧处理入口 ★★★
     def process_watching_list(self, item_id: Optional[str] = None):
         if item_id:
@@ -59,7 +59,7 @@ from routes.discover import discover_bp
 # --- 核心模块导入 ---
 import constants # 你的常量定义\
 import logging
-from logger_setup import frontend_log_queue, add_file_handler # 日志记录器和前端日志队列
+from logger_setup import frontend_log_queue, add_file_handler, configure_log_sampling # 日志记录器和前端日志队列
 import config_manager
 from database import connection
 
@@ -107,6 +107,9 @@ def save_config_and_reload(new_config: Dict[str, Any]):
         init_auth()
         
         scheduler_manager.update_all_scheduled_jobs()
+
+        # 反代相关配置 (原生库合并/顺序/选择) 可能已变化
+        extensions.invalidate_views_cache()
         
         logger.info("  ✅ 新配置重新初始化完毕。")
         
@@ -274,6 +277,8 @@ def application_exit_handler():
         extensions.media_processor_instance.close()
     
     scheduler_manager.shutdown()
+
+    connection.close_pool()
     
     logger.info("atexit 清理操作执行完毕。")
 atexit.register(application_exit_handler)
@@ -334,6 +339,7 @@ def main_app_start():
         log_size = constants.DEFAULT_LOG_ROTATION_SIZE_MB
         log_backups = constants.DEFAULT_LOG_ROTATION_BACKUPS
     add_file_handler(log_directory=config_manager.LOG_DIRECTORY, log_size_mb=log_size, log_backups=log_backups)
+    configure_log_sampling(config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_LOG_SAMPLING_ENABLED, True))
     
     connection.init_db()
 